@@ -37,11 +37,9 @@ class DeployExecutor:
         Returns:
             渲染后的字符串
         """
-        result = template
-        for key, value in context.items():
-            placeholder = f"{{{{ {key} }}}}"
-            result = result.replace(placeholder, str(value))
-        return result
+        from backend.template_renderer import render
+
+        return render(template, context, none_as="None")
 
     def _cleanup_existing_deployment(
         self, docker_config: Dict[str, Any], deploy_mode: str, context: Dict[str, Any]
@@ -40,10 +40,14 @@ except Exception as e:
     logger.error(f"设置 Python 路径失败: {e}", exc_info=True)
     sys.exit(1)
 
-# 导入模块
+# 尽早开始统计导入耗时（连接主程序后输出到日志）
+from backend import import_profiler
+
+import_profiler.install()
+
+# 导入模块（部署执行器在首次收到部署任务时再导入，先尽快连接主程序）
 try:
     from backend.agent.websocket_client import WebSocketClient
-    from backend.agent.deploy_executor import DeployExecutor
 
     logger.info("✅ 模块导入成功")
 except ImportError as e:
@@ -56,10 +60,20 @@ logging.getLogger("websockets").setLevel(logging.WARNING)  # 减少 websockets 
 
 # 全局变量
 websocket_client: Optional[WebSocketClient] = None
-deploy_executor: Optional[DeployExecutor] = None
+deploy_executor = None  # DeployExecutor，首次收到部署任务时创建
 running = True
 
 
+def get_deploy_executor():
+    """获取部署执行器（首次调用时导入并创建）"""
+    global deploy_executor
+    if deploy_executor is None:
+        from backend.agent.deploy_executor import DeployExecutor
+
+        deploy_executor = DeployExecutor()
+    return deploy_executor
+
+
 def generate_agent_unique_id() -> Optional[str]:
     """生成Agent唯一标识
     优先使用Docker的SystemID，如果不可用则使用/etc/machine-id
@@ -254,10 +268,14 @@ def on_connect():
         # 等待一小段时间，确保连接完全稳定
         await asyncio.sleep(0.5)
         if websocket_client and websocket_client.connected:
+            # 采集主机信息耗时较长（CPU 占用需采样 1 秒），在线程池中执行，不阻塞事件循环
+            loop = asyncio.get_running_loop()
+            host_info = await loop.run_in_executor(None, get_host_info)
+            docker_info = await loop.run_in_executor(None, get_docker_info)
             host_info_message = {
                 "type": "host_info",
-                "host_info": get_host_info(),
-                "docker_info": get_docker_info(),
+                "host_info": host_info,
+                "docker_info": docker_info,
             }
             # 如果使用新方式且有agent_token，添加到消息中
             if websocket_client.agent_token:
@@ -404,7 +422,7 @@ async def handle_deploy_task(message: Dict[str, Any]):
         # 短暂延迟，确保消息发送完成
         await asyncio.sleep(0.2)
 
-        result = deploy_executor.execute_deploy(
+        result = get_deploy_executor().execute_deploy(
             deploy_config, context, deploy_mode=deploy_mode
         )
 
@@ -511,7 +529,7 @@ def signal_handler(signum, frame):
 
 async def main():
     """主函数"""
-    global websocket_client, deploy_executor, running
+    global websocket_client, running
 
     logger.info("=" * 60)
     logger.info("Agent 启动中...")
@@ -550,9 +568,6 @@ async def main():
     if agent_token:
         logger.info(f"标识: {agent_token[:16]}...")
 
-    # 初始化部署执行器
-    deploy_executor = DeployExecutor()
-
     # 初始化 WebSocket 客户端
     def get_heartbeat_data():
         """获取心跳数据（包含host_info和docker_info）"""
@@ -600,6 +615,10 @@ async def main():
         # 启动 WebSocket 客户端
         await websocket_client.start()
 
+        # 输出启动耗时（最慢的导入模块和各启动阶段），之后不再统计运行期的延迟导入
+        import_profiler.log_report("Agent 启动耗时", log=logger.info)
+        import_profiler.uninstall()
+
         # 保持运行
         while running:
             await asyncio.sleep(1)
@@ -282,9 +282,13 @@ class WebSocketClient:
                         heartbeat_message["agent_token"] = self.agent_token
 
                     # 如果提供了心跳数据回调，获取额外数据并添加到心跳消息中
+                    # （采集主机信息耗时较长，在线程池中执行，不阻塞事件循环）
                     if self.heartbeat_data_callback:
                         try:
-                            extra_data = self.heartbeat_data_callback()
+                            loop = asyncio.get_running_loop()
+                            extra_data = await loop.run_in_executor(
+                                None, self.heartbeat_data_callback
+                            )
                             if extra_data:
                                 heartbeat_message.update(extra_data)
                         except Exception as e:
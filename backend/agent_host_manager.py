@@ -13,16 +13,9 @@ from typing import List, Dict, Optional, Any
 from backend.database import get_db_session, init_db
 from backend.models import AgentHost
 from backend.config import load_config
-from backend.portainer_client import PortainerClient
 
 logger = logging.getLogger(__name__)
 
-# 确保数据库已初始化
-try:
-    init_db()
-except:
-    pass
-
 
 class AgentHostManager:
     """Agent主机资源管理器"""
@@ -39,7 +32,11 @@ class AgentHostManager:
 
     def _init(self):
         """初始化Agent主机管理器"""
-        pass
+        # 首次使用时确保数据库已初始化（不在模块导入时执行）
+        try:
+            init_db()
+        except:
+            pass
 
     def _generate_token(self) -> str:
         """生成唯一token"""
@@ -284,6 +281,8 @@ class AgentHostManager:
         Returns:
             测试结果
         """
+        from backend.portainer_client import PortainerClient
+
         try:
             client = PortainerClient(portainer_url, api_key, endpoint_id)
             result = client.test_connection()
@@ -351,6 +350,8 @@ class AgentHostManager:
             ):
                 return None
 
+            from backend.portainer_client import PortainerClient
+
             # 重试机制：只有在多次失败后才标记为离线
             last_error = None
             success = False
@@ -12,12 +12,6 @@ from typing import List, Dict, Optional, Any
 from backend.database import get_db_session, init_db
 from backend.models import AgentSecret
 
-# 确保数据库已初始化
-try:
-    init_db()
-except:
-    pass
-
 
 class AgentSecretManager:
     """Agent密钥管理器"""
@@ -34,7 +28,11 @@ class AgentSecretManager:
 
     def _init(self):
         """初始化密钥管理器"""
-        pass
+        # 首次使用时确保数据库已初始化（不在模块导入时执行）
+        try:
+            init_db()
+        except:
+            pass
 
     def _generate_secret_key(self) -> str:
         """生成唯一密钥（32位小写字母和数字）"""
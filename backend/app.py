@@ -5,12 +5,18 @@ import sys
 # 添加项目根目录到 Python 路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# 尽早开始统计导入耗时（启动完成后输出到日志）
+from backend import import_profiler
+
+import_profiler.install()
+
 from fastapi import FastAPI, Request
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Dict, Any
 
+from backend import metrics
 from backend.routes import router
 from backend.utils import ensure_dirs
 
@@ -30,6 +36,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 请求指标（按路由统计耗时和数据库查询，从 /metrics 输出）
+app.add_middleware(metrics.MetricsMiddleware)
+
 # 注册路由（添加 /api 前缀）
 app.include_router(router, prefix="/api")
 
@@ -94,6 +103,13 @@ async def health_check_api():
     return {"status": "healthy", "service": "app2docker"}
 
 
+# Prometheus 指标（在 /api 之外）
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    """Prometheus 文本格式的运行指标"""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # 全局变量：本地 Agent WebSocket 客户端
 _local_agent_client = None
 
@@ -225,13 +241,36 @@ async def startup_event():
     # 确保必要的目录存在
     ensure_dirs()
 
+    # 在后台连接 Docker（远程 Docker 可能需要数秒，不阻塞服务就绪）
+    from backend.handlers import init_docker_builder_async
+
+    init_docker_builder_async()
+
     # 初始化数据库（包括迁移）
     from backend.database import init_db
 
-    init_db()
+    with import_profiler.phase("数据库初始化"):
+        init_db()
 
     # 启动流水线调度器
-    start_scheduler()
+    with import_profiler.phase("流水线调度器"):
+        start_scheduler()
+
+    with import_profiler.phase("后台服务"):
+        # 启动 Webhook 接收队列（恢复未处理完的投递）
+        from backend.webhook_ingest import WebhookIngestQueue
+
+        WebhookIngestQueue().start()
+
+        # 启动磁盘配额回收（构建上下文和导出文件）
+        from backend.disk_gc import DiskBudgetGC
+
+        DiskBudgetGC().start()
+
+        # 启动构建后Webhook分发器（恢复未完成的通知）
+        from backend.webhook_dispatcher import PostBuildWebhookDispatcher
+
+        PostBuildWebhookDispatcher().start()
 
     # 自动注册主程序为 Agent 并连接
     global _local_agent_client
@@ -255,26 +294,30 @@ async def startup_event():
             print(f"✅ 已自动注册本地 Agent: {local_agent.get('host_id')}")
             print(f"   Token: {local_agent.get('token')}")
 
-        # 立即获取并更新本地主机的host_info和docker_info
-        try:
-            host_info = get_local_host_info()
-            docker_info = get_local_docker_info()
-
-            # 更新主机状态和信息（设置为online，因为本地agent是直接连接的）
-            agent_manager.update_host_status(
-                local_agent.get("host_id"),
-                "online",
-                host_info=host_info,
-                docker_info=docker_info,
-            )
-            print(
-                f"✅ 已更新本地 Agent 主机信息: host_info={len(host_info)}项, docker_info={len(docker_info)}项"
-            )
-        except Exception as e:
-            print(f"⚠️ 更新本地 Agent 主机信息失败: {e}")
-            import traceback
+        # 在后台获取并更新本地主机的host_info和docker_info
+        # （采集 CPU 占用需要 1 秒，docker 命令可能更久，不阻塞服务就绪）
+        def update_local_host_info():
+            try:
+                host_info = get_local_host_info()
+                docker_info = get_local_docker_info()
 
-            traceback.print_exc()
+                # 更新主机状态和信息（设置为online，因为本地agent是直接连接的）
+                agent_manager.update_host_status(
+                    local_agent.get("host_id"),
+                    "online",
+                    host_info=host_info,
+                    docker_info=docker_info,
+                )
+                print(
+                    f"✅ 已更新本地 Agent 主机信息: host_info={len(host_info)}项, docker_info={len(docker_info)}项"
+                )
+            except Exception as e:
+                print(f"⚠️ 更新本地 Agent 主机信息失败: {e}")
+                import traceback
+
+                traceback.print_exc()
+
+        asyncio.get_running_loop().run_in_executor(None, update_local_host_info)
 
         # 启动本地 Agent WebSocket 客户端连接到自身
         try:
@@ -309,40 +352,44 @@ async def startup_event():
 
                 # 连接成功后，立即发送主机信息
                 if _local_agent_client:
-                    # 获取最新的主机信息
-                    try:
-                        host_info = get_local_host_info()
-                        docker_info = get_local_docker_info()
+                    asyncio.create_task(send_local_host_info())
 
-                        # 发送host_info消息
-                        asyncio.create_task(
-                            _local_agent_client.send_message(
-                                {
-                                    "type": "host_info",
-                                    "host_info": host_info,
-                                    "docker_info": docker_info,
-                                }
-                            )
-                        )
-                        print("✅ 已发送本地 Agent 主机信息")
+            async def send_local_host_info():
+                """在线程池中采集主机信息后发送（采集耗时较长，不阻塞事件循环）"""
+                try:
+                    loop = asyncio.get_running_loop()
+                    host_info = await loop.run_in_executor(None, get_local_host_info)
+                    docker_info = await loop.run_in_executor(
+                        None, get_local_docker_info
+                    )
 
-                        # 同时更新数据库中的主机信息
-                        try:
-                            agent_manager.update_host_status(
-                                local_agent.get("host_id"),
-                                "online",
-                                host_info=host_info,
-                                docker_info=docker_info,
-                            )
-                            print("✅ 已更新本地 Agent 主机状态为 online")
-                        except Exception as update_error:
-                            print(f"⚠️ 更新本地 Agent 主机状态失败: {update_error}")
-                    except Exception as e:
-                        print(f"⚠️ 发送本地 Agent 主机信息失败: {e}")
-                        print(f"   错误类型: {type(e).__name__}")
-                        import traceback
+                    # 发送host_info消息
+                    await _local_agent_client.send_message(
+                        {
+                            "type": "host_info",
+                            "host_info": host_info,
+                            "docker_info": docker_info,
+                        }
+                    )
+                    print("✅ 已发送本地 Agent 主机信息")
 
-                        traceback.print_exc()
+                    # 同时更新数据库中的主机信息
+                    try:
+                        agent_manager.update_host_status(
+                            local_agent.get("host_id"),
+                            "online",
+                            host_info=host_info,
+                            docker_info=docker_info,
+                        )
+                        print("✅ 已更新本地 Agent 主机状态为 online")
+                    except Exception as update_error:
+                        print(f"⚠️ 更新本地 Agent 主机状态失败: {update_error}")
+                except Exception as e:
+                    print(f"⚠️ 发送本地 Agent 主机信息失败: {e}")
+                    print(f"   错误类型: {type(e).__name__}")
+                    import traceback
+
+                    traceback.print_exc()
 
             def on_disconnect():
                 """断开连接回调"""
@@ -507,21 +554,22 @@ async def startup_event():
             print(f"   本地 Agent host_id: {local_agent.get('host_id')}")
             print(f"   本地 Agent token: {local_agent.get('token')[:8]}...")
 
-            # 等待一小段时间，让连接有机会建立
-            await asyncio.sleep(1)
+            async def check_local_agent_connection():
+                """服务就绪后检查本地 Agent 连接状态（启动事件完成前服务不接受连接）"""
+                await asyncio.sleep(3)
+                from backend.websocket_handler import active_connections
 
-            # 检查连接状态
-            from backend.websocket_handler import active_connections
+                host_id = local_agent.get("host_id")
+                if host_id in active_connections:
+                    print(f"✅ 本地 Agent 连接已建立并注册: {host_id}")
+                else:
+                    print(f"⚠️ 本地 Agent 连接尚未建立: {host_id}")
+                    print(
+                        f"   当前 active_connections keys: {list(active_connections.keys())}"
+                    )
+                    print(f"   提示: 连接可能在后台建立中，请稍候...")
 
-            host_id = local_agent.get("host_id")
-            if host_id in active_connections:
-                print(f"✅ 本地 Agent 连接已建立并注册: {host_id}")
-            else:
-                print(f"⚠️ 本地 Agent 连接尚未建立: {host_id}")
-                print(
-                    f"   当前 active_connections keys: {list(active_connections.keys())}"
-                )
-                print(f"   提示: 连接可能在后台建立中，请稍候...")
+            asyncio.create_task(check_local_agent_connection())
 
         except Exception as e:
             print(f"⚠️ 启动本地 Agent WebSocket 客户端失败: {e}")
@@ -583,6 +631,10 @@ async def startup_event():
     print("⏰ 流水线调度器: 已启动")
     print("=" * 60)
 
+    # 输出启动耗时（最慢的导入模块和各启动阶段），之后不再统计运行期的延迟导入
+    import_profiler.log_report("服务启动耗时")
+    import_profiler.uninstall()
+
 
 # 关闭事件
 @app.on_event("shutdown")
@@ -602,6 +654,26 @@ async def shutdown_event():
     # 停止流水线调度器
     stop_scheduler()
 
+    # 停止 Webhook 接收队列（未处理的投递在下次启动时继续处理）
+    from backend.webhook_ingest import WebhookIngestQueue
+
+    WebhookIngestQueue().stop()
+
+    # 停止磁盘配额回收
+    from backend.disk_gc import DiskBudgetGC
+
+    DiskBudgetGC().stop()
+
+    # 停止构建后Webhook分发器（未完成的通知在下次启动时继续发送）
+    from backend.webhook_dispatcher import PostBuildWebhookDispatcher
+
+    PostBuildWebhookDispatcher().stop()
+
+    # 写入队列中尚未写入的操作日志
+    from backend.handlers import OperationLogger
+
+    OperationLogger.flush()
+
     print("\n👋 服务已停止")
 
 
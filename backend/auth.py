@@ -5,13 +5,25 @@ import jwt
 import hashlib
 import secrets
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from functools import wraps
-from typing import List, Set, Optional
+from typing import FrozenSet, List, Set, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from backend.session_changes import get_pending, register_change_handler
 
 # 配置
 TOKEN_EXPIRE_HOURS = 24
 
+# 已验证 token 的缓存条数（按 token 哈希，过期后自动失效）
+TOKEN_CACHE_SIZE = 1024
+
+# 用户角色/权限缓存的用户数
+ACCESS_CACHE_SIZE = 1024
+
 # SECRET_KEY 文件路径
 SECRET_KEY_FILE = "data/secret_key.txt"
 
@@ -72,18 +84,43 @@ def create_token(username: str) -> str:
     return jwt.encode(payload, SECRET_KEY, algorithm='HS256')
 
 
+# 已验证 token 缓存：token 哈希 -> (用户名, 过期时间戳)
+_token_cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+
 def verify_token(token: str) -> dict:
-    """验证 JWT token"""
+    """验证 JWT token（验证通过的 token 在过期前缓存，避免每个请求重复解码）"""
+    cache_key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    with _token_cache_lock:
+        cached = _token_cache.get(cache_key)
+        if cached is not None:
+            username, exp = cached
+            # 与 JWT 库的过期判断一致：exp 为 UTC 时间戳
+            if time.time() < exp:
+                _token_cache.move_to_end(cache_key)
+                return {'valid': True, 'username': username}
+            del _token_cache[cache_key]
+
     try:
         # 使用 options 参数，不验证 iat（issued at）时间，避免时间不匹配问题
         # JWT 库默认使用 UTC 时间，但我们的系统使用本地时间
         payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'], options={'verify_iat': False})
-        return {'valid': True, 'username': payload['username']}
     except jwt.ExpiredSignatureError:
         return {'valid': False, 'error': 'Token 已过期'}
     except jwt.InvalidTokenError:
         return {'valid': False, 'error': 'Token 无效'}
 
+    username = payload['username']
+    exp = payload.get('exp')
+    if isinstance(exp, (int, float)):
+        with _token_cache_lock:
+            _token_cache[cache_key] = (username, float(exp))
+            _token_cache.move_to_end(cache_key)
+            while len(_token_cache) > TOKEN_CACHE_SIZE:
+                _token_cache.popitem(last=False)
+    return {'valid': True, 'username': username}
+
 
 def authenticate(username: str, password: str) -> dict:
     """用户认证"""
@@ -181,44 +218,68 @@ def get_user_from_db(username: str):
         return None
 
 
+# 用户角色/权限缓存：用户名 -> (角色名集合, 权限代码集合)
+_access_cache: "OrderedDict[str, Tuple[FrozenSet[str], FrozenSet[str]]]" = OrderedDict()
+_access_cache_lock = threading.Lock()
+# 每次失效时递增，防止失效前开始的查询把旧结果写回缓存
+_access_cache_generation = 0
+
+# 会话变更处理器名称（记录本事务中修改的用户、角色或权限模型）
+_CHANGE_HANDLER_NAME = "auth_access"
+
+
+def _get_user_access(username: str) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    """获取用户的角色名和权限代码（一条关联查询，结果缓存到用户、角色或权限变更为止）"""
+    with _access_cache_lock:
+        cached = _access_cache.get(username)
+        if cached is not None:
+            _access_cache.move_to_end(username)
+            return cached
+        generation = _access_cache_generation
+
+    from backend.database import get_db_session
+    from backend.models import User, UserRole, Role, RolePermission, Permission
+
+    db = get_db_session()
+    try:
+        rows = (
+            db.query(Role.name, Permission.code)
+            .select_from(User)
+            .join(UserRole, UserRole.user_id == User.user_id)
+            .join(Role, Role.role_id == UserRole.role_id)
+            .outerjoin(RolePermission, RolePermission.role_id == Role.role_id)
+            .outerjoin(Permission, Permission.permission_id == RolePermission.permission_id)
+            .filter(User.username == username, User.enabled == True)
+            .all()
+        )
+    finally:
+        db.close()
+
+    access = (
+        frozenset(row[0] for row in rows if row[0]),
+        frozenset(row[1] for row in rows if row[1]),
+    )
+    with _access_cache_lock:
+        if generation == _access_cache_generation:
+            _access_cache[username] = access
+            _access_cache.move_to_end(username)
+            while len(_access_cache) > ACCESS_CACHE_SIZE:
+                _access_cache.popitem(last=False)
+    return access
+
+
+def invalidate_access_cache():
+    """清空用户角色/权限缓存（用户、角色、权限或其关联变更后调用）"""
+    global _access_cache_generation
+    with _access_cache_lock:
+        _access_cache.clear()
+        _access_cache_generation += 1
+
+
 def get_user_permissions(username: str) -> Set[str]:
     """获取用户的所有权限代码集合"""
     try:
-        from backend.database import get_db_session
-        from backend.models import User, UserRole, RolePermission
-        
-        db = get_db_session()
-        try:
-            user = db.query(User).filter(User.username == username, User.enabled == True).first()
-            if not user:
-                return set()
-            
-            # 获取用户的所有角色
-            user_roles = db.query(UserRole).filter(UserRole.user_id == user.user_id).all()
-            role_ids = [ur.role_id for ur in user_roles]
-            
-            if not role_ids:
-                return set()
-            
-            # 获取角色对应的所有权限
-            role_permissions = db.query(RolePermission).filter(
-                RolePermission.role_id.in_(role_ids)
-            ).all()
-            
-            permission_ids = [rp.permission_id for rp in role_permissions]
-            
-            if not permission_ids:
-                return set()
-            
-            # 获取权限代码
-            from backend.models import Permission
-            permissions = db.query(Permission).filter(
-                Permission.permission_id.in_(permission_ids)
-            ).all()
-            
-            return {perm.code for perm in permissions}
-        finally:
-            db.close()
+        return set(_get_user_access(username)[1])
     except Exception as e:
         print(f"⚠️ 获取用户权限失败: {e}")
         return set()
@@ -233,29 +294,51 @@ def check_permission(username: str, permission_code: str) -> bool:
 def check_role(username: str, role_name: str) -> bool:
     """检查用户是否有指定角色"""
     try:
-        from backend.database import get_db_session
-        from backend.models import User, UserRole, Role
-        
-        db = get_db_session()
-        try:
-            user = db.query(User).filter(User.username == username, User.enabled == True).first()
-            if not user:
-                return False
-            
-            # 获取用户的所有角色
-            user_roles = db.query(UserRole).join(Role).filter(
-                UserRole.user_id == user.user_id,
-                Role.name == role_name
-            ).first()
-            
-            return user_roles is not None
-        finally:
-            db.close()
+        return role_name in _get_user_access(username)[0]
     except Exception as e:
         print(f"⚠️ 检查用户角色失败: {e}")
         return False
 
 
+def _is_access_model(obj_or_class) -> bool:
+    """是否为影响用户角色/权限的模型"""
+    from backend.models import User, UserRole, Role, RolePermission, Permission
+
+    access_models = (User, UserRole, Role, RolePermission, Permission)
+    if isinstance(obj_or_class, type):
+        return issubclass(obj_or_class, access_models)
+    return isinstance(obj_or_class, access_models)
+
+
+def _collect_access_changes(session, changed: Set[str]):
+    """记录本次刷新中修改的用户、角色或权限模型"""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if _is_access_model(obj):
+            changed.add(type(obj).__name__)
+
+
+def _invalidate_access_changes(changed: Set[str]):
+    """事务提交后使用户角色/权限缓存失效"""
+    invalidate_access_cache()
+
+
+register_change_handler(
+    _CHANGE_HANDLER_NAME, _collect_access_changes, _invalidate_access_changes
+)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_access_changes(orm_execute_state):
+    """记录批量更新/删除（如 query(UserRole).delete()）是否涉及用户、角色或权限"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and _is_access_model(mapper.class_):
+        get_pending(orm_execute_state.session, _CHANGE_HANDLER_NAME).add(
+            mapper.class_.__name__
+        )
+
+
 def require_permission(permission_code: str):
     """装饰器：要求指定权限"""
     def decorator(func):
@@ -0,0 +1,323 @@
+# backend/blob_store.py
+"""
+内容寻址存储模块（CAS）
+资源包、上传的构建产物按 sha256 存储一份，构建上下文通过 reflink/硬链接组装，
+跨文件系统时回退为复制；通过引用计数保证清理时不会删除仍在使用中的 blob
+"""
+import os
+import json
+import shutil
+import hashlib
+import threading
+import uuid
+from typing import Dict, Iterable, List, Optional
+
+# blob 存储目录
+BLOB_STORE_DIR = "data/blobs"
+
+# 引用索引文件：{digest: [holder, ...]}
+BLOB_REFS_FILE = os.path.join(BLOB_STORE_DIR, "refs.json")
+
+# 读取文件时的块大小
+_CHUNK_SIZE = 1024 * 1024
+
+# Linux FICLONE ioctl（btrfs/xfs 等支持写时复制的文件系统）
+_FICLONE = 0x40049409
+
+
+def package_holder(package_id: str) -> str:
+    """资源包对应的引用持有者标识"""
+    return f"package:{package_id}"
+
+
+def context_holder(build_context: str) -> str:
+    """构建上下文对应的引用持有者标识"""
+    return f"context:{os.path.abspath(build_context)}"
+
+
+def _try_reflink(src: str, dst: str) -> bool:
+    """尝试使用 reflink（写时复制）克隆文件，不支持时返回 False"""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        shutil.copystat(src, dst)
+        return True
+    except OSError:
+        try:
+            if os.path.exists(dst):
+                os.remove(dst)
+        except OSError:
+            pass
+        return False
+
+
+def link_or_copy(src: str, dst: str) -> str:
+    """
+    将 src 放置到 dst：优先 reflink，其次硬链接，最后回退为复制
+
+    Returns:
+        实际使用的方式："reflink"、"hardlink" 或 "copy"
+    """
+    # 目标已存在时先删除，避免写入共享 inode 破坏 blob 内容
+    if os.path.lexists(dst):
+        os.remove(dst)
+
+    if _try_reflink(src, dst):
+        return "reflink"
+
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        # 跨文件系统或不支持硬链接
+        shutil.copy2(src, dst)
+        return "copy"
+
+
+class BlobStore:
+    """内容寻址 blob 存储（带引用计数）"""
+
+    _instance = None
+    _lock = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._lock = threading.RLock()
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        """初始化 blob 存储"""
+        os.makedirs(BLOB_STORE_DIR, exist_ok=True)
+        self._refs: Dict[str, List[str]] = self._load_refs()
+
+    def _load_refs(self) -> Dict[str, List[str]]:
+        """加载引用索引"""
+        if not os.path.exists(BLOB_REFS_FILE):
+            return {}
+        try:
+            with open(BLOB_REFS_FILE, "r", encoding="utf-8") as f:
+                refs = json.load(f)
+            return {k: list(v) for k, v in refs.items() if isinstance(v, list)}
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"⚠️ 加载 blob 引用索引失败: {e}，将重新建立")
+            return {}
+
+    def _save_refs(self):
+        """保存引用索引（临时文件 + 原子替换）"""
+        temp_file = BLOB_REFS_FILE + ".tmp"
+        try:
+            with open(temp_file, "w", encoding="utf-8") as f:
+                json.dump(self._refs, f, indent=2, ensure_ascii=False)
+            os.replace(temp_file, BLOB_REFS_FILE)
+        except Exception as e:
+            print(f"⚠️ 保存 blob 引用索引失败: {e}")
+            if os.path.exists(temp_file):
+                try:
+                    os.remove(temp_file)
+                except OSError:
+                    pass
+
+    def blob_path(self, digest: str) -> str:
+        """获取 blob 的存储路径（按前两位分目录）"""
+        return os.path.join(BLOB_STORE_DIR, "sha256", digest[:2], digest)
+
+    def has_blob(self, digest: str) -> bool:
+        """检查 blob 是否存在"""
+        return os.path.exists(self.blob_path(digest))
+
+    @staticmethod
+    def hash_file(file_path: str) -> str:
+        """计算文件的 sha256"""
+        h = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            while True:
+                chunk = f.read(_CHUNK_SIZE)
+                if not chunk:
+                    break
+                h.update(chunk)
+        return h.hexdigest()
+
+    def put_file(
+        self,
+        file_path: str,
+        holder: Optional[str] = None,
+        replace_with_link: bool = False,
+    ) -> str:
+        """
+        将文件存入 blob 存储
+
+        Args:
+            file_path: 源文件路径
+            holder: 引用持有者（可选），存入后自动增加引用
+            replace_with_link: 是否将源文件替换为指向 blob 的链接（去重原文件占用）
+
+        Returns:
+            blob 的 sha256 摘要
+        """
+        digest = self.hash_file(file_path)
+        blob = self.blob_path(digest)
+
+        with self._lock:
+            if not os.path.exists(blob):
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                temp_blob = f"{blob}.{uuid.uuid4().hex[:8]}.tmp"
+                try:
+                    link_or_copy(file_path, temp_blob)
+                    os.replace(temp_blob, blob)
+                finally:
+                    if os.path.exists(temp_blob):
+                        os.remove(temp_blob)
+            elif replace_with_link:
+                # 内容已存在：用已有 blob 替换源文件，释放重复空间
+                temp_file = f"{file_path}.{uuid.uuid4().hex[:8]}.tmp"
+                try:
+                    link_or_copy(blob, temp_file)
+                    os.replace(temp_file, file_path)
+                finally:
+                    if os.path.exists(temp_file):
+                        os.remove(temp_file)
+
+            if holder:
+                self._add_ref(digest, holder)
+                self._save_refs()
+
+        return digest
+
+    def put_bytes(self, data: bytes, holder: Optional[str] = None) -> str:
+        """将字节内容存入 blob 存储，返回 sha256 摘要"""
+        digest = hashlib.sha256(data).hexdigest()
+        blob = self.blob_path(digest)
+
+        with self._lock:
+            if not os.path.exists(blob):
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                temp_blob = f"{blob}.{uuid.uuid4().hex[:8]}.tmp"
+                try:
+                    with open(temp_blob, "wb") as f:
+                        f.write(data)
+                    os.replace(temp_blob, blob)
+                finally:
+                    if os.path.exists(temp_blob):
+                        os.remove(temp_blob)
+
+            if holder:
+                self._add_ref(digest, holder)
+                self._save_refs()
+
+        return digest
+
+    def materialize(self, digest: str, dst: str, holder: Optional[str] = None) -> str:
+        """
+        将 blob 放置到目标路径（reflink/硬链接/复制）
+
+        Args:
+            digest: blob 摘要
+            dst: 目标文件路径
+            holder: 引用持有者（可选）
+
+        Returns:
+            实际使用的方式："reflink"、"hardlink" 或 "copy"
+        """
+        blob = self.blob_path(digest)
+        if not os.path.exists(blob):
+            raise FileNotFoundError(f"blob 不存在: {digest}")
+
+        os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+        with self._lock:
+            method = link_or_copy(blob, dst)
+            if holder:
+                self._add_ref(digest, holder)
+                self._save_refs()
+        return method
+
+    def _add_ref(self, digest: str, holder: str):
+        """增加引用（调用方需持有锁）"""
+        holders = self._refs.setdefault(digest, [])
+        if holder not in holders:
+            holders.append(holder)
+
+    def add_refs(self, digests: Iterable[str], holder: str):
+        """批量为持有者增加引用"""
+        with self._lock:
+            for digest in digests:
+                self._add_ref(digest, holder)
+            self._save_refs()
+
+    def ref_count(self, digest: str) -> int:
+        """获取 blob 的引用数"""
+        with self._lock:
+            return len(self._refs.get(digest, []))
+
+    def release_holder(self, holder: str, collect: bool = True) -> int:
+        """
+        释放持有者的全部引用
+
+        Args:
+            holder: 引用持有者
+            collect: 释放后是否立即回收无引用的 blob
+
+        Returns:
+            回收的 blob 数量
+        """
+        with self._lock:
+            changed = False
+            for digest in list(self._refs.keys()):
+                holders = self._refs[digest]
+                if holder in holders:
+                    holders.remove(holder)
+                    changed = True
+            if changed:
+                self._save_refs()
+            if not collect:
+                return 0
+            return self.gc()
+
+    def release_context(self, build_context: str, collect: bool = True) -> int:
+        """释放构建上下文持有的引用（构建上下文删除后调用）"""
+        return self.release_holder(context_holder(build_context), collect)
+
+    def gc(self) -> int:
+        """
+        回收无引用的 blob
+
+        已不存在的构建上下文持有的引用视为失效（例如被手动删除的目录）
+
+        Returns:
+            回收的 blob 数量
+        """
+        removed = 0
+        with self._lock:
+            for digest in list(self._refs.keys()):
+                holders = [
+                    h
+                    for h in self._refs[digest]
+                    if not (
+                        h.startswith("context:")
+                        and not os.path.exists(h[len("context:"):])
+                    )
+                ]
+                if holders:
+                    self._refs[digest] = holders
+                    continue
+
+                del self._refs[digest]
+                blob = self.blob_path(digest)
+                if os.path.exists(blob):
+                    try:
+                        os.remove(blob)
+                        removed += 1
+                    except OSError as e:
+                        print(f"⚠️ 删除 blob 失败 ({digest[:12]}): {e}")
+
+            self._save_refs()
+
+        if removed:
+            print(f"🧹 已回收 {removed} 个无引用的 blob")
+        return removed
@@ -0,0 +1,251 @@
+# backend/build_context.py
+"""
+构建上下文打包模块
+远程构建时按 .dockerignore 过滤构建上下文，并打包为 gzip 压缩的 tar 上传，
+默认排除 .git；内容相同的上下文复用已缓存的 tar（同一任务重试、多服务共用上下文）
+"""
+import os
+import stat
+import time
+import hashlib
+import tarfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# 构建上下文 tar 缓存目录
+CONTEXT_CACHE_DIR = "data/context_cache"
+
+# 最多保留的缓存 tar 数量（按最近使用时间淘汰）
+CONTEXT_CACHE_MAX_ENTRIES = 20
+
+# gzip 压缩级别（9 压缩率最高但明显更慢，6 为速度与体积的折中）
+CONTEXT_GZIP_LEVEL = 6
+
+# 默认排除的路径（.dockerignore 之外）
+# source_temp 为从源码构建时克隆仓库的临时目录，源码已复制到上下文根目录
+DEFAULT_CONTEXT_EXCLUDES = ["**/.git", "source_temp"]
+
+_cache_lock = threading.Lock()
+# 正在打包的上下文：指纹 -> [打包锁, 等待/打包中的线程数]
+_packing: Dict[str, list] = {}
+
+
+def read_dockerignore(context_path: str) -> List[str]:
+    """读取 .dockerignore 中的排除规则（忽略空行和注释）"""
+    dockerignore = os.path.join(context_path, ".dockerignore")
+    if not os.path.exists(dockerignore):
+        return []
+    with open(dockerignore, "r", encoding="utf-8", errors="ignore") as f:
+        return [
+            line.strip()
+            for line in f.read().splitlines()
+            if line.strip() and not line.strip().startswith("#")
+        ]
+
+
+def _list_context_files(context_path: str, dockerfile: Optional[str]) -> List[str]:
+    """按排除规则列出构建上下文中需要打包的路径（相对路径，已排序）"""
+    from docker.utils.build import exclude_paths
+
+    patterns = DEFAULT_CONTEXT_EXCLUDES + read_dockerignore(context_path)
+    return sorted(exclude_paths(context_path, patterns, dockerfile=dockerfile))
+
+
+def _file_digest(full_path: str) -> str:
+    """计算文件内容的 sha256"""
+    h = hashlib.sha256()
+    with open(full_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _fingerprint(context_path: str, paths: List[str], dockerfile: Optional[str]) -> str:
+    """
+    根据内容计算上下文指纹（相对路径、权限和文件内容摘要）
+
+    不包含上下文所在目录和修改时间，重试任务重新克隆到新目录时仍能命中缓存
+    """
+    h = hashlib.sha256()
+    h.update((dockerfile or "Dockerfile").encode("utf-8"))
+    h.update(str(CONTEXT_GZIP_LEVEL).encode("utf-8"))
+    for rel_path in paths:
+        full_path = os.path.join(context_path, rel_path)
+        try:
+            st = os.lstat(full_path)
+            if stat.S_ISLNK(st.st_mode):
+                content = "link:" + os.readlink(full_path)
+            elif stat.S_ISREG(st.st_mode):
+                content = _file_digest(full_path)
+            else:
+                content = ""
+        except OSError:
+            continue
+        h.update(
+            f"{rel_path}\0{st.st_mode}\0{content}\n".encode(
+                "utf-8", errors="surrogateescape"
+            )
+        )
+    return h.hexdigest()
+
+
+def _prune_cache():
+    """淘汰多余的缓存 tar（保留最近使用的）"""
+    try:
+        entries = [
+            os.path.join(CONTEXT_CACHE_DIR, name)
+            for name in os.listdir(CONTEXT_CACHE_DIR)
+            if name.endswith(".tar.gz")
+        ]
+    except OSError:
+        return
+    if len(entries) <= CONTEXT_CACHE_MAX_ENTRIES:
+        return
+    entries.sort(key=lambda p: os.path.getmtime(p), reverse=True)
+    for path in entries[CONTEXT_CACHE_MAX_ENTRIES:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def list_cache_entries() -> List[Tuple[str, int, float]]:
+    """
+    列出缓存的上下文 tar（供磁盘配额回收使用）
+
+    Returns:
+        [(绝对路径, 大小, 最近使用时间)]
+    """
+    entries = []
+    try:
+        names = os.listdir(CONTEXT_CACHE_DIR)
+    except OSError:
+        return entries
+    for name in names:
+        if not name.endswith(".tar.gz"):
+            continue
+        path = os.path.abspath(os.path.join(CONTEXT_CACHE_DIR, name))
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((path, st.st_size, st.st_mtime))
+    return entries
+
+
+def evict_cache_entry(tar_path: str, used_before: float) -> bool:
+    """
+    删除缓存的上下文 tar（在缓存锁内重新检查，期间被使用过的不删除）
+
+    Args:
+        tar_path: 缓存 tar 路径
+        used_before: 最近使用时间早于该时间戳才删除
+
+    Returns:
+        是否已删除
+    """
+    with _cache_lock:
+        try:
+            if os.path.getmtime(tar_path) >= used_before:
+                return False
+            os.remove(tar_path)
+        except FileNotFoundError:
+            return True
+        except OSError as e:
+            print(f"⚠️ 删除构建上下文缓存失败 ({tar_path}): {e}")
+            return False
+    return True
+
+
+def _pack(context_path: str, paths: List[str], tar_path: str):
+    """打包为临时文件后原子替换为缓存 tar"""
+    temp_path = f"{tar_path}.{threading.get_ident()}.tmp"
+    try:
+        with tarfile.open(temp_path, "w:gz", compresslevel=CONTEXT_GZIP_LEVEL) as tar:
+            for rel_path in paths:
+                full_path = os.path.join(context_path, rel_path)
+                try:
+                    tar.add(
+                        full_path,
+                        arcname=rel_path.replace(os.sep, "/"),
+                        recursive=False,
+                    )
+                except OSError as e:
+                    # 打包过程中文件被删除等情况，跳过该文件
+                    print(f"⚠️ 打包构建上下文时跳过文件 {rel_path}: {e}")
+        os.replace(temp_path, tar_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def prepare_build_context(context_path: str, dockerfile: Optional[str] = None) -> Dict:
+    """
+    打包构建上下文（过滤 + gzip 压缩），相同内容时复用缓存
+
+    Args:
+        context_path: 构建上下文目录
+        dockerfile: Dockerfile 相对路径（始终会被打包，即使被 .dockerignore 排除）
+
+    Returns:
+        {
+            "path": 压缩 tar 文件路径,
+            "file_count": 打包的文件数,
+            "raw_size": 原始文件总大小（字节）,
+            "compressed_size": 压缩后大小（字节）,
+            "cached": 是否命中缓存,
+            "elapsed": 打包耗时（秒）
+        }
+    """
+    start_time = time.time()
+    context_path = os.path.abspath(context_path)
+    paths = _list_context_files(context_path, dockerfile)
+    key = _fingerprint(context_path, paths, dockerfile)
+
+    os.makedirs(CONTEXT_CACHE_DIR, exist_ok=True)
+    tar_path = os.path.join(CONTEXT_CACHE_DIR, f"{key}.tar.gz")
+
+    file_count = 0
+    raw_size = 0
+    for rel_path in paths:
+        full_path = os.path.join(context_path, rel_path)
+        if os.path.isfile(full_path) and not os.path.islink(full_path):
+            file_count += 1
+            raw_size += os.path.getsize(full_path)
+
+    # 全局锁只用于查找缓存和登记正在打包的上下文，打包在锁外进行，
+    # 不同上下文的打包可以并发；相同上下文由该上下文的锁保证只打包一次
+    with _cache_lock:
+        cached = os.path.exists(tar_path)
+        if cached:
+            # 更新修改时间，作为最近使用时间
+            os.utime(tar_path, None)
+        else:
+            packing = _packing.setdefault(key, [threading.Lock(), 0])
+            packing[1] += 1
+
+    if not cached:
+        try:
+            with packing[0]:
+                # 等待期间其他线程可能已打包完成
+                cached = os.path.exists(tar_path)
+                if cached:
+                    os.utime(tar_path, None)
+                else:
+                    _pack(context_path, paths, tar_path)
+        finally:
+            with _cache_lock:
+                packing[1] -= 1
+                if packing[1] == 0:
+                    _packing.pop(key, None)
+                if not cached:
+                    _prune_cache()
+
+    return {
+        "path": tar_path,
+        "file_count": file_count,
+        "raw_size": raw_size,
+        "compressed_size": os.path.getsize(tar_path),
+        "cached": cached,
+        "elapsed": time.time() - start_time,
+    }
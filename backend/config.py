@@ -1,8 +1,10 @@
 # config.py
 import os
+import copy
+import threading
 import yaml
 import base64
-from typing import Optional
+from typing import Dict, Optional
 from backend.crypto_utils import encrypt_password, decrypt_password
 
 # 将配置文件放在data目录中，方便Docker映射
@@ -24,6 +26,13 @@ DEFAULT_CONFIG = {
         ],
         "default_push": False,
         "expose_port": 8080,
+        "push_concurrency": 3,  # 多目标推送时的最大并发数
+        # Docker 客户端连接池（元数据调用与 build/push/pull 等流式调用分通道）
+        "client_pool": {
+            "metadata_size": 2,  # 元数据通道客户端数
+            "stream_size": 2,  # 流式通道客户端数
+            "health_interval": 30,  # 健康检查间隔（秒）
+        },
         # 远程构建配置
         "use_remote": False,  # 是否使用远程 Docker
         "remote": {
@@ -46,6 +55,44 @@ DEFAULT_CONFIG = {
         "ssh_key_path": "",  # SSH 私钥路径（可选）
         "ssh_key_password": "",  # SSH 私钥密码（可选）
     },
+    "webhook": {
+        "workers": 4,  # Webhook 投递处理的工作线程数（同一流水线的投递按顺序处理）
+    },
+    "scheduler": {
+        "misfire_grace_seconds": 300,  # 定时执行延迟超过该时间视为错过执行
+        "catch_up": "once",  # 错过执行的补偿策略：once（补触发一次）或 skip（跳过）
+        "max_jitter_seconds": 30,  # 相同 cron 的流水线按 ID 分散到该秒数范围内触发
+    },
+    "retention": {
+        "build_task_days": 1,  # 构建任务保留天数（0 表示不按时间清理）
+        "export_task_days": 1,  # 导出任务保留天数（0 表示不按时间清理）
+        "statuses": ["stopped", "completed", "failed"],  # 按时间清理的任务状态
+        "max_tasks_per_pipeline": 0,  # 每条流水线最多保留的任务数（0 表示不限制）
+        "batch_size": 500,  # 每批删除的任务数
+        "io_workers": 2,  # 删除磁盘目录的后台线程数
+    },
+    "disk_gc": {
+        "enabled": True,
+        "interval_seconds": 60,  # 定期检查间隔
+        "build_dir_quota_mb": 0,  # 构建目录配额（0 表示不限制）
+        "export_dir_quota_mb": 0,  # 导出目录配额（0 表示不限制）
+        "context_cache_quota_mb": 0,  # 构建上下文 tar 缓存配额（0 表示不限制）
+        "min_free_mb": 2048,  # 磁盘剩余空间低于该值时开始回收
+        "min_age_seconds": 600,  # 最近修改时间在该秒数内的条目不回收
+        "download_pin_seconds": 3600,  # 导出文件被下载后在该秒数内不回收
+    },
+    "post_build_webhook": {
+        "timeout": 10.0,  # 单次请求超时（秒）
+        "max_attempts": 5,  # 最多尝试次数（含首次）
+        "backoff_base_seconds": 5,  # 第 n 次重试等待 base * 2^(n-1) 秒
+        "backoff_max_seconds": 600,  # 重试等待上限
+        "per_host_limit": 4,  # 同一主机的最大并发请求数
+        "max_connections": 100,  # 连接池最大连接数
+        "history_days": 30,  # 通知记录保留天数
+    },
+    "operation_log": {
+        "retention_days": 0,  # 操作日志保留天数（0 表示不自动清理）
+    },
 }
 
 
@@ -62,11 +109,61 @@ def ensure_config_exists():
     return False
 
 
-def load_config():
-    """加载配置文件"""
-    # 确保配置文件存在
-    ensure_config_exists()
+# 配置缓存：(文件 mtime, 文件大小, 配置)，文件变化或 save_config 后失效
+_config_cache = None
+# 解密后的仓库密码缓存：密文 -> 明文，配置变化时清空
+_registry_password_cache: Dict[str, str] = {}
+_config_cache_lock = threading.Lock()
+
 
+def _config_file_key():
+    """配置文件的缓存键（mtime 与大小），文件不存在时返回 None"""
+    try:
+        stat = os.stat(CONFIG_FILE)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def invalidate_config_cache():
+    """使配置缓存和解密后的仓库密码缓存失效（配置文件被修改后调用）"""
+    global _config_cache
+    with _config_cache_lock:
+        _config_cache = None
+        _registry_password_cache.clear()
+
+
+def load_config():
+    """加载配置文件（按文件 mtime 和大小缓存，返回副本，调用方可自由修改）"""
+    global _config_cache
+
+    file_key = _config_file_key()
+    if file_key is None or file_key[1] == 0:
+        # 确保配置文件存在
+        ensure_config_exists()
+        file_key = _config_file_key()
+
+    with _config_cache_lock:
+        if (
+            _config_cache is not None
+            and file_key is not None
+            and _config_cache[:2] == file_key
+        ):
+            return copy.deepcopy(_config_cache[2])
+
+    config = _read_config_file()
+
+    # 读取期间文件未被修改时才写入缓存
+    if file_key is not None and _config_file_key() == file_key:
+        with _config_cache_lock:
+            if _config_cache is None or _config_cache[:2] != file_key:
+                _registry_password_cache.clear()
+            _config_cache = (file_key[0], file_key[1], copy.deepcopy(config))
+    return config
+
+
+def _read_config_file():
+    """读取并解析配置文件（兼容旧格式、补充缺失的默认字段）"""
     try:
         with open(CONFIG_FILE, "r", encoding="utf-8") as f:
             config = yaml.safe_load(f)
@@ -146,6 +243,7 @@ def save_config(config):
             os.replace(temp_file, CONFIG_FILE)
         else:
             os.rename(temp_file, CONFIG_FILE)
+        invalidate_config_cache()
     except Exception as e:
         # 清理临时文件
         if os.path.exists(temp_file):
@@ -157,6 +255,19 @@ def save_config(config):
         raise
 
 
+def _decrypt_registry_password(password: str) -> str:
+    """解密仓库密码（结果按密文缓存，配置变化时清空；解密失败时抛出异常）"""
+    with _config_cache_lock:
+        plaintext = _registry_password_cache.get(password)
+    if plaintext is not None:
+        return plaintext
+
+    plaintext = decrypt_password(password)
+    with _config_cache_lock:
+        _registry_password_cache[password] = plaintext
+    return plaintext
+
+
 def get_active_registry():
     """获取当前激活的仓库配置（用于推送，返回解密后的密码）"""
     config = load_config()
@@ -170,7 +281,7 @@ def get_active_registry():
             password = registry.get("password")
             if password:
                 try:
-                    registry_copy["password"] = decrypt_password(password)
+                    registry_copy["password"] = _decrypt_registry_password(password)
                 except (ValueError, Exception):
                     # 如果解密失败，尝试迁移旧格式
                     try:
@@ -198,7 +309,7 @@ def get_active_registry():
         password = registries[0].get("password")
         if password:
             try:
-                registry["password"] = decrypt_password(password)
+                registry["password"] = _decrypt_registry_password(password)
             except (ValueError, Exception):
                 try:
                     try:
@@ -240,7 +351,7 @@ def get_registry_by_name(name):
             password = registry.get("password")
             if password:
                 try:
-                    registry_copy["password"] = decrypt_password(password)
+                    registry_copy["password"] = _decrypt_registry_password(password)
                 except (ValueError, Exception):
                     # 如果解密失败，尝试迁移旧格式
                     try:
@@ -296,7 +407,7 @@ def get_registry_password(registry_name: str) -> Optional[str]:
 
             try:
                 # 尝试解密（AES加密格式）
-                return decrypt_password(password)
+                return _decrypt_registry_password(password)
             except (ValueError, Exception):
                 # 如果解密失败，尝试迁移旧格式（明文或base64）
                 try:
@@ -330,7 +441,7 @@ def encrypt_registry_passwords(registries: list) -> list:
             # 如果密码不是加密格式，则加密它
             try:
                 # 尝试解密，如果成功说明已经是加密格式
-                decrypt_password(password)
+                _decrypt_registry_password(password)
                 # 已经是加密格式，保持不变
                 encrypted_registry["password"] = password
             except (ValueError, Exception):
@@ -5,10 +5,19 @@
 """
 import base64
 import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.backends import default_backend
 from backend.auth import SECRET_KEY
 
+# 明文缓存条数与有效期（秒）
+PLAINTEXT_CACHE_SIZE = 1024
+PLAINTEXT_CACHE_TTL = 300
+
 
 def _get_encryption_key() -> bytes:
     """从 SECRET_KEY 生成加密密钥（32字节）"""
@@ -17,6 +26,109 @@ def _get_encryption_key() -> bytes:
     return key_hash
 
 
+class CryptoService:
+    """加解密服务（密钥只派生一次、复用 AESGCM 实例，解密结果按密文缓存）"""
+
+    _instance = None
+    _lock = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._lock = threading.Lock()
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        """初始化服务"""
+        self._aesgcm = AESGCM(_get_encryption_key())
+        # 密文 -> (明文, 过期时间)
+        self._cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.cache_size = PLAINTEXT_CACHE_SIZE
+        self.cache_ttl = PLAINTEXT_CACHE_TTL
+
+    def _cache_get(self, encrypted: str) -> Optional[str]:
+        with self._lock:
+            entry = self._cache.get(encrypted)
+            if entry is None:
+                return None
+            plaintext, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._cache[encrypted]
+                return None
+            self._cache.move_to_end(encrypted)
+            return plaintext
+
+    def _cache_put(self, encrypted: str, plaintext: str):
+        with self._lock:
+            self._cache[encrypted] = (plaintext, time.monotonic() + self.cache_ttl)
+            self._cache.move_to_end(encrypted)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def encrypt(self, plaintext: str) -> str:
+        """加密（返回 base64 编码的 nonce + 密文）"""
+        if not plaintext:
+            return ""
+
+        # 生成随机 nonce（12字节，GCM推荐）
+        nonce = os.urandom(12)
+
+        # 加密数据
+        ciphertext = self._aesgcm.encrypt(nonce, plaintext.encode("utf-8"), None)
+
+        # 将 nonce 和 ciphertext 组合，然后 base64 编码
+        encrypted = base64.b64encode(nonce + ciphertext).decode("utf-8")
+        self._cache_put(encrypted, plaintext)
+        return encrypted
+
+    def decrypt(self, encrypted: str) -> str:
+        """解密（失败时抛出异常，失败结果不缓存）"""
+        if not encrypted:
+            return ""
+
+        plaintext = self._cache_get(encrypted)
+        if plaintext is not None:
+            return plaintext
+
+        # base64 解码
+        encrypted_data = base64.b64decode(encrypted.encode("utf-8"))
+
+        # 提取 nonce（前12字节）和 ciphertext（剩余部分）
+        nonce = encrypted_data[:12]
+        ciphertext = encrypted_data[12:]
+
+        # 解密数据
+        plaintext = self._aesgcm.decrypt(nonce, ciphertext, None).decode("utf-8")
+        self._cache_put(encrypted, plaintext)
+        return plaintext
+
+    def decrypt_many(self, values: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        批量解密（用于列表接口，相同密文只解密一次）
+
+        Args:
+            values: 加密后的字符串列表（空值会被忽略）
+
+        Returns:
+            {密文: 明文}，解密失败的为 None
+        """
+        result = {}
+        for encrypted in values:
+            if not encrypted or encrypted in result:
+                continue
+            try:
+                result[encrypted] = self.decrypt(encrypted)
+            except Exception:
+                result[encrypted] = None
+        return result
+
+    def clear_cache(self):
+        """清空明文缓存"""
+        with self._lock:
+            self._cache.clear()
+
+
 def encrypt_password(plaintext: str) -> str:
     """
     加密密码
@@ -31,24 +143,7 @@ def encrypt_password(plaintext: str) -> str:
         return ""
 
     try:
-        # 生成加密密钥
-        key = _get_encryption_key()
-
-        # 创建 AESGCM 实例
-        aesgcm = AESGCM(key)
-
-        # 生成随机 nonce（12字节，GCM推荐）
-        import os
-
-        nonce = os.urandom(12)
-
-        # 加密数据
-        plaintext_bytes = plaintext.encode("utf-8")
-        ciphertext = aesgcm.encrypt(nonce, plaintext_bytes, None)
-
-        # 将 nonce 和 ciphertext 组合，然后 base64 编码
-        encrypted_data = nonce + ciphertext
-        return base64.b64encode(encrypted_data).decode("utf-8")
+        return CryptoService().encrypt(plaintext)
     except Exception as e:
         print(f"⚠️ 加密密码失败: {e}")
         raise
@@ -71,28 +166,26 @@ def decrypt_password(encrypted: str) -> str:
         return ""
 
     try:
-        # 生成加密密钥
-        key = _get_encryption_key()
-
-        # 创建 AESGCM 实例
-        aesgcm = AESGCM(key)
-
-        # base64 解码
-        encrypted_data = base64.b64decode(encrypted.encode("utf-8"))
-
-        # 提取 nonce（前12字节）和 ciphertext（剩余部分）
-        nonce = encrypted_data[:12]
-        ciphertext = encrypted_data[12:]
-
-        # 解密数据
-        plaintext_bytes = aesgcm.decrypt(nonce, ciphertext, None)
-        return plaintext_bytes.decode("utf-8")
+        return CryptoService().decrypt(encrypted)
     except Exception as e:
         # 如果解密失败，可能是旧格式的数据，返回 None 让调用者处理
         print(f"⚠️ 解密密码失败: {e}")
         raise ValueError(f"解密失败: {str(e)}")
 
 
+def decrypt_many(values: Iterable[str]) -> Dict[str, Optional[str]]:
+    """
+    批量解密密码（解密失败的为 None，由调用者按旧格式处理）
+
+    Args:
+        values: 加密后的字符串列表
+
+    Returns:
+        {密文: 明文}
+    """
+    return CryptoService().decrypt_many(values)
+
+
 def is_encrypted(value: str) -> bool:
     """
     判断字符串是否是加密后的格式
@@ -5,6 +5,8 @@ import time
 from typing import Dict, Optional
 from datetime import datetime
 
+from backend import metrics
+
 
 class DashboardCacheManager:
     """仪表盘统计缓存管理器"""
@@ -47,6 +49,7 @@ class DashboardCacheManager:
         with self._lock:
             # 如果缓存有效且不强制刷新，直接返回
             if not force_refresh and self._is_cache_valid():
+                metrics.record_cache("dashboard", hit=True)
                 return self._cache.copy()
 
             # 防止并发刷新
@@ -54,8 +57,10 @@ class DashboardCacheManager:
                 if self._refreshing and not force_refresh:
                     # 如果正在刷新且不是强制刷新，返回旧缓存
                     if self._cache:
+                        metrics.record_cache("dashboard", hit=True)
                         return self._cache.copy()
 
+                metrics.record_cache("dashboard", hit=False)
                 self._refreshing = True
                 try:
                     # 计算统计数据
@@ -4,9 +4,12 @@ import os
 import uuid
 from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import QueuePool
 import threading
 import sqlite3
+import time
+
+from backend import metrics
 
 # 数据库文件路径
 DB_DIR = "data"
@@ -19,24 +22,41 @@ connect_args = {
     "timeout": 30.0,  # 等待锁的超时时间（秒）
 }
 
+# 连接池大小：每个线程使用独立连接，WAL 模式下读操作互不阻塞
+POOL_SIZE = 8
+POOL_MAX_OVERFLOW = 16
+
+# 进程内写锁的最长等待时间（秒），超时后交给 SQLite 自身的忙等待处理
+WRITE_LOCK_TIMEOUT = 30.0
+
+# "database is locked" 时语句的重试次数与初始退避（秒）
+LOCKED_RETRY_ATTEMPTS = 3
+LOCKED_RETRY_BACKOFF = 0.05
+
+# 会开启写事务的语句
+_WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "DROP", "ALTER")
+
 # 创建数据库引擎
-# 使用 StaticPool 和 check_same_thread=False 以支持多线程
+# 使用连接池：读操作各自使用独立连接并发执行，写操作通过进程内写锁串行化
 engine = create_engine(
     DB_URL,
     connect_args=connect_args,
-    poolclass=StaticPool,
+    poolclass=QueuePool,
+    pool_size=POOL_SIZE,
+    max_overflow=POOL_MAX_OVERFLOW,
+    pool_timeout=30,
     echo=False,  # 设置为 True 可以查看 SQL 语句
     pool_pre_ping=True,  # 连接前ping，检测连接是否有效
 )
 
 
-# 启用WAL模式以提高并发性能
+# 启用WAL模式以提高并发性能（连接池中的每个连接建立时都会执行）
 @event.listens_for(engine, "connect")
 def set_sqlite_pragma(dbapi_conn, connection_record):
     """设置SQLite的PRAGMA选项以提高并发性能"""
     cursor = dbapi_conn.cursor()
     try:
-        # WAL模式：Write-Ahead Logging，提高并发读写性能
+        # WAL模式：Write-Ahead Logging，读操作不阻塞写操作
         cursor.execute("PRAGMA journal_mode=WAL")
         # 设置同步模式为NORMAL（在WAL模式下更安全）
         cursor.execute("PRAGMA synchronous=NORMAL")
@@ -52,6 +72,166 @@ def set_sqlite_pragma(dbapi_conn, connection_record):
         cursor.close()
 
 
+class _WriteGate:
+    """
+    进程内写锁
+
+    SQLite 同一时刻只允许一个写事务。写事务的第一条写语句执行前获取、提交或回滚后释放，
+    进程内的写操作排队等待，而不是在 SQLite 的忙等待中反复重试；读操作不需要获取
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._owner = None  # 持有写锁的线程
+        self._holders = set()  # 持有写锁的连接（同一线程的多个连接可重入）
+        self.acquisitions = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+
+    def acquire(self, key: int):
+        """获取写锁（同一连接重复获取直接返回）"""
+        me = threading.get_ident()
+        with self._cond:
+            if key in self._holders:
+                return
+            start = time.monotonic()
+            deadline = start + WRITE_LOCK_TIMEOUT
+            while self._owner is not None and self._owner != me:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    # 持有者长时间未提交，放弃等待，由 SQLite 忙等待兜底
+                    self.timeouts += 1
+                    print(f"⚠️ 等待数据库写锁超时（{WRITE_LOCK_TIMEOUT}秒）")
+                    return
+                self._cond.wait(remaining)
+            waited = time.monotonic() - start
+            self._owner = me
+            self._holders.add(key)
+            self.acquisitions += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def release(self, key: int):
+        """释放写锁（未持有时忽略）"""
+        with self._cond:
+            if key not in self._holders:
+                return
+            self._holders.discard(key)
+            if not self._holders:
+                self._owner = None
+                self._cond.notify_all()
+
+
+_write_gate = _WriteGate()
+
+# "database is locked" 统计
+_locked_stats = {"retries": 0, "errors": 0}
+_locked_stats_lock = threading.Lock()
+
+
+def _is_locked_error(error: Exception) -> bool:
+    return isinstance(error, sqlite3.OperationalError) and (
+        "database is locked" in str(error) or "database is busy" in str(error)
+    )
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _acquire_write_gate(conn, cursor, statement, parameters, context, executemany):
+    """写语句执行前获取进程内写锁"""
+    if statement.lstrip()[:7].upper().startswith(_WRITE_PREFIXES):
+        _write_gate.acquire(id(conn.connection.dbapi_connection))
+
+
+@event.listens_for(engine, "commit")
+def _release_write_gate_on_commit(conn):
+    _write_gate.release(id(conn.connection.dbapi_connection))
+
+
+@event.listens_for(engine, "rollback")
+def _release_write_gate_on_rollback(conn):
+    _write_gate.release(id(conn.connection.dbapi_connection))
+
+
+@event.listens_for(engine, "checkin")
+def _release_write_gate_on_checkin(dbapi_conn, connection_record):
+    """连接归还连接池时确保写锁已释放"""
+    _write_gate.release(id(dbapi_conn))
+
+
+def _execute_with_retry(execute):
+    """执行语句，遇到 "database is locked" 时按退避重试"""
+    for attempt in range(LOCKED_RETRY_ATTEMPTS):
+        try:
+            execute()
+            return True
+        except sqlite3.OperationalError as e:
+            if not _is_locked_error(e):
+                raise
+            with _locked_stats_lock:
+                if attempt == LOCKED_RETRY_ATTEMPTS - 1:
+                    _locked_stats["errors"] += 1
+                    raise
+                _locked_stats["retries"] += 1
+            time.sleep(LOCKED_RETRY_BACKOFF * (2**attempt))
+    return True
+
+
+@event.listens_for(engine, "do_execute")
+def _do_execute(cursor, statement, parameters, context):
+    return _execute_with_retry(lambda: cursor.execute(statement, parameters))
+
+
+@event.listens_for(engine, "do_executemany")
+def _do_executemany(cursor, statement, parameters, context):
+    return _execute_with_retry(lambda: cursor.executemany(statement, parameters))
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _record_query_start(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started_at"] = time.perf_counter()
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _record_query_end(conn, cursor, statement, parameters, context, executemany):
+    """记录查询耗时（按语句类型，以及所在 HTTP 请求的查询次数和耗时）"""
+    started_at = conn.info.pop("query_started_at", None)
+    if started_at is not None:
+        metrics.record_db_query(statement, time.perf_counter() - started_at)
+
+
+def get_db_stats() -> dict:
+    """数据库访问统计：连接池状态、写锁等待时间、"database is locked" 重试次数"""
+    gate = _write_gate
+    with gate._cond:
+        write_lock = {
+            "acquisitions": gate.acquisitions,
+            "wait_total_ms": round(gate.wait_total * 1000, 2),
+            "wait_avg_ms": (
+                round(gate.wait_total * 1000 / gate.acquisitions, 2)
+                if gate.acquisitions
+                else 0.0
+            ),
+            "wait_max_ms": round(gate.wait_max * 1000, 2),
+            "timeouts": gate.timeouts,
+            "held": gate._owner is not None,
+        }
+    with _locked_stats_lock:
+        locked = dict(_locked_stats)
+    pool = engine.pool
+    return {
+        "pool": {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "status": pool.status(),
+        },
+        "write_lock": write_lock,
+        "locked_retries": locked["retries"],
+        "locked_errors": locked["errors"],
+    }
+
+
 # 创建会话工厂
 SessionLocal = scoped_session(
     sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -75,61 +255,114 @@ def get_db_session():
     return SessionLocal()
 
 
-def init_db():
-    """初始化数据库（创建所有表）"""
-    from backend.models import Base
+SCHEMA_VERSION_TABLE = "schema_version"
 
-    # 确保目录存在
-    os.makedirs(DB_DIR, exist_ok=True)
+# 进程内只初始化一次（各管理器的 _init 都会调用 init_db）
+_db_initialized = False
+_init_lock = threading.Lock()
 
-    # 在创建表之前，先设置WAL模式（如果数据库已存在）
-    if os.path.exists(DB_FILE):
-        try:
-            conn = sqlite3.connect(DB_FILE, timeout=30.0)
-            cursor = conn.cursor()
-            cursor.execute("PRAGMA journal_mode=WAL")
-            cursor.execute("PRAGMA synchronous=NORMAL")
-            cursor.execute("PRAGMA cache_size=-65536")
-            cursor.execute("PRAGMA temp_store=MEMORY")
-            cursor.execute("PRAGMA busy_timeout=30000")
-            conn.close()
-        except Exception as e:
-            print(f"⚠️ 设置数据库PRAGMA失败: {e}")
 
-    # 创建所有表
-    Base.metadata.create_all(bind=engine)
+def _get_applied_versions() -> set:
+    """读取已执行的迁移版本（不存在时创建 schema_version 表）"""
+    conn = sqlite3.connect(DB_FILE, timeout=30.0)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TEXT NOT NULL
+            )
+            """)
+        conn.commit()
+        cursor.execute(f"SELECT version FROM {SCHEMA_VERSION_TABLE}")
+        return {row[0] for row in cursor.fetchall()}
+    finally:
+        conn.close()
+
+
+def _record_version(version: int, name: str):
+    """记录已执行的迁移版本"""
+    from datetime import datetime
+
+    conn = sqlite3.connect(DB_FILE, timeout=30.0)
+    try:
+        conn.execute(
+            f"INSERT OR REPLACE INTO {SCHEMA_VERSION_TABLE} (version, name, applied_at) "
+            "VALUES (?, ?, ?)",
+            (version, name, datetime.now().isoformat()),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run_migrations() -> int:
+    """
+    执行未执行过的迁移
+
+    Returns:
+        本次执行成功的迁移数量
+    """
+    applied = _get_applied_versions()
+    pending = [m for m in MIGRATIONS if m[0] not in applied]
+    if not pending:
+        return 0
 
-    # 迁移：添加webhook_allowed_branches字段（如果不存在）
-    migrate_add_webhook_allowed_branches()
+    count = 0
+    for version, name, migrate in sorted(pending, key=lambda m: m[0]):
+        print(f"🔄 执行数据库迁移 {version}: {name}")
+        if migrate() is False:
+            # 后续迁移可能依赖这一步，停止并在下次启动时重试
+            print(f"⚠️ 数据库迁移 {version} 失败，后续迁移将在下次启动时重试")
+            break
+        _record_version(version, name)
+        count += 1
+    return count
 
-    # 迁移：添加post_build_webhooks字段（如果不存在）
-    migrate_add_post_build_webhooks()
 
-    # 迁移：添加Portainer相关字段到agent_hosts表（如果不存在）
-    migrate_add_portainer_fields()
+def run_data_repairs():
+    """执行数据修复（每次启动都执行，失败只记录日志）"""
+    for name, repair in DATA_REPAIRS:
+        if repair() is False:
+            print(f"⚠️ 数据修复 {name} 失败，将在下次启动时重试")
 
-    # 迁移：修改token字段允许NULL（如果表已存在且token字段不允许NULL）
-    migrate_token_nullable()
 
-    # 迁移：修复JSON字段的无效数据
-    migrate_fix_json_fields()
+def get_schema_version() -> int:
+    """获取当前已执行的最高迁移版本"""
+    applied = _get_applied_versions()
+    return max(applied) if applied else 0
+
+
+def init_db():
+    """初始化数据库（创建所有表、执行未执行过的迁移和数据修复，进程内只执行一次）"""
+    global _db_initialized
+    if _db_initialized:
+        return
+
+    with _init_lock:
+        if _db_initialized:
+            return
 
-    # 迁移：添加started_at字段到tasks表（如果不存在）
-    migrate_add_started_at_field()
+        from backend.models import Base
 
-    # 迁移：添加用户系统表
-    migrate_add_user_system()
+        # 确保目录存在
+        os.makedirs(DB_DIR, exist_ok=True)
 
-    # 迁移：创建agent_secrets表
-    migrate_add_agent_secrets_table()
+        # 创建所有表
+        Base.metadata.create_all(bind=engine)
 
-    # 迁移：添加agent_unique_id字段到agent_hosts表
-    migrate_add_agent_unique_id()
+        # 执行未执行过的迁移
+        applied = run_migrations()
 
-    # 迁移：创建deploy_configs表
-    migrate_add_deploy_config_table()
+        # 修复运行期间写入的坏数据
+        run_data_repairs()
 
-    print(f"✅ 数据库初始化完成: {DB_FILE}")
+        _db_initialized = True
+        print(
+            f"✅ 数据库初始化完成: {DB_FILE} "
+            f"(schema_version={get_schema_version()}, 本次迁移 {applied} 个)"
+        )
 
 
 def migrate_add_webhook_allowed_branches():
@@ -162,8 +395,10 @@ def migrate_add_webhook_allowed_branches():
             print("✅ webhook_allowed_branches 字段已存在")
         else:
             print(f"⚠️ 迁移webhook_allowed_branches字段失败: {e}")
+            return False
     except Exception as e:
         print(f"⚠️ 迁移webhook_allowed_branches字段失败: {e}")
+        return False
 
 
 def migrate_add_post_build_webhooks():
@@ -204,8 +439,10 @@ def migrate_add_post_build_webhooks():
             print("✅ post_build_webhooks 字段已存在")
         else:
             print(f"⚠️ 迁移post_build_webhooks字段失败: {e}")
+            return False
     except Exception as e:
         print(f"⚠️ 迁移post_build_webhooks字段失败: {e}")
+        return False
 
 
 def migrate_add_portainer_fields():
@@ -269,8 +506,10 @@ def migrate_add_portainer_fields():
             print("✅ Portainer 相关字段已存在")
         else:
             print(f"⚠️ 迁移Portainer字段失败: {e}")
+            return False
     except Exception as e:
         print(f"⚠️ 迁移Portainer字段失败: {e}")
+        return False
 
 
 def migrate_token_nullable():
@@ -388,8 +627,10 @@ def migrate_token_nullable():
             print("✅ agent_hosts 表不存在，无需迁移")
         else:
             print(f"⚠️ 迁移token字段失败: {e}")
+            return False
     except Exception as e:
         print(f"⚠️ 迁移token字段失败: {e}")
+        return False
 
 
 def migrate_add_started_at_field():
@@ -419,8 +660,151 @@ def migrate_add_started_at_field():
             print("✅ started_at 字段已存在")
         else:
             print(f"⚠️ 迁移started_at字段失败: {e}")
+            return False
     except Exception as e:
         print(f"⚠️ 迁移started_at字段失败: {e}")
+        return False
+
+
+def migrate_add_task_config_hash():
+    """迁移：为tasks表添加config_hash字段及索引"""
+    if not os.path.exists(DB_FILE):
+        return
+
+    try:
+        conn = sqlite3.connect(DB_FILE, timeout=30.0)
+        cursor = conn.cursor()
+
+        # 检查字段是否已存在
+        cursor.execute("PRAGMA table_info(tasks)")
+        columns = [row[1] for row in cursor.fetchall()]
+
+        if "config_hash" not in columns:
+            print("🔄 添加 config_hash 字段到 tasks 表...")
+            cursor.execute("ALTER TABLE tasks ADD COLUMN config_hash VARCHAR(32)")
+            conn.commit()
+            print("✅ config_hash 字段添加成功")
+
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_task_pipeline_config_hash "
+            "ON tasks (pipeline_id, config_hash)"
+        )
+        conn.commit()
+        conn.close()
+    except sqlite3.OperationalError as e:
+        if "duplicate column name" in str(e).lower():
+            print("✅ config_hash 字段已存在")
+        else:
+            print(f"⚠️ 迁移config_hash字段失败: {e}")
+            return False
+    except Exception as e:
+        print(f"⚠️ 迁移config_hash字段失败: {e}")
+        return False
+
+
+def migrate_add_task_pipeline_indexes():
+    """迁移：为tasks表添加流水线汇总统计使用的复合索引"""
+    if not os.path.exists(DB_FILE):
+        return
+
+    try:
+        conn = sqlite3.connect(DB_FILE, timeout=30.0)
+        cursor = conn.cursor()
+
+        cursor.execute("PRAGMA index_list(tasks)")
+        indexes = [row[1] for row in cursor.fetchall()]
+
+        created = False
+        if "idx_task_pipeline_type_created" not in indexes:
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_task_pipeline_type_created "
+                "ON tasks (pipeline_id, task_type, created_at)"
+            )
+            created = True
+        if "idx_task_pipeline_status" not in indexes:
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_task_pipeline_status "
+                "ON tasks (pipeline_id, status)"
+            )
+            created = True
+
+        if created:
+            conn.commit()
+            print("✅ tasks 表流水线统计索引创建成功")
+
+        conn.close()
+    except Exception as e:
+        print(f"⚠️ 迁移tasks表流水线统计索引失败: {e}")
+        return False
+
+
+def migrate_add_operation_log_indexes():
+    """迁移：为operation_logs表添加按用户/操作类型分页使用的复合索引"""
+    if not os.path.exists(DB_FILE):
+        return
+
+    try:
+        conn = sqlite3.connect(DB_FILE, timeout=30.0)
+        cursor = conn.cursor()
+
+        cursor.execute("PRAGMA index_list(operation_logs)")
+        indexes = [row[1] for row in cursor.fetchall()]
+
+        created = False
+        if "idx_operation_log_user_time" not in indexes:
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_operation_log_user_time "
+                "ON operation_logs (username, timestamp)"
+            )
+            created = True
+        if "idx_operation_log_action_time" not in indexes:
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_operation_log_action_time "
+                "ON operation_logs (action, timestamp)"
+            )
+            created = True
+
+        if created:
+            conn.commit()
+            print("✅ operation_logs 表复合索引创建成功")
+
+        conn.close()
+    except Exception as e:
+        print(f"⚠️ 迁移operation_logs表复合索引失败: {e}")
+        return False
+
+
+def migrate_add_task_feed_indexes():
+    """迁移：为tasks和export_tasks表添加统一任务列表使用的复合索引"""
+    if not os.path.exists(DB_FILE):
+        return
+
+    try:
+        conn = sqlite3.connect(DB_FILE, timeout=30.0)
+        cursor = conn.cursor()
+
+        created = False
+        for table, index_name, columns in (
+            ("tasks", "idx_task_status_created", "status, created_at"),
+            ("tasks", "idx_task_type_created", "task_type, created_at"),
+            ("export_tasks", "idx_export_task_status_created", "status, created_at"),
+        ):
+            cursor.execute(f"PRAGMA index_list({table})")
+            indexes = [row[1] for row in cursor.fetchall()]
+            if index_name not in indexes:
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({columns})"
+                )
+                created = True
+
+        if created:
+            conn.commit()
+            print("✅ 统一任务列表复合索引创建成功")
+
+        conn.close()
+    except Exception as e:
+        print(f"⚠️ 迁移统一任务列表复合索引失败: {e}")
+        return False
 
 
 def migrate_fix_json_fields():
@@ -500,6 +884,7 @@ def migrate_fix_json_fields():
         conn.close()
     except Exception as e:
         print(f"⚠️ 修复JSON字段失败: {e}")
+        return False
 
 
 def migrate_add_user_system():
@@ -707,6 +1092,7 @@ def migrate_add_user_system():
 
         traceback.print_exc()
         print(f"⚠️ 迁移用户系统失败: {e}")
+        return False
 
 
 def migrate_add_agent_secrets_table():
@@ -757,8 +1143,10 @@ def migrate_add_agent_secrets_table():
             print("✅ agent_secrets 表已存在")
         else:
             print(f"⚠️ 创建agent_secrets表失败: {e}")
+            return False
     except Exception as e:
         print(f"⚠️ 创建agent_secrets表失败: {e}")
+        return False
 
 
 def migrate_add_agent_unique_id():
@@ -802,8 +1190,10 @@ def migrate_add_agent_unique_id():
             print("✅ agent_unique_id 字段已存在")
         else:
             print(f"⚠️ 迁移agent_unique_id字段失败: {e}")
+            return False
     except Exception as e:
         print(f"⚠️ 迁移agent_unique_id字段失败: {e}")
+        return False
 
 
 def migrate_add_deploy_config_table():
@@ -831,6 +1221,49 @@ def migrate_add_deploy_config_table():
         print("✅ deploy_configs 表将在表创建时自动创建")
     except Exception as e:
         print(f"⚠️ 检查deploy_configs表失败: {e}")
+        return False
+
+
+# 迁移注册表：(版本号, 名称, 迁移函数)，按版本号顺序执行，每个版本只执行一次
+# 新增迁移时在末尾追加新的版本号，不要修改已发布的版本号
+# 迁移函数返回 False 表示失败，失败的版本不会记录，下次启动时重试
+MIGRATIONS = [
+    # 添加webhook_allowed_branches字段（如果不存在）
+    (1, "add_webhook_allowed_branches", migrate_add_webhook_allowed_branches),
+    # 添加post_build_webhooks字段（如果不存在）
+    (2, "add_post_build_webhooks", migrate_add_post_build_webhooks),
+    # 添加Portainer相关字段到agent_hosts表（如果不存在）
+    (3, "add_portainer_fields", migrate_add_portainer_fields),
+    # 修改token字段允许NULL（如果表已存在且token字段不允许NULL）
+    (4, "token_nullable", migrate_token_nullable),
+    # 版本 5（fix_json_fields）是数据修复，已移到 DATA_REPAIRS 每次启动执行
+    # 已记录的版本 5 保留，版本号不再复用
+    # 添加started_at字段到tasks表（如果不存在）
+    (6, "add_started_at_field", migrate_add_started_at_field),
+    # 添加用户系统表
+    (7, "add_user_system", migrate_add_user_system),
+    # 创建agent_secrets表
+    (8, "add_agent_secrets_table", migrate_add_agent_secrets_table),
+    # 添加agent_unique_id字段到agent_hosts表
+    (9, "add_agent_unique_id", migrate_add_agent_unique_id),
+    # 创建deploy_configs表
+    (10, "add_deploy_config_table", migrate_add_deploy_config_table),
+    # 为tasks表添加流水线汇总统计使用的复合索引
+    (11, "add_task_pipeline_indexes", migrate_add_task_pipeline_indexes),
+    # 添加config_hash字段到tasks表（如果不存在）
+    (12, "add_task_config_hash", migrate_add_task_config_hash),
+    # 为operation_logs表添加按用户/操作类型分页使用的复合索引
+    (13, "add_operation_log_indexes", migrate_add_operation_log_indexes),
+    # 为tasks和export_tasks表添加统一任务列表使用的复合索引
+    (14, "add_task_feed_indexes", migrate_add_task_feed_indexes),
+]
+
+# 数据修复注册表：(名称, 修复函数)，修复运行期间写入的坏数据
+# 每次启动都执行，不记录版本
+DATA_REPAIRS = [
+    # 修复JSON字段的无效数据
+    ("fix_json_fields", migrate_fix_json_fields),
+]
 
 
 def close_db():
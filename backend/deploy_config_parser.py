@@ -4,7 +4,6 @@
 解析 deploy-config.yaml 格式，验证配置有效性，支持模板变量替换
 """
 import yaml
-import re
 from typing import Dict, Any, List, Optional
 from pathlib import Path
 
@@ -242,7 +241,7 @@ class DeployConfigParser:
     
     def render_template(self, template: str, context: Dict[str, Any]) -> str:
         """
-        渲染模板字符串（支持 {{ variable }} 格式）
+        渲染模板字符串（支持 {{ variable }} 和嵌套的 {{ app.name }} 格式）
         
         Args:
             template: 模板字符串
@@ -251,22 +250,10 @@ class DeployConfigParser:
         Returns:
             渲染后的字符串
         """
-        result = template
+        from backend.template_renderer import render
         
-        # 查找所有模板变量 {{ variable }}
-        pattern = r'\{\{\s*(\w+)\s*\}\}'
-        matches = re.findall(pattern, template)
-        
-        for var_name in matches:
-            if var_name in context:
-                value = str(context[var_name])
-                placeholder = f"{{{{ {var_name} }}}}"
-                result = result.replace(placeholder, value)
-            else:
-                # 如果变量不存在，保留原样（或可以抛出异常）
-                pass
-        
-        return result
+        # 编译结果按模板内容缓存，多目标重复渲染时只解析一次；不存在的变量保留原样
+        return render(template, context, none_as="None")
     
     def build_deploy_context(
         self,
@@ -5,13 +5,15 @@ Portainer 主机执行器
 """
 import logging
 import asyncio
-from typing import Dict, Any, Optional, Callable
+from typing import TYPE_CHECKING, Dict, Any, Optional, Callable
 
 from backend.deploy_executors.base import DeployExecutor
-from backend.portainer_client import PortainerClient
 from backend.database import get_db_session
 from backend.models import AgentHost
 
+if TYPE_CHECKING:
+    from backend.portainer_client import PortainerClient
+
 logger = logging.getLogger(__name__)
 
 
@@ -60,7 +62,7 @@ class PortainerExecutor(DeployExecutor):
         finally:
             db.close()
     
-    def _get_portainer_client(self) -> PortainerClient:
+    def _get_portainer_client(self) -> "PortainerClient":
         """
         获取 Portainer 客户端
         
@@ -77,6 +79,9 @@ class PortainerExecutor(DeployExecutor):
         finally:
             db.close()
         
+        # 按需导入（依赖 requests，导入较慢）
+        from backend.portainer_client import PortainerClient
+
         return PortainerClient(
             self.portainer_url,
             api_key,
@@ -21,6 +21,7 @@ from backend.database import get_db_session
 from backend.models import AgentHost, Host
 from backend.deploy_executors.factory import ExecutorFactory
 from backend.command_adapter import CommandAdapter
+from backend import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -117,6 +118,7 @@ class DeployTaskManager:
         for target in targets:
             target_name = target.get("name")
 
+            metrics.task_stage(task_id, "deploy", "deploy")
             # 添加日志
             task_manager.add_log(task_id, f"📦 开始部署目标: {target_name}\n")
 
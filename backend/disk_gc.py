@@ -0,0 +1,359 @@
+# backend/disk_gc.py
+"""
+磁盘配额回收
+后台线程定期（以及新建构建/导出任务时）检查构建上下文 tar 缓存、构建目录和导出目录的占用
+与磁盘剩余空间，超出配额或剩余空间不足时按最近使用时间从旧到新回收缓存 tar、构建上下文
+和导出文件，回收构建上下文后再回收不再被引用的 blob；
+等待中/运行中任务的目录、最近下载过的导出文件以及手动固定的路径不会被回收
+"""
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+# 默认回收策略
+DEFAULT_DISK_GC = {
+    "enabled": True,
+    "interval_seconds": 60,  # 定期检查间隔
+    "build_dir_quota_mb": 0,  # 构建目录配额（0 表示不限制）
+    "export_dir_quota_mb": 0,  # 导出目录配额（0 表示不限制）
+    "context_cache_quota_mb": 0,  # 构建上下文 tar 缓存配额（0 表示不限制）
+    "min_free_mb": 2048,  # 磁盘剩余空间低于该值时开始回收
+    "min_age_seconds": 600,  # 最近修改时间在该秒数内的条目不回收
+    "download_pin_seconds": 3600,  # 导出文件被下载后在该秒数内不回收
+}
+
+# 新建任务触发检查的最小间隔（秒）
+NOTIFY_DEBOUNCE_SECONDS = 5
+
+MB = 1024 * 1024
+
+
+def get_disk_gc_policy() -> Dict:
+    """读取回收策略（config.yml 中的 disk_gc 节，缺省项使用默认值）"""
+    policy = dict(DEFAULT_DISK_GC)
+    try:
+        from backend.config import load_config
+
+        policy.update(load_config().get("disk_gc") or {})
+    except Exception as e:
+        print(f"⚠️ 读取磁盘回收策略失败，使用默认值: {e}")
+    return policy
+
+
+def _free_bytes(path: str) -> Optional[int]:
+    """路径所在磁盘的剩余空间（目录不存在时返回 None）"""
+    try:
+        return shutil.disk_usage(path).free
+    except OSError:
+        return None
+
+
+class DiskBudgetGC:
+    """构建上下文和导出文件的磁盘配额回收器"""
+
+    _instance = None
+    _lock = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._lock = threading.Lock()
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        """初始化回收器"""
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._last_notify = 0.0
+        # 手动固定的路径（绝对路径 -> 引用计数）
+        self._pins: Dict[str, int] = {}
+        # 最近访问（下载）的路径（绝对路径 -> time.time()）
+        self._accessed: Dict[str, float] = {}
+        self._stats = {
+            "runs": 0,
+            "evicted": 0,
+            "freed_bytes": 0,
+            "errors": 0,
+            "last_run_at": None,
+            "last_free_mb": None,
+        }
+
+    # ============ 固定与访问记录 ============
+
+    def pin(self, path: str):
+        """固定路径（使用中的目录或文件），直到 unpin 前不会被回收"""
+        path = os.path.abspath(path)
+        with self._lock:
+            self._pins[path] = self._pins.get(path, 0) + 1
+
+    def unpin(self, path: str):
+        """取消固定"""
+        path = os.path.abspath(path)
+        with self._lock:
+            count = self._pins.get(path, 0) - 1
+            if count > 0:
+                self._pins[path] = count
+            else:
+                self._pins.pop(path, None)
+
+    def touch(self, path: str):
+        """记录路径被访问（如导出文件被下载），在 download_pin_seconds 内不回收"""
+        with self._lock:
+            self._accessed[os.path.abspath(path)] = time.time()
+
+    # ============ 后台线程 ============
+
+    def start(self):
+        """启动后台回收线程"""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(
+            target=self._loop, daemon=True, name="disk-budget-gc"
+        )
+        self._thread.start()
+        print("✅ 磁盘配额回收已启动")
+
+    def stop(self):
+        """停止后台回收线程"""
+        with self._lock:
+            self._running = False
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def notify(self):
+        """新建构建/导出任务时调用，尽快检查一次磁盘占用（带防抖）"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_notify < NOTIFY_DEBOUNCE_SECONDS:
+                return
+            self._last_notify = now
+        self._wakeup.set()
+
+    def _loop(self):
+        while True:
+            policy = get_disk_gc_policy()
+            self._wakeup.wait(max(1, int(policy.get("interval_seconds") or 60)))
+            self._wakeup.clear()
+            with self._lock:
+                if not self._running:
+                    return
+            if not policy.get("enabled", True):
+                continue
+            try:
+                self.collect(policy)
+            except Exception as e:
+                with self._lock:
+                    self._stats["errors"] += 1
+                print(f"⚠️ 磁盘配额回收出错: {e}")
+
+    # ============ 回收 ============
+
+    def _active_paths(self) -> Set[str]:
+        """等待中/运行中任务使用的路径（绝对路径）"""
+        from backend.database import get_db_session
+        from backend.handlers import EXPORT_DIR
+        from backend.models import ExportTask, Task
+        from backend.retention import _build_context_path
+
+        active = ("pending", "running")
+        db = get_db_session()
+        try:
+            build_rows = (
+                db.query(Task.task_id, Task.image).filter(Task.status.in_(active)).all()
+            )
+            export_rows = (
+                db.query(ExportTask.task_id, ExportTask.file_path)
+                .filter(ExportTask.status.in_(active))
+                .all()
+            )
+        finally:
+            db.close()
+
+        paths = {
+            os.path.abspath(_build_context_path(task_id, image))
+            for task_id, image in build_rows
+            if image
+        }
+        for task_id, file_path in export_rows:
+            paths.add(os.path.abspath(os.path.join(EXPORT_DIR, "tasks", task_id)))
+            if file_path:
+                paths.add(os.path.abspath(file_path))
+        return paths
+
+    def _candidates(
+        self, base_dir: str, stats_type: str
+    ) -> List[Tuple[str, int, float]]:
+        """
+        可回收的条目（构建目录按构建上下文目录，导出目录按任务目录或文件）
+
+        Returns:
+            [(绝对路径, 大小, 最近修改时间)]
+        """
+        from backend.stats_cache import StatsCacheManager
+
+        if not os.path.isdir(base_dir):
+            return []
+        items = StatsCacheManager(base_dir).get_items(stats_type)
+
+        units: Dict[str, List] = {}
+        for rel_path, item in items.items():
+            parts = rel_path.replace(os.sep, "/").split("/")
+            if stats_type == "export" and len(parts) > 2 and parts[0] == "tasks":
+                # 导出任务目录下的文件按任务目录整体回收
+                rel_path = os.path.join(parts[0], parts[1])
+            unit = units.setdefault(
+                os.path.abspath(os.path.join(base_dir, rel_path)), [0, 0.0]
+            )
+            unit[0] += item["size"]
+            unit[1] = max(unit[1], item["mtime"])
+        return [(path, size, mtime) for path, (size, mtime) in units.items()]
+
+    @staticmethod
+    def _is_pinned(path: str, pinned: Set[str]) -> bool:
+        """路径本身或其中的文件被固定"""
+        prefix = path + os.sep
+        return any(p == path or p.startswith(prefix) for p in pinned)
+
+    def _evict(self, path: str, kind: str, used_before: float) -> bool:
+        """删除条目（kind: context_cache / build / export）"""
+        if kind == "context_cache":
+            from backend.build_context import evict_cache_entry
+
+            return evict_cache_entry(path, used_before)
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+        except Exception as e:
+            with self._lock:
+                self._stats["errors"] += 1
+            print(f"⚠️ 回收失败 ({path}): {e}")
+            return False
+        if kind == "build":
+            # 只释放引用，本轮构建目录回收结束后统一回收无引用的 blob
+            try:
+                from backend.blob_store import BlobStore
+
+                BlobStore().release_context(path, collect=False)
+            except Exception as e:
+                print(f"⚠️ 释放构建上下文 blob 引用失败 ({path}): {e}")
+        return not os.path.exists(path)
+
+    def _collect_blobs(self):
+        """回收构建上下文删除后不再被引用的 blob"""
+        try:
+            from backend.blob_store import BlobStore
+
+            BlobStore().gc()
+        except Exception as e:
+            with self._lock:
+                self._stats["errors"] += 1
+            print(f"⚠️ 回收无引用的 blob 失败: {e}")
+
+    def collect(self, policy: Optional[Dict] = None) -> Dict:
+        """
+        检查一次磁盘占用，必要时回收
+
+        Returns:
+            {"evicted": n, "freed_mb": float, "free_mb": float}
+        """
+        from backend.build_context import CONTEXT_CACHE_DIR, list_cache_entries
+        from backend.handlers import BUILD_DIR, EXPORT_DIR
+
+        policy = {**get_disk_gc_policy(), **(policy or {})}
+        now = time.time()
+        min_free = (policy.get("min_free_mb") or 0) * MB
+        min_age = policy.get("min_age_seconds") or 0
+        download_pin = policy.get("download_pin_seconds") or 0
+
+        with self._lock:
+            pinned = set(self._pins)
+            # 清理过期的访问记录
+            self._accessed = {
+                p: t for p, t in self._accessed.items() if now - t < download_pin
+            }
+            pinned.update(self._accessed)
+        pinned |= self._active_paths()
+
+        evicted = 0
+        freed = 0
+        # 缓存 tar 可随时重新打包，最先回收
+        for base_dir, kind, quota_key in (
+            (CONTEXT_CACHE_DIR, "context_cache", "context_cache_quota_mb"),
+            (BUILD_DIR, "build", "build_dir_quota_mb"),
+            (EXPORT_DIR, "export", "export_dir_quota_mb"),
+        ):
+            if kind == "context_cache":
+                candidates = list_cache_entries()
+            else:
+                candidates = self._candidates(base_dir, kind)
+            if not candidates:
+                continue
+            quota = (policy.get(quota_key) or 0) * MB
+            used = sum(size for _, size, _ in candidates)
+            free = _free_bytes(base_dir)
+
+            def over_budget():
+                if quota and used > quota:
+                    return True
+                return min_free and free is not None and free < min_free
+
+            if not over_budget():
+                continue
+
+            # 最久未使用的优先回收
+            evicted_here = 0
+            for path, size, mtime in sorted(candidates, key=lambda c: c[2]):
+                if not over_budget():
+                    break
+                if now - mtime < min_age or self._is_pinned(path, pinned):
+                    continue
+                if self._evict(path, kind, now - min_age):
+                    evicted_here += 1
+                    freed += size
+                    used -= size
+                    free = _free_bytes(base_dir)
+                    print(f"🧹 磁盘配额回收: {path} ({size / MB:.1f}MB)")
+            evicted += evicted_here
+
+            if kind == "build" and evicted_here:
+                self._collect_blobs()
+                free = _free_bytes(base_dir)
+
+            if over_budget():
+                print(
+                    f"⚠️ 磁盘配额回收后仍超出预算: {base_dir} 占用 {used / MB:.1f}MB，"
+                    f"剩余空间 {(free or 0) / MB:.1f}MB（其余条目正在使用或刚被修改）"
+                )
+
+        free_now = _free_bytes(BUILD_DIR if os.path.isdir(BUILD_DIR) else ".")
+        free_mb = round(free_now / MB, 2) if free_now is not None else None
+        with self._lock:
+            self._stats["runs"] += 1
+            self._stats["evicted"] += evicted
+            self._stats["freed_bytes"] += freed
+            self._stats["last_run_at"] = datetime.now().isoformat()
+            self._stats["last_free_mb"] = free_mb
+        return {
+            "evicted": evicted,
+            "freed_mb": round(freed / MB, 2),
+            "free_mb": free_mb,
+        }
+
+    def stats(self) -> Dict:
+        """回收统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pinned"] = len(self._pins)
+            stats["recently_accessed"] = len(self._accessed)
+            return stats
@@ -10,6 +10,7 @@ import json
 import shutil
 import threading
 import queue
+import time
 from abc import ABC, abstractmethod
 from typing import Optional, Dict, Any, Iterator, List, Union
 
@@ -24,10 +25,85 @@ class DockerBuilder(ABC):
             config: Docker 配置字典
         """
         self.config = config
+        self._client_pool = None
         self.client = None
         self.available = False
         self._initialize()
 
+    @property
+    def client(self):
+        """
+        Docker 客户端（短调用使用）
+        启用连接池后从元数据通道中选取，长时间的流式调用请使用 _stream_call
+        """
+        if self._client_pool is not None:
+            return self._client_pool.metadata_client()
+        return self._client
+
+    @client.setter
+    def client(self, value):
+        if value is None and self._client_pool is not None:
+            self._client_pool.close()
+            self._client_pool = None
+        self._client = value
+
+    @abstractmethod
+    def _create_client(self):
+        """创建新的 Docker 客户端（连接池按需创建客户端时调用）"""
+        pass
+
+    def _setup_client_pool(self):
+        """连接成功后建立客户端连接池（元数据/流式双通道）"""
+        from backend.docker_client_pool import (
+            DockerClientPool,
+            DEFAULT_METADATA_SIZE,
+            DEFAULT_STREAM_SIZE,
+            DEFAULT_HEALTH_INTERVAL,
+        )
+
+        pool_config = self.config.get("client_pool", {}) or {}
+        if pool_config.get("enabled", True) is False:
+            return
+        try:
+            self._client_pool = DockerClientPool(
+                factory=self._create_client,
+                seed_client=self._client,
+                metadata_size=pool_config.get("metadata_size", DEFAULT_METADATA_SIZE),
+                stream_size=pool_config.get("stream_size", DEFAULT_STREAM_SIZE),
+                health_interval=pool_config.get(
+                    "health_interval", DEFAULT_HEALTH_INTERVAL
+                ),
+            )
+        except Exception as e:
+            print(f"⚠️ 创建 Docker 客户端连接池失败，使用单客户端: {e}")
+            self._client_pool = None
+
+    def _stream_call(self, call):
+        """
+        执行长时间的流式调用（build、push、pull、save）
+        连接池取出客户端前会合并各客户端的登录信息（依赖 docker-py 私有属性，
+        属性不存在时各客户端各自登录，见 docker_client_pool._get_auth_configs）
+        Args:
+            call: 接收客户端并发起调用的函数
+        Returns:
+            调用结果（流式结果迭代结束后归还客户端）
+        """
+        if self._client_pool is not None:
+            return self._client_pool.run_stream(call)
+        return call(self._client)
+
+    def get_pool_stats(self) -> Optional[Dict]:
+        """获取连接池状态"""
+        if self._client_pool is None:
+            return None
+        return self._client_pool.stats()
+
+    def close(self):
+        """关闭连接池及客户端"""
+        if self._client_pool is not None:
+            self._client_pool.close()
+            self._client_pool = None
+
     @abstractmethod
     def _initialize(self):
         """初始化 Docker 客户端（由子类实现）"""
@@ -105,6 +181,43 @@ class DockerBuilder(ABC):
         """获取连接信息（用于日志显示）"""
         return "Unknown"
 
+    def _push_concurrently(self, push_targets: List[Dict]) -> Iterator[Dict]:
+        """
+        并发推送多个目标，推送日志以 stream 数据块形式流式返回
+        Args:
+            push_targets: 推送目标列表，每项包含 repository、tag，可选 auth_config
+        Returns:
+            推送日志流（失败的目标以 error 数据块返回）
+        """
+        from backend.push_orchestrator import PushOrchestrator
+
+        messages = queue.Queue()
+        outcome = {}
+
+        def worker():
+            try:
+                orchestrator = PushOrchestrator(self, log_func=messages.put)
+                outcome["results"] = orchestrator.push_all(push_targets)
+            except Exception as e:
+                outcome["error"] = str(e)
+            finally:
+                messages.put(None)
+
+        threading.Thread(target=worker, daemon=True).start()
+        while True:
+            message = messages.get()
+            if message is None:
+                break
+            yield {"stream": message}
+
+        if "error" in outcome:
+            yield {"error": f"推送失败: {outcome['error']}"}
+        for result in outcome.get("results", []):
+            if not result["success"]:
+                yield {
+                    "error": f"推送失败 {result['repository']}:{result['tag']}: {result['error']}"
+                }
+
     def _ensure_buildx_builder(self, docker_path: str) -> str:
         """
         确保 buildx builder 存在并可用
@@ -480,7 +593,8 @@ class LocalDockerBuilder(DockerBuilder):
         """初始化本地 Docker 客户端"""
         try:
             try:
-                import docker
+                # 尝试连接本地 Docker（_create_client 中导入 docker 库）
+                self.client = self._create_client()
             except ImportError as e:
                 if "distutils" in str(e).lower():
                     print(
@@ -493,16 +607,21 @@ class LocalDockerBuilder(DockerBuilder):
                 self.client = None
                 return
 
-            # 尝试连接本地 Docker
-            self.client = docker.from_env()
             self.client.ping()
             self.available = True
+            self._setup_client_pool()
             print("✅ 本地 Docker 连接成功")
         except Exception as e:
             print(f"⚠️ 本地 Docker 连接失败: {e}")
             self.available = False
             self.client = None
 
+    def _create_client(self):
+        """创建本地 Docker 客户端"""
+        import docker
+
+        return docker.from_env()
+
     def ping(self) -> bool:
         """测试 Docker 连接"""
         if not self.client:
@@ -575,12 +694,14 @@ class LocalDockerBuilder(DockerBuilder):
             raise RuntimeError("本地 Docker 不可用")
 
         # 使用低级 API 推送，支持完整的 repository 路径
-        return self.client.api.push(
-            repository=repository,
-            tag=tag,
-            auth_config=auth_config,
-            stream=True,
-            decode=True,
+        return self._stream_call(
+            lambda client: client.api.push(
+                repository=repository,
+                tag=tag,
+                auth_config=auth_config,
+                stream=True,
+                decode=True,
+            )
         )
 
     def get_image(self, name: str):
@@ -605,14 +726,14 @@ class LocalDockerBuilder(DockerBuilder):
         if auth_config:
             pull_kwargs["auth_config"] = auth_config
 
-        return self.client.api.pull(**pull_kwargs)
+        return self._stream_call(lambda client: client.api.pull(**pull_kwargs))
 
     def export_image(self, name: str) -> Iterator[bytes]:
         """导出镜像为 tar 文件"""
         if not self.available:
             raise RuntimeError("本地 Docker 不可用")
 
-        return self.client.api.get_image(name)
+        return self._stream_call(lambda client: client.api.get_image(name))
 
     def get_connection_info(self) -> str:
         """获取连接信息"""
@@ -671,7 +792,6 @@ class RemoteDockerBuilder(DockerBuilder):
             remote_config = self.config.get("remote", {})
             host = remote_config.get("host", "")
             port = remote_config.get("port", 2375)
-            use_tls = remote_config.get("use_tls", False)
 
             if not host:
                 print("⚠️ 未配置远程 Docker 主机地址")
@@ -679,38 +799,12 @@ class RemoteDockerBuilder(DockerBuilder):
                 self.client = None
                 return
 
-            # 构建连接 URL
-            if use_tls:
-                base_url = f"https://{host}:{port}"
-                # TLS 配置
-                tls_config = None
-                cert_path = remote_config.get("cert_path")
-                if cert_path:
-                    tls_config = docker.tls.TLSConfig(
-                        client_cert=(
-                            os.path.join(cert_path, "cert.pem"),
-                            os.path.join(cert_path, "key.pem"),
-                        ),
-                        ca_cert=os.path.join(cert_path, "ca.pem"),
-                        verify=remote_config.get("verify_tls", True),
-                    )
-                self.client = docker.DockerClient(
-                    base_url=base_url,
-                    tls=tls_config,
-                    use_ssh_client=False,
-                    credstore_env={},  # 禁用凭证存储
-                )
-            else:
-                base_url = f"tcp://{host}:{port}"
-                self.client = docker.DockerClient(
-                    base_url=base_url,
-                    use_ssh_client=False,
-                    credstore_env={},  # 禁用凭证存储
-                )
+            self.client = self._create_client()
 
             # 测试连接
             self.client.ping()
             self.available = True
+            self._setup_client_pool()
             self._connection_info = f"远程 Docker ({host}:{port})"
             print(f"✅ 远程 Docker 连接成功: {host}:{port}")
 
@@ -732,6 +826,44 @@ class RemoteDockerBuilder(DockerBuilder):
             self._connection_info = f"远程 Docker (连接异常: {str(e)})"
             self._connection_error = error_msg
 
+    def _create_client(self):
+        """根据远程配置创建 Docker 客户端"""
+        import docker
+
+        remote_config = self.config.get("remote", {})
+        host = remote_config.get("host", "")
+        port = remote_config.get("port", 2375)
+        use_tls = remote_config.get("use_tls", False)
+
+        # 构建连接 URL
+        if use_tls:
+            base_url = f"https://{host}:{port}"
+            # TLS 配置
+            tls_config = None
+            cert_path = remote_config.get("cert_path")
+            if cert_path:
+                tls_config = docker.tls.TLSConfig(
+                    client_cert=(
+                        os.path.join(cert_path, "cert.pem"),
+                        os.path.join(cert_path, "key.pem"),
+                    ),
+                    ca_cert=os.path.join(cert_path, "ca.pem"),
+                    verify=remote_config.get("verify_tls", True),
+                )
+            return docker.DockerClient(
+                base_url=base_url,
+                tls=tls_config,
+                use_ssh_client=False,
+                credstore_env={},  # 禁用凭证存储
+            )
+        else:
+            base_url = f"tcp://{host}:{port}"
+            return docker.DockerClient(
+                base_url=base_url,
+                use_ssh_client=False,
+                credstore_env={},  # 禁用凭证存储
+            )
+
     def ping(self) -> bool:
         """测试 Docker 连接"""
         if not self.client:
@@ -868,8 +1000,59 @@ class RemoteDockerBuilder(DockerBuilder):
                 print(f"   构建参数: {build_args}")
             print(f"   完整参数: {build_kwargs}")
 
+            # 打包过滤并压缩后的构建上下文（.dockerignore + 默认排除 .git），相同内容复用缓存
+            context_info = None
+            if not build_kwargs["dockerfile"].startswith(".."):
+                try:
+                    from backend.build_context import prepare_build_context
+                    from backend.progress_stream import format_bytes
+
+                    context_info = prepare_build_context(
+                        build_context, build_kwargs["dockerfile"]
+                    )
+                    if context_info["cached"]:
+                        pack_info = "复用缓存"
+                    else:
+                        pack_info = f"打包耗时 {context_info['elapsed']:.1f}s"
+                    yield {
+                        "stream": f"📦 构建上下文: {context_info['file_count']} 个文件，"
+                        f"原始 {format_bytes(context_info['raw_size'])}，"
+                        f"压缩后 {format_bytes(context_info['compressed_size'])}"
+                        f"（{pack_info}）\n"
+                    }
+                except Exception as e:
+                    print(f"⚠️ 打包构建上下文失败，回退为直接上传目录: {e}")
+                    context_info = None
+
+            context_file = None
+            if context_info:
+                context_file = open(context_info["path"], "rb")
+                build_kwargs.pop("path")
+                build_kwargs["fileobj"] = context_file
+                build_kwargs["custom_context"] = True
+                build_kwargs["encoding"] = "gzip"
+
             # 使用 Docker API 构建（默认返回生成器，流式返回日志）
-            build_logs = self.client.api.build(**build_kwargs)
+            # 上下文在请求发出时上传完成，调用耗时即为上传耗时
+            upload_start = time.time()
+            try:
+                build_logs = self._stream_call(
+                    lambda client: client.api.build(**build_kwargs)
+                )
+            finally:
+                if context_file:
+                    context_file.close()
+            if context_info:
+                upload_elapsed = time.time() - upload_start
+                speed = (
+                    context_info["compressed_size"] / upload_elapsed
+                    if upload_elapsed > 0
+                    else 0
+                )
+                yield {
+                    "stream": f"📤 构建上下文上传完成，耗时 {upload_elapsed:.1f}s"
+                    f"（{format_bytes(speed)}/s）\n"
+                }
 
             # 流式返回构建日志
             try:
@@ -912,15 +1095,17 @@ class RemoteDockerBuilder(DockerBuilder):
                     except Exception as e:
                         yield {"error": f"Failed to tag {tag_name}: {str(e)}\n"}
 
-            # 如果需要推送
+            # 如果需要推送（多标签并发推送，同一仓库的层只上传一次）
             if push:
+                push_targets = []
                 for tag_name in tags:
                     # 解析标签（格式：repository:tag）
                     if ":" in tag_name:
                         repo, tag = tag_name.rsplit(":", 1)
                     else:
                         repo, tag = tag_name, "latest"
-                    yield from self.push_image(repository=repo, tag=tag)
+                    push_targets.append({"repository": repo, "tag": tag})
+                yield from self._push_concurrently(push_targets)
 
         except Exception as e:
             import traceback
@@ -1000,12 +1185,14 @@ class RemoteDockerBuilder(DockerBuilder):
             raise RuntimeError("远程 Docker 不可用")
 
         # 使用低级 API 推送，支持完整的 repository 路径
-        return self.client.api.push(
-            repository=repository,
-            tag=tag,
-            auth_config=auth_config,
-            stream=True,
-            decode=True,
+        return self._stream_call(
+            lambda client: client.api.push(
+                repository=repository,
+                tag=tag,
+                auth_config=auth_config,
+                stream=True,
+                decode=True,
+            )
         )
 
     def get_image(self, name: str):
@@ -1030,7 +1217,7 @@ class RemoteDockerBuilder(DockerBuilder):
         if auth_config:
             pull_kwargs["auth_config"] = auth_config
 
-        return self.client.api.pull(**pull_kwargs)
+        return self._stream_call(lambda client: client.api.pull(**pull_kwargs))
 
     def export_image(self, name: str) -> Iterator[bytes]:
         """导出镜像为 tar 文件"""
@@ -1040,7 +1227,7 @@ class RemoteDockerBuilder(DockerBuilder):
                 error_msg += f": {self._connection_error}"
             raise RuntimeError(error_msg)
 
-        return self.client.api.get_image(name)
+        return self._stream_call(lambda client: client.api.get_image(name))
 
     def get_connection_info(self) -> str:
         """获取连接信息"""
@@ -1055,6 +1242,10 @@ class MockDockerBuilder(DockerBuilder):
         self.available = True
         print("⚠️ 使用模拟 Docker 构建器（仅用于测试）")
 
+    def _create_client(self):
+        """模拟构建器不连接 Docker，没有客户端"""
+        return None
+
     def ping(self) -> bool:
         """测试 Docker 连接"""
         return True
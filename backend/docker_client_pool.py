@@ -0,0 +1,311 @@
+# backend/docker_client_pool.py
+"""
+Docker 客户端连接池
+按用途分为两个通道：元数据通道（镜像列表、inspect 等短调用）和流式通道（build、push、pull、save 等长调用），
+长时间的流式调用不会占满元数据调用的连接；后台定期 ping 检查健康状态，失败的客户端按指数退避自动重连
+"""
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+# 默认元数据通道客户端数
+DEFAULT_METADATA_SIZE = 2
+
+# 默认流式通道客户端数
+DEFAULT_STREAM_SIZE = 2
+
+# 默认健康检查间隔（秒）
+DEFAULT_HEALTH_INTERVAL = 30
+
+# 重连退避：初始间隔与最大间隔（秒）
+RECONNECT_BACKOFF_BASE = 1
+RECONNECT_BACKOFF_MAX = 60
+
+LANE_METADATA = "metadata"
+LANE_STREAM = "stream"
+
+
+def _get_auth_configs(client):
+    """
+    客户端的登录信息对象
+
+    docker-py 没有公开共享登录信息的接口，这里依赖其私有属性 APIClient._auth_configs；
+    属性不存在时（docker-py 版本变化）返回 None，各客户端各自登录
+    """
+    return getattr(getattr(client, "api", None), "_auth_configs", None)
+
+
+def _set_auth_configs(client, auth_configs):
+    """让客户端使用共享的登录信息对象（私有属性不存在时不处理）"""
+    api = getattr(client, "api", None)
+    if api is not None and hasattr(api, "_auth_configs"):
+        api._auth_configs = auth_configs
+
+
+class _PooledClient:
+    """连接池中的单个客户端"""
+
+    def __init__(self, lane: str, index: int, client=None):
+        self.lane = lane
+        self.index = index
+        self.client = client
+        self.healthy = client is not None
+        self.active_streams = 0
+        self.failures = 0
+        self.next_retry = 0.0
+        self.last_error: Optional[str] = None
+
+
+class DockerClientPool:
+    """Docker 客户端连接池（元数据/流式双通道，带健康检查与自动重连）"""
+
+    def __init__(
+        self,
+        factory: Callable[[], object],
+        seed_client=None,
+        metadata_size: int = DEFAULT_METADATA_SIZE,
+        stream_size: int = DEFAULT_STREAM_SIZE,
+        health_interval: float = DEFAULT_HEALTH_INTERVAL,
+    ):
+        """
+        Args:
+            factory: 创建新 docker.DockerClient 的函数（需已能连通）
+            seed_client: 已创建并验证过的客户端，作为元数据通道的第一个客户端
+            metadata_size: 元数据通道客户端数
+            stream_size: 流式通道客户端数
+            health_interval: 健康检查间隔（秒）
+        """
+        self.factory = factory
+        self.health_interval = max(1, float(health_interval or DEFAULT_HEALTH_INTERVAL))
+        self._lock = threading.Lock()
+        self._round_robin = 0
+        self._shared_auth = None
+        self._stop_event = threading.Event()
+
+        self._lanes: Dict[str, List[_PooledClient]] = {
+            LANE_METADATA: [
+                _PooledClient(LANE_METADATA, i)
+                for i in range(max(1, int(metadata_size or 1)))
+            ],
+            LANE_STREAM: [
+                _PooledClient(LANE_STREAM, i)
+                for i in range(max(1, int(stream_size or 1)))
+            ],
+        }
+
+        if seed_client is not None:
+            slot = self._lanes[LANE_METADATA][0]
+            slot.client = seed_client
+            slot.healthy = True
+            self._shared_auth = _get_auth_configs(seed_client)
+
+        # 其余客户端由健康检查线程在后台建立，避免阻塞初始化
+        self._health_thread = threading.Thread(
+            target=self._health_loop, daemon=True, name="docker-pool-health"
+        )
+        self._health_thread.start()
+
+    def _all_slots(self) -> List[_PooledClient]:
+        return self._lanes[LANE_METADATA] + self._lanes[LANE_STREAM]
+
+    def _sync_auth(self, slot: _PooledClient):
+        """
+        让所有客户端共享同一份登录信息
+
+        docker-py 的 login 只记录在调用它的客户端上，且认证为空时会替换认证对象，
+        因此每次取出客户端前把各客户端新增的认证合并到共享对象中
+        """
+        if slot.client is None:
+            return
+        for other in self._all_slots():
+            if other.client is None:
+                continue
+            auth_configs = _get_auth_configs(other.client)
+            if auth_configs is None:
+                continue
+            if self._shared_auth is None:
+                self._shared_auth = auth_configs
+                continue
+            if auth_configs is not self._shared_auth:
+                for registry, auth_data in auth_configs.auths.items():
+                    self._shared_auth.add_auth(registry, auth_data)
+                _set_auth_configs(other.client, self._shared_auth)
+
+    def _reconnect(self, slot: _PooledClient) -> bool:
+        """重建客户端（失败时按指数退避安排下次重试）"""
+        try:
+            client = self.factory()
+            client.ping()
+            old_client = slot.client
+            with self._lock:
+                slot.client = client
+                slot.healthy = True
+                slot.failures = 0
+                slot.next_retry = 0.0
+                slot.last_error = None
+                if self._shared_auth is not None:
+                    _set_auth_configs(client, self._shared_auth)
+            if old_client is not None and slot.active_streams == 0:
+                try:
+                    old_client.close()
+                except Exception:
+                    pass
+            return True
+        except Exception as e:
+            with self._lock:
+                slot.healthy = False
+                slot.failures += 1
+                slot.last_error = str(e)
+                backoff = min(
+                    RECONNECT_BACKOFF_MAX,
+                    RECONNECT_BACKOFF_BASE * (2 ** (slot.failures - 1)),
+                )
+                slot.next_retry = time.time() + backoff
+            return False
+
+    def _mark_unhealthy(self, slot: _PooledClient, error: str):
+        """标记客户端不健康，由健康检查线程负责重连"""
+        with self._lock:
+            if slot.healthy:
+                print(
+                    f"⚠️ Docker 客户端不可用（{slot.lane}#{slot.index}）: {error}，将自动重连"
+                )
+            slot.healthy = False
+            slot.last_error = error
+            if slot.next_retry == 0.0:
+                slot.next_retry = time.time()
+
+    def _check(self, slot: _PooledClient):
+        """检查单个客户端的健康状态"""
+        if slot.healthy and slot.client is not None:
+            try:
+                slot.client.ping()
+            except Exception as e:
+                self._mark_unhealthy(slot, str(e))
+        elif time.time() >= slot.next_retry:
+            first_connect = slot.client is None and slot.failures == 0
+            if self._reconnect(slot) and not first_connect:
+                print(f"✅ Docker 客户端已重连（{slot.lane}#{slot.index}）")
+
+    def _health_loop(self):
+        """后台健康检查（不健康的客户端每秒检查一次是否到了重连时间）"""
+        last_full_check = time.time()
+        while not self._stop_event.wait(1):
+            now = time.time()
+            full_check = now - last_full_check >= self.health_interval
+            if full_check:
+                last_full_check = now
+            for slot in self._all_slots():
+                if self._stop_event.is_set():
+                    return
+                if full_check or not slot.healthy:
+                    try:
+                        self._check(slot)
+                    except Exception as e:
+                        print(f"⚠️ Docker 客户端健康检查异常: {e}")
+
+    def _pick(self, lane: str) -> _PooledClient:
+        """选取通道中的客户端：优先健康的、进行中流式调用最少的"""
+        with self._lock:
+            slots = self._lanes[lane]
+            candidates = [s for s in slots if s.healthy and s.client is not None]
+            if not candidates:
+                # 通道内全部不可用时借用另一通道的健康客户端
+                other = LANE_STREAM if lane == LANE_METADATA else LANE_METADATA
+                candidates = [
+                    s for s in self._lanes[other] if s.healthy and s.client is not None
+                ]
+            if not candidates:
+                candidates = [s for s in slots if s.client is not None] or slots
+            self._round_robin += 1
+            fewest = min(s.active_streams for s in candidates)
+            least_busy = [s for s in candidates if s.active_streams == fewest]
+            slot = least_busy[self._round_robin % len(least_busy)]
+            self._sync_auth(slot)
+            return slot
+
+    def metadata_client(self):
+        """获取元数据通道的客户端（短调用，不独占）"""
+        return self._pick(LANE_METADATA).client
+
+    def run_stream(self, call: Callable[[object], object]):
+        """
+        在流式通道中执行长时间调用
+
+        Args:
+            call: 接收客户端并发起调用的函数，如 lambda c: c.api.push(...)
+
+        Returns:
+            调用结果；若为迭代器则包装为生成器，迭代结束（或关闭）后释放客户端
+        """
+        slot = self._pick(LANE_STREAM)
+        if slot.client is None:
+            raise RuntimeError(f"Docker 客户端不可用: {slot.last_error or '未连接'}")
+
+        with self._lock:
+            slot.active_streams += 1
+        try:
+            result = call(slot.client)
+        except Exception as e:
+            with self._lock:
+                slot.active_streams -= 1
+            if _is_connection_error(e):
+                self._mark_unhealthy(slot, str(e))
+            raise
+
+        if not hasattr(result, "__next__"):
+            with self._lock:
+                slot.active_streams -= 1
+            return result
+        return self._release_after(slot, result)
+
+    def _release_after(self, slot: _PooledClient, stream):
+        """包装流式结果，迭代结束后释放客户端"""
+        try:
+            yield from stream
+        except Exception as e:
+            if _is_connection_error(e):
+                self._mark_unhealthy(slot, str(e))
+            raise
+        finally:
+            with self._lock:
+                slot.active_streams -= 1
+
+    def stats(self) -> Dict:
+        """连接池状态（用于诊断）"""
+        with self._lock:
+            return {
+                lane: [
+                    {
+                        "index": s.index,
+                        "healthy": s.healthy,
+                        "active_streams": s.active_streams,
+                        "failures": s.failures,
+                        "last_error": s.last_error,
+                    }
+                    for s in slots
+                ]
+                for lane, slots in self._lanes.items()
+            }
+
+    def close(self):
+        """停止健康检查并关闭所有客户端"""
+        self._stop_event.set()
+        for slot in self._all_slots():
+            if slot.client is not None:
+                try:
+                    slot.client.close()
+                except Exception:
+                    pass
+
+
+def _is_connection_error(error: Exception) -> bool:
+    """判断异常是否为连接层错误（需要重连）"""
+    try:
+        import requests
+
+        if isinstance(error, (requests.exceptions.ConnectionError,)):
+            return True
+    except ImportError:
+        pass
+    return isinstance(error, (ConnectionError, OSError))
@@ -10,7 +10,8 @@ import shutil
 import re
 from typing import Dict, Optional
 from datetime import datetime, timedelta
-from backend.handlers import docker_builder, DOCKER_AVAILABLE
+
+from backend import metrics
 
 
 class DockerInfoCache:
@@ -44,8 +45,11 @@ class DockerInfoCache:
     
     def _fetch_docker_info(self) -> Dict:
         """获取Docker信息（实际获取逻辑）"""
+        from backend.handlers import get_docker_builder
+        
+        docker_builder = get_docker_builder()
         info = {
-            "connected": DOCKER_AVAILABLE,
+            "connected": bool(docker_builder and docker_builder.is_available()),
             "builder_type": "unknown",
             "version": None,
             "api_version": None,
@@ -255,8 +259,10 @@ class DockerInfoCache:
                     if self.refreshing and not force_refresh:
                         # 如果正在刷新且不是强制刷新，返回旧缓存
                         if self.cache:
+                            metrics.record_cache("docker_info", hit=True)
                             return self.cache.copy()
                     
+                    metrics.record_cache("docker_info", hit=False)
                     self.refreshing = True
                     try:
                         self.cache = self._fetch_docker_info()
@@ -264,6 +270,8 @@ class DockerInfoCache:
                         print(f"✅ Docker信息已刷新，缓存时间: {self.cache_time}")
                     finally:
                         self.refreshing = False
+            else:
+                metrics.record_cache("docker_info", hit=True)
             
             # 返回缓存副本
             if self.cache:
@@ -0,0 +1,406 @@
+# backend/dockerfile_parser.py
+"""
+Dockerfile 解析模块
+单遍扫描把 Dockerfile 切分为指令（处理行续接和注释），识别构建阶段（FROM ... AS）、
+替换全局 ARG、分析阶段之间的依赖（FROM <阶段>、COPY --from、RUN --mount=from），
+生成阶段依赖图；解析结果按内容哈希缓存，相同内容重复解析不再计算
+"""
+import copy
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+# 解析结果缓存条数
+PARSE_CACHE_SIZE = 256
+
+# 不识别为服务的常见构建阶段名称（只排除明确的构建阶段，不要排除可能作为最终镜像的阶段）
+EXCLUDED_STAGES = {"builder", "build", "runtime", "deps", "dependencies"}
+# 排除以 -builder 结尾的阶段（如 frontend-builder），但保留 -base 结尾的（如 backend-base 可能是最终镜像）
+EXCLUDED_STAGE_SUFFIXES = ["-builder"]
+
+# 模板变量：{{VAR_NAME}} 或 {{VAR_NAME:default}}
+TEMPLATE_VAR_PATTERN = re.compile(r"\{\{([A-Z_][A-Z0-9_]*?)(?::([^}]+))?\}\}")
+
+# ${VAR}、${VAR:-default}、$VAR 形式的 ARG 引用
+_ARG_REF_PATTERN = re.compile(
+    r"\$\{([A-Za-z_][A-Za-z0-9_]*)(?::[-+]([^}]*))?\}|\$([A-Za-z_][A-Za-z0-9_]*)"
+)
+_STAGE_NAME_PATTERN = re.compile(r"^[a-zA-Z0-9_-]+$")
+_MOUNT_FROM_PATTERN = re.compile(r"(?:^|,)from=([^,\s]+)")
+
+
+class DockerfileInstruction:
+    """一条指令（已合并续接行）"""
+
+    __slots__ = ("keyword", "args", "line")
+
+    def __init__(self, keyword: str, args: str, line: int):
+        self.keyword = keyword  # 大写的指令名，如 FROM、RUN
+        self.args = args  # 指令参数（续接行已合并为一行）
+        self.line = line  # 指令起始行号（从 1 开始）
+
+    def flags(self) -> Dict[str, str]:
+        """指令开头的 --key=value 选项"""
+        result = {}
+        for token in self.args.split():
+            if not token.startswith("--"):
+                break
+            key, _, value = token[2:].partition("=")
+            result.setdefault(key.lower(), value)
+        return result
+
+
+class DockerfileStage:
+    """构建阶段"""
+
+    def __init__(self, index: int, name: Optional[str], base: str, base_resolved: str):
+        self.index = index
+        self.name = name  # FROM ... AS <name>，没有 AS 时为 None
+        self.base = base  # FROM 的原始镜像引用
+        self.base_resolved = base_resolved  # 替换全局 ARG 后的镜像引用
+        self.instructions: List[DockerfileInstruction] = []
+        self.depends_on: List[str] = []  # 依赖的阶段（阶段名，或无名阶段的索引）
+
+    @property
+    def key(self) -> str:
+        """阶段在依赖图中的标识：有名称用名称，否则用索引"""
+        return self.name or str(self.index)
+
+
+class ParsedDockerfile:
+    """Dockerfile 解析结果（缓存共享，调用方不应修改）"""
+
+    def __init__(self, content_hash: str):
+        self.content_hash = content_hash
+        self.instructions: List[DockerfileInstruction] = []
+        # 第一个 FROM 之前的 ARG（全局 ARG）及其默认值
+        self.global_args: Dict[str, str] = {}
+        self.stages: List[DockerfileStage] = []
+        self._services: Optional[Tuple[List[Dict], Set[str]]] = None
+
+    def get_stage(self, ref: str) -> Optional[DockerfileStage]:
+        """按阶段名（不区分大小写）或索引查找阶段"""
+        if ref is None:
+            return None
+        ref_lower = ref.lower()
+        for stage in self.stages:
+            if stage.name and stage.name.lower() == ref_lower:
+                return stage
+        if ref.isdigit() and int(ref) < len(self.stages):
+            return self.stages[int(ref)]
+        return None
+
+    def dependency_graph(self) -> Dict[str, List[str]]:
+        """阶段依赖图 {阶段: [依赖的阶段]}"""
+        return {stage.key: list(stage.depends_on) for stage in self.stages}
+
+    def ancestors(self, ref: str) -> Set[str]:
+        """阶段及其全部（间接）依赖的阶段"""
+        result = set()
+        pending = [ref]
+        while pending:
+            stage = self.get_stage(pending.pop())
+            if stage is None or stage.key in result:
+                continue
+            result.add(stage.key)
+            pending.extend(stage.depends_on)
+        return result
+
+    def build_levels(self, targets: Optional[List[str]] = None) -> List[List[str]]:
+        """
+        按依赖关系分层：同一层的阶段互不依赖，可以并行构建
+
+        Args:
+            targets: 只包含这些阶段及其依赖（None 表示全部阶段）
+
+        Returns:
+            [[第一层阶段], [第二层阶段], ...]
+        """
+        if targets is None:
+            wanted = {stage.key for stage in self.stages}
+        else:
+            wanted = set()
+            for target in targets:
+                wanted |= self.ancestors(target)
+
+        graph = {
+            key: {d for d in deps if d in wanted}
+            for key, deps in self.dependency_graph().items()
+            if key in wanted
+        }
+        levels = []
+        done: Set[str] = set()
+        while graph:
+            ready = [key for key, deps in graph.items() if deps <= done]
+            if not ready:
+                # 存在循环依赖（无效的 Dockerfile），剩余阶段按原顺序放在最后一层
+                levels.append(list(graph))
+                break
+            levels.append(ready)
+            done.update(ready)
+            for key in ready:
+                del graph[key]
+        return levels
+
+
+def tokenize_dockerfile(content: str) -> List[DockerfileInstruction]:
+    """
+    把 Dockerfile 切分为指令（单遍扫描）
+
+    处理行尾反斜杠续接；注释行（包括续接中的注释行）和空行被忽略
+    """
+    instructions = []
+    parts: List[str] = []
+    start_line = 0
+
+    for line_no, raw_line in enumerate(content.split("\n"), 1):
+        line = raw_line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if not parts:
+            start_line = line_no
+        if line.endswith("\\"):
+            parts.append(line[:-1].strip())
+            continue
+        parts.append(line)
+        text = " ".join(p for p in parts if p)
+        parts = []
+        keyword, _, args = text.partition(" ")
+        instructions.append(
+            DockerfileInstruction(keyword.upper(), args.strip(), start_line)
+        )
+
+    if parts:
+        # 文件以续接行结尾
+        text = " ".join(p for p in parts if p)
+        keyword, _, args = text.partition(" ")
+        instructions.append(
+            DockerfileInstruction(keyword.upper(), args.strip(), start_line)
+        )
+    return instructions
+
+
+def substitute_args(value: str, args: Dict[str, str]) -> str:
+    """替换 ${VAR}、${VAR:-default} 和 $VAR 形式的 ARG 引用（未定义的保持原样或使用默认值）"""
+
+    def replace(match):
+        name = match.group(1) or match.group(3)
+        if name in args and args[name] != "":
+            return args[name]
+        if match.group(2) is not None:
+            return match.group(2)
+        return args.get(name, match.group(0))
+
+    return _ARG_REF_PATTERN.sub(replace, value)
+
+
+def _parse_arg(args: str) -> Optional[Tuple[str, str]]:
+    """解析 ARG 指令参数：NAME 或 NAME=default"""
+    name, sep, default = args.partition("=")
+    name = name.strip()
+    if not name or " " in name:
+        return None
+    return name, default.strip().strip("\"'") if sep else ""
+
+
+def _parse(content: str, content_hash: str) -> ParsedDockerfile:
+    parsed = ParsedDockerfile(content_hash)
+    parsed.instructions = tokenize_dockerfile(content)
+    stage_names: Dict[str, str] = {}  # 小写阶段名 -> 阶段标识
+    current: Optional[DockerfileStage] = None
+
+    for instruction in parsed.instructions:
+        if instruction.keyword == "FROM":
+            tokens = [t for t in instruction.args.split() if not t.startswith("--")]
+            base = tokens[0] if tokens else ""
+            name = None
+            if len(tokens) >= 3 and tokens[1].upper() == "AS":
+                if _STAGE_NAME_PATTERN.match(tokens[2]):
+                    name = tokens[2]
+            base_resolved = substitute_args(base, parsed.global_args)
+            current = DockerfileStage(len(parsed.stages), name, base, base_resolved)
+            dependency = stage_names.get(base_resolved.lower())
+            if dependency:
+                current.depends_on.append(dependency)
+            parsed.stages.append(current)
+            if name:
+                stage_names[name.lower()] = current.key
+            continue
+
+        if current is None:
+            if instruction.keyword == "ARG":
+                arg = _parse_arg(instruction.args)
+                if arg:
+                    parsed.global_args[arg[0]] = arg[1]
+            continue
+
+        current.instructions.append(instruction)
+
+        refs = []
+        flags = instruction.flags()
+        if instruction.keyword in ("COPY", "ADD") and flags.get("from"):
+            refs.append(flags["from"])
+        elif instruction.keyword == "RUN" and "mount" in instruction.args:
+            for token in instruction.args.split():
+                if token.startswith("--mount="):
+                    refs.extend(_MOUNT_FROM_PATTERN.findall(token[len("--mount=") :]))
+        for ref in refs:
+            if ref.isdigit():
+                index = int(ref)
+                dependency = parsed.stages[index].key if index < current.index else None
+            else:
+                dependency = stage_names.get(ref.lower())
+            if dependency and dependency not in current.depends_on:
+                current.depends_on.append(dependency)
+
+    return parsed
+
+
+def _is_excluded_stage(stage_name: str) -> bool:
+    """检查阶段名称是否应该被排除（不识别为服务）"""
+    stage_lower = stage_name.lower()
+    # 完全匹配排除列表
+    if stage_lower in EXCLUDED_STAGES:
+        return True
+    # 匹配排除的后缀（如 -builder）
+    return any(stage_lower.endswith(suffix) for suffix in EXCLUDED_STAGE_SUFFIXES)
+
+
+def _parse_env(args: str) -> Dict[str, str]:
+    """解析 ENV 指令参数（ENV KEY=value ... 或 ENV KEY value）"""
+    env = {}
+    if "=" in args:
+        # 格式1: KEY=value（可能多个，用空格分隔）
+        for part in args.split():
+            if "=" in part:
+                key, value = part.split("=", 1)
+                env[key.strip()] = value.strip().strip("\"'")
+    else:
+        # 格式2: KEY value（单个环境变量）
+        parts = args.split(None, 1)
+        if len(parts) >= 2:
+            env[parts[0].strip()] = parts[1].strip().strip("\"'")
+    return env
+
+
+def _extract_services(parsed: ParsedDockerfile) -> Tuple[List[Dict], Set[str]]:
+    """
+    从指令中提取服务阶段（FROM ... AS <name>）及其动态参数
+
+    第一个命名阶段之前的模板变量为全局模板参数；之后的指令归属当前命名阶段
+    """
+    from backend.template_parser import _get_var_description
+
+    services = []
+    global_params = set()
+    current_stage = None
+    current_params: Dict = {}
+
+    def save_current():
+        if current_stage and not _is_excluded_stage(current_stage):
+            services.append({"name": current_stage, **current_params})
+
+    for instruction in parsed.instructions:
+        keyword = instruction.keyword
+        args = instruction.args
+
+        if keyword == "FROM":
+            tokens = [t for t in args.split() if not t.startswith("--")]
+            if (
+                len(tokens) >= 3
+                and tokens[1].upper() == "AS"
+                and _STAGE_NAME_PATTERN.match(tokens[2])
+            ):
+                # 开始新的命名阶段（先保存之前的阶段）
+                save_current()
+                current_stage = tokens[2]
+                current_params = {}
+                continue
+
+        # 在第一个命名阶段之前，收集全局模板参数
+        if current_stage is None:
+            for match in TEMPLATE_VAR_PATTERN.finditer(args):
+                global_params.add(match.group(1))
+            continue
+
+        if keyword == "EXPOSE":
+            match = re.match(r"(\d+)", args)
+            if match:
+                current_params["port"] = int(match.group(1))
+        elif keyword == "USER":
+            match = re.match(r"([a-zA-Z0-9_-]+|\d+)", args)
+            if match:
+                current_params["user"] = match.group(1)
+        elif keyword == "WORKDIR":
+            current_params["workdir"] = args.strip().strip("\"'")
+        elif keyword == "ENV":
+            current_params.setdefault("env", {}).update(_parse_env(args))
+        elif keyword == "CMD":
+            current_params["cmd"] = args.strip().strip("[]\"'")
+        elif keyword == "ENTRYPOINT":
+            current_params["entrypoint"] = args.strip().strip("[]\"'")
+        elif keyword == "ARG":
+            arg = _parse_arg(args)
+            if arg:
+                current_params.setdefault("args", {})[arg[0]] = arg[1]
+
+        # 模板变量（{{VAR_NAME}} 或 {{VAR_NAME:default}}）
+        for match in TEMPLATE_VAR_PATTERN.finditer(args):
+            var_name = match.group(1)
+            default_value = match.group(2) or ""
+            template_params = current_params.setdefault("template_params", [])
+            if not any(p["name"] == var_name for p in template_params):
+                template_params.append(
+                    {
+                        "name": var_name,
+                        "default": default_value.strip(),
+                        "required": not bool(default_value),
+                        "description": _get_var_description(var_name),
+                        "type": "template",
+                    }
+                )
+
+    # 保存最后一个阶段
+    save_current()
+    return services, global_params
+
+
+def get_dockerfile_services(content: str) -> Tuple[List[Dict], Set[str]]:
+    """
+    获取 Dockerfile 的服务阶段和全局模板参数（结果随解析结果缓存，返回副本）
+
+    Returns:
+        (services, global_param_names)
+    """
+    parsed = parse_dockerfile(content)
+    with _cache_lock:
+        cached = parsed._services
+    if cached is None:
+        cached = _extract_services(parsed)
+        with _cache_lock:
+            parsed._services = cached
+    return copy.deepcopy(cached[0]), set(cached[1])
+
+
+_cache: "OrderedDict[str, ParsedDockerfile]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def parse_dockerfile(content: str) -> ParsedDockerfile:
+    """解析 Dockerfile（按内容哈希缓存，返回的结果为共享对象，请勿修改）"""
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    with _cache_lock:
+        parsed = _cache.get(content_hash)
+        if parsed is not None:
+            _cache.move_to_end(content_hash)
+            return parsed
+
+    parsed = _parse(content, content_hash)
+    with _cache_lock:
+        _cache[content_hash] = parsed
+        _cache.move_to_end(content_hash)
+        while len(_cache) > PARSE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return parsed
@@ -7,25 +7,34 @@ from datetime import datetime
 from typing import Optional, Dict, List
 from backend.database import get_db_session, init_db
 from backend.models import GitSource
-from backend.crypto_utils import encrypt_password, decrypt_password
-
-# 确保数据库已初始化
-try:
-    init_db()
-except:
-    pass
+from backend.crypto_utils import encrypt_password, decrypt_password, decrypt_many
 
 
 class GitSourceManager:
     """Git 数据源管理器（基于数据库）"""
 
     def __init__(self):
+        # 首次使用时确保数据库已初始化（不在模块导入时执行）
+        try:
+            init_db()
+        except:
+            pass
         self.lock = threading.RLock()
 
     def _to_dict(
-        self, source: GitSource, include_password: bool = False
+        self,
+        source: GitSource,
+        include_password: bool = False,
+        decrypted: Optional[Dict[str, Optional[str]]] = None,
     ) -> Optional[Dict]:
-        """将数据库模型转换为字典"""
+        """
+        将数据库模型转换为字典
+
+        Args:
+            source: 数据源模型
+            include_password: 是否包含解密后的密码
+            decrypted: 已批量解密的 {密文: 明文}（列表接口传入，未传入时按本数据源解密）
+        """
         if not source:
             return None
 
@@ -45,9 +54,13 @@ class GitSourceManager:
 
         if include_password:
             # 返回解密后的密码（用于内部操作）
+            if decrypted is None:
+                decrypted = decrypt_many([source.password])
             if source.password:
                 try:
-                    result["password"] = decrypt_password(source.password)
+                    result["password"] = decrypted.get(source.password)
+                    if result["password"] is None:
+                        raise ValueError("解密失败")
                 except (ValueError, Exception):
                     # 如果解密失败，尝试迁移旧格式（base64编码）
                     try:
@@ -154,7 +167,11 @@ class GitSourceManager:
                 )
             
             sources = query_obj.order_by(GitSource.created_at.desc()).all()
-            result = [self._to_dict(s, include_password) for s in sources]
+            decrypted = None
+            if include_password:
+                # 批量解密（相同密文只解密一次）
+                decrypted = decrypt_many(s.password for s in sources)
+            result = [self._to_dict(s, include_password, decrypted) for s in sources]
             
             # 限制返回结果数量（最多50条）
             if len(result) > 50:
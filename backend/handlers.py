@@ -28,6 +28,10 @@ from backend.config import (
 )
 from backend.utils import generate_image_name, get_safe_filename
 from backend.auth import authenticate, verify_token, require_auth
+from backend.progress_stream import compact_progress_stream
+from backend.template_index import TemplateIndex
+from backend.dockerfile_parser import get_dockerfile_services, parse_dockerfile
+from backend import metrics
 
 # 目录配置
 UPLOAD_DIR = "data/uploads"
@@ -48,23 +52,71 @@ from backend.docker_builder import create_docker_builder
 docker_builder = None
 DOCKER_AVAILABLE = False
 
+# 服务启动时在后台线程连接 Docker，不阻塞服务就绪
+# （远程 Docker 超时或 TLS 握手可能需要数秒）
+DOCKER_INIT_WAIT_SECONDS = 30
+_docker_ready = threading.Event()
+_docker_init_thread: Optional[threading.Thread] = None
+_docker_init_lock = threading.Lock()
+
 
 def init_docker_builder():
     """初始化 Docker 构建器"""
     global docker_builder, DOCKER_AVAILABLE
     config = load_config()
     docker_config = config.get("docker", {})
+    if docker_builder is not None:
+        # 关闭旧构建器的连接池（停止健康检查线程并释放连接）
+        try:
+            docker_builder.close()
+        except Exception as e:
+            print(f"⚠️ 关闭旧 Docker 构建器失败: {e}")
     docker_builder = create_docker_builder(docker_config)
     DOCKER_AVAILABLE = docker_builder.is_available()
+    _docker_ready.set()
     print(f"🐳 Docker 构建器已初始化: {docker_builder.get_connection_info()}")
     return docker_builder
 
 
-# 在模块加载时初始化
-try:
-    init_docker_builder()
-except Exception as e:
-    print(f"⚠️ 初始化 Docker 构建器失败: {e}")
+def init_docker_builder_async() -> Optional[threading.Thread]:
+    """在后台线程初始化 Docker 构建器（已初始化或正在初始化时不重复启动）"""
+    global _docker_init_thread
+    with _docker_init_lock:
+        if _docker_ready.is_set() or _docker_init_thread is not None:
+            return _docker_init_thread
+
+        def _run():
+            try:
+                init_docker_builder()
+            except Exception as e:
+                print(f"⚠️ 初始化 Docker 构建器失败: {e}")
+            finally:
+                # 失败时也放行等待方（按 Docker 不可用处理）
+                _docker_ready.set()
+
+        _docker_init_thread = threading.Thread(
+            target=_run, daemon=True, name="docker-builder-init"
+        )
+        _docker_init_thread.start()
+        return _docker_init_thread
+
+
+def get_docker_builder(timeout: float = DOCKER_INIT_WAIT_SECONDS):
+    """
+    获取 Docker 构建器
+
+    后台初始化尚未完成时最多等待 timeout 秒；尚未开始初始化时（如脚本中直接调用）先启动初始化
+    只在工作线程中等待；async 路由中传 timeout=0，不阻塞事件循环
+    """
+    if not _docker_ready.is_set():
+        init_docker_builder_async()
+        _docker_ready.wait(timeout)
+    return docker_builder
+
+
+def is_docker_available(timeout: float = DOCKER_INIT_WAIT_SECONDS) -> bool:
+    """Docker 是否可用（等待后台初始化完成）"""
+    return get_docker_builder(timeout) is not None and DOCKER_AVAILABLE
 
 
 def natural_sort_key(s):
@@ -122,54 +174,8 @@ def validate_and_clean_image_name(image_name: str) -> str:
 
 # === 模板目录辅助函数 ===
 def get_all_templates():
-    """获取所有模板列表（内置 + 用户自定义），支持子目录分类，用户模板优先"""
-    templates = {}
-
-    def scan_templates(base_dir, template_type):
-        """扫描模板目录，支持子目录（项目类型）"""
-        if not os.path.exists(base_dir):
-            return
-
-        # 扫描根目录的模板（向后兼容）
-        for f in os.listdir(base_dir):
-            if f.endswith(".Dockerfile"):
-                name = f.replace(".Dockerfile", "")
-                # 从文件名推断项目类型（兼容模式）
-                project_type = "nodejs" if "node" in name.lower() else "jar"
-                templates[name] = {
-                    "name": name,
-                    "path": os.path.join(base_dir, f),
-                    "type": template_type,
-                    "project_type": project_type,
-                }
-
-        # 扫描子目录（项目类型目录）
-        for project_type in os.listdir(base_dir):
-            type_dir = os.path.join(base_dir, project_type)
-            if not os.path.isdir(type_dir):
-                continue
-
-            # 跳过隐藏目录和特殊目录
-            if project_type.startswith(".") or project_type.startswith("_"):
-                continue
-
-            for f in os.listdir(type_dir):
-                if f.endswith(".Dockerfile"):
-                    name = f.replace(".Dockerfile", "")
-                    templates[name] = {
-                        "name": name,
-                        "path": os.path.join(type_dir, f),
-                        "type": template_type,
-                        "project_type": project_type,
-                    }
-
-    # 1. 先加载内置模板
-    scan_templates(BUILTIN_TEMPLATES_DIR, "builtin")
-
-    # 2. 再加载用户自定义模板（会覆盖同名内置模板）
-    scan_templates(USER_TEMPLATES_DIR, "user")
-
-    return templates
+    """获取所有模板列表（内置 + 用户自定义），支持子目录分类，用户模板优先（来自内存中的模板索引）"""
+    return TemplateIndex().get_templates()
 
 
 def get_template_path(template_name, project_type=None):
@@ -236,191 +242,8 @@ def parse_dockerfile_services(dockerfile_content: str) -> tuple:
           - 其他动态参数（port, user, workdir, env, cmd, entrypoint 等）
         - global_param_names: 全局模板参数名称集合（在第一个 FROM 之前）
     """
-    services = []
-
-    # 需要排除的非服务阶段名称（常见的构建阶段）
-    # 注意：只排除明确的构建阶段，不要排除可能作为最终镜像的阶段
-    excluded_stages = {"builder", "build", "runtime", "deps", "dependencies"}
-    # 排除以 -builder 结尾的阶段（如 frontend-builder），但保留 -base 结尾的（如 backend-base 可能是最终镜像）
-    excluded_suffixes = ["-builder"]
-
-    def is_excluded_stage(stage_name: str) -> bool:
-        """检查阶段名称是否应该被排除（不识别为服务）"""
-        stage_lower = stage_name.lower()
-        # 完全匹配排除列表
-        if stage_lower in excluded_stages:
-            return True
-        # 匹配排除的后缀（如 -builder）
-        for suffix in excluded_suffixes:
-            if stage_lower.endswith(suffix):
-                return True
-        return False
-
-    lines = dockerfile_content.split("\n")
-    current_stage = None
-    current_params = {}  # 存储当前阶段的所有参数
-    global_params = set()  # 存储全局模板参数（在第一个 FROM 之前）
-    first_from_found = False
-
-    # 正则表达式
-    from_as_pattern = re.compile(r"FROM\s+.*?\s+AS\s+([a-zA-Z0-9_-]+)", re.IGNORECASE)
-    from_pattern = re.compile(r"FROM\s+.*?(?:\s+AS\s+([a-zA-Z0-9_-]+))?", re.IGNORECASE)
-    expose_pattern = re.compile(r"EXPOSE\s+(\d+)", re.IGNORECASE)
-    user_pattern = re.compile(r"USER\s+([a-zA-Z0-9_-]+|\d+)", re.IGNORECASE)
-    workdir_pattern = re.compile(r"WORKDIR\s+(.+)", re.IGNORECASE)
-    # ENV 支持两种格式：ENV KEY=value 或 ENV KEY value
-    env_pattern = re.compile(r"ENV\s+(.+)", re.IGNORECASE)
-    cmd_pattern = re.compile(r"CMD\s+(.+)", re.IGNORECASE)
-    entrypoint_pattern = re.compile(r"ENTRYPOINT\s+(.+)", re.IGNORECASE)
-    arg_pattern = re.compile(r"ARG\s+([A-Z_][A-Z0-9_]*)(?:=(.+))?", re.IGNORECASE)
-    # 模板变量模式：{{VAR_NAME}} 或 {{VAR_NAME:default}}
-    template_var_pattern = re.compile(r"\{\{([A-Z_][A-Z0-9_]*?)(?::([^}]+))?\}\}")
-
-    for line in lines:
-        # 移除注释和前后空白
-        line = line.strip()
-        if not line or line.startswith("#"):
-            continue
-
-        # 匹配 FROM ... AS <stage_name>
-        from_as_match = from_as_pattern.search(line)
-        if from_as_match:
-            if not first_from_found:
-                first_from_found = True
-            # 如果之前有阶段，先保存
-            if current_stage and not is_excluded_stage(current_stage):
-                service_data = {"name": current_stage, **current_params}
-                services.append(service_data)
-
-            # 开始新阶段
-            current_stage = from_as_match.group(1)
-            current_params = {}
-            continue
-
-        # 匹配 FROM（可能没有 AS）
-        from_match = from_pattern.search(line)
-        if from_match and from_match.group(1):
-            if not first_from_found:
-                first_from_found = True
-            # 如果之前有阶段，先保存
-            if current_stage and not is_excluded_stage(current_stage):
-                service_data = {"name": current_stage, **current_params}
-                services.append(service_data)
-
-            # 开始新阶段
-            current_stage = from_match.group(1)
-            current_params = {}
-            continue
-
-        # 在第一个 FROM 之前，收集全局模板参数
-        if not first_from_found:
-            for match in template_var_pattern.finditer(line):
-                var_name = match.group(1)
-                global_params.add(var_name)
-            continue
-
-        # 如果当前有阶段，收集信息
-        if current_stage:
-            # 匹配 EXPOSE
-            expose_match = expose_pattern.search(line)
-            if expose_match:
-                current_params["port"] = int(expose_match.group(1))
-
-            # 匹配 USER
-            user_match = user_pattern.search(line)
-            if user_match:
-                current_params["user"] = user_match.group(1)
-
-            # 匹配 WORKDIR
-            workdir_match = workdir_pattern.search(line)
-            if workdir_match:
-                current_params["workdir"] = workdir_match.group(1).strip().strip("\"'")
-
-            # 匹配 ENV（支持 ENV KEY=value 和 ENV KEY value 两种格式）
-            env_match = env_pattern.search(line)
-            if env_match:
-                if "env" not in current_params:
-                    current_params["env"] = {}
-                env_line = env_match.group(1).strip()
-                # ENV 可能有两种格式：
-                # 1. ENV KEY=value
-                # 2. ENV KEY value
-                if "=" in env_line:
-                    # 格式1: KEY=value（可能多个，用空格分隔）
-                    parts = env_line.split()
-                    for part in parts:
-                        if "=" in part:
-                            key, value = part.split("=", 1)
-                            current_params["env"][key.strip()] = value.strip().strip(
-                                "\"'"
-                            )
-                else:
-                    # 格式2: KEY value（单个环境变量）
-                    parts = env_line.split(None, 1)
-                    if len(parts) >= 2:
-                        key = parts[0].strip()
-                        value = parts[1].strip().strip("\"'")
-                        current_params["env"][key] = value
-
-            # 匹配 CMD
-            cmd_match = cmd_pattern.search(line)
-            if cmd_match:
-                current_params["cmd"] = cmd_match.group(1).strip().strip("[]\"'")
-
-            # 匹配 ENTRYPOINT
-            entrypoint_match = entrypoint_pattern.search(line)
-            if entrypoint_match:
-                current_params["entrypoint"] = (
-                    entrypoint_match.group(1).strip().strip("[]\"'")
-                )
-
-            # 匹配 ARG（构建参数）
-            arg_match = arg_pattern.search(line)
-            if arg_match:
-                if "args" not in current_params:
-                    current_params["args"] = {}
-                key = arg_match.group(1).strip()
-                value = (
-                    arg_match.group(2).strip().strip("\"'")
-                    if arg_match.group(2)
-                    else ""
-                )
-                current_params["args"][key] = value
-
-            # 匹配模板变量（{{VAR_NAME}} 或 {{VAR_NAME:default}}）
-            for match in template_var_pattern.finditer(line):
-                var_name = match.group(1)
-                default_value = match.group(2) or ""
-                if "template_params" not in current_params:
-                    current_params["template_params"] = []
-                # 检查是否已存在
-                existing = next(
-                    (
-                        p
-                        for p in current_params["template_params"]
-                        if p["name"] == var_name
-                    ),
-                    None,
-                )
-                if not existing:
-                    from backend.template_parser import _get_var_description
-
-                    current_params["template_params"].append(
-                        {
-                            "name": var_name,
-                            "default": default_value.strip(),
-                            "required": not bool(default_value),
-                            "description": _get_var_description(var_name),
-                            "type": "template",
-                        }
-                    )
-
-    # 保存最后一个阶段
-    if current_stage and not is_excluded_stage(current_stage):
-        service_data = {"name": current_stage, **current_params}
-        services.append(service_data)
-
-    return services, global_params
+    # 单遍解析，结果按内容哈希缓存（见 backend/dockerfile_parser.py）
+    return get_dockerfile_services(dockerfile_content)
 
 
 class App2DockerHandler(BaseHTTPRequestHandler):
@@ -694,7 +517,7 @@ class App2DockerHandler(BaseHTTPRequestHandler):
             self._send_json(500, {"error": f"获取模板失败: {clean_msg or '未知错误'}"})
 
     def handle_export_image(self, query_params):
-        if not DOCKER_AVAILABLE:
+        if not is_docker_available():
             self._send_json(503, {"error": "Docker 服务不可用，无法导出镜像"})
             return
 
@@ -917,30 +740,7 @@ class App2DockerHandler(BaseHTTPRequestHandler):
 
     def _collect_template_details(self):
         """收集所有模板详情（内置 + 用户自定义）"""
-        details = []
-        templates = get_all_templates()
-
-        for name, info in templates.items():
-            try:
-                stat = os.stat(info["path"])
-                details.append(
-                    {
-                        "name": name,
-                        "filename": os.path.basename(info["path"]),
-                        "size": stat.st_size,
-                        "updated_at": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                        "type": info["type"],  # 'builtin' 或 'user'
-                        "project_type": info.get(
-                            "project_type", "jar"
-                        ),  # 项目类型：jar 或 nodejs
-                        "editable": info["type"] == "user",  # 只有用户模板可编辑
-                    }
-                )
-            except OSError:
-                continue
-
-        details.sort(key=lambda item: natural_sort_key(item["name"]))
-        return details
+        return TemplateIndex().get_details()
 
     def _extract_images_from_compose(self, compose_doc):
         images = []
@@ -1086,6 +886,7 @@ class App2DockerHandler(BaseHTTPRequestHandler):
             # 写入文件
             with open(filepath, "w", encoding="utf-8") as f:
                 f.write(content)
+            TemplateIndex().invalidate(filepath)
 
             self._send_json(
                 201,
@@ -1186,6 +987,7 @@ class App2DockerHandler(BaseHTTPRequestHandler):
                     os.remove(original_template["path"])
                 except OSError:
                     pass  # 如果删除失败也不影响
+            TemplateIndex().invalidate(dst_path, original_template["path"])
 
             # 构建成功消息
             if is_builtin:
@@ -1236,6 +1038,7 @@ class App2DockerHandler(BaseHTTPRequestHandler):
                 self._send_json(404, {"error": "模板不存在"})
                 return
             os.remove(filepath)
+            TemplateIndex().invalidate(filepath)
             self._send_json(200, {"message": "模板已删除"})
         except ValueError as ve:
             self._send_json(400, {"error": str(ve)})
@@ -1335,6 +1138,30 @@ class App2DockerHandler(BaseHTTPRequestHandler):
         return  # 静音日志
 
 
+def _place_uploaded_file(file_data: bytes, file_path: str, build_context: str):
+    """将上传的文件放入构建上下文（经 blob 存储去重，以硬链接/reflink 方式放置）"""
+    try:
+        from backend.blob_store import BlobStore, context_holder
+
+        store = BlobStore()
+        digest = store.put_bytes(file_data, holder=context_holder(build_context))
+        store.materialize(digest, file_path)
+    except Exception as e:
+        print(f"⚠️ blob 存储不可用，直接写入文件: {e}")
+        with open(file_path, "wb") as f:
+            f.write(file_data)
+
+
+def _release_build_context_blobs(build_context: str):
+    """释放构建上下文持有的 blob 引用（构建上下文删除后调用）"""
+    try:
+        from backend.blob_store import BlobStore
+
+        BlobStore().release_context(build_context)
+    except Exception as e:
+        print(f"⚠️ 释放构建上下文 blob 引用失败 ({build_context}): {e}")
+
+
 def _retry_login_and_push(
     docker_builder,
     repository: str,
@@ -1387,6 +1214,54 @@ def _retry_login_and_push(
     return False
 
 
+def _push_targets_concurrently(docker_builder, push_targets: list, log_func=None):
+    """
+    并发推送多个目标（同一 registry 的目标复用已上传的层）
+
+    Args:
+        docker_builder: Docker构建器实例
+        push_targets: 推送目标列表，每项包含 label、repository、tag、auth_config、
+            username、password、registry_host
+        log_func: 日志函数
+
+    Returns:
+        list: 每个目标的推送结果（success、error、duration、bytes 等）
+    """
+    from backend.push_orchestrator import PushOrchestrator, DEFAULT_PUSH_CONCURRENCY
+
+    if log_func is None:
+        log_func = print
+
+    try:
+        max_concurrency = (
+            load_config()
+            .get("docker", {})
+            .get("push_concurrency", DEFAULT_PUSH_CONCURRENCY)
+        )
+    except Exception:
+        max_concurrency = DEFAULT_PUSH_CONCURRENCY
+
+    def relogin(target):
+        return _retry_login_and_push(
+            docker_builder,
+            target["repository"],
+            target["tag"],
+            target.get("auth_config"),
+            target.get("username"),
+            target.get("password"),
+            target.get("registry_host"),
+            log_func,
+        )
+
+    orchestrator = PushOrchestrator(
+        docker_builder,
+        log_func=log_func,
+        max_concurrency=max_concurrency,
+        relogin=relogin,
+    )
+    return orchestrator.push_all(push_targets)
+
+
 class BuildManager:
     _instance_lock = threading.Lock()
     _instance = None
@@ -1642,6 +1517,7 @@ class BuildManager:
                 return False
 
         try:
+            metrics.task_stage(task_id, "build", "extract")
             log(f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n")
             log(f"🚀 开始构建任务\n")
             log(f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n")
@@ -1671,7 +1547,7 @@ class BuildManager:
             log(f"\n")
 
             # === 模拟模式 ===
-            if not DOCKER_AVAILABLE:
+            if not is_docker_available():
                 config = load_config()
                 os.makedirs(build_context, exist_ok=True)
 
@@ -1789,8 +1665,7 @@ class BuildManager:
                 log(f"  构建上下文路径: {build_context}\n")
                 log(f"  压缩包文件路径: {file_path}\n")
 
-                with open(file_path, "wb") as f:
-                    f.write(file_data)
+                _place_uploaded_file(file_data, file_path, build_context)
 
                 file_size = os.path.getsize(file_path)
                 if file_size < 1024:
@@ -1825,16 +1700,14 @@ class BuildManager:
             elif is_jar:
                 # JAR 文件：保存为固定名称 app.jar
                 jar_path = os.path.join(build_context, "app.jar")
-                with open(jar_path, "wb") as f:
-                    f.write(file_data)
+                _place_uploaded_file(file_data, jar_path, build_context)
                 log(
                     f"✅ JAR 文件已保存为: app.jar（原始文件名: {original_filename}）\n"
                 )
             else:
                 # 其他文件：保持原文件名
                 file_path = os.path.join(build_context, original_filename)
-                with open(file_path, "wb") as f:
-                    f.write(file_data)
+                _place_uploaded_file(file_data, file_path, build_context)
                 log(f"✅ 文件已保存: {original_filename}（保持原文件名）\n")
 
             # 获取模板路径（优先用户模板，否则使用内置模板）
@@ -1920,6 +1793,7 @@ class BuildManager:
                 except Exception as e:
                     log(f"⚠️ 复制资源包失败: {str(e)}\n")
 
+            metrics.task_stage(task_id, "build", "build")
             log(f"\n🚀 开始构建镜像: {full_tag}\n")
             connection_info = docker_builder.get_connection_info()
             log(f"🐳 使用构建器: {connection_info}\n")
@@ -1938,7 +1812,7 @@ class BuildManager:
             build_succeeded = False
             last_error = None
 
-            for chunk in build_stream:
+            for chunk in compact_progress_stream(build_stream, log):
                 # 检查是否请求停止（通过任务状态判断）
                 from backend.database import get_db_session
                 from backend.models import Task
@@ -2063,6 +1937,7 @@ class BuildManager:
                         f"\n🎯 找到匹配的registry配置: {push_registry_config.get('name', 'Unknown')}\n"
                     )
 
+                metrics.task_stage(task_id, "build", "push")
                 log(f"📤 开始推送镜像: {full_tag}\n")
 
                 # 直接使用构建时的镜像名
@@ -2164,7 +2039,7 @@ class BuildManager:
                     push_stream = docker_builder.push_image(
                         push_repository, tag, auth_config=auth_config
                     )
-                    for chunk in push_stream:
+                    for chunk in compact_progress_stream(push_stream, log):
                         status = (
                             chunk.get("status")
                             or chunk.get("progress")
@@ -2248,6 +2123,7 @@ class BuildManager:
                     shutil.rmtree(build_context, ignore_errors=True)
                 except Exception as e:
                     print(f"⚠️ 清理失败: {e}")
+                _release_build_context_blobs(build_context)
 
     def get_logs(self, build_id: str):
         with self.lock:
@@ -2490,6 +2366,9 @@ class BuildManager:
         except Exception as e:
             print(f"⚠️ 更新任务状态失败: {e}")
 
+        # 服务刚启动时等待后台 Docker 连接完成
+        get_docker_builder()
+
         try:
             log(f"🚀 开始从 Git 源码构建: {git_url}\n")
 
@@ -2584,9 +2463,11 @@ class BuildManager:
                     shutil.rmtree(build_context)
                 except Exception as e:
                     log(f"⚠️ 清理旧构建上下文失败: {e}\n")
+                _release_build_context_blobs(build_context)
             os.makedirs(build_context, exist_ok=True)
 
             # 克隆 Git 仓库
+            metrics.task_stage(task_id, "build_from_source", "clone")
             log(f"📥 正在克隆 Git 仓库...\n")
             # 创建临时目录用于克隆（Git clone 会在目标目录下创建仓库目录）
             temp_clone_dir = os.path.join(build_context, "source_temp")
@@ -2872,6 +2753,7 @@ logs/
                     )
                 log(f"✅ .dockerignore 已创建\n")
 
+            metrics.task_stage(task_id, "build_from_source", "build")
             # 多服务构建逻辑（只有当服务数量大于1时才进入多服务构建）
             if selected_services and len(selected_services) > 1:
                 log(f"🔨 开始多服务构建，共 {len(selected_services)} 个服务\n")
@@ -2880,6 +2762,7 @@ logs/
 
                 service_push_config = service_push_config or {}
                 built_services = []
+                push_targets = []
 
                 # 单一推送模式：构建所有服务到一个镜像
                 if push_mode == "single":
@@ -2947,7 +2830,7 @@ logs/
 
                     log(f"🔍 开始处理 Docker 构建流输出...\n")
                     chunk_count = 0
-                    for chunk in build_stream:
+                    for chunk in compact_progress_stream(build_stream, log):
                         chunk_count += 1
                         if isinstance(chunk, dict):
                             if "stream" in chunk:
@@ -3005,9 +2888,29 @@ logs/
                                             )
                                             break
 
+                                # 按阶段依赖关系排序：被依赖的阶段先构建，后续服务可直接复用其构建缓存
+                                build_levels = parse_dockerfile(
+                                    dockerfile_content
+                                ).build_levels(list(service_to_stage_map.values()))
+                                stage_order = {
+                                    stage.lower(): position
+                                    for position, stage in enumerate(
+                                        stage
+                                        for level in build_levels
+                                        for stage in level
+                                    )
+                                }
+                                selected_services = sorted(
+                                    selected_services,
+                                    key=lambda name: stage_order.get(
+                                        service_to_stage_map.get(name, "").lower(),
+                                        len(stage_order),
+                                    ),
+                                )
                                 log(
                                     f"🔍 从 Dockerfile 解析到阶段映射: {service_to_stage_map}\n"
                                 )
+                                log(f"🔍 阶段构建层级: {build_levels}\n")
                                 log(
                                     f"🔍 解析到的所有阶段: {[s.get('name') for s in services]}\n"
                                 )
@@ -3073,7 +2976,9 @@ logs/
 
                         log(f"🔍 开始处理 Docker 构建流输出...\n")
                         chunk_count = 0
-                        for chunk in build_stream:
+                        for chunk in compact_progress_stream(
+                            build_stream, log, prefix=f"[{service_name}] "
+                        ):
                             chunk_count += 1
                             if isinstance(chunk, dict):
                                 if "stream" in chunk:
@@ -3137,7 +3042,7 @@ logs/
                             should_push_service = bool(service_config)
 
                         if should_push_service:
-                            log(f"📡 开始推送服务镜像: {service_tag}\n")
+                            log(f"📡 服务镜像加入推送队列: {service_tag}\n")
                             try:
                                 # 初始化 registry_config
                                 registry_config = None
@@ -3249,180 +3154,37 @@ logs/
                                 push_repository = service_image_name
                                 push_tag = service_tag_value  # 使用服务配置的 tag
 
-                                # 推送并处理错误（支持重试）
-                                push_retried = False
-
-                                try:
-                                    push_stream = docker_builder.push_image(
-                                        push_repository,
-                                        push_tag,
-                                        auth_config=auth_config,
-                                    )
-
-                                    for chunk in push_stream:
-                                        if isinstance(chunk, dict):
-                                            if "status" in chunk:
-                                                log(
-                                                    f"[{service_name}] {chunk['status']}\n"
-                                                )
-                                            elif "error" in chunk:
-                                                error_msg = chunk["error"]
-                                                error_detail = chunk.get(
-                                                    "errorDetail", {}
-                                                )
-                                                log(
-                                                    f"[{service_name}] ❌ 推送错误: {error_msg}\n"
-                                                )
-
-                                                # 检查是否是认证错误
-                                                is_auth_error = (
-                                                    "denied" in error_msg.lower()
-                                                    or "unauthorized"
-                                                    in error_msg.lower()
-                                                    or "401"
-                                                    in str(error_detail).lower()
-                                                    or "authentication required"
-                                                    in error_msg.lower()
-                                                )
-
-                                                if is_auth_error and not push_retried:
-                                                    # 尝试重新登录并重试
-                                                    log(
-                                                        f"[{service_name}] 🔄 检测到认证错误，尝试重新登录...\n"
-                                                    )
-                                                    if _retry_login_and_push(
-                                                        docker_builder,
-                                                        push_repository,
-                                                        push_tag,
-                                                        auth_config,
-                                                        username,
-                                                        password,
-                                                        registry_host,
-                                                        log,
-                                                    ):
-                                                        # 重新登录成功，重试推送
-                                                        log(
-                                                            f"[{service_name}] 🔄 重新登录成功，重试推送...\n"
-                                                        )
-                                                        push_retried = True
-                                                        push_stream = (
-                                                            docker_builder.push_image(
-                                                                push_repository,
-                                                                push_tag,
-                                                                auth_config=auth_config,
-                                                            )
-                                                        )
-                                                        for retry_chunk in push_stream:
-                                                            if isinstance(
-                                                                retry_chunk, dict
-                                                            ):
-                                                                if (
-                                                                    "status"
-                                                                    in retry_chunk
-                                                                ):
-                                                                    log(
-                                                                        f"[{service_name}] {retry_chunk['status']}\n"
-                                                                    )
-                                                                elif (
-                                                                    "error"
-                                                                    in retry_chunk
-                                                                ):
-                                                                    retry_error_msg = (
-                                                                        retry_chunk[
-                                                                            "error"
-                                                                        ]
-                                                                    )
-                                                                    log(
-                                                                        f"[{service_name}] ❌ 重试推送仍然失败: {retry_error_msg}\n"
-                                                                    )
-                                                                    raise RuntimeError(
-                                                                        f"服务 {service_name} 推送失败（已重试）: {retry_error_msg}"
-                                                                    )
-                                                        # 重试成功，跳出外层循环
-                                                        break
-                                                    else:
-                                                        raise RuntimeError(
-                                                            f"服务 {service_name} 推送失败: {error_msg}（重新登录失败）"
-                                                        )
-                                                else:
-                                                    raise RuntimeError(
-                                                        f"服务 {service_name} 推送失败: {error_msg}"
-                                                    )
-
-                                    log(f"✅ 服务 {service_name} 推送完成\n")
-
-                                except RuntimeError:
-                                    raise
-                                except Exception as e:
-                                    error_str = str(e)
-                                    # 检查是否是认证错误
-                                    is_auth_error = (
-                                        "denied" in error_str.lower()
-                                        or "unauthorized" in error_str.lower()
-                                        or "401" in error_str
-                                        or "authentication required"
-                                        in error_str.lower()
-                                    )
-
-                                    if is_auth_error and not push_retried:
-                                        log(
-                                            f"[{service_name}] 🔄 检测到认证错误，尝试重新登录...\n"
-                                        )
-                                        if _retry_login_and_push(
-                                            docker_builder,
-                                            push_repository,
-                                            push_tag,
-                                            auth_config,
-                                            username,
-                                            password,
-                                            registry_host,
-                                            log,
-                                        ):
-                                            # 重新登录成功，重试推送
-                                            log(
-                                                f"[{service_name}] 🔄 重新登录成功，重试推送...\n"
-                                            )
-                                            try:
-                                                push_stream = docker_builder.push_image(
-                                                    push_repository,
-                                                    push_tag,
-                                                    auth_config=auth_config,
-                                                )
-                                                for retry_chunk in push_stream:
-                                                    if isinstance(retry_chunk, dict):
-                                                        if "status" in retry_chunk:
-                                                            log(
-                                                                f"[{service_name}] {retry_chunk['status']}\n"
-                                                            )
-                                                        elif "error" in retry_chunk:
-                                                            retry_error_msg = (
-                                                                retry_chunk["error"]
-                                                            )
-                                                            log(
-                                                                f"[{service_name}] ❌ 重试推送仍然失败: {retry_error_msg}\n"
-                                                            )
-                                                            raise RuntimeError(
-                                                                f"服务 {service_name} 推送失败（已重试）: {retry_error_msg}"
-                                                            )
-                                                log(
-                                                    f"✅ 服务 {service_name} 推送完成（重试成功）\n"
-                                                )
-                                            except Exception as retry_error:
-                                                raise RuntimeError(
-                                                    f"服务 {service_name} 推送失败（已重试）: {str(retry_error)}"
-                                                )
-                                        else:
-                                            raise RuntimeError(
-                                                f"服务 {service_name} 推送失败: {error_str}（重新登录失败）"
-                                            )
-                                    else:
-                                        raise
+                                # 加入推送队列，所有服务构建完成后统一并发推送
+                                push_targets.append(
+                                    {
+                                        "label": service_name,
+                                        "repository": push_repository,
+                                        "tag": push_tag,
+                                        "auth_config": auth_config,
+                                        "username": username,
+                                        "password": password,
+                                        "registry_host": registry_host,
+                                    }
+                                )
                             except Exception as e:
                                 log(f"❌ 服务 {service_name} 推送失败: {str(e)}\n")
                                 # 推送失败不影响构建成功
                         else:
                             log(f"⏭️  服务 {service_name} 跳过推送\n")
 
+                if push_targets:
+                    metrics.task_stage(task_id, "build_from_source", "push")
+                    log(f"\n{'='*60}\n")
+                    push_results = _push_targets_concurrently(
+                        docker_builder, push_targets, log
+                    )
+                    for result in push_results:
+                        if not result["success"]:
+                            # 推送失败不影响构建成功
+                            log(
+                                f"❌ 服务 {result['label']} 推送失败: {result['error']}\n"
+                            )
+
                 log(f"\n{'='*60}\n")
                 log(f"✅ 所有服务构建完成，共构建 {len(built_services)} 个服务\n")
                 log(f"📋 已构建的服务: {', '.join(built_services)}\n")
@@ -3448,7 +3210,7 @@ logs/
 
                 log(f"🔍 开始处理 Docker 构建流输出...\n")
                 chunk_count = 0
-                for chunk in build_stream:
+                for chunk in compact_progress_stream(build_stream, log):
                     chunk_count += 1
                     if isinstance(chunk, dict):
                         # 记录所有字段，确保不遗漏任何信息
@@ -3485,6 +3247,7 @@ logs/
 
             # 如果需要推送，直接使用构建好的镜像名推送，从激活的registry获取认证信息
             if should_push:
+                metrics.task_stage(task_id, "build_from_source", "push")
                 log(f"📡 开始推送镜像...\n")
                 # 直接使用构建时的镜像名和标签进行推送
                 # full_tag 格式: image_name:tag，可能包含registry路径
@@ -3636,7 +3399,7 @@ logs/
                     push_stream = docker_builder.push_image(
                         push_repository, tag, auth_config=auth_config
                     )
-                    for chunk in push_stream:
+                    for chunk in compact_progress_stream(push_stream, log):
                         if isinstance(chunk, dict):
                             if "status" in chunk:
                                 log(chunk["status"] + "\n")
@@ -3676,7 +3439,9 @@ logs/
                                             tag,
                                             auth_config=auth_config,
                                         )
-                                        for retry_chunk in push_stream:
+                                        for retry_chunk in compact_progress_stream(
+                                            push_stream, log
+                                        ):
                                             if isinstance(retry_chunk, dict):
                                                 if "status" in retry_chunk:
                                                     log(retry_chunk["status"] + "\n")
@@ -3745,7 +3510,9 @@ logs/
                                     push_stream = docker_builder.push_image(
                                         push_repository, tag, auth_config=auth_config
                                     )
-                                    for retry_chunk in push_stream:
+                                    for retry_chunk in compact_progress_stream(
+                                        push_stream, log
+                                    ):
                                         if isinstance(retry_chunk, dict):
                                             if "status" in retry_chunk:
                                                 log(retry_chunk["status"] + "\n")
@@ -4569,20 +4336,10 @@ class BuildTaskManager:
             db.close()
 
     def _start_cleanup_task(self):
-        """启动自动清理过期任务的后台线程"""
-
-        def cleanup_loop():
-            import time
-
-            while True:
-                try:
-                    time.sleep(3600)  # 每小时检查一次
-                    self.cleanup_expired_tasks()
-                except Exception as e:
-                    print(f"⚠️ 清理构建任务出错: {e}")
+        """启动按保留策略定期清理过期任务的后台线程（构建任务和导出任务共用）"""
+        from backend.retention import RetentionEngine
 
-        cleanup_thread = threading.Thread(target=cleanup_loop, daemon=True)
-        cleanup_thread.start()
+        RetentionEngine().start()
 
     def create_task(
         self,
@@ -4592,6 +4349,11 @@ class BuildTaskManager:
         **kwargs,  # 其他任务参数
     ) -> str:
         """创建构建任务"""
+        # 构建高峰期间尽快检查一次磁盘占用，不等待定期检查
+        from backend.disk_gc import DiskBudgetGC
+
+        DiskBudgetGC().notify()
+
         try:
             task_id = str(uuid.uuid4())
             created_at = datetime.now()
@@ -4872,8 +4634,9 @@ class BuildTaskManager:
                 f"🔍 [update_task_status] 验证更新后状态: {task.status}, 完成时间: {task.completed_at}"
             )
 
-            # 任务完成、失败或停止时，解绑流水线并处理队列
+            # 任务完成、失败或停止时，记录耗时，解绑流水线并处理队列
             if status in ("completed", "failed", "stopped"):
+                metrics.task_finished(task_id, status)
                 try:
                     from backend.pipeline_manager import PipelineManager
 
@@ -4892,42 +4655,9 @@ class BuildTaskManager:
                                 f"🔔 任务 {task_id[:8]} 已完成，准备触发构建后webhook: pipeline_id={pipeline_id[:8]}"
                             )
                             try:
-                                # 在后台线程中异步触发webhook
-                                import threading
-
-                                def trigger_webhooks():
-                                    import asyncio
-
-                                    try:
-                                        print(
-                                            f"🔔 开始异步触发构建后webhook: pipeline_id={pipeline_id[:8]}, task_id={task_id[:8]}"
-                                        )
-                                        loop = asyncio.new_event_loop()
-                                        asyncio.set_event_loop(loop)
-                                        loop.run_until_complete(
-                                            _trigger_post_build_webhooks(
-                                                pipeline_id,
-                                                task_id,
-                                                task,
-                                                pipeline_manager,
-                                            )
-                                        )
-                                        loop.close()
-                                        print(
-                                            f"✅ 构建后webhook触发完成: pipeline_id={pipeline_id[:8]}"
-                                        )
-                                    except Exception as e:
-                                        print(f"⚠️ 触发构建后webhook异常: {e}")
-                                        import traceback
-
-                                        traceback.print_exc()
-
-                                thread = threading.Thread(
-                                    target=trigger_webhooks, daemon=True
-                                )
-                                thread.start()
-                                print(
-                                    f"✅ 已启动构建后webhook触发线程: pipeline_id={pipeline_id[:8]}"
+                                # 只持久化通知并交给分发器，发送在后台并发进行
+                                _dispatch_post_build_webhooks(
+                                    pipeline_id, task_id, task, pipeline_manager
                                 )
                             except Exception as webhook_error:
                                 print(f"⚠️ 触发构建后webhook失败: {webhook_error}")
@@ -5166,6 +4896,7 @@ class BuildTaskManager:
                     print(f"🧹 已清理构建上下文: {build_context}")
                 except Exception as e:
                     print(f"⚠️ 清理构建上下文失败 ({build_context}): {e}")
+                _release_build_context_blobs(build_context)
 
             return True
         except Exception as e:
@@ -5175,56 +4906,13 @@ class BuildTaskManager:
             db.close()
 
     def cleanup_expired_tasks(self):
-        """清理过期任务（超过1天）"""
-        from backend.database import get_db_session
-        from backend.models import Task, TaskLog
-
-        cutoff_time = datetime.now() - timedelta(days=1)
+        """按保留策略清理过期任务（见 RetentionEngine.run）"""
+        from backend.retention import RetentionEngine
 
-        db = get_db_session()
         try:
-            expired_tasks = db.query(Task).filter(Task.created_at < cutoff_time).all()
-
-            expired_tasks_info = []
-            cleaned_count = 0
-            for task in expired_tasks:
-                # 获取构建上下文路径
-                build_context = None
-                image_name = task.image
-                if image_name:
-                    build_context = os.path.join(
-                        BUILD_DIR, f"{image_name.replace('/', '_')}_{task.task_id[:8]}"
-                    )
-                expired_tasks_info.append((task.task_id, build_context))
-
-                # 删除任务日志
-                db.query(TaskLog).filter(TaskLog.task_id == task.task_id).delete()
-
-                # 删除任务
-                db.delete(task)
-
-            db.commit()
-
-            # 清理构建上下文目录
-            for task_id, build_context in expired_tasks_info:
-                if build_context and os.path.exists(build_context):
-                    try:
-                        import shutil
-
-                        shutil.rmtree(build_context, ignore_errors=True)
-                        cleaned_count += 1
-                    except Exception as e:
-                        print(f"⚠️ 清理构建上下文失败 ({build_context}): {e}")
-
-            if expired_tasks_info:
-                print(
-                    f"🧹 已清理 {len(expired_tasks_info)} 个过期构建任务，清理了 {cleaned_count} 个构建上下文目录"
-                )
+            return RetentionEngine().run()
         except Exception as e:
-            db.rollback()
             print(f"⚠️ 清理过期任务失败: {e}")
-        finally:
-            db.close()
 
     def create_deploy_task(
         self,
@@ -5800,20 +5488,10 @@ class ExportTaskManager:
             db.close()
 
     def _start_cleanup_task(self):
-        """启动自动清理过期任务的后台线程"""
-
-        def cleanup_loop():
-            import time
-
-            while True:
-                try:
-                    time.sleep(3600)  # 每小时检查一次
-                    self.cleanup_expired_tasks()
-                except Exception as e:
-                    print(f"⚠️ 清理任务出错: {e}")
+        """启动按保留策略定期清理过期任务的后台线程（构建任务和导出任务共用）"""
+        from backend.retention import RetentionEngine
 
-        cleanup_thread = threading.Thread(target=cleanup_loop, daemon=True)
-        cleanup_thread.start()
+        RetentionEngine().start()
 
     def create_task(
         self,
@@ -5827,6 +5505,11 @@ class ExportTaskManager:
         from backend.database import get_db_session
         from backend.models import ExportTask
 
+        # 导出高峰期间尽快检查一次磁盘占用，不等待定期检查
+        from backend.disk_gc import DiskBudgetGC
+
+        DiskBudgetGC().notify()
+
         task_id = str(uuid.uuid4())
         created_at = datetime.now()
 
@@ -5892,6 +5575,8 @@ class ExportTaskManager:
                 task.completed_at = datetime.now()
 
             db.commit()
+            if status in ("completed", "failed", "stopped"):
+                metrics.task_finished(task_id, status)
             return True
         except Exception as e:
             db.rollback()
@@ -5987,9 +5672,10 @@ class ExportTaskManager:
             if not task or task.status == "stopped":
                 return
 
-            if not DOCKER_AVAILABLE:
+            if not is_docker_available():
                 raise RuntimeError("Docker 服务不可用，无法导出镜像")
 
+            metrics.task_stage(task_id, "export", "pull")
             # 获取认证信息
             from backend.config import (
                 get_all_registries,
@@ -6079,6 +5765,7 @@ class ExportTaskManager:
             tar_path = os.path.join(task_dir, tar_filename)
 
             # 导出镜像
+            metrics.task_stage(task_id, "export", "export")
             image_stream = docker_builder.export_image(full_tag)
             chunk_count = 0
             with open(tar_path, "wb") as f:
@@ -6112,6 +5799,7 @@ class ExportTaskManager:
 
             # 如果需要压缩
             if compress.lower() in ("gzip", "gz", "tgz", "1", "true", "yes"):
+                metrics.task_stage(task_id, "export", "compress")
                 final_path = f"{tar_path}.gz"
                 with open(tar_path, "rb") as src, gzip.open(final_path, "wb") as dst:
                     shutil.copyfileobj(src, dst)
@@ -6336,37 +6024,44 @@ class ExportTaskManager:
         finally:
             db.close()
 
-    def cleanup_expired_tasks(self, days: int = 1):
-        """清理过期任务（默认保留1天）"""
-        from backend.database import get_db_session
-        from backend.models import ExportTask
-        from datetime import timedelta
-
-        cutoff_time = datetime.now() - timedelta(days=days)
+    def cleanup_expired_tasks(self, days: int = None):
+        """按保留策略清理过期任务（见 RetentionEngine.run，days 覆盖导出任务保留天数）"""
+        from backend.retention import RetentionEngine
 
-        db = get_db_session()
         try:
-            expired_tasks = (
-                db.query(ExportTask).filter(ExportTask.created_at < cutoff_time).all()
-            )
-
-            for task in expired_tasks:
-                try:
-                    self.delete_task(task.task_id)
-                    print(f"🗑️ 已清理过期任务: {task.task_id}")
-                except Exception as e:
-                    print(f"⚠️ 清理任务失败 {task.task_id}: {e}")
-        finally:
-            db.close()
+            return RetentionEngine().run({"export_task_days": days} if days else None)
+        except Exception as e:
+            print(f"⚠️ 清理过期任务失败: {e}")
 
 
 # ============ 操作日志管理器 ============
 class OperationLogger:
-    """操作日志管理器 - 记录用户操作（基于数据库）"""
+    """操作日志管理器 - 记录用户操作（基于数据库）
+
+    log() 只把日志放入内存队列，后台写入线程按批次（或每隔 FLUSH_INTERVAL 秒）批量插入，
+    请求处理过程中不产生写事务；读取前会先写入队列中的日志
+    """
 
     _instance_lock = threading.Lock()
     _instance = None
 
+    # 批量写入的最大条数和最长间隔（秒）
+    BATCH_SIZE = 200
+    FLUSH_INTERVAL = 1.0
+    # 队列最多保留的条数（数据库长时间不可写时丢弃最早的日志）
+    MAX_QUEUE_SIZE = 10000
+    # 按保留天数清理时每批删除的条数
+    PRUNE_BATCH_SIZE = 5000
+    # 自动清理的检查间隔（秒）
+    PRUNE_INTERVAL = 3600
+
+    _queue = deque()
+    _queue_cond = threading.Condition()
+    _writer_thread = None
+    _flush_lock = threading.Lock()
+    _last_prune = 0.0
+    _stats = {"queued": 0, "written": 0, "batches": 0, "errors": 0, "dropped": 0}
+
     def __new__(cls):
         if cls._instance is None:
             with cls._instance_lock:
@@ -6386,56 +6081,335 @@ class OperationLogger:
 
     @classmethod
     def log(cls, username: str, operation: str, details: dict = None):
-        """记录操作日志"""
+        """记录操作日志（放入队列，由后台线程批量写入）"""
+        try:
+            # 入队前转换为可写入 JSON 字段的值（datetime 等转为字符串），
+            # 避免无法序列化的日志导致整批写入失败
+            details = json.loads(json.dumps(details or {}, default=str))
+        except (TypeError, ValueError) as e:
+            details = {"unserializable": str(e)}
+        entry = {
+            "username": username,
+            "action": operation,
+            "details": details,
+            "timestamp": datetime.now(),
+        }
+        with cls._queue_cond:
+            if len(cls._queue) >= cls.MAX_QUEUE_SIZE:
+                cls._queue.popleft()
+                cls._stats["dropped"] += 1
+            cls._queue.append(entry)
+            cls._stats["queued"] += 1
+            if len(cls._queue) >= cls.BATCH_SIZE:
+                cls._queue_cond.notify()
+        cls._ensure_writer()
+
+    @classmethod
+    def _ensure_writer(cls):
+        """启动后台写入线程（首次记录日志时）"""
+        if cls._writer_thread is not None:
+            return
+        with cls._queue_cond:
+            if cls._writer_thread is not None:
+                return
+            cls._writer_thread = threading.Thread(
+                target=cls._writer_loop, daemon=True, name="operation-log-writer"
+            )
+            cls._writer_thread.start()
+        import atexit
+
+        atexit.register(cls.flush)
+
+    @classmethod
+    def _writer_loop(cls):
+        import time
+
+        while True:
+            with cls._queue_cond:
+                if len(cls._queue) < cls.BATCH_SIZE:
+                    cls._queue_cond.wait(cls.FLUSH_INTERVAL)
+            try:
+                cls.flush()
+                if time.monotonic() - cls._last_prune >= cls.PRUNE_INTERVAL:
+                    cls._last_prune = time.monotonic()
+                    cls._auto_prune()
+            except Exception as e:
+                print(f"⚠️ 写入操作日志出错: {e}")
+
+    @classmethod
+    def flush(cls) -> int:
+        """把队列中的日志批量写入数据库
+
+        Returns:
+            写入的条数
+        """
+        from backend.database import get_db_session
+        from backend.models import OperationLog
+
+        written = 0
+        with cls._flush_lock:
+            while True:
+                with cls._queue_cond:
+                    batch = [
+                        cls._queue.popleft()
+                        for _ in range(min(cls.BATCH_SIZE, len(cls._queue)))
+                    ]
+                if not batch:
+                    return written
+
+                db = get_db_session()
+                try:
+                    db.bulk_insert_mappings(OperationLog, batch)
+                    db.commit()
+                    written += len(batch)
+                    cls._stats["written"] += len(batch)
+                    cls._stats["batches"] += 1
+                    continue
+                except Exception as e:
+                    db.rollback()
+                    cls._stats["errors"] += 1
+                    print(f"⚠️ 批量记录操作日志失败，逐条写入: {e}")
+                finally:
+                    db.close()
+
+                batch_written, requeue = cls._insert_one_by_one(batch)
+                written += batch_written
+                if requeue:
+                    # 数据库暂时不可写，放回队列下次重试
+                    with cls._queue_cond:
+                        cls._queue.extendleft(reversed(requeue))
+                    return written
+
+    @classmethod
+    def _insert_one_by_one(cls, batch: list):
+        """
+        逐条写入（批量写入失败时），数据有误的日志丢弃
+
+        Returns:
+            (写入条数, 因数据库不可写需要放回队列的日志)
+        """
+        from sqlalchemy.exc import OperationalError
+        from backend.database import get_db_session
+        from backend.models import OperationLog
+
+        written = 0
+        for index, entry in enumerate(batch):
+            db = get_db_session()
+            try:
+                db.bulk_insert_mappings(OperationLog, [entry])
+                db.commit()
+                written += 1
+                cls._stats["written"] += 1
+            except OperationalError as e:
+                db.rollback()
+                print(f"⚠️ 记录操作日志失败，稍后重试: {e}")
+                return written, batch[index:]
+            except Exception as e:
+                db.rollback()
+                cls._stats["dropped"] += 1
+                print(f"⚠️ 丢弃无法写入的操作日志 ({entry.get('action')}): {e}")
+            finally:
+                db.close()
+        return written, []
+
+    @classmethod
+    def stats(cls) -> dict:
+        """写入统计（排队、已写入、批次数）"""
+        with cls._queue_cond:
+            stats = dict(cls._stats)
+            stats["pending"] = len(cls._queue)
+        return stats
+
+    @staticmethod
+    def _to_dict(log) -> dict:
+        return {
+            "id": log.id,
+            "timestamp": log.timestamp.isoformat() if log.timestamp else None,
+            "username": log.username,
+            "operation": log.action,
+            "details": log.details or {},
+        }
+
+    @staticmethod
+    def encode_cursor(log: dict) -> str:
+        """分页游标（上一页最后一条的时间和ID）"""
+        return f"{log['timestamp']}|{log['id']}"
+
+    @staticmethod
+    def _decode_cursor(cursor: str):
+        timestamp, _, log_id = cursor.rpartition("|")
+        try:
+            return datetime.fromisoformat(timestamp), int(log_id)
+        except ValueError:
+            raise ValueError(f"无效的分页游标: {cursor}")
+
+    def query_logs(
+        self,
+        limit: int = 100,
+        username: str = None,
+        operation: str = None,
+        start_time: datetime = None,
+        end_time: datetime = None,
+        cursor: str = None,
+        offset: int = 0,
+    ) -> dict:
+        """
+        按时间倒序查询操作日志
+
+        Args:
+            limit: 返回条数
+            username: 过滤用户名
+            operation: 过滤操作类型
+            start_time: 起始时间（包含）
+            end_time: 结束时间（不包含）
+            cursor: 上一页返回的 next_cursor（键集分页，不需要 offset）
+            offset: 偏移量（没有 cursor 时的页码分页）
+
+        Returns:
+            {"logs": [...], "next_cursor": str 或 None}
+        """
+        from sqlalchemy import and_, or_
         from backend.database import get_db_session
         from backend.models import OperationLog
 
+        # 先写入队列中的日志，保证能读到刚记录的操作
+        self.flush()
+
         db = get_db_session()
         try:
-            log_entry = OperationLog(
-                username=username,
-                action=operation,
-                details=details or {},
-                timestamp=datetime.now(),
+            query = db.query(OperationLog)
+            if username:
+                query = query.filter(OperationLog.username == username)
+            if operation:
+                query = query.filter(OperationLog.action == operation)
+            if start_time:
+                query = query.filter(OperationLog.timestamp >= start_time)
+            if end_time:
+                query = query.filter(OperationLog.timestamp < end_time)
+            if cursor:
+                cursor_time, cursor_id = self._decode_cursor(cursor)
+                query = query.filter(
+                    or_(
+                        OperationLog.timestamp < cursor_time,
+                        and_(
+                            OperationLog.timestamp == cursor_time,
+                            OperationLog.id < cursor_id,
+                        ),
+                    )
+                )
+
+            query = query.order_by(
+                OperationLog.timestamp.desc(), OperationLog.id.desc()
             )
-            db.add(log_entry)
-            db.commit()
-        except Exception as e:
-            db.rollback()
-            print(f"⚠️ 记录操作日志失败: {e}")
+            if offset and not cursor:
+                query = query.offset(offset)
+            # 多取一条判断是否还有下一页
+            logs = [self._to_dict(log) for log in query.limit(limit + 1).all()]
+            next_cursor = None
+            if len(logs) > limit:
+                logs = logs[:limit]
+                next_cursor = self.encode_cursor(logs[-1])
+            return {"logs": logs, "next_cursor": next_cursor}
         finally:
             db.close()
 
-    def get_logs(self, limit: int = 100, username: str = None, operation: str = None):
-        """获取操作日志"""
+    def count_logs(
+        self,
+        username: str = None,
+        operation: str = None,
+        start_time: datetime = None,
+        end_time: datetime = None,
+    ) -> int:
+        """统计符合条件的日志条数"""
+        from sqlalchemy import func
         from backend.database import get_db_session
         from backend.models import OperationLog
 
         db = get_db_session()
         try:
-            query = db.query(OperationLog)
-
+            query = db.query(func.count(OperationLog.id))
             if username:
                 query = query.filter(OperationLog.username == username)
             if operation:
                 query = query.filter(OperationLog.action == operation)
+            if start_time:
+                query = query.filter(OperationLog.timestamp >= start_time)
+            if end_time:
+                query = query.filter(OperationLog.timestamp < end_time)
+            return query.scalar() or 0
+        finally:
+            db.close()
 
-            logs = query.order_by(OperationLog.timestamp.desc()).limit(limit).all()
-
-            return [
-                {
-                    "timestamp": log.timestamp.isoformat() if log.timestamp else None,
-                    "username": log.username,
-                    "operation": log.action,
-                    "details": log.details or {},
-                }
-                for log in logs
+    def get_logs(self, limit: int = 100, username: str = None, operation: str = None):
+        """获取操作日志"""
+        try:
+            logs = self.query_logs(limit=limit, username=username, operation=operation)[
+                "logs"
             ]
+            for log in logs:
+                log.pop("id", None)
+            return logs
         except Exception as e:
             print(f"⚠️ 读取操作日志失败: {e}")
             return []
-        finally:
-            db.close()
+
+    @classmethod
+    def prune(cls, cutoff_time: datetime) -> int:
+        """按天分批删除 cutoff_time 之前的日志（每批一个短事务）
+
+        Returns:
+            删除的日志条数
+        """
+        from sqlalchemy import func
+        from backend.database import get_db_session
+        from backend.models import OperationLog
+
+        deleted = 0
+        while True:
+            db = get_db_session()
+            try:
+                oldest = db.query(func.min(OperationLog.timestamp)).scalar()
+                if oldest is None or oldest >= cutoff_time:
+                    return deleted
+                # 一次删除一天（类似按天分区），单天数据过多时再按条数分批
+                day_end = min(
+                    datetime(oldest.year, oldest.month, oldest.day) + timedelta(days=1),
+                    cutoff_time,
+                )
+                ids = [
+                    row[0]
+                    for row in db.query(OperationLog.id)
+                    .filter(OperationLog.timestamp < day_end)
+                    .limit(cls.PRUNE_BATCH_SIZE)
+                    .all()
+                ]
+                if not ids:
+                    return deleted
+                db.query(OperationLog).filter(OperationLog.id.in_(ids)).delete(
+                    synchronize_session=False
+                )
+                db.commit()
+                deleted += len(ids)
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+
+    @classmethod
+    def _auto_prune(cls):
+        """按配置的保留天数自动清理（operation_log.retention_days，0 表示不清理）"""
+        try:
+            from backend.config import load_config
+
+            days = (load_config().get("operation_log") or {}).get("retention_days")
+        except Exception:
+            days = None
+        if not days:
+            return
+        deleted = cls.prune(datetime.now() - timedelta(days=days))
+        if deleted:
+            print(f"🧹 已清理 {deleted} 条超过 {days} 天的操作日志")
 
     def clear_logs(self, days: int = None):
         """清理操作日志
@@ -6449,24 +6423,21 @@ class OperationLogger:
         from backend.database import get_db_session
         from backend.models import OperationLog
 
+        self.flush()
+        if days is not None:
+            # 保留最近 N 天的日志
+            try:
+                return self.prune(datetime.now() - timedelta(days=days))
+            except Exception as e:
+                print(f"⚠️ 清理操作日志失败: {e}")
+                return 0
+
         db = get_db_session()
         try:
-            if days is None:
-                # 清空所有日志
-                count = db.query(OperationLog).count()
-                db.query(OperationLog).delete()
-                db.commit()
-                return count
-            else:
-                # 保留最近 N 天的日志
-                cutoff_time = datetime.now() - timedelta(days=days)
-                deleted = (
-                    db.query(OperationLog)
-                    .filter(OperationLog.timestamp < cutoff_time)
-                    .delete()
-                )
-                db.commit()
-                return deleted
+            # 清空所有日志（不带条件的 DELETE，SQLite 直接清空表）
+            deleted = db.query(OperationLog).delete(synchronize_session=False)
+            db.commit()
+            return deleted
         except Exception as e:
             db.rollback()
             print(f"⚠️ 清理操作日志失败: {e}")
@@ -6475,11 +6446,11 @@ class OperationLogger:
             db.close()
 
 
-async def _trigger_post_build_webhooks(
+def _dispatch_post_build_webhooks(
     pipeline_id: str, task_id: str, task_obj, pipeline_manager
 ):
     """
-    触发构建后的webhook
+    分发构建后的webhook（渲染请求体后交给 PostBuildWebhookDispatcher，立即返回）
 
     Args:
         pipeline_id: 流水线ID
@@ -6500,12 +6471,7 @@ async def _trigger_post_build_webhooks(
             print(f"ℹ️ 流水线 {pipeline.get('name')} 没有配置构建后Webhook")
             return
 
-        print(
-            f"🔔 开始触发构建后Webhook: pipeline={pipeline.get('name')}, task_id={task_id[:8]}, webhook数量={len(post_build_webhooks)}"
-        )
-
         # 构建模板变量上下文
-        task_config = task_obj.task_config or {}
         context = {
             "task_id": task_id,
             "image": task_obj.image or "",
@@ -6522,9 +6488,10 @@ async def _trigger_post_build_webhooks(
             ),
         }
 
-        # 触发每个启用的webhook
-        from backend.webhook_trigger import trigger_webhook, render_template
+        from backend.webhook_dispatcher import PostBuildWebhookDispatcher
+        from backend.webhook_trigger import render_body
 
+        webhooks = []
         for idx, webhook_config in enumerate(post_build_webhooks):
             if not webhook_config.get("enabled", True):
                 print(f"⏭️ Webhook {idx + 1} 已禁用，跳过")
@@ -6535,44 +6502,35 @@ async def _trigger_post_build_webhooks(
                 print(f"⚠️ Webhook {idx + 1} 配置缺少URL，跳过")
                 continue
 
-            method = webhook_config.get("method", "POST")
-            headers = webhook_config.get("headers", {})
             body_template = webhook_config.get("body_template", "{}")
+            headers = webhook_config.get("headers", {})
 
-            # 渲染请求体模板
+            # 渲染请求体模板（JSON 请求体中的变量值按 JSON 转义）
             try:
-                body = render_template(body_template, context)
-                print(f"🔍 Webhook {idx + 1} 模板渲染成功: url={url}")
+                body = render_body(body_template, context, headers)
             except Exception as e:
                 print(f"⚠️ Webhook {idx + 1} 渲染模板失败: {e}")
-                import traceback
-
-                traceback.print_exc()
                 body = body_template
 
-            # 发送webhook请求
-            print(
-                f"🔔 触发构建后webhook {idx + 1}: pipeline={pipeline.get('name')}, url={url}, method={method}"
+            webhooks.append(
+                {
+                    "index": idx,
+                    "url": url,
+                    "method": webhook_config.get("method", "POST"),
+                    "headers": headers,
+                    "body": body,
+                }
             )
-            try:
-                result = await trigger_webhook(url, method, headers, body)
 
-                if result.get("success"):
-                    print(
-                        f"✅ Webhook {idx + 1} 触发成功: url={url}, status_code={result.get('status_code')}"
-                    )
-                else:
-                    error_msg = result.get("error", "unknown")
-                    status_code = result.get("status_code")
-                    response_text = result.get("response_text", "")[:200]
-                    print(
-                        f"❌ Webhook {idx + 1} 触发失败: url={url}, error={error_msg}, status_code={status_code}, response={response_text}"
-                    )
-            except Exception as e:
-                print(f"❌ Webhook {idx + 1} 触发异常: url={url}, error={str(e)}")
-                import traceback
+        if not webhooks:
+            return
 
-                traceback.print_exc()
+        record_ids = PostBuildWebhookDispatcher().dispatch(
+            pipeline_id, task_id, webhooks
+        )
+        print(
+            f"🔔 已分发构建后Webhook: pipeline={pipeline.get('name')}, task_id={task_id[:8]}, webhook数量={len(record_ids)}"
+        )
     except Exception as e:
         print(f"⚠️ 触发构建后webhook异常: {e}")
         import traceback
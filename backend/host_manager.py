@@ -5,23 +5,16 @@
 """
 import os
 import uuid
-import paramiko
 from datetime import datetime
 from typing import List, Dict, Optional
 from backend.database import get_db_session, init_db
 from backend.models import Host
 from backend.crypto_utils import (
     encrypt_password,
-    decrypt_password,
+    decrypt_many,
     migrate_old_password,
 )
 
-# 确保数据库已初始化
-try:
-    init_db()
-except:
-    pass
-
 
 class HostManager:
     """主机资源管理器（基于数据库）"""
@@ -40,10 +33,26 @@ class HostManager:
 
     def _init(self):
         """初始化主机管理器"""
-        pass
+        # 首次使用时确保数据库已初始化（不在模块导入时执行）
+        try:
+            init_db()
+        except:
+            pass
 
-    def _to_dict(self, host: Host, include_secrets: bool = False) -> Optional[Dict]:
-        """将数据库模型转换为字典"""
+    def _to_dict(
+        self,
+        host: Host,
+        include_secrets: bool = False,
+        decrypted: Optional[Dict[str, Optional[str]]] = None,
+    ) -> Optional[Dict]:
+        """
+        将数据库模型转换为字典
+
+        Args:
+            host: 主机模型
+            include_secrets: 是否包含解密后的密码和密钥
+            decrypted: 已批量解密的 {密文: 明文}（列表接口传入，未传入时按本主机解密）
+        """
         if not host:
             return None
 
@@ -61,10 +70,16 @@ class HostManager:
         }
 
         if include_secrets:
-            # 解密密码和密钥
+            # 解密密码和密钥（解密失败的为 None，按旧格式迁移）
+            if decrypted is None:
+                decrypted = decrypt_many(
+                    [host.password, host.private_key, host.key_password]
+                )
             if host.password:
                 try:
-                    result["password"] = decrypt_password(host.password)
+                    result["password"] = decrypted.get(host.password)
+                    if result["password"] is None:
+                        raise ValueError("解密失败")
                 except (ValueError, Exception):
                     # 如果解密失败，尝试迁移旧格式（明文或base64）
                     try:
@@ -116,7 +131,9 @@ class HostManager:
 
             if host.private_key:
                 try:
-                    result["private_key"] = decrypt_password(host.private_key)
+                    result["private_key"] = decrypted.get(host.private_key)
+                    if result["private_key"] is None:
+                        raise ValueError("解密失败")
                 except (ValueError, Exception):
                     try:
                         # 尝试迁移旧格式
@@ -163,7 +180,9 @@ class HostManager:
 
             if host.key_password:
                 try:
-                    result["key_password"] = decrypt_password(host.key_password)
+                    result["key_password"] = decrypted.get(host.key_password)
+                    if result["key_password"] is None:
+                        raise ValueError("解密失败")
                 except (ValueError, Exception):
                     try:
                         # 尝试迁移旧格式
@@ -228,6 +247,8 @@ class HostManager:
         timeout: int = 10,
     ) -> Dict:
         """测试SSH连接"""
+        import paramiko
+
         ssh_client = None
         try:
             ssh_client = paramiko.SSHClient()
@@ -508,8 +529,8 @@ class HostManager:
             finally:
                 db.close()
 
-    def list_hosts(self) -> List[Dict]:
-        """列出所有主机"""
+    def list_hosts(self, include_secrets: bool = False) -> List[Dict]:
+        """列出所有主机（include_secrets 时批量解密密码和密钥）"""
         db = get_db_session()
         try:
             hosts = db.query(Host).order_by(Host.created_at.desc()).all()
@@ -517,7 +538,14 @@ class HostManager:
             for host in hosts:
                 _ = host.created_at
                 _ = host.updated_at
-            return [self._to_dict(h) for h in hosts]
+            decrypted = None
+            if include_secrets:
+                decrypted = decrypt_many(
+                    value
+                    for h in hosts
+                    for value in (h.password, h.private_key, h.key_password)
+                )
+            return [self._to_dict(h, include_secrets, decrypted) for h in hosts]
         finally:
             db.close()
 
@@ -0,0 +1,180 @@
+# backend/import_profiler.py
+"""
+启动耗时统计
+类似 python -X importtime：在 sys.meta_path 最前面挂一个查找器，记录每个模块执行模块代码的
+累计耗时和自身耗时（减去其中导入其他模块的时间）；配合 phase() 记录的启动阶段耗时，
+启动完成后在日志中输出最慢的模块和各阶段耗时
+设置环境变量 APP_IMPORT_PROFILE=0 关闭统计
+"""
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+# 关闭统计的环境变量
+ENV_SWITCH = "APP_IMPORT_PROFILE"
+
+# 日志中输出的最慢模块数量
+TOP_N = 15
+
+# 开始统计的时间（模块首次导入时）
+_started_at = time.perf_counter()
+
+# 模块名 -> (自身耗时, 累计耗时)，单位秒
+_records: Dict[str, Tuple[float, float]] = {}
+# [(阶段名, 耗时)]
+_phases: List[Tuple[str, float]] = []
+_lock = threading.Lock()
+# 每个线程正在执行的模块栈（栈元素为已计入的子模块耗时）
+_local = threading.local()
+_finder = None
+
+
+def _timed_exec_module(original):
+    """包装 loader.exec_module，记录模块执行耗时"""
+
+    def exec_module(module):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            original(module)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with _lock:
+                _records[module.__name__] = (elapsed - children, elapsed)
+
+    exec_module._import_timed = True
+    return exec_module
+
+
+class _TimingFinder:
+    """委托其余查找器查找模块，只为返回的 loader 挂上计时"""
+
+    def find_spec(self, fullname, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self:
+                continue
+            find_spec = getattr(finder, "find_spec", None)
+            if find_spec is None:
+                continue
+            spec = find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+
+        loader = spec.loader
+        # 内置/冻结模块的 loader 是类本身，耗时计入导入它的模块
+        if loader is None or isinstance(loader, type):
+            return spec
+        exec_module = getattr(loader, "exec_module", None)
+        if exec_module is None or getattr(exec_module, "_import_timed", False):
+            return spec
+        try:
+            loader.exec_module = _timed_exec_module(exec_module)
+        except (AttributeError, TypeError):
+            pass
+        return spec
+
+    def invalidate_caches(self):
+        pass
+
+
+def is_enabled() -> bool:
+    """是否开启统计（已使用 -X importtime 时由解释器自行输出，不再重复统计）"""
+    if "importtime" in getattr(sys, "_xoptions", {}):
+        return False
+    return os.getenv(ENV_SWITCH, "1").lower() not in ("0", "false", "no", "off")
+
+
+def install():
+    """开始统计导入耗时（应在导入其他模块之前调用，重复调用无副作用）"""
+    global _finder
+    with _lock:
+        if _finder is not None or not is_enabled():
+            return
+        _finder = _TimingFinder()
+        sys.meta_path.insert(0, _finder)
+
+
+def uninstall():
+    """停止统计导入耗时（已记录的数据保留）"""
+    global _finder
+    with _lock:
+        if _finder is None:
+            return
+        try:
+            sys.meta_path.remove(_finder)
+        except ValueError:
+            pass
+        _finder = None
+
+
+@contextmanager
+def phase(name: str):
+    """记录一个启动阶段的耗时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _lock:
+            _phases.append((name, time.perf_counter() - start))
+
+
+def stats(top: int = TOP_N) -> Dict:
+    """
+    启动耗时统计
+
+    Returns:
+        {"elapsed_seconds", "modules", "import_seconds", "slowest": [...], "phases": [...]}
+    """
+    with _lock:
+        records = dict(_records)
+        phases = list(_phases)
+    # 各模块自身耗时之和即导入总耗时（累计耗时会重复计入嵌套导入）
+    import_seconds = sum(self_time for self_time, _ in records.values())
+    slowest = sorted(records.items(), key=lambda item: item[1][0], reverse=True)
+    return {
+        "elapsed_seconds": round(time.perf_counter() - _started_at, 3),
+        "modules": len(records),
+        "import_seconds": round(import_seconds, 3),
+        "slowest": [
+            {
+                "module": name,
+                "self_ms": round(self_time * 1000, 1),
+                "cumulative_ms": round(cumulative * 1000, 1),
+            }
+            for name, (self_time, cumulative) in slowest[:top]
+        ],
+        "phases": [
+            {"name": name, "ms": round(seconds * 1000, 1)} for name, seconds in phases
+        ],
+    }
+
+
+def log_report(title: str = "启动耗时", top: int = TOP_N, log=print):
+    """输出启动耗时报告（-X importtime 格式的最慢模块 + 各启动阶段）"""
+    if not is_enabled():
+        return
+    report = stats(top)
+    log(
+        f"⏱️ {title}: {report['elapsed_seconds']:.2f}s"
+        f"（导入 {report['modules']} 个模块共 {report['import_seconds']:.2f}s）"
+    )
+    if report["slowest"]:
+        log("import time: self [us] | cumulative | imported package")
+        for item in report["slowest"]:
+            log(
+                f"import time: {int(item['self_ms'] * 1000):>9} | "
+                f"{int(item['cumulative_ms'] * 1000):>10} | {item['module']}"
+            )
+    for item in report["phases"]:
+        log(f"⏱️ {item['name']}: {item['ms']:.1f}ms")
@@ -0,0 +1,483 @@
+# backend/metrics.py
+"""
+运行指标
+进程内的计数器、仪表和直方图，以 Prometheus 文本格式（0.0.4）从 /metrics 输出：
+HTTP 请求按路由统计耗时和数据库查询次数/耗时，构建/导出/部署任务按阶段统计耗时，
+WebSocket 消息按 Agent 统计，缓存按命中/未命中统计；
+各后台服务已有的 stats()（数据库连接池、Webhook 队列、清理、回收、分发、操作日志）
+在抓取时转换为仪表输出
+"""
+import math
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 指标名前缀
+PREFIX = "app2docker"
+
+# 输出格式
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 耗时直方图的默认分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 任务阶段耗时分桶（秒）：构建、推送等可能持续数十分钟
+TASK_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+# 单个请求的数据库查询次数分桶
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# 同时跟踪阶段的任务数上限（异常退出未结束的任务按先后顺序丢弃）
+MAX_TRACKED_TASKS = 1000
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class _Metric:
+    """指标基类：按标签值分组保存样本"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = f"{PREFIX}_{name}"
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(
+                f"指标 {self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> Iterable[Tuple[str, Sequence[Tuple[str, str]], float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for name, labels, value in self._samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """只增计数器"""
+
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, list(zip(self.labelnames, key)), value
+
+
+class Gauge(_Metric):
+    """可增可减的仪表"""
+
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, list(zip(self.labelnames, key)), value
+
+
+class Histogram(_Metric):
+    """直方图（累计分桶计数、总和、次数）"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各分桶计数（不累计）..., +Inf 分桶计数, 总和]
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-1] += value
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        for key, state in items:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), state[:-1]):
+                cumulative += count
+                yield f"{self.name}_bucket", labels + [
+                    ("le", _format_value(float(bound)))
+                ], cumulative
+            yield f"{self.name}_sum", labels, state[-1]
+            yield f"{self.name}_count", labels, cumulative
+
+
+class MetricsRegistry:
+    """指标注册表：已注册的指标 + 抓取时调用的采集函数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[_Metric]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标已注册: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[_Metric]]):
+        """注册采集函数（抓取时调用，返回临时指标）"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Prometheus 文本格式输出"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            try:
+                for metric in collector():
+                    lines.extend(metric.render())
+            except Exception as e:
+                print(
+                    f"⚠️ 采集指标失败 ({getattr(collector, '__name__', collector)}): {e}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# ============ HTTP 请求 ============
+
+http_requests = REGISTRY.counter(
+    "http_requests_total", "HTTP 请求数", ("method", "route", "status")
+)
+http_request_duration = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP 请求耗时（秒）", ("method", "route")
+)
+http_requests_in_progress = REGISTRY.gauge(
+    "http_requests_in_progress", "正在处理的 HTTP 请求数", ("method",)
+)
+http_request_db_queries = REGISTRY.histogram(
+    "http_request_db_queries",
+    "单个 HTTP 请求执行的数据库查询次数",
+    ("method", "route"),
+    QUERY_COUNT_BUCKETS,
+)
+http_request_db_duration = REGISTRY.histogram(
+    "http_request_db_duration_seconds",
+    "单个 HTTP 请求的数据库查询总耗时（秒）",
+    ("method", "route"),
+)
+
+# ============ 数据库 ============
+
+db_query_duration = REGISTRY.histogram(
+    "db_query_duration_seconds", "数据库查询耗时（秒）", ("operation",)
+)
+
+# ============ 任务 ============
+
+task_stage_duration = REGISTRY.histogram(
+    "task_stage_duration_seconds",
+    "构建/导出/部署任务各阶段耗时（秒）",
+    ("kind", "stage"),
+    TASK_BUCKETS,
+)
+task_duration = REGISTRY.histogram(
+    "task_duration_seconds",
+    "构建/导出/部署任务从第一个阶段开始到结束的耗时（秒）",
+    ("kind", "status"),
+    TASK_BUCKETS,
+)
+
+# ============ WebSocket ============
+
+websocket_messages = REGISTRY.counter(
+    "websocket_messages_total",
+    "Agent WebSocket 消息数",
+    ("host_id", "direction", "type"),
+)
+
+# ============ 缓存 ============
+
+cache_requests = REGISTRY.counter(
+    "cache_requests_total", "缓存读取次数", ("cache", "result")
+)
+
+
+# 当前请求的数据库查询累计 [次数, 耗时]（中间件设置，同一上下文内的查询累加）
+_request_db: ContextVar[Optional[List]] = ContextVar("request_db", default=None)
+
+
+def record_db_query(statement: str, seconds: float):
+    """记录一次数据库查询（由数据库引擎的事件调用）"""
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement else ""
+    if operation not in ("SELECT", "INSERT", "UPDATE", "DELETE"):
+        operation = "OTHER"
+    db_query_duration.observe(seconds, operation=operation)
+    current = _request_db.get()
+    if current is not None:
+        current[0] += 1
+        current[1] += seconds
+
+
+def record_cache(cache: str, hit: bool):
+    """记录一次缓存读取"""
+    cache_requests.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_websocket_message(host_id: Optional[str], direction: str, message_type):
+    """
+    记录一条 WebSocket 消息
+
+    Args:
+        host_id: Agent 主机ID（未通过审批的 Agent 为 None）
+        direction: "in"（Agent 发来）或 "out"（发给 Agent）
+        message_type: 消息 type 字段
+    """
+    websocket_messages.inc(
+        host_id=host_id or "pending",
+        direction=direction,
+        type=message_type or "unknown",
+    )
+
+
+# ============ 任务阶段 ============
+
+# 任务ID -> [类型, 当前阶段, 阶段开始时间, 任务开始时间]
+_task_stages: Dict[str, list] = {}
+_task_lock = threading.Lock()
+
+
+def task_stage(task_id: str, kind: str, stage: str):
+    """
+    任务进入新阶段（结束上一阶段的计时）
+
+    Args:
+        task_id: 任务ID
+        kind: 任务类型（build/build_from_source/export/deploy）
+        stage: 阶段名称（clone/extract/build/push/pull/export/compress/deploy）
+    """
+    now = time.perf_counter()
+    with _task_lock:
+        state = _task_stages.pop(task_id, None)
+        if state is None:
+            state = [kind, None, now, now]
+            if len(_task_stages) >= MAX_TRACKED_TASKS:
+                _task_stages.pop(next(iter(_task_stages)))
+        elif state[1] is not None:
+            task_stage_duration.observe(now - state[2], kind=state[0], stage=state[1])
+        state[1], state[2] = stage, now
+        _task_stages[task_id] = state
+
+
+def task_finished(task_id: str, status: str):
+    """任务结束（completed/failed/stopped），记录最后一个阶段和任务总耗时"""
+    now = time.perf_counter()
+    with _task_lock:
+        state = _task_stages.pop(task_id, None)
+    if state is None:
+        return
+    kind, stage, stage_start, task_start = state
+    if stage is not None:
+        task_stage_duration.observe(now - stage_start, kind=kind, stage=stage)
+    task_duration.observe(now - task_start, kind=kind, status=status)
+
+
+# ============ HTTP 中间件 ============
+
+
+class MetricsMiddleware:
+    """
+    ASGI 中间件：按路由模板（如 /api/tasks/{task_id}）统计请求数、耗时和数据库查询
+
+    直接包装 ASGI 调用而不是使用 BaseHTTPMiddleware，流式响应的耗时统计到响应发送完毕
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope.get("method", "")
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        db_usage = [0, 0.0]
+        token = _request_db.set(db_usage)
+        http_requests_in_progress.inc(method=method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_db.reset(token)
+            http_requests_in_progress.dec(method=method)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_requests.inc(method=method, route=route, status=status["code"])
+            http_request_duration.observe(elapsed, method=method, route=route)
+            http_request_db_queries.observe(db_usage[0], method=method, route=route)
+            http_request_db_duration.observe(db_usage[1], method=method, route=route)
+
+
+# ============ 后台服务状态 ============
+
+
+def _stats_gauges(component: str, stats: Dict, prefix: str = "") -> List[Gauge]:
+    """把 stats() 返回的数值项（含嵌套字典）转换为仪表"""
+    gauges = []
+    for key, value in stats.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            gauges.extend(_stats_gauges(component, value, f"{name}_"))
+        elif isinstance(value, (int, float)):
+            # bool 输出为 0/1
+            gauge = Gauge(f"{component}_{name}", f"{component} 状态: {name}")
+            gauge.set(value)
+            gauges.append(gauge)
+    return gauges
+
+
+def _collect_services() -> List[_Metric]:
+    from backend.database import get_db_stats
+    from backend.disk_gc import DiskBudgetGC
+    from backend.handlers import OperationLogger
+    from backend.retention import RetentionEngine
+    from backend.webhook_dispatcher import PostBuildWebhookDispatcher
+    from backend.webhook_ingest import WebhookIngestQueue
+
+    sources = (
+        ("db", get_db_stats),
+        ("webhook_queue", WebhookIngestQueue().stats),
+        ("retention", RetentionEngine().stats),
+        ("disk_gc", DiskBudgetGC().stats),
+        ("post_build_webhook", PostBuildWebhookDispatcher().stats),
+        ("operation_log", OperationLogger.stats),
+    )
+    metrics: List[_Metric] = []
+    for component, stats in sources:
+        try:
+            metrics.extend(_stats_gauges(component, stats()))
+        except Exception as e:
+            print(f"⚠️ 读取 {component} 状态失败: {e}")
+    return metrics
+
+
+def _collect_runtime() -> List[_Metric]:
+    from backend import import_profiler
+    from backend.websocket_handler import active_connections
+
+    agents = Gauge("websocket_connected_agents", "已连接的 Agent 数量")
+    agents.set(len(active_connections))
+
+    startup = import_profiler.stats(top=0)
+    imports = Gauge("startup_import_seconds", "启动时导入模块的总耗时（秒）")
+    imports.set(startup["import_seconds"])
+    phases = Gauge("startup_phase_seconds", "启动各阶段耗时（秒）", ("phase",))
+    for item in startup["phases"]:
+        phases.set(item["ms"] / 1000, phase=item["name"])
+
+    ratio = Gauge("cache_hit_ratio", "缓存命中率（启动以来）", ("cache",))
+    with cache_requests._lock:
+        counts = dict(cache_requests._values)
+    for cache in {key[0] for key in counts}:
+        hits = counts.get((cache, "hit"), 0)
+        total = hits + counts.get((cache, "miss"), 0)
+        if total:
+            ratio.set(round(hits / total, 4), cache=cache)
+    return [agents, imports, phases, ratio]
+
+
+REGISTRY.add_collector(_collect_services)
+REGISTRY.add_collector(_collect_runtime)
+
+
+def render() -> str:
+    """所有指标的 Prometheus 文本格式输出"""
+    return REGISTRY.render()
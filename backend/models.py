@@ -125,6 +125,8 @@ class Task(Base):
     use_project_dockerfile = Column(Boolean, default=True)
     dockerfile_name = Column(String(255), default="Dockerfile")
     trigger_source = Column(String(50), default="manual")
+    # 流水线任务配置哈希（用于重复任务检查，见 pipeline_task_index）
+    config_hash = Column(String(32))
 
     # 关系
     pipeline = relationship("Pipeline", foreign_keys=[pipeline_id])
@@ -133,6 +135,13 @@ class Task(Base):
         Index("idx_task_status", "status"),
         Index("idx_task_pipeline", "pipeline_id"),
         Index("idx_task_created", "created_at"),
+        # 流水线汇总统计（分组计数、最后一次构建、排队数）
+        Index("idx_task_pipeline_type_created", "pipeline_id", "task_type", "created_at"),
+        Index("idx_task_pipeline_status", "pipeline_id", "status"),
+        Index("idx_task_pipeline_config_hash", "pipeline_id", "config_hash"),
+        # 统一任务列表（按状态/类型过滤后按创建时间分页）
+        Index("idx_task_status_created", "status", "created_at"),
+        Index("idx_task_type_created", "task_type", "created_at"),
     )
 
 
@@ -233,6 +242,69 @@ class OperationLog(Base):
         Index("idx_operation_log_user", "username"),
         Index("idx_operation_log_action", "action"),
         Index("idx_operation_log_time", "timestamp"),
+        # 按用户/操作类型过滤并按时间倒序分页
+        Index("idx_operation_log_user_time", "username", "timestamp"),
+        Index("idx_operation_log_action_time", "action", "timestamp"),
+    )
+
+
+class WebhookDelivery(Base):
+    """Webhook 投递记录表（异步处理队列）"""
+
+    __tablename__ = "webhook_deliveries"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    delivery_id = Column(String(128), nullable=False)  # 平台投递ID（用于幂等）
+    pipeline_id = Column(
+        String(36), ForeignKey("pipelines.pipeline_id"), nullable=False
+    )
+    headers = Column(JSON, default=dict)  # 请求头（不含签名和令牌）
+    body = Column(Text)  # 原始请求体
+    status = Column(
+        String(20), default="pending"
+    )  # pending, processing, completed, failed
+    result = Column(JSON, nullable=True)  # 处理结果
+    error = Column(Text, nullable=True)
+    received_at = Column(DateTime, default=datetime.now)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index(
+            "idx_webhook_delivery_unique", "pipeline_id", "delivery_id", unique=True
+        ),
+        Index("idx_webhook_delivery_status", "status", "received_at"),
+    )
+
+
+class WebhookNotification(Base):
+    """构建后 Webhook 通知记录表（投递历史与重试队列）"""
+
+    __tablename__ = "webhook_notifications"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    pipeline_id = Column(String(36), nullable=False)
+    task_id = Column(String(36), nullable=True)
+    webhook_index = Column(Integer, default=0)  # 在流水线 post_build_webhooks 中的序号
+    url = Column(String(1024), nullable=False)
+    method = Column(String(10), default="POST")
+    headers = Column(JSON, default=dict)
+    body = Column(Text)  # 已渲染的请求体
+    status = Column(
+        String(20), default="pending"
+    )  # pending, retrying, succeeded, failed
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=5)
+    next_attempt_at = Column(DateTime, nullable=True)
+    last_status_code = Column(Integer, nullable=True)
+    last_error = Column(Text, nullable=True)
+    response_text = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("idx_webhook_notification_status", "status", "next_attempt_at"),
+        Index("idx_webhook_notification_pipeline", "pipeline_id", "created_at"),
     )
 
 
@@ -261,6 +333,8 @@ class ExportTask(Base):
     __table_args__ = (
         Index("idx_export_task_status", "status"),
         Index("idx_export_task_created", "created_at"),
+        # 统一任务列表（按状态过滤后按创建时间分页）
+        Index("idx_export_task_status_created", "status", "created_at"),
     )
 
 
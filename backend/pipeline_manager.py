@@ -10,18 +10,19 @@ from typing import Optional, Dict, List
 from sqlalchemy.orm import Session
 from backend.database import get_db_session, init_db
 from backend.models import Pipeline, PipelineTaskHistory
-
-# 确保数据库已初始化
-try:
-    init_db()
-except:
-    pass
+from backend.pipeline_registry import PipelineRegistry
+from backend.pipeline_task_index import PipelineTaskIndex, generate_config_hash
 
 
 class PipelineManager:
     """流水线管理器（基于数据库）"""
 
     def __init__(self):
+        # 首次使用时确保数据库已初始化（不在模块导入时执行）
+        try:
+            init_db()
+        except:
+            pass
         self.lock = threading.RLock()
         # 存储每个流水线最后一次触发的配置信息（用于防抖检查）
         # 格式: {pipeline_id: {"config_hash": str, "timestamp": datetime}}
@@ -232,277 +233,16 @@ class PipelineManager:
             db.close()
 
     def get_pipeline(self, pipeline_id: str) -> Optional[Dict]:
-        """获取流水线配置"""
-        # 使用原始 SQL 查询来避免 JSON 解码问题（与 list_pipelines 保持一致）
-        import sqlite3
-        from backend.database import DB_FILE
-
-        conn = sqlite3.connect(DB_FILE)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        try:
-            # 先尝试参数化查询
-            cursor.execute(
-                "SELECT * FROM pipelines WHERE pipeline_id = ?", (pipeline_id,)
-            )
-            row = cursor.fetchone()
-
-            # 如果没找到，尝试获取所有流水线并在内存中匹配（处理可能的编码问题）
-            if not row:
-                cursor.execute("SELECT * FROM pipelines")
-                all_rows = cursor.fetchall()
-                for r in all_rows:
-                    if r["pipeline_id"] == pipeline_id:
-                        row = r
-                        break
-
-            if not row:
-                return None
-
-            # 手动构建字典，安全处理 JSON 字段（与 list_pipelines 逻辑一致）
-            pipeline_dict = {
-                "pipeline_id": row["pipeline_id"],
-                "name": row["name"],
-                "description": row["description"] or "",
-                "enabled": bool(row["enabled"]),
-                "git_url": row["git_url"],
-                "branch": row["branch"],
-                "sub_path": row["sub_path"],
-                "project_type": row["project_type"],
-                "template": row["template"],
-                "image_name": row["image_name"],
-                "tag": row["tag"],
-                "push": bool(row["push"]),
-                "push_registry": row["push_registry"],
-                "template_params": self._safe_parse_json(row["template_params"], {}),
-                "use_project_dockerfile": bool(row["use_project_dockerfile"]),
-                "dockerfile_name": row["dockerfile_name"],
-                "webhook_token": row["webhook_token"],
-                "webhook_secret": row["webhook_secret"],
-                "webhook_branch_filter": bool(row["webhook_branch_filter"]),
-                "webhook_use_push_branch": bool(row["webhook_use_push_branch"]),
-                "webhook_allowed_branches": self._safe_parse_json(
-                    (
-                        row["webhook_allowed_branches"]
-                        if "webhook_allowed_branches" in row.keys()
-                        else None
-                    ),
-                    [],
-                ),
-                "branch_tag_mapping": self._safe_parse_json(
-                    row["branch_tag_mapping"], {}
-                ),
-                "source_id": row["source_id"],
-                "selected_services": self._safe_parse_json(
-                    row["selected_services"], []
-                ),
-                "service_push_config": self._safe_parse_json(
-                    row["service_push_config"], {}
-                ),
-                "service_template_params": self._safe_parse_json(
-                    row["service_template_params"], {}
-                ),
-                "push_mode": row["push_mode"],
-                "resource_package_configs": self._safe_parse_json(
-                    row["resource_package_configs"], []
-                ),
-                "cron_expression": row["cron_expression"],
-                "next_run_time": row["next_run_time"],
-                "post_build_webhooks": self._safe_parse_json(
-                    (
-                        row["post_build_webhooks"]
-                        if "post_build_webhooks" in row.keys()
-                        else None
-                    ),
-                    [],
-                ),
-                "current_task_id": row["current_task_id"],
-                "task_queue": self._safe_parse_json(row["task_queue"], []),
-                "created_at": row["created_at"],
-                "updated_at": row["updated_at"],
-                "last_triggered_at": row["last_triggered_at"],
-                "trigger_count": row["trigger_count"] or 0,
-            }
-
-            # 格式化日期时间
-            from datetime import datetime
-
-            for date_field in [
-                "created_at",
-                "updated_at",
-                "last_triggered_at",
-                "next_run_time",
-            ]:
-                if pipeline_dict[date_field]:
-                    if isinstance(pipeline_dict[date_field], datetime):
-                        pipeline_dict[date_field] = pipeline_dict[
-                            date_field
-                        ].isoformat()
-
-            return pipeline_dict
-        finally:
-            conn.close()
+        """获取流水线配置（从进程内注册表读取，仅在流水线变化后访问数据库）"""
+        return PipelineRegistry().get(pipeline_id)
 
     def get_pipeline_by_token(self, webhook_token: str) -> Optional[Dict]:
         """通过 Webhook Token 获取流水线配置"""
-        db = get_db_session()
-        try:
-            pipeline = (
-                db.query(Pipeline)
-                .filter(Pipeline.webhook_token == webhook_token)
-                .first()
-            )
-            return self._to_dict(pipeline)
-        finally:
-            db.close()
+        return PipelineRegistry().get_by_token(webhook_token)
 
     def list_pipelines(self, enabled: bool = None) -> List[Dict]:
-        """列出所有流水线配置"""
-        db = get_db_session()
-        try:
-            # 使用原始 SQL 查询来避免 SQLAlchemy 的 JSON 自动解码问题
-            import sqlite3
-            from backend.database import DB_FILE
-
-            conn = sqlite3.connect(DB_FILE)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
-            try:
-                if enabled is not None:
-                    cursor.execute(
-                        "SELECT * FROM pipelines WHERE enabled = ? ORDER BY created_at DESC",
-                        (enabled,),
-                    )
-                else:
-                    cursor.execute("SELECT * FROM pipelines ORDER BY created_at DESC")
-
-                rows = cursor.fetchall()
-                result = []
-
-                for row in rows:
-                    try:
-                        # 手动构建字典，安全处理 JSON 字段
-                        pipeline_dict = {
-                            "pipeline_id": row["pipeline_id"],
-                            "name": row["name"],
-                            "description": row["description"] or "",
-                            "enabled": bool(row["enabled"]),
-                            "git_url": row["git_url"],
-                            "branch": row["branch"],
-                            "sub_path": row["sub_path"],
-                            "project_type": row["project_type"],
-                            "template": row["template"],
-                            "image_name": row["image_name"],
-                            "tag": row["tag"],
-                            "push": bool(row["push"]),
-                            "push_registry": row["push_registry"],
-                            "template_params": self._safe_parse_json(
-                                row["template_params"], {}
-                            ),
-                            "use_project_dockerfile": bool(
-                                row["use_project_dockerfile"]
-                            ),
-                            "dockerfile_name": row["dockerfile_name"],
-                            "webhook_token": row["webhook_token"],
-                            "webhook_secret": row["webhook_secret"],
-                            "webhook_branch_filter": bool(row["webhook_branch_filter"]),
-                            "webhook_use_push_branch": bool(
-                                row["webhook_use_push_branch"]
-                            ),
-                            "webhook_allowed_branches": self._safe_parse_json(
-                                (
-                                    row["webhook_allowed_branches"]
-                                    if "webhook_allowed_branches" in row.keys()
-                                    else None
-                                ),
-                                [],
-                            ),
-                            "branch_tag_mapping": self._safe_parse_json(
-                                row["branch_tag_mapping"], {}
-                            ),
-                            "source_id": row["source_id"],
-                            "selected_services": self._safe_parse_json(
-                                row["selected_services"], []
-                            ),
-                            "service_push_config": self._safe_parse_json(
-                                row["service_push_config"], {}
-                            ),
-                            "service_template_params": self._safe_parse_json(
-                                row["service_template_params"], {}
-                            ),
-                            "push_mode": row["push_mode"],
-                            "resource_package_configs": self._safe_parse_json(
-                                row["resource_package_configs"], []
-                            ),
-                            "cron_expression": row["cron_expression"],
-                            "next_run_time": row["next_run_time"],
-                            "post_build_webhooks": self._safe_parse_json(
-                                (
-                                    row["post_build_webhooks"]
-                                    if "post_build_webhooks" in row.keys()
-                                    else None
-                                ),
-                                [],
-                            ),
-                            "current_task_id": row["current_task_id"],
-                            "task_queue": self._safe_parse_json(row["task_queue"], []),
-                            "created_at": row["created_at"],
-                            "updated_at": row["updated_at"],
-                            "last_triggered_at": row["last_triggered_at"],
-                            "trigger_count": row["trigger_count"] or 0,
-                        }
-
-                        # 格式化日期时间（SQLite 返回的是字符串，需要转换为 ISO 格式）
-                        from datetime import datetime
-
-                        for date_field in [
-                            "created_at",
-                            "updated_at",
-                            "last_triggered_at",
-                            "next_run_time",
-                        ]:
-                            if pipeline_dict[date_field]:
-                                # 如果已经是字符串格式，直接使用；否则转换为 ISO 格式
-                                if isinstance(pipeline_dict[date_field], datetime):
-                                    pipeline_dict[date_field] = pipeline_dict[
-                                        date_field
-                                    ].isoformat()
-                                elif isinstance(pipeline_dict[date_field], str):
-                                    # 已经是字符串，保持原样
-                                    pass
-
-                        result.append(pipeline_dict)
-                    except Exception as e:
-                        pipeline_id = (
-                            row["pipeline_id"]
-                            if "pipeline_id" in row.keys()
-                            else "Unknown"
-                        )
-                        print(f"⚠️ 跳过流水线 {pipeline_id}: {e}")
-                        import traceback
-
-                        traceback.print_exc()
-
-                return result
-            finally:
-                conn.close()
-        finally:
-            db.close()
-
-    def _safe_parse_json(self, value, default):
-        """安全地解析 JSON 值"""
-        if value is None or value == "":
-            return default
-        if isinstance(value, (dict, list)):
-            return value
-        try:
-            import json
-
-            return json.loads(value) if value else default
-        except (json.JSONDecodeError, TypeError):
-            return default
+        """列出所有流水线配置（按创建时间倒序）"""
+        return PipelineRegistry().list(enabled=enabled)
 
     def update_pipeline(
         self,
@@ -904,6 +644,22 @@ class PipelineManager:
         finally:
             db.close()
 
+    def set_next_run_time(self, pipeline_id: str, next_run_time: Optional[datetime]):
+        """更新流水线的下次定时执行时间"""
+        db = get_db_session()
+        try:
+            pipeline = (
+                db.query(Pipeline).filter(Pipeline.pipeline_id == pipeline_id).first()
+            )
+            if pipeline:
+                pipeline.next_run_time = next_run_time
+                db.commit()
+        except Exception as e:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
     def add_task_to_queue(self, pipeline_id: str, task_config: dict) -> str:
         """将任务添加到队列"""
         queue_id = str(uuid.uuid4())
@@ -934,25 +690,23 @@ class PipelineManager:
             db.close()
 
     def get_queue_length(self, pipeline_id: str) -> int:
-        """获取队列长度（从实际任务列表中统计）"""
+        """获取队列长度（统计该流水线等待中的任务，不含当前绑定的任务）"""
         try:
-            from backend.handlers import BuildManager
-
-            build_manager = BuildManager()
-            pending_tasks = build_manager.task_manager.list_tasks(status="pending")
+            from sqlalchemy import func
+            from backend.models import Task
 
             current_task_id = self.get_pipeline_running_task(pipeline_id)
 
-            queue_count = 0
-            for task in pending_tasks:
-                task_config = task.get("task_config", {})
-                task_pipeline_id = task_config.get("pipeline_id")
-                task_id = task.get("task_id")
-
-                if task_pipeline_id == pipeline_id and task_id != current_task_id:
-                    queue_count += 1
-
-            return queue_count
+            db = get_db_session()
+            try:
+                query = db.query(func.count(Task.task_id)).filter(
+                    Task.pipeline_id == pipeline_id, Task.status == "pending"
+                )
+                if current_task_id:
+                    query = query.filter(Task.task_id != current_task_id)
+                return query.scalar() or 0
+            finally:
+                db.close()
         except Exception as e:
             print(f"⚠️ 获取队列长度失败: {e}")
             import traceback
@@ -1036,24 +790,7 @@ class PipelineManager:
 
     def _generate_config_hash(self, task_config: dict) -> str:
         """生成任务配置的哈希值（用于判断是否为相同信息）"""
-        import hashlib
-        import json
-
-        # 提取关键字段进行比较
-        key_fields = {
-            "pipeline_id": task_config.get("pipeline_id"),
-            "branch": task_config.get("branch"),
-            "tag": task_config.get("tag"),
-            "selected_services": (
-                sorted(task_config.get("selected_services", []))
-                if task_config.get("selected_services")
-                else None
-            ),
-        }
-
-        # 生成哈希值
-        config_str = json.dumps(key_fields, sort_keys=True, ensure_ascii=False)
-        return hashlib.md5(config_str.encode("utf-8")).hexdigest()
+        return generate_config_hash(task_config)
 
     def check_same_trigger_info(
         self, pipeline_id: str, task_config: dict, debounce_seconds: int = 3
@@ -1152,37 +889,23 @@ class PipelineManager:
                 print(f"🔍 [运行中任务检查] 流水线 {pipeline_id[:8]} 没有运行中的任务")
                 return False
 
-            # 获取任务信息
-            from backend.handlers import BuildManager
-
-            build_manager = BuildManager()
-            task = build_manager.task_manager.get_task(current_task_id)
+            # 从活跃任务索引中获取任务（只索引等待中和运行中的任务）
+            task = PipelineTaskIndex().get_task(current_task_id)
             if not task:
                 print(
-                    f"🔍 [运行中任务检查] 流水线 {pipeline_id[:8]} 运行中的任务 {current_task_id[:8]}... 不存在"
+                    f"🔍 [运行中任务检查] 流水线 {pipeline_id[:8]} 任务 {current_task_id[:8]}... 不存在或不在运行中"
                 )
                 return False
 
-            # 检查任务状态
-            task_status = task.get("status")
-            if task_status not in ["pending", "running"]:
-                print(
-                    f"🔍 [运行中任务检查] 流水线 {pipeline_id[:8]} 任务 {current_task_id[:8]}... 状态为 {task_status}，不在运行中"
-                )
-                return False
-
-            # 获取任务配置
-            task_config_data = task.get("task_config", {})
-            if not task_config_data:
+            # 生成配置哈希值
+            current_hash = self._generate_config_hash(task_config)
+            task_hash = task["config_hash"]
+            if not task_hash:
                 print(
                     f"🔍 [运行中任务检查] 流水线 {pipeline_id[:8]} 任务 {current_task_id[:8]}... 没有配置信息"
                 )
                 return False
 
-            # 生成配置哈希值
-            current_hash = self._generate_config_hash(task_config)
-            task_hash = self._generate_config_hash(task_config_data)
-
             # 比较哈希值
             if task_hash == current_hash:
                 print(
@@ -1214,29 +937,18 @@ class PipelineManager:
             True 如果队列中已有相同配置的任务，False 否则
         """
         try:
-            from backend.handlers import BuildManager
-
-            build_manager = BuildManager()
-            # 获取所有待执行的任务（pending 状态）
-            pending_tasks = build_manager.task_manager.list_tasks(status="pending")
-
             # 生成当前配置的哈希值
             current_hash = self._generate_config_hash(task_config)
 
-            # 检查是否有相同配置的任务
-            for task in pending_tasks:
-                task_config_data = task.get("task_config", {})
-                task_pipeline_id = task_config_data.get("pipeline_id")
-
-                # 只检查同一流水线的任务
-                if task_pipeline_id == pipeline_id:
-                    task_hash = self._generate_config_hash(task_config_data)
-                    if task_hash == current_hash:
-                        task_id = task.get("task_id", "unknown")
-                        print(
-                            f"🔍 [队列检查] 流水线 {pipeline_id[:8]} 队列中已存在相同配置的任务: task_id={task_id[:8]}..., hash={current_hash[:8]}..."
-                        )
-                        return True
+            # 按 (流水线, 分支, 配置哈希) 查找待执行的任务（pending 状态）
+            task = PipelineTaskIndex().find_by_config(
+                pipeline_id, task_config, status="pending"
+            )
+            if task:
+                print(
+                    f"🔍 [队列检查] 流水线 {pipeline_id[:8]} 队列中已存在相同配置的任务: task_id={task['task_id'][:8]}..., hash={current_hash[:8]}..."
+                )
+                return True
 
             print(
                 f"🔍 [队列检查] 流水线 {pipeline_id[:8]} 队列中未找到相同配置的任务: hash={current_hash[:8]}..."
@@ -1358,36 +1070,14 @@ class PipelineManager:
             True 如果有相同分支的任务在运行或排队，False 否则
         """
         try:
-            from backend.handlers import BuildManager
+            # 按 (流水线, 分支) 查找运行中或待执行的任务
+            task = PipelineTaskIndex().find_by_branch(pipeline_id, branch)
+            if task:
+                print(
+                    f"🔍 [分支检查] 流水线 {pipeline_id[:8]}... 分支 {branch} 已有任务在 {task['status']}: task_id={task['task_id'][:8]}..."
+                )
+                return True
 
-            build_manager = BuildManager()
-            
-            # 获取所有运行中或待执行的任务
-            running_tasks = build_manager.task_manager.list_tasks(status="running")
-            pending_tasks = build_manager.task_manager.list_tasks(status="pending")
-            
-            # 合并所有活跃任务
-            active_tasks = running_tasks + pending_tasks
-            
-            # 检查是否有相同流水线和相同分支的任务
-            for task in active_tasks:
-                task_config = task.get("task_config", {})
-                task_pipeline_id = task_config.get("pipeline_id")
-                task_branch = task_config.get("branch")
-                
-                # 也检查任务对象本身的 branch 字段（向后兼容）
-                if not task_branch:
-                    task_branch = task.get("branch")
-                
-                # 检查是否是同一流水线和同一分支
-                if task_pipeline_id == pipeline_id and task_branch == branch:
-                    task_id = task.get("task_id", "unknown")
-                    task_status = task.get("status", "unknown")
-                    print(
-                        f"🔍 [分支检查] 流水线 {pipeline_id[:8]}... 分支 {branch} 已有任务在 {task_status}: task_id={task_id[:8]}..."
-                    )
-                    return True
-            
             print(
                 f"🔍 [分支检查] 流水线 {pipeline_id[:8]}... 分支 {branch} 没有运行中或排队的任务，可以立即执行"
             )
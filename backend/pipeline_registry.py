@@ -0,0 +1,287 @@
+# backend/pipeline_registry.py
+"""
+流水线注册表（进程内缓存）
+每个流水线只解析一次，按 pipeline_id 和 webhook_token 建立索引；
+流水线被新增、修改、删除（包括触发记录、任务绑定等）提交后只重新加载对应的流水线，
+稳定状态下 Webhook 查找和调度器检查不访问数据库、不解析 JSON
+"""
+import copy
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from backend.session_changes import register_change_handler
+
+
+def _safe_parse_json(value, default):
+    """安全地解析 JSON 值"""
+    if value is None or value == "":
+        return default
+    if isinstance(value, (dict, list)):
+        return value
+    try:
+        return json.loads(value) if value else default
+    except (json.JSONDecodeError, TypeError):
+        return default
+
+
+def _row_to_dict(row: sqlite3.Row) -> Dict:
+    """将 pipelines 表的一行转换为字典（安全处理 JSON 字段）"""
+    keys = row.keys()
+    pipeline_dict = {
+        "pipeline_id": row["pipeline_id"],
+        "name": row["name"],
+        "description": row["description"] or "",
+        "enabled": bool(row["enabled"]),
+        "git_url": row["git_url"],
+        "branch": row["branch"],
+        "sub_path": row["sub_path"],
+        "project_type": row["project_type"],
+        "template": row["template"],
+        "image_name": row["image_name"],
+        "tag": row["tag"],
+        "push": bool(row["push"]),
+        "push_registry": row["push_registry"],
+        "template_params": _safe_parse_json(row["template_params"], {}),
+        "use_project_dockerfile": bool(row["use_project_dockerfile"]),
+        "dockerfile_name": row["dockerfile_name"],
+        "webhook_token": row["webhook_token"],
+        "webhook_secret": row["webhook_secret"],
+        "webhook_branch_filter": bool(row["webhook_branch_filter"]),
+        "webhook_use_push_branch": bool(row["webhook_use_push_branch"]),
+        "webhook_allowed_branches": _safe_parse_json(
+            (
+                row["webhook_allowed_branches"]
+                if "webhook_allowed_branches" in keys
+                else None
+            ),
+            [],
+        ),
+        "branch_tag_mapping": _safe_parse_json(row["branch_tag_mapping"], {}),
+        "source_id": row["source_id"],
+        "selected_services": _safe_parse_json(row["selected_services"], []),
+        "service_push_config": _safe_parse_json(row["service_push_config"], {}),
+        "service_template_params": _safe_parse_json(row["service_template_params"], {}),
+        "push_mode": row["push_mode"],
+        "resource_package_configs": _safe_parse_json(
+            row["resource_package_configs"], []
+        ),
+        "cron_expression": row["cron_expression"],
+        "next_run_time": row["next_run_time"],
+        "post_build_webhooks": _safe_parse_json(
+            row["post_build_webhooks"] if "post_build_webhooks" in keys else None,
+            [],
+        ),
+        "current_task_id": row["current_task_id"],
+        "task_queue": _safe_parse_json(row["task_queue"], []),
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+        "last_triggered_at": row["last_triggered_at"],
+        "trigger_count": row["trigger_count"] or 0,
+    }
+
+    # 格式化日期时间（SQLite 返回的是字符串，已是字符串时保持原样）
+    for date_field in [
+        "created_at",
+        "updated_at",
+        "last_triggered_at",
+        "next_run_time",
+    ]:
+        if isinstance(pipeline_dict[date_field], datetime):
+            pipeline_dict[date_field] = pipeline_dict[date_field].isoformat()
+
+    return pipeline_dict
+
+
+class PipelineRegistry:
+    """流水线注册表"""
+
+    _instance = None
+    _lock = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._lock = threading.RLock()
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        """初始化注册表"""
+        self._by_id: Dict[str, Dict] = {}
+        self._by_token: Dict[str, str] = {}
+        self._sorted_ids: Optional[List[str]] = None
+        self._dirty: Set[str] = set()
+        self._loaded = False
+        self._listeners: List[Callable[[Optional[Set[str]]], None]] = []
+        # 每次内容变化时递增，调用方可据此判断是否需要重新计算
+        self.version = 0
+
+    def _fetch(self, pipeline_ids: Optional[Iterable[str]] = None) -> List[Dict]:
+        """从数据库读取流水线（使用原始 SQL，避免 SQLAlchemy 的 JSON 自动解码问题）"""
+        from backend.database import DB_FILE
+
+        conn = sqlite3.connect(DB_FILE, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        try:
+            cursor = conn.cursor()
+            if pipeline_ids is None:
+                cursor.execute("SELECT * FROM pipelines")
+            else:
+                pipeline_ids = list(pipeline_ids)
+                placeholders = ",".join("?" for _ in pipeline_ids)
+                cursor.execute(
+                    f"SELECT * FROM pipelines WHERE pipeline_id IN ({placeholders})",
+                    pipeline_ids,
+                )
+
+            result = []
+            for row in cursor.fetchall():
+                try:
+                    result.append(_row_to_dict(row))
+                except Exception as e:
+                    pipeline_id = (
+                        row["pipeline_id"] if "pipeline_id" in row.keys() else "Unknown"
+                    )
+                    print(f"⚠️ 跳过流水线 {pipeline_id}: {e}")
+                    import traceback
+
+                    traceback.print_exc()
+            return result
+        finally:
+            conn.close()
+
+    def _set(self, pipeline: Dict):
+        """写入注册表（调用方需持有锁）"""
+        self._drop(pipeline["pipeline_id"])
+        self._by_id[pipeline["pipeline_id"]] = pipeline
+        if pipeline.get("webhook_token"):
+            self._by_token[pipeline["webhook_token"]] = pipeline["pipeline_id"]
+
+    def _drop(self, pipeline_id: str):
+        """从注册表移除（调用方需持有锁）"""
+        old = self._by_id.pop(pipeline_id, None)
+        if old and self._by_token.get(old.get("webhook_token")) == pipeline_id:
+            del self._by_token[old["webhook_token"]]
+
+    def _ensure_fresh(self):
+        """首次使用时全量加载，之后只重新加载被标记为脏的流水线"""
+        with self._lock:
+            if self._loaded and not self._dirty:
+                return
+
+            if not self._loaded:
+                pipelines = self._fetch()
+                self._by_id = {}
+                self._by_token = {}
+                for pipeline in pipelines:
+                    self._set(pipeline)
+                self._dirty = set()
+                self._loaded = True
+            else:
+                dirty = self._dirty
+                self._dirty = set()
+                try:
+                    fresh = {p["pipeline_id"]: p for p in self._fetch(dirty)}
+                except Exception:
+                    self._dirty |= dirty
+                    raise
+                for pipeline_id in dirty:
+                    if pipeline_id in fresh:
+                        self._set(fresh[pipeline_id])
+                    else:
+                        self._drop(pipeline_id)
+
+            self._sorted_ids = None
+            self.version += 1
+
+    def get(self, pipeline_id: str) -> Optional[Dict]:
+        """按 ID 获取流水线（返回副本）"""
+        self._ensure_fresh()
+        with self._lock:
+            pipeline = self._by_id.get(pipeline_id)
+            return copy.deepcopy(pipeline) if pipeline else None
+
+    def get_by_token(self, webhook_token: str) -> Optional[Dict]:
+        """按 Webhook Token 获取流水线（返回副本）"""
+        self._ensure_fresh()
+        with self._lock:
+            pipeline_id = self._by_token.get(webhook_token)
+            pipeline = self._by_id.get(pipeline_id) if pipeline_id else None
+            return copy.deepcopy(pipeline) if pipeline else None
+
+    def list(self, enabled: bool = None) -> List[Dict]:
+        """列出流水线（按创建时间倒序，返回副本）"""
+        self._ensure_fresh()
+        with self._lock:
+            if self._sorted_ids is None:
+                self._sorted_ids = sorted(
+                    self._by_id,
+                    key=lambda pid: str(self._by_id[pid].get("created_at") or ""),
+                    reverse=True,
+                )
+            return [
+                copy.deepcopy(self._by_id[pid])
+                for pid in self._sorted_ids
+                if enabled is None or self._by_id[pid].get("enabled") == enabled
+            ]
+
+    def invalidate(self, pipeline_ids: Optional[Iterable[str]] = None):
+        """
+        使流水线缓存失效
+
+        Args:
+            pipeline_ids: 需要重新加载的流水线ID（None 表示全部重新加载）
+        """
+        changed = None if pipeline_ids is None else {p for p in pipeline_ids if p}
+        with self._lock:
+            if changed is None:
+                self._loaded = False
+                self._dirty = set()
+            else:
+                self._dirty.update(changed)
+            listeners = list(self._listeners)
+
+        for listener in listeners:
+            try:
+                listener(changed)
+            except Exception as e:
+                print(f"⚠️ 流水线变更通知失败: {e}")
+
+    def add_listener(self, listener: Callable[[Optional[Set[str]]], None]):
+        """
+        注册流水线变更监听（在提交变更的线程中调用，应尽快返回）
+
+        Args:
+            listener: 接收变化的流水线ID集合的函数（None 表示全部）
+        """
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Optional[Set[str]]], None]):
+        """移除流水线变更监听"""
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+
+def _collect_changed_pipelines(session, changed: Set[str]):
+    """记录本次刷新中新增、修改、删除的流水线"""
+    from backend.models import Pipeline
+
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Pipeline) and obj.pipeline_id:
+            changed.add(obj.pipeline_id)
+
+
+def _invalidate_changed_pipelines(changed: Set[str]):
+    """事务提交后使对应流水线的缓存失效"""
+    PipelineRegistry().invalidate(changed)
+
+
+register_change_handler(
+    "pipeline_registry", _collect_changed_pipelines, _invalidate_changed_pipelines
+)
@@ -0,0 +1,210 @@
+# backend/pipeline_summary_cache.py
+"""
+流水线汇总缓存模块
+每个流水线的最后一次构建、成功/失败次数和排队任务数由一条分组 SQL 计算；
+任务新增、状态变化、删除提交后只标记对应流水线为脏，下次读取时仅重新统计这些流水线
+"""
+import threading
+from typing import Dict, Iterable, Optional, Set
+
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.orm import aliased
+
+from backend.session_changes import register_change_handler
+
+# 流水线构建任务类型（成功/失败统计和最后一次构建只统计此类型）
+PIPELINE_TASK_TYPE = "build_from_source"
+
+
+def _isoformat(value) -> Optional[str]:
+    if value is None:
+        return None
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+class PipelineSummaryCache:
+    """流水线汇总缓存"""
+
+    _instance = None
+    _lock = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._lock = threading.Lock()
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        """初始化缓存"""
+        self._summaries: Dict[str, Dict] = {}
+        self._loaded = False
+        self._dirty: Set[str] = set()
+        self._refresh_lock = threading.Lock()
+
+    @staticmethod
+    def empty_summary() -> Dict:
+        """没有任何任务的流水线的汇总"""
+        return {
+            "last_build": None,
+            "success_count": 0,
+            "failed_count": 0,
+            "pending_count": 0,
+        }
+
+    def _query(self, db, pipeline_ids: Optional[Iterable[str]] = None) -> Dict:
+        """
+        分组统计流水线任务（一条 SQL）
+
+        Args:
+            db: 数据库会话
+            pipeline_ids: 只统计这些流水线（None 表示全部）
+        """
+        from backend.models import Task
+
+        is_pipeline_build = Task.task_type == PIPELINE_TASK_TYPE
+        stats = select(
+            Task.pipeline_id.label("pipeline_id"),
+            func.sum(
+                case((and_(is_pipeline_build, Task.status == "completed"), 1), else_=0)
+            ).label("success_count"),
+            func.sum(
+                case((and_(is_pipeline_build, Task.status == "failed"), 1), else_=0)
+            ).label("failed_count"),
+            func.sum(case((Task.status == "pending", 1), else_=0)).label(
+                "pending_count"
+            ),
+            func.max(case((is_pipeline_build, Task.created_at))).label(
+                "last_created_at"
+            ),
+        ).where(Task.pipeline_id.isnot(None))
+        if pipeline_ids is not None:
+            stats = stats.where(Task.pipeline_id.in_(list(pipeline_ids)))
+        stats = stats.group_by(Task.pipeline_id).subquery()
+
+        last = aliased(Task)
+        rows = db.execute(
+            select(
+                stats,
+                last.task_id,
+                last.status,
+                last.created_at,
+                last.completed_at,
+                last.image,
+                last.tag,
+                last.error,
+            ).outerjoin(
+                last,
+                and_(
+                    last.pipeline_id == stats.c.pipeline_id,
+                    last.task_type == PIPELINE_TASK_TYPE,
+                    last.created_at == stats.c.last_created_at,
+                ),
+            )
+        ).all()
+
+        summaries = {}
+        for row in rows:
+            if row.pipeline_id in summaries:
+                # 创建时间相同的多个任务，保留第一个
+                continue
+            last_build = None
+            if row.task_id:
+                last_build = {
+                    "task_id": row.task_id,
+                    "status": row.status,
+                    "created_at": _isoformat(row.created_at),
+                    "completed_at": _isoformat(row.completed_at),
+                    "image": row.image,
+                    "tag": row.tag,
+                    "error": row.error,
+                }
+            summaries[row.pipeline_id] = {
+                "last_build": last_build,
+                "success_count": int(row.success_count or 0),
+                "failed_count": int(row.failed_count or 0),
+                "pending_count": int(row.pending_count or 0),
+            }
+        return summaries
+
+    def get_summaries(self) -> Dict[str, Dict]:
+        """
+        获取所有流水线的汇总（首次全量统计，之后只重新统计有变化的流水线）
+
+        Returns:
+            {pipeline_id: {"last_build", "success_count", "failed_count", "pending_count"}}
+            没有任务的流水线不在结果中
+        """
+        from backend.database import get_db_session
+
+        with self._refresh_lock:
+            with self._lock:
+                loaded = self._loaded
+                dirty = self._dirty
+                self._dirty = set()
+
+            if not loaded or dirty:
+                db = get_db_session()
+                try:
+                    fresh = self._query(db, None if not loaded else dirty)
+                except Exception:
+                    with self._lock:
+                        self._dirty |= dirty
+                    raise
+                finally:
+                    db.close()
+
+                with self._lock:
+                    if not loaded:
+                        self._summaries = fresh
+                        self._loaded = True
+                    else:
+                        for pipeline_id in dirty:
+                            if pipeline_id in fresh:
+                                self._summaries[pipeline_id] = fresh[pipeline_id]
+                            else:
+                                self._summaries.pop(pipeline_id, None)
+
+            with self._lock:
+                return {k: dict(v) for k, v in self._summaries.items()}
+
+    def get_summary(self, pipeline_id: str) -> Dict:
+        """获取单个流水线的汇总"""
+        return self.get_summaries().get(pipeline_id) or self.empty_summary()
+
+    def mark_dirty(self, pipeline_ids: Iterable[str]):
+        """标记流水线的汇总需要重新统计"""
+        with self._lock:
+            self._dirty.update(p for p in pipeline_ids if p)
+
+    def invalidate(self):
+        """清空缓存（下次读取时全量统计）"""
+        with self._lock:
+            self._summaries = {}
+            self._loaded = False
+            self._dirty = set()
+
+
+def _collect_changed_pipelines(session, changed: Set[str]):
+    """记录本次刷新中新增、修改、删除的任务所属的流水线"""
+    from sqlalchemy import inspect as sa_inspect
+    from backend.models import Task
+
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Task):
+            continue
+        if obj.pipeline_id:
+            changed.add(obj.pipeline_id)
+        # 流水线关联被修改时，原流水线同样需要重新统计
+        history = sa_inspect(obj).attrs.pipeline_id.history
+        changed.update(p for p in history.deleted or () if p)
+
+
+def _notify_changed_pipelines(changed: Set[str]):
+    """事务提交后标记对应流水线的汇总为脏"""
+    PipelineSummaryCache().mark_dirty(changed)
+
+
+register_change_handler(
+    "pipeline_summary_cache", _collect_changed_pipelines, _notify_changed_pipelines
+)
@@ -0,0 +1,271 @@
+# backend/pipeline_task_index.py
+"""
+流水线活跃任务索引
+按 (pipeline_id, branch, config_hash) 索引等待中和运行中的任务，Webhook 重复/防抖检查直接查表；
+任务的 config_hash 持久化在 tasks 表中，索引启动时从数据库加载，之后随任务提交事件增量更新
+"""
+import hashlib
+import json
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from backend.session_changes import register_change_handler
+
+# 被索引的任务状态
+ACTIVE_STATUSES = ("pending", "running")
+
+
+def generate_config_hash(task_config: dict) -> str:
+    """生成任务配置的哈希值（用于判断是否为相同信息）"""
+    # 提取关键字段进行比较
+    key_fields = {
+        "pipeline_id": task_config.get("pipeline_id"),
+        "branch": task_config.get("branch"),
+        "tag": task_config.get("tag"),
+        "selected_services": (
+            sorted(task_config.get("selected_services", []))
+            if task_config.get("selected_services")
+            else None
+        ),
+    }
+
+    # 生成哈希值
+    config_str = json.dumps(key_fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.md5(config_str.encode("utf-8")).hexdigest()
+
+
+def _task_entry(
+    task_id: str,
+    pipeline_id: Optional[str],
+    status: Optional[str],
+    branch: Optional[str],
+    config_hash: Optional[str],
+    task_config: Optional[dict],
+) -> Dict:
+    """任务在索引中的条目（分支优先取任务配置中的分支）"""
+    task_config = task_config if isinstance(task_config, dict) else {}
+    if not config_hash and task_config:
+        config_hash = generate_config_hash(task_config)
+    return {
+        "task_id": task_id,
+        "pipeline_id": pipeline_id,
+        "status": status,
+        "branch": task_config.get("branch") or branch,
+        "config_hash": config_hash,
+    }
+
+
+class PipelineTaskIndex:
+    """流水线活跃任务索引"""
+
+    _instance = None
+    _lock = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._lock = threading.RLock()
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        """初始化索引"""
+        self._tasks: Dict[str, Dict] = {}
+        self._by_config: Dict[Tuple[str, Optional[str], str], Set[str]] = {}
+        self._by_branch: Dict[Tuple[str, Optional[str]], Set[str]] = {}
+        self._loaded = False
+        self._loading = False
+        self._pending_changes: List[Dict] = []
+
+    def _ensure_loaded(self):
+        """首次使用时从数据库加载等待中和运行中的任务"""
+        with self._lock:
+            if self._loaded:
+                return
+            self._loading = True
+            self._pending_changes = []
+
+        try:
+            from backend.database import get_db_session
+            from backend.models import Task
+
+            db = get_db_session()
+            try:
+                rows = (
+                    db.query(
+                        Task.task_id,
+                        Task.pipeline_id,
+                        Task.status,
+                        Task.branch,
+                        Task.config_hash,
+                        Task.task_config,
+                    )
+                    .filter(
+                        Task.pipeline_id.isnot(None),
+                        Task.status.in_(ACTIVE_STATUSES),
+                    )
+                    .all()
+                )
+            finally:
+                db.close()
+        except Exception:
+            with self._lock:
+                self._loading = False
+            raise
+
+        with self._lock:
+            self._tasks = {}
+            self._by_config = {}
+            self._by_branch = {}
+            for row in rows:
+                self._put(
+                    _task_entry(
+                        row.task_id,
+                        row.pipeline_id,
+                        row.status,
+                        row.branch,
+                        row.config_hash,
+                        row.task_config,
+                    )
+                )
+            # 加载期间提交的变化比查询结果更新，加载后再应用一次
+            for entry in self._pending_changes:
+                self._apply(entry)
+            self._pending_changes = []
+            self._loading = False
+            self._loaded = True
+
+    def _remove(self, task_id: str):
+        """从索引中移除任务（调用方需持有锁）"""
+        entry = self._tasks.pop(task_id, None)
+        if not entry:
+            return
+        config_key = (entry["pipeline_id"], entry["branch"], entry["config_hash"])
+        branch_key = (entry["pipeline_id"], entry["branch"])
+        for index, key in (
+            (self._by_config, config_key),
+            (self._by_branch, branch_key),
+        ):
+            task_ids = index.get(key)
+            if task_ids is not None:
+                task_ids.discard(task_id)
+                if not task_ids:
+                    del index[key]
+
+    def _put(self, entry: Dict):
+        """加入索引（调用方需持有锁）"""
+        task_id = entry["task_id"]
+        self._remove(task_id)
+        if not entry["pipeline_id"] or entry["status"] not in ACTIVE_STATUSES:
+            return
+        self._tasks[task_id] = entry
+        self._by_config.setdefault(
+            (entry["pipeline_id"], entry["branch"], entry["config_hash"]), set()
+        ).add(task_id)
+        self._by_branch.setdefault((entry["pipeline_id"], entry["branch"]), set()).add(
+            task_id
+        )
+
+    def _apply(self, entry: Dict):
+        """应用一条任务变化（调用方需持有锁）"""
+        if entry.get("deleted"):
+            self._remove(entry["task_id"])
+        else:
+            self._put(entry)
+
+    def apply_changes(self, entries: List[Dict]):
+        """应用已提交的任务变化"""
+        with self._lock:
+            if self._loading:
+                self._pending_changes.extend(entries)
+            if not self._loaded:
+                return
+            for entry in entries:
+                self._apply(entry)
+
+    def get_task(self, task_id: str) -> Optional[Dict]:
+        """获取等待中或运行中任务的索引条目"""
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            return dict(entry) if entry else None
+
+    def find_by_config(
+        self, pipeline_id: str, task_config: dict, status: Optional[str] = None
+    ) -> Optional[Dict]:
+        """
+        查找相同配置（相同流水线、分支和配置哈希）的活跃任务
+
+        Args:
+            pipeline_id: 流水线ID
+            task_config: 任务配置字典
+            status: 只查找该状态的任务（None 表示等待中或运行中）
+        """
+        self._ensure_loaded()
+        key = (
+            pipeline_id,
+            task_config.get("branch"),
+            generate_config_hash(task_config),
+        )
+        with self._lock:
+            for task_id in self._by_config.get(key, ()):
+                entry = self._tasks[task_id]
+                if status is None or entry["status"] == status:
+                    return dict(entry)
+        return None
+
+    def find_by_branch(self, pipeline_id: str, branch: Optional[str]) -> Optional[Dict]:
+        """查找相同流水线和分支的活跃任务"""
+        self._ensure_loaded()
+        with self._lock:
+            for task_id in self._by_branch.get((pipeline_id, branch), ()):
+                return dict(self._tasks[task_id])
+        return None
+
+    def invalidate(self):
+        """清空索引（下次使用时重新从数据库加载）"""
+        with self._lock:
+            self._init()
+
+
+@event.listens_for(Session, "before_flush")
+def _fill_config_hash(session, flush_context, instances):
+    """新建或修改配置的流水线任务写入前计算 config_hash"""
+    from backend.models import Task
+
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Task) and obj.pipeline_id and obj.task_config:
+            if isinstance(obj.task_config, dict):
+                obj.config_hash = generate_config_hash(obj.task_config)
+
+
+def _collect_task_changes(session, changes: Dict[str, Dict]):
+    """记录本次刷新中新增、修改、删除的流水线任务"""
+    from backend.models import Task
+
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Task):
+            changes[obj.task_id] = _task_entry(
+                obj.task_id,
+                obj.pipeline_id,
+                obj.status,
+                obj.branch,
+                obj.config_hash,
+                obj.task_config,
+            )
+    for obj in session.deleted:
+        if isinstance(obj, Task):
+            changes[obj.task_id] = {"task_id": obj.task_id, "deleted": True}
+
+
+def _apply_task_changes(changes: Dict[str, Dict]):
+    """事务提交后更新索引"""
+    PipelineTaskIndex().apply_changes(list(changes.values()))
+
+
+register_change_handler(
+    "pipeline_task_index", _collect_task_changes, _apply_task_changes, factory=dict
+)
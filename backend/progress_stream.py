@@ -0,0 +1,223 @@
+# backend/progress_stream.py
+"""
+Docker 拉取/推送/构建流的进度日志压缩
+按层保存最新进度，只输出周期性汇总快照和每层最终结果，避免每个进度块写一行日志
+"""
+import time
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+# 汇总快照输出间隔（秒）
+SNAPSHOT_INTERVAL = 5.0
+
+# 表示层已结束的状态
+_TERMINAL_STATUSES = (
+    "Pushed",
+    "Layer already exists",
+    "Pull complete",
+    "Already exists",
+)
+
+# 表示层已跳过传输（远端已有）的状态
+_SKIPPED_STATUSES = ("Layer already exists", "Already exists")
+
+# 计入传输字节数的状态（Extracting 等本地操作不计入）
+_TRANSFER_STATUSES = ("Pushing", "Downloading")
+
+
+def format_bytes(size: float) -> str:
+    """格式化字节数"""
+    if size < 1024:
+        return f"{int(size)} B"
+    elif size < 1024 * 1024:
+        return f"{size / 1024:.2f} KB"
+    elif size < 1024 * 1024 * 1024:
+        return f"{size / (1024 * 1024):.2f} MB"
+    return f"{size / (1024 * 1024 * 1024):.2f} GB"
+
+
+class LayerProgressTracker:
+    """按层跟踪 Docker 流中的进度（id -> 最新进度）"""
+
+    def __init__(
+        self,
+        log_func: Callable[[str], None],
+        prefix: str = "",
+        snapshot_interval: float = SNAPSHOT_INTERVAL,
+    ):
+        """
+        Args:
+            log_func: 日志函数
+            prefix: 日志前缀（如多服务构建时的 "[service] "）
+            snapshot_interval: 汇总快照输出间隔（秒）
+        """
+        self.log_func = log_func
+        self.prefix = prefix
+        self.snapshot_interval = snapshot_interval
+        self.layers: Dict[str, Dict] = {}
+        self.start_time = time.time()
+        self.first_transfer_time: Optional[float] = None
+        self.last_snapshot_time = self.start_time
+        self.consumed_chunks = 0
+        self.flushed = False
+
+    def feed(self, chunk) -> bool:
+        """
+        处理一个数据块
+
+        Returns:
+            True 表示数据块已被压缩处理（调用方无需再记录），False 表示需要原样处理
+        """
+        if not isinstance(chunk, dict):
+            return False
+        if "error" in chunk or "errorDetail" in chunk:
+            return False
+
+        layer_id = chunk.get("id")
+        status = chunk.get("status")
+        if not layer_id or not status:
+            return False
+        # "Pulling from xxx" 等标题行的 id 是标签而不是层
+        if status.startswith("Pulling from") or status.startswith("The push refers"):
+            return False
+
+        now = time.time()
+        layer = self.layers.get(layer_id)
+        if layer is None:
+            layer = {
+                "status": status,
+                "current": 0,
+                "total": 0,
+                "done": False,
+                "skipped": False,
+            }
+            self.layers[layer_id] = layer
+
+        layer["status"] = status
+        detail = chunk.get("progressDetail") or {}
+        if status in _TRANSFER_STATUSES and detail:
+            if self.first_transfer_time is None:
+                self.first_transfer_time = now
+            layer["current"] = max(layer["current"], detail.get("current") or 0)
+            if detail.get("total"):
+                layer["total"] = detail["total"]
+        elif status in ("Download complete", "Pushed") and layer["total"]:
+            layer["current"] = layer["total"]
+
+        is_terminal = status in _TERMINAL_STATUSES or status.startswith("Mounted from")
+        if is_terminal and not layer["done"]:
+            layer["done"] = True
+            layer["skipped"] = status in _SKIPPED_STATUSES or status.startswith(
+                "Mounted from"
+            )
+            size_str = f" ({format_bytes(layer['total'])})" if layer["total"] else ""
+            self.log_func(f"{self.prefix}📦 {layer_id}: {status}{size_str}\n")
+
+        self.consumed_chunks += 1
+        if now - self.last_snapshot_time >= self.snapshot_interval:
+            self._snapshot(now)
+        return True
+
+    def _transferred_bytes(self) -> int:
+        """已传输字节数"""
+        return sum(layer["current"] for layer in self.layers.values())
+
+    def _throughput(self, now: float) -> float:
+        """平均吞吐（字节/秒）"""
+        if self.first_transfer_time is None:
+            return 0.0
+        elapsed = now - self.first_transfer_time
+        if elapsed <= 0:
+            return 0.0
+        return self._transferred_bytes() / elapsed
+
+    def _snapshot(self, now: float):
+        """输出当前汇总快照"""
+        self.last_snapshot_time = now
+        active = [
+            (layer_id, layer)
+            for layer_id, layer in self.layers.items()
+            if not layer["done"]
+        ]
+        if not active:
+            return
+
+        done_count = len(self.layers) - len(active)
+        known_total = sum(layer["total"] for layer in self.layers.values())
+        transferred = self._transferred_bytes()
+        total_str = (
+            f"{format_bytes(transferred)} / {format_bytes(known_total)}"
+            if known_total
+            else format_bytes(transferred)
+        )
+
+        active_parts = []
+        for layer_id, layer in active[:5]:
+            if layer["total"]:
+                percent = int(layer["current"] * 100 / layer["total"])
+                active_parts.append(f"{layer_id} {layer['status']} {percent}%")
+            else:
+                active_parts.append(f"{layer_id} {layer['status']}")
+        if len(active) > 5:
+            active_parts.append(f"... 共 {len(active)} 层进行中")
+
+        self.log_func(
+            f"{self.prefix}⏳ 进度: {done_count}/{len(self.layers)} 层完成, "
+            f"{total_str}, {format_bytes(self._throughput(now))}/s | "
+            f"{', '.join(active_parts)}\n"
+        )
+
+    def flush(self):
+        """输出最终汇总（未结束的层逐个输出最后状态）"""
+        if self.flushed or not self.layers:
+            return
+        self.flushed = True
+
+        now = time.time()
+        for layer_id, layer in self.layers.items():
+            if not layer["done"]:
+                size_str = (
+                    f" ({format_bytes(layer['current'])}/{format_bytes(layer['total'])})"
+                    if layer["total"]
+                    else ""
+                )
+                self.log_func(
+                    f"{self.prefix}📦 {layer_id}: {layer['status']}{size_str}\n"
+                )
+
+        skipped = sum(1 for layer in self.layers.values() if layer["skipped"])
+        elapsed = now - self.start_time
+        self.log_func(
+            f"{self.prefix}📊 层汇总: 共 {len(self.layers)} 层（传输 {len(self.layers) - skipped}，"
+            f"已存在 {skipped}），传输 {format_bytes(self._transferred_bytes())}，"
+            f"耗时 {elapsed:.1f}s，平均 {format_bytes(self._throughput(now))}/s，"
+            f"合并 {self.consumed_chunks} 条进度\n"
+        )
+
+
+def compact_progress_stream(
+    stream: Iterable,
+    log_func: Callable[[str], None],
+    prefix: str = "",
+    snapshot_interval: float = SNAPSHOT_INTERVAL,
+) -> Iterator:
+    """
+    包装 Docker 流：按层进度块被压缩为快照和汇总写入日志，其余数据块原样产出
+
+    用法：
+        for chunk in compact_progress_stream(push_stream, log):
+            ...  # 只会收到非层进度的数据块（错误、stream、aux、标题行等）
+
+    Args:
+        stream: Docker 流（dict 数据块迭代器）
+        log_func: 日志函数
+        prefix: 日志前缀
+        snapshot_interval: 汇总快照输出间隔（秒）
+    """
+    tracker = LayerProgressTracker(log_func, prefix, snapshot_interval)
+    try:
+        for chunk in stream:
+            if tracker.feed(chunk):
+                continue
+            yield chunk
+    finally:
+        tracker.flush()
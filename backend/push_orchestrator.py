@@ -0,0 +1,245 @@
+# backend/push_orchestrator.py
+"""
+镜像推送编排器
+多个目标（多服务 × 多仓库 × 多标签）并发推送，并发数有上限；
+同一 registry 的目标先推送一个作为种子，其余目标再并发推送，
+此时 Docker 守护进程会对已上传的层执行跨仓库挂载（Mounted from），避免重复上传
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from typing import Callable, Dict, List, Optional
+
+from backend.progress_stream import LayerProgressTracker, format_bytes
+
+# 默认最大并发推送数
+DEFAULT_PUSH_CONCURRENCY = 3
+
+
+def registry_of(repository: str) -> str:
+    """从仓库名中提取 registry 地址（无前缀时为 docker.io）"""
+    parts = repository.split("/")
+    if len(parts) >= 2 and (
+        "." in parts[0] or ":" in parts[0] or parts[0] == "localhost"
+    ):
+        return parts[0]
+    return "docker.io"
+
+
+def is_auth_error(error_msg: str) -> bool:
+    """判断推送错误是否为认证错误"""
+    lower = (error_msg or "").lower()
+    return (
+        "denied" in lower
+        or "unauthorized" in lower
+        or "401" in lower
+        or "authentication required" in lower
+    )
+
+
+class PushOrchestrator:
+    """镜像推送编排器"""
+
+    def __init__(
+        self,
+        docker_builder,
+        log_func: Optional[Callable[[str], None]] = None,
+        max_concurrency: int = DEFAULT_PUSH_CONCURRENCY,
+        relogin: Optional[Callable[[Dict], bool]] = None,
+    ):
+        """
+        Args:
+            docker_builder: Docker 构建器实例
+            log_func: 日志函数（会在多个线程中调用，内部加锁）
+            max_concurrency: 最大并发推送数
+            relogin: 认证失败时的重新登录回调，参数为推送目标，返回是否登录成功
+        """
+        self.docker_builder = docker_builder
+        self.max_concurrency = max(1, int(max_concurrency or 1))
+        self.relogin = relogin
+        self._log_func = log_func or print
+        self._log_lock = threading.Lock()
+
+    def _log(self, message: str):
+        """线程安全的日志输出"""
+        with self._log_lock:
+            self._log_func(message)
+
+    def _push_once(self, target: Dict, prefix: str) -> Dict:
+        """执行一次推送，返回推送结果（不抛出异常）"""
+        tracker = LayerProgressTracker(self._log, prefix=prefix)
+        error = None
+        try:
+            push_stream = self.docker_builder.push_image(
+                target["repository"],
+                target["tag"],
+                auth_config=target.get("auth_config"),
+            )
+            for chunk in push_stream:
+                if tracker.feed(chunk):
+                    continue
+                if not isinstance(chunk, dict):
+                    self._log(f"{prefix}{str(chunk)}\n")
+                    continue
+                if "error" in chunk:
+                    error = chunk["error"]
+                    error_detail = chunk.get("errorDetail")
+                    self._log(f"{prefix}❌ 推送错误: {error}\n")
+                    if error_detail:
+                        self._log(f"{prefix}❌ 错误详情: {error_detail}\n")
+                    break
+                if "status" in chunk:
+                    self._log(f"{prefix}{chunk['status']}\n")
+        except Exception as e:
+            error = str(e)
+            self._log(f"{prefix}❌ 推送异常: {error}\n")
+        finally:
+            tracker.flush()
+
+        layers = tracker.layers.values()
+        return {
+            "error": error,
+            "bytes": tracker._transferred_bytes(),
+            "layers": len(tracker.layers),
+            "mounted": sum(
+                1 for layer in layers if layer["status"].startswith("Mounted from")
+            ),
+            "existed": sum(
+                1
+                for layer in layers
+                if layer["skipped"] and not layer["status"].startswith("Mounted from")
+            ),
+        }
+
+    def _push_target(self, target: Dict) -> Dict:
+        """推送单个目标（认证失败时重新登录并重试一次）"""
+        full_name = f"{target['repository']}:{target['tag']}"
+        label = target.get("label") or full_name
+        prefix = f"[{label}] "
+
+        start_time = time.time()
+        self._log(f"{prefix}🚀 开始推送: {full_name}\n")
+        outcome = self._push_once(target, prefix)
+
+        retried = False
+        if outcome["error"] and is_auth_error(outcome["error"]) and self.relogin:
+            self._log(f"{prefix}🔄 检测到认证错误，尝试重新登录...\n")
+            if self.relogin(target):
+                self._log(f"{prefix}🔄 重新登录成功，重试推送...\n")
+                retried = True
+                outcome = self._push_once(target, prefix)
+
+        duration = time.time() - start_time
+        result = {
+            "label": label,
+            "repository": target["repository"],
+            "tag": target["tag"],
+            "registry": registry_of(target["repository"]),
+            "success": outcome["error"] is None,
+            "error": outcome["error"],
+            "retried": retried,
+            "duration": round(duration, 2),
+            "bytes": outcome["bytes"],
+            "layers": outcome["layers"],
+            "mounted": outcome["mounted"],
+            "existed": outcome["existed"],
+        }
+
+        if result["success"]:
+            self._log(
+                f"{prefix}✅ 推送完成: {full_name}，耗时 {duration:.1f}s，"
+                f"上传 {format_bytes(result['bytes'])}，"
+                f"跨仓库挂载 {result['mounted']} 层，已存在 {result['existed']} 层\n"
+            )
+        else:
+            self._log(f"{prefix}❌ 推送失败: {full_name}（耗时 {duration:.1f}s）\n")
+        return result
+
+    def push_all(self, targets: List[Dict]) -> List[Dict]:
+        """
+        并发推送所有目标
+
+        Args:
+            targets: 推送目标列表，每项包含 repository、tag，可选 auth_config、label
+                （以及供 relogin 回调使用的其他字段）
+
+        Returns:
+            每个目标的推送结果（顺序与 targets 一致），包含 success、error、
+            duration（秒）、bytes（上传字节数）、layers、mounted、existed
+        """
+        if not targets:
+            return []
+
+        # 去重：同一 repository:tag 只推送一次
+        unique_targets = []
+        seen = set()
+        for target in targets:
+            key = (target["repository"], target["tag"])
+            if key in seen:
+                continue
+            seen.add(key)
+            unique_targets.append(target)
+
+        # 按 registry 分组（保持原有顺序）
+        groups: Dict[str, List[Dict]] = {}
+        for target in unique_targets:
+            groups.setdefault(registry_of(target["repository"]), []).append(target)
+
+        self._log(
+            f"📡 推送编排: {len(unique_targets)} 个目标，{len(groups)} 个 registry，"
+            f"最大并发 {self.max_concurrency}\n"
+        )
+
+        start_time = time.time()
+
+        def run(target: Dict) -> Dict:
+            try:
+                return self._push_target(target)
+            except Exception as e:
+                return {
+                    "label": target.get("label"),
+                    "repository": target["repository"],
+                    "tag": target["tag"],
+                    "registry": registry_of(target["repository"]),
+                    "success": False,
+                    "error": str(e),
+                    "retried": False,
+                    "duration": 0,
+                    "bytes": 0,
+                    "layers": 0,
+                    "mounted": 0,
+                    "existed": 0,
+                }
+
+        future_targets = {}
+        with ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="push"
+        ) as executor:
+            # 每个 registry 先推送一个种子目标
+            seed_rest = {}
+            for group_targets in groups.values():
+                seed_future = executor.submit(run, group_targets[0])
+                future_targets[seed_future] = group_targets[0]
+                seed_rest[seed_future] = group_targets[1:]
+            # 种子推送完成后再提交同 registry 的其余目标，以便复用已上传的层
+            for seed_future in as_completed(seed_rest):
+                for target in seed_rest[seed_future]:
+                    future_targets[executor.submit(run, target)] = target
+            wait(future_targets)
+
+        results_by_key = {
+            (target["repository"], target["tag"]): future.result()
+            for future, target in future_targets.items()
+        }
+
+        total_duration = time.time() - start_time
+        results = [results_by_key[(t["repository"], t["tag"])] for t in targets]
+        succeeded = sum(1 for r in results_by_key.values() if r["success"])
+        total_bytes = sum(r["bytes"] for r in results_by_key.values())
+        serial_duration = sum(r["duration"] for r in results_by_key.values())
+        self._log(
+            f"📊 推送汇总: 成功 {succeeded}/{len(results_by_key)}，"
+            f"总耗时 {total_duration:.1f}s（串行累计 {serial_duration:.1f}s），"
+            f"共上传 {format_bytes(total_bytes)}\n"
+        )
+        return results
@@ -4,21 +4,20 @@
 用于管理不能公开的配置信息，在构建时一同打包到镜像中
 """
 import os
+import json
 import shutil
 import uuid
 from datetime import datetime
 from typing import List, Dict, Optional
 from backend.database import get_db_session, init_db
 from backend.models import ResourcePackage
+from backend.blob_store import BlobStore, package_holder, context_holder
 
 # 资源包存储目录
 RESOURCE_PACKAGE_DIR = "data/resource_packages"
 
-# 确保数据库已初始化
-try:
-    init_db()
-except:
-    pass
+# 资源包 blob 清单文件名：{相对路径: sha256}
+PACKAGE_MANIFEST_FILE = ".blobs.json"
 
 
 class ResourcePackageManager:
@@ -37,7 +36,100 @@ class ResourcePackageManager:
     
     def _init(self):
         """初始化资源包管理器"""
+        # 首次使用时确保数据库已初始化（不在模块导入时执行）
+        try:
+            init_db()
+        except:
+            pass
         os.makedirs(RESOURCE_PACKAGE_DIR, exist_ok=True)
+        self.blob_store = BlobStore()
+    
+    def _load_manifest(self, package_dir: str) -> Dict[str, str]:
+        """加载资源包的 blob 清单"""
+        manifest_file = os.path.join(package_dir, PACKAGE_MANIFEST_FILE)
+        if not os.path.exists(manifest_file):
+            return {}
+        try:
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"⚠️ 加载资源包清单失败 ({manifest_file}): {e}")
+            return {}
+    
+    def _save_manifest(self, package_dir: str, manifest: Dict[str, str]):
+        """保存资源包的 blob 清单"""
+        manifest_file = os.path.join(package_dir, PACKAGE_MANIFEST_FILE)
+        temp_file = manifest_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.replace(temp_file, manifest_file)
+    
+    def _ingest_package_files(self, package_id: str, package_dir: str) -> Dict[str, str]:
+        """
+        将资源包目录中的文件存入 blob 存储，并把原文件替换为指向 blob 的链接
+        
+        旧版本上传的资源包没有清单，首次使用时按需补齐
+        """
+        manifest = self._load_manifest(package_dir)
+        holder = package_holder(package_id)
+        changed = False
+        
+        for root, dirs, files in os.walk(package_dir):
+            for name in files:
+                file_path = os.path.join(root, name)
+                rel_path = os.path.relpath(file_path, package_dir).replace('\\', '/')
+                if rel_path in (PACKAGE_MANIFEST_FILE, PACKAGE_MANIFEST_FILE + ".tmp"):
+                    continue
+                if rel_path in manifest and self.blob_store.has_blob(manifest[rel_path]):
+                    continue
+                manifest[rel_path] = self.blob_store.put_file(
+                    file_path, replace_with_link=True
+                )
+                changed = True
+        
+        if changed:
+            self.blob_store.add_refs(set(manifest.values()), holder)
+            self._save_manifest(package_dir, manifest)
+        return manifest
+    
+    def _link_file(
+        self,
+        package_dir: str,
+        manifest: Dict[str, str],
+        src: str,
+        dst: str,
+        used_digests: set,
+    ):
+        """通过 blob 存储将资源包中的单个文件放入构建上下文"""
+        rel_path = os.path.relpath(src, package_dir).replace('\\', '/')
+        digest = manifest.get(rel_path)
+        if digest and self.blob_store.has_blob(digest):
+            self.blob_store.materialize(digest, dst)
+            used_digests.add(digest)
+        else:
+            shutil.copy2(src, dst)
+    
+    def _link_tree(
+        self,
+        package_dir: str,
+        manifest: Dict[str, str],
+        src_dir: str,
+        dst_dir: str,
+        used_digests: set,
+    ):
+        """通过 blob 存储将资源包中的目录放入构建上下文（等价于 copytree）"""
+        for root, dirs, files in os.walk(src_dir):
+            rel_root = os.path.relpath(root, src_dir)
+            target_root = dst_dir if rel_root == '.' else os.path.join(dst_dir, rel_root)
+            os.makedirs(target_root, exist_ok=True)
+            for name in files:
+                self._link_file(
+                    package_dir,
+                    manifest,
+                    os.path.join(root, name),
+                    os.path.join(target_root, name),
+                    used_digests,
+                )
     
     def _to_dict(self, package: ResourcePackage) -> Optional[Dict]:
         """将数据库模型转换为字典"""
@@ -101,6 +193,12 @@ class ResourcePackageManager:
             
             file_size = len(file_data)
             
+            # 存入 blob 存储（相同内容只保留一份）
+            try:
+                self._ingest_package_files(package_id, package_dir)
+            except Exception as e:
+                print(f"⚠️ 资源包存入 blob 存储失败，将使用普通文件: {e}")
+            
             db = get_db_session()
             try:
                 package = ResourcePackage(
@@ -122,6 +220,7 @@ class ResourcePackageManager:
                 # 如果数据库保存失败，删除已创建的文件
                 if os.path.exists(package_dir):
                     shutil.rmtree(package_dir)
+                self.blob_store.release_holder(package_holder(package_id))
                 raise
             finally:
                 db.close()
@@ -188,6 +287,9 @@ class ResourcePackageManager:
                 db.delete(package)
                 db.commit()
                 
+                # 释放 blob 引用（仍被构建上下文引用的 blob 会保留）
+                self.blob_store.release_holder(package_holder(package_id))
+                
                 print(f"✅ 资源包已删除: {package_id}")
                 return True
             except Exception as e:
@@ -201,11 +303,17 @@ class ResourcePackageManager:
         package_configs: List[Dict],
         build_context: str
     ) -> List[str]:
-        """将资源包复制到构建上下文"""
+        """
+        将资源包放入构建上下文
+        
+        文件通过 blob 存储以 reflink/硬链接方式放置（跨文件系统时回退为复制），
+        并为构建上下文登记引用，构建上下文删除后需调用 BlobStore().release_context()
+        """
         if not package_configs:
             return []
         
         db = get_db_session()
+        used_digests = set()
         try:
             copied_packages = []
             
@@ -227,6 +335,12 @@ class ResourcePackageManager:
                     continue
                 
                 try:
+                    try:
+                        manifest = self._ingest_package_files(package_id, package_dir)
+                    except Exception as e:
+                        print(f"⚠️ 资源包存入 blob 存储失败，将直接复制: {e}")
+                        manifest = {}
+                    
                     target_path_rel = target_path_rel.replace('\\', '/')
                     path_parts = target_path_rel.split('/')
                     last_part = path_parts[-1]
@@ -248,31 +362,33 @@ class ResourcePackageManager:
                         target_dir_abs = os.path.join(build_context, target_dir_rel)
                     os.makedirs(target_dir_abs, exist_ok=True)
                     
-                    if package.extracted:
-                        extracted_path = os.path.join(package_dir, "extracted")
-                        if os.path.exists(extracted_path):
-                            for item in os.listdir(extracted_path):
-                                src = os.path.join(extracted_path, item)
-                                if target_filename and os.path.isfile(src):
-                                    dst = os.path.join(target_dir_abs, target_filename)
-                                    shutil.copy2(src, dst)
-                                    break
+                    dst_filename = None
+                    extracted_path = os.path.join(package_dir, "extracted")
+                    if package.extracted and os.path.exists(extracted_path):
+                        for item in os.listdir(extracted_path):
+                            src = os.path.join(extracted_path, item)
+                            if target_filename and os.path.isfile(src):
+                                dst_filename = target_filename
+                                dst = os.path.join(target_dir_abs, target_filename)
+                                self._link_file(package_dir, manifest, src, dst, used_digests)
+                                break
+                            else:
+                                dst = os.path.join(target_dir_abs, item)
+                                if os.path.isdir(src):
+                                    self._link_tree(package_dir, manifest, src, dst, used_digests)
                                 else:
-                                    dst = os.path.join(target_dir_abs, item)
-                                    if os.path.isdir(src):
-                                        shutil.copytree(src, dst, dirs_exist_ok=True)
-                                    else:
-                                        shutil.copy2(src, dst)
-                        else:
-                            original_file = os.path.join(package_dir, package.filename)
-                            if os.path.exists(original_file):
-                                dst_filename = target_filename or package.filename
-                                shutil.copy2(original_file, os.path.join(target_dir_abs, dst_filename))
+                                    self._link_file(package_dir, manifest, src, dst, used_digests)
                     else:
                         original_file = os.path.join(package_dir, package.filename)
                         if os.path.exists(original_file):
                             dst_filename = target_filename or package.filename
-                            shutil.copy2(original_file, os.path.join(target_dir_abs, dst_filename))
+                            self._link_file(
+                                package_dir,
+                                manifest,
+                                original_file,
+                                os.path.join(target_dir_abs, dst_filename),
+                                used_digests,
+                            )
                     
                     copied_packages.append(package_id)
                     final_path = os.path.join(target_dir_rel, dst_filename or package.filename).replace('\\', '/')
@@ -284,6 +400,9 @@ class ResourcePackageManager:
                     import traceback
                     traceback.print_exc()
             
+            if used_digests:
+                self.blob_store.add_refs(used_digests, context_holder(build_context))
+            
             return copied_packages
         finally:
             db.close()
@@ -0,0 +1,426 @@
+# backend/retention.py
+"""
+任务保留与清理引擎
+按保留策略（按时间、按状态、每条流水线保留数量）分批执行集合删除
+DELETE ... WHERE task_id IN (...)，每批一个短事务，不会长时间占用数据库写锁；
+构建上下文、导出文件等磁盘目录交给后台 I/O 线程池删除，不阻塞接口和数据库事务
+"""
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Set
+
+# 定期清理的间隔（秒）
+RUN_INTERVAL_SECONDS = 3600
+
+# 已结束（可清理）的任务状态，等待中和运行中的任务不会被清理
+TERMINAL_STATUSES = ("stopped", "completed", "failed")
+
+# 默认保留策略
+DEFAULT_RETENTION = {
+    "build_task_days": 1,  # 构建任务保留天数（0 表示不按时间清理）
+    "export_task_days": 1,  # 导出任务保留天数（0 表示不按时间清理）
+    "statuses": list(TERMINAL_STATUSES),  # 按时间清理时只清理这些状态的任务
+    "max_tasks_per_pipeline": 0,  # 每条流水线最多保留的任务数（0 表示不限制）
+    "batch_size": 500,  # 每批删除的任务数
+    "io_workers": 2,  # 删除磁盘目录的后台线程数
+}
+
+
+def get_retention_policy() -> Dict:
+    """读取保留策略（config.yml 中的 retention 节，缺省项使用默认值）"""
+    policy = dict(DEFAULT_RETENTION)
+    try:
+        from backend.config import load_config
+
+        policy.update(load_config().get("retention") or {})
+    except Exception as e:
+        print(f"⚠️ 读取保留策略失败，使用默认值: {e}")
+    return policy
+
+
+def _build_context_path(task_id: str, image: Optional[str]) -> Optional[str]:
+    """构建任务的构建上下文目录（与 BuildTaskManager.delete_task 一致）"""
+    if not image:
+        return None
+    from backend.handlers import BUILD_DIR
+
+    return os.path.join(BUILD_DIR, f"{image.replace('/', '_')}_{task_id[:8]}")
+
+
+class RetentionEngine:
+    """任务保留与清理引擎"""
+
+    _instance = None
+    _lock = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._lock = threading.Lock()
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        """初始化引擎"""
+        policy = get_retention_policy()
+        self._io_pool = ThreadPoolExecutor(
+            max_workers=max(1, int(policy.get("io_workers") or 1)),
+            thread_name_prefix="retention-io",
+        )
+        # 同一时刻只执行一次清理
+        self._run_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pending_io = 0
+        self._stats = {
+            "runs": 0,
+            "build_tasks_removed": 0,
+            "export_tasks_removed": 0,
+            "paths_removed": 0,
+            "path_errors": 0,
+            "last_run_at": None,
+            "last_run_seconds": 0.0,
+        }
+
+    # ============ 后台 I/O ============
+
+    def _remove_path(self, path: str, release_blobs: bool):
+        """删除文件或目录（在 I/O 线程池中执行）"""
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+            with self._lock:
+                self._stats["paths_removed"] += 1
+        except Exception as e:
+            with self._lock:
+                self._stats["path_errors"] += 1
+            print(f"⚠️ 清理路径失败 ({path}): {e}")
+        finally:
+            if release_blobs:
+                from backend.handlers import _release_build_context_blobs
+
+                _release_build_context_blobs(path)
+            with self._lock:
+                self._pending_io -= 1
+
+    def remove_paths(self, paths: Iterable[str], release_blobs: bool = False) -> int:
+        """
+        提交路径到后台删除
+
+        Args:
+            paths: 文件或目录路径
+            release_blobs: 是否为构建上下文（删除后释放 blob 引用）
+
+        Returns:
+            提交的路径数量
+        """
+        count = 0
+        for path in paths:
+            if not path or not os.path.exists(path):
+                continue
+            with self._lock:
+                self._pending_io += 1
+            self._io_pool.submit(self._remove_path, path, release_blobs)
+            count += 1
+        return count
+
+    # ============ 集合删除 ============
+
+    def _delete_in_batches(self, select_batch, delete_batch, batch_size: int) -> int:
+        """
+        分批删除：每批查询最多 batch_size 条、删除并提交，直到没有剩余
+
+        Args:
+            select_batch: (db, size) -> [行]，返回下一批待删除的行
+            delete_batch: (db, [行]) -> 提交后执行的函数，删除这一批（不提交）
+            batch_size: 每批数量
+        """
+        from backend.database import get_db_session
+
+        removed = 0
+        while True:
+            db = get_db_session()
+            try:
+                rows = select_batch(db, batch_size)
+                if not rows:
+                    break
+                after_commit = delete_batch(db, rows)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+
+            if after_commit:
+                after_commit()
+            removed += len(rows)
+            if len(rows) < batch_size:
+                break
+            # 让出写锁，避免连续批次饿死其他写操作
+            time.sleep(0)
+        return removed
+
+    def _delete_build_rows(self, select_batch, batch_size: int) -> int:
+        """分批删除构建任务及其日志，select_batch 返回 (task_id, image, pipeline_id)"""
+        from backend.models import Task, TaskLog
+
+        def delete_batch(db, rows):
+            task_ids = [row[0] for row in rows]
+            db.query(TaskLog).filter(TaskLog.task_id.in_(task_ids)).delete(
+                synchronize_session=False
+            )
+            db.query(Task).filter(Task.task_id.in_(task_ids)).delete(
+                synchronize_session=False
+            )
+            contexts = [_build_context_path(row[0], row[1]) for row in rows]
+            pipeline_ids = {row[2] for row in rows if row[2]}
+
+            def after_commit():
+                # 集合删除不经过 ORM 刷新事件，需要手动标记流水线汇总
+                if pipeline_ids:
+                    from backend.pipeline_summary_cache import PipelineSummaryCache
+
+                    PipelineSummaryCache().mark_dirty(pipeline_ids)
+                self.remove_paths((c for c in contexts if c), release_blobs=True)
+
+            return after_commit
+
+        removed = self._delete_in_batches(select_batch, delete_batch, batch_size)
+        with self._lock:
+            self._stats["build_tasks_removed"] += removed
+        return removed
+
+    def build_context_paths(self) -> Set[str]:
+        """所有构建任务的构建上下文目录（绝对路径）"""
+        from backend.database import get_db_session
+        from backend.models import Task
+
+        db = get_db_session()
+        try:
+            rows = (
+                db.query(Task.task_id, Task.image)
+                .filter(Task.image.isnot(None), Task.image != "")
+                .all()
+            )
+        finally:
+            db.close()
+        return {
+            os.path.abspath(_build_context_path(task_id, image))
+            for task_id, image in rows
+        }
+
+    def purge_build_tasks(
+        self,
+        before: Optional[datetime] = None,
+        statuses: Optional[Iterable[str]] = None,
+        batch_size: Optional[int] = None,
+    ) -> int:
+        """
+        清理构建任务（含任务日志和构建上下文）
+
+        Args:
+            before: 只清理创建时间早于该时间的任务（None 表示不限时间）
+            statuses: 只清理这些状态的任务（None 表示所有已结束的任务）
+            batch_size: 每批删除数量
+
+        Returns:
+            删除的任务数量
+        """
+        from backend.models import Task
+
+        statuses = [
+            s for s in (statuses or TERMINAL_STATUSES) if s in TERMINAL_STATUSES
+        ]
+        if not statuses:
+            return 0
+        filters = [Task.status.in_(statuses)]
+        if before is not None:
+            filters.append(Task.created_at < before)
+
+        def select_batch(db, size):
+            return (
+                db.query(Task.task_id, Task.image, Task.pipeline_id)
+                .filter(*filters)
+                .limit(size)
+                .all()
+            )
+
+        return self._delete_build_rows(
+            select_batch, batch_size or get_retention_policy()["batch_size"]
+        )
+
+    def purge_export_tasks(
+        self,
+        before: Optional[datetime] = None,
+        statuses: Optional[Iterable[str]] = None,
+        batch_size: Optional[int] = None,
+    ) -> int:
+        """
+        清理导出任务（含导出文件和任务目录）
+
+        Args:
+            before: 只清理创建时间早于该时间的任务（None 表示不限时间）
+            statuses: 只清理这些状态的任务（None 表示所有已结束的任务）
+            batch_size: 每批删除数量
+
+        Returns:
+            删除的任务数量
+        """
+        from backend.handlers import EXPORT_DIR
+        from backend.models import ExportTask
+
+        statuses = [
+            s for s in (statuses or TERMINAL_STATUSES) if s in TERMINAL_STATUSES
+        ]
+        if not statuses:
+            return 0
+        filters = [ExportTask.status.in_(statuses)]
+        if before is not None:
+            filters.append(ExportTask.created_at < before)
+        tasks_dir = os.path.join(EXPORT_DIR, "tasks")
+
+        def select_batch(db, size):
+            return (
+                db.query(ExportTask.task_id, ExportTask.file_path)
+                .filter(*filters)
+                .limit(size)
+                .all()
+            )
+
+        def delete_batch(db, rows):
+            task_ids = [row[0] for row in rows]
+            db.query(ExportTask).filter(ExportTask.task_id.in_(task_ids)).delete(
+                synchronize_session=False
+            )
+            paths = [row[1] for row in rows if row[1]]
+            paths += [os.path.join(tasks_dir, task_id) for task_id in task_ids]
+            return lambda: self.remove_paths(paths)
+
+        removed = self._delete_in_batches(
+            select_batch,
+            delete_batch,
+            batch_size or get_retention_policy()["batch_size"],
+        )
+        with self._lock:
+            self._stats["export_tasks_removed"] += removed
+        return removed
+
+    def enforce_pipeline_limit(
+        self, max_tasks: int, batch_size: Optional[int] = None
+    ) -> int:
+        """
+        每条流水线只保留最近 max_tasks 个任务（等待中和运行中的任务不计入也不删除）
+
+        Returns:
+            删除的任务数量
+        """
+        if not max_tasks or max_tasks <= 0:
+            return 0
+        from sqlalchemy import text
+
+        placeholders = ", ".join(f"'{s}'" for s in TERMINAL_STATUSES)
+        sql = text(f"""
+            SELECT task_id, image, pipeline_id FROM (
+                SELECT task_id, image, pipeline_id,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY pipeline_id ORDER BY created_at DESC
+                       ) AS rn
+                FROM tasks
+                WHERE pipeline_id IS NOT NULL AND status IN ({placeholders})
+            ) WHERE rn > :max_tasks
+            LIMIT :size
+            """)
+
+        def select_batch(db, size):
+            return [
+                tuple(row)
+                for row in db.execute(sql, {"max_tasks": max_tasks, "size": size})
+            ]
+
+        return self._delete_build_rows(
+            select_batch, batch_size or get_retention_policy()["batch_size"]
+        )
+
+    # ============ 策略执行 ============
+
+    def run(self, policy: Optional[Dict] = None) -> Dict:
+        """
+        按保留策略执行一次清理（已有清理在执行时直接返回）
+
+        Returns:
+            {"build_tasks": n, "export_tasks": n, "pipeline_limit": n, "seconds": s}
+        """
+        policy = {**get_retention_policy(), **(policy or {})}
+        if not self._run_lock.acquire(blocking=False):
+            return {"skipped": True}
+        start = time.monotonic()
+        try:
+            result = {"build_tasks": 0, "export_tasks": 0, "pipeline_limit": 0}
+            now = datetime.now()
+            batch_size = policy["batch_size"]
+            if policy.get("build_task_days"):
+                result["build_tasks"] = self.purge_build_tasks(
+                    before=now - timedelta(days=policy["build_task_days"]),
+                    statuses=policy.get("statuses"),
+                    batch_size=batch_size,
+                )
+            if policy.get("export_task_days"):
+                result["export_tasks"] = self.purge_export_tasks(
+                    before=now - timedelta(days=policy["export_task_days"]),
+                    statuses=policy.get("statuses"),
+                    batch_size=batch_size,
+                )
+            result["pipeline_limit"] = self.enforce_pipeline_limit(
+                policy.get("max_tasks_per_pipeline") or 0, batch_size=batch_size
+            )
+            elapsed = time.monotonic() - start
+            result["seconds"] = round(elapsed, 3)
+            with self._lock:
+                self._stats["runs"] += 1
+                self._stats["last_run_at"] = now.isoformat()
+                self._stats["last_run_seconds"] = round(elapsed, 3)
+            removed = (
+                result["build_tasks"]
+                + result["export_tasks"]
+                + result["pipeline_limit"]
+            )
+            if removed:
+                print(
+                    f"🧹 保留策略清理完成: 构建任务 {result['build_tasks']} 个，"
+                    f"导出任务 {result['export_tasks']} 个，"
+                    f"超出流水线保留数量 {result['pipeline_limit']} 个，耗时 {elapsed:.2f}秒"
+                )
+            return result
+        finally:
+            self._run_lock.release()
+
+    def start(self):
+        """启动定期清理线程（每 RUN_INTERVAL_SECONDS 秒按保留策略执行一次，重复调用无副作用）"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._loop, daemon=True, name="retention"
+            )
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(RUN_INTERVAL_SECONDS)
+            try:
+                self.run()
+            except Exception as e:
+                print(f"⚠️ 按保留策略清理任务出错: {e}")
+
+    def stats(self) -> Dict:
+        """清理统计（累计删除数量、待删除的磁盘路径数）"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending_io"] = self._pending_io
+            return stats
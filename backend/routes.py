@@ -32,14 +32,12 @@ from backend.handlers import (
     OperationLogger,
     generate_image_name,
     get_all_templates,
-    get_template_path,
     BUILTIN_TEMPLATES_DIR,
     USER_TEMPLATES_DIR,
     EXPORT_DIR,
     BUILD_DIR,
     natural_sort_key,
-    docker_builder,
-    DOCKER_AVAILABLE,
+    is_docker_available,
     parse_dockerfile_services,
     validate_and_clean_image_name,
 )
@@ -60,6 +58,7 @@ from backend.config import (
     get_all_registries,
     get_git_config,
     save_git_config,
+    invalidate_config_cache,
 )
 from backend.utils import get_safe_filename
 from backend.auth import authenticate, verify_token
@@ -185,7 +184,7 @@ def require_auth(request: Request) -> str:
         raise HTTPException(status_code=401, detail="认证失败，请重新登录")
 
 
-from backend.template_parser import parse_template_variables
+from backend.template_index import TemplateIndex
 from backend.handlers import parse_dockerfile_services
 from datetime import datetime
 import json
@@ -958,58 +957,62 @@ async def get_operation_logs(
     page_size: int = Query(10, ge=1, le=1000, description="每页数量"),
     username: Optional[str] = Query(None, description="过滤用户名"),
     operation: Optional[str] = Query(None, description="过滤操作类型"),
+    start_time: Optional[str] = Query(None, description="起始时间（ISO格式，包含）"),
+    end_time: Optional[str] = Query(None, description="结束时间（ISO格式，不包含）"),
+    cursor: Optional[str] = Query(
+        None, description="上一页返回的 next_cursor（键集分页，不统计总数）"
+    ),
 ):
-    """获取操作日志（支持分页）"""
+    """获取操作日志（支持页码分页和键集分页）"""
     try:
-        from backend.database import get_db_session
-        from backend.models import OperationLog
-
-        db = get_db_session()
         try:
-            # 构建查询
-            query = db.query(OperationLog)
+            start = datetime.fromisoformat(start_time) if start_time else None
+            end = datetime.fromisoformat(end_time) if end_time else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="时间格式错误，应为ISO格式")
 
-            if username:
-                query = query.filter(OperationLog.username == username)
-            if operation:
-                query = query.filter(OperationLog.action == operation)
-
-            # 获取总数
-            total = query.count()
-
-            # 计算分页
-            offset = (page - 1) * page_size
-            logs_query = (
-                query.order_by(OperationLog.timestamp.desc())
-                .offset(offset)
-                .limit(page_size)
+        logger = OperationLogger()
+        try:
+            result = logger.query_logs(
+                limit=page_size,
+                username=username,
+                operation=operation,
+                start_time=start,
+                end_time=end,
+                cursor=cursor,
+                offset=(page - 1) * page_size,
             )
-            logs = logs_query.all()
-
-            # 转换为字典列表
-            logs_list = [
-                {
-                    "timestamp": log.timestamp.isoformat() if log.timestamp else None,
-                    "username": log.username,
-                    "operation": log.action,
-                    "details": log.details or {},
-                }
-                for log in logs
-            ]
-
-            total_pages = (total + page_size - 1) // page_size if total > 0 else 0
-
-            return JSONResponse(
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        logs_list = result["logs"]
+        for log in logs_list:
+            log.pop("id", None)
+
+        response = {
+            "logs": logs_list,
+            "page_size": page_size,
+            "next_cursor": result["next_cursor"],
+        }
+        if not cursor:
+            # 页码分页时返回总数
+            total = logger.count_logs(
+                username=username,
+                operation=operation,
+                start_time=start,
+                end_time=end,
+            )
+            response.update(
                 {
-                    "logs": logs_list,
                     "total": total,
                     "page": page,
-                    "page_size": page_size,
-                    "total_pages": total_pages,
+                    "total_pages": (
+                        (total + page_size - 1) // page_size if total > 0 else 0
+                    ),
                 }
             )
-        finally:
-            db.close()
+        return JSONResponse(response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取操作日志失败: {str(e)}")
 
@@ -1228,6 +1231,7 @@ async def save_registries(request: SaveRegistriesRequest, http_request: Request)
                         allow_unicode=True,
                         sort_keys=False,
                     )
+                invalidate_config_cache()
             except:
                 pass
             raise HTTPException(
@@ -1253,6 +1257,7 @@ async def save_registries(request: SaveRegistriesRequest, http_request: Request)
                         allow_unicode=True,
                         sort_keys=False,
                     )
+                invalidate_config_cache()
                 # 重新保存，但这次只更新 registries
                 verify_config = load_config()
                 verify_config["docker"]["registries"] = registries_data
@@ -1342,8 +1347,9 @@ async def test_registry_login(request: TestRegistryRequest, http_request: Reques
 
         # 系统认证通过后，使用传入的仓库用户名和密码测试仓库连接
         # 注意：这里的 username 和 password 是仓库的认证信息，不是系统的
-        from backend.handlers import docker_builder
+        from backend.handlers import get_docker_builder
 
+        docker_builder = get_docker_builder(timeout=0)
         if not docker_builder or not docker_builder.is_available():
             return JSONResponse(
                 {"success": False, "message": "Docker 不可用，请检查 Docker 连接"},
@@ -2204,128 +2210,71 @@ async def get_all_tasks(
     task_type: Optional[str] = Query(
         None, description="任务类型过滤: build, build_from_source, export, deploy"
     ),
+    category: Optional[str] = Query(
+        None, description="任务分类过滤: build（含源码构建）, export, deploy"
+    ),
+    start_time: Optional[str] = Query(
+        None, description="创建时间起点（ISO格式，包含）"
+    ),
+    end_time: Optional[str] = Query(
+        None, description="创建时间终点（ISO格式，不包含）"
+    ),
     page: int = Query(1, ge=1, description="页码，从1开始"),
     page_size: int = Query(10, ge=1, le=1000, description="每页数量"),
+    cursor: Optional[str] = Query(
+        None, description="上一页返回的 next_cursor（键集分页，不统计总数）"
+    ),
 ):
-    """获取所有任务（构建任务 + 导出任务 + 部署任务），支持后台分页"""
+    """获取所有任务（构建任务 + 导出任务 + 部署任务）的摘要，支持页码分页和键集分页"""
+    from backend.task_feed import count_task_feed, query_task_feed
+
     try:
-        all_tasks = []
+        try:
+            start = datetime.fromisoformat(start_time) if start_time else None
+            end = datetime.fromisoformat(end_time) if end_time else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="时间格式错误，应为ISO格式")
 
-        # 获取构建任务（排除部署任务）
-        build_manager = BuildTaskManager()
-        if task_type and task_type == "deploy":
-            # 如果只查询部署任务，跳过构建任务
-            build_tasks = []
-        else:
-            # 获取构建任务（排除部署任务）
-            build_task_type = task_type if task_type and task_type != "deploy" else None
-            build_tasks = build_manager.list_tasks(
-                status=status, task_type=build_task_type
+        try:
+            result = query_task_feed(
+                limit=page_size,
+                status=status,
+                category=category,
+                task_type=task_type,
+                start_time=start,
+                end_time=end,
+                cursor=cursor,
+                offset=(page - 1) * page_size,
             )
-            # 过滤掉部署任务（task_type="deploy"）
-            build_tasks = [t for t in build_tasks if t.get("task_type") != "deploy"]
-            for task in build_tasks:
-                # 标记为构建任务
-                task["task_category"] = "build"
-
-                # 如果是流水线触发的任务，补充流水线名称（用于在任务列表中显示）
-                try:
-                    if task.get("pipeline_id"):
-                        from backend.pipeline_manager import PipelineManager
-
-                        pm = PipelineManager()
-                        pipeline = pm.get_pipeline(task["pipeline_id"])
-                        if pipeline and isinstance(pipeline, dict):
-                            task["pipeline_name"] = pipeline.get("name")
-                except Exception as e:
-                    # 获取流水线名称失败不影响任务显示
-                    print(
-                        f"⚠️ 获取流水线名称失败 (task_id={task.get('task_id', 'unknown')[:8]}): {e}"
-                    )
-
-                all_tasks.append(task)
-
-        # 获取部署任务（包括配置和执行产生的任务）
-        if not task_type or task_type == "deploy":
-            try:
-                deploy_tasks = build_manager.list_tasks(
-                    status=status, task_type="deploy"
-                )
-                for task in deploy_tasks:
-                    task_config = task.get("task_config", {})
-                    # 任务管理页面显示所有部署任务（包括配置和执行产生的任务）
-                    # 不需要过滤 source_config_id，因为任务管理应该显示所有任务
-
-                    task["task_category"] = "deploy"  # 标记为部署任务
-
-                    # 为部署任务添加显示名称
-                    try:
-                        # 如果 task_config 是字符串，尝试解析为 JSON
-                        if isinstance(task_config, str):
-                            try:
-                                task_config = json.loads(task_config)
-                            except (json.JSONDecodeError, TypeError):
-                                task_config = {}
-
-                        # 安全地获取配置信息
-                        if isinstance(task_config, dict):
-                            config = task_config.get("config", {})
-                            if isinstance(config, str):
-                                try:
-                                    config = json.loads(config)
-                                except (json.JSONDecodeError, TypeError):
-                                    config = {}
-
-                            if isinstance(config, dict):
-                                app = config.get("app", {})
-                                if isinstance(app, dict):
-                                    app_name = app.get("name")
-                                    if app_name:
-                                        task["image"] = (
-                                            app_name  # 使用应用名称作为显示名称
-                                        )
-                    except Exception as e:
-                        # 如果解析失败，不影响任务添加，只是没有显示名称
-                        print(
-                            f"⚠️ 解析部署任务配置失败 (task_id={task.get('task_id', 'unknown')[:8]}): {e}"
-                        )
-
-                    all_tasks.append(task)
-            except Exception as e:
-                # 如果获取部署任务失败，记录错误但不影响其他任务
-                print(f"⚠️ 获取部署任务失败: {e}")
-                import traceback
-
-                traceback.print_exc()
-
-        # 获取导出任务
-        if not task_type or task_type == "export":
-            export_manager = ExportTaskManager()
-            export_tasks = export_manager.list_tasks(status=status)
-            for task in export_tasks:
-                task["task_category"] = "export"  # 标记为导出任务
-                all_tasks.append(task)
-
-        # 按创建时间倒序排列
-        all_tasks.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-
-        # 计算总数
-        total = len(all_tasks)
-
-        # 后台分页
-        start = (page - 1) * page_size
-        end = start + page_size
-        paginated_tasks = all_tasks[start:end]
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-        return JSONResponse(
-            {
-                "tasks": paginated_tasks,
-                "total": total,
-                "page": page,
-                "page_size": page_size,
-                "total_pages": (total + page_size - 1) // page_size if total > 0 else 0,
-            }
-        )
+        response = {
+            "tasks": result["tasks"],
+            "page_size": page_size,
+            "next_cursor": result["next_cursor"],
+        }
+        if not cursor:
+            # 页码分页时返回总数
+            total = count_task_feed(
+                status=status,
+                category=category,
+                task_type=task_type,
+                start_time=start,
+                end_time=end,
+            )
+            response.update(
+                {
+                    "total": total,
+                    "page": page,
+                    "total_pages": (
+                        (total + page_size - 1) // page_size if total > 0 else 0
+                    ),
+                }
+            )
+        return JSONResponse(response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取任务列表失败: {str(e)}")
 
@@ -2671,101 +2620,30 @@ async def cleanup_tasks(
     """批量清理任务"""
     try:
         username = get_current_username(request)
+        from backend.retention import RetentionEngine
+
+        # 集合删除：按条件分批删除已结束的任务（等待中和运行中的任务不会被删除），
+        # 构建上下文和导出文件在后台清理
+        retention = RetentionEngine()
+        before = None
+        if days:
+            from datetime import timedelta
+
+            before = datetime.now() - timedelta(days=days)
+        statuses = [status] if status else None
         removed_count = 0
 
         # 清理构建任务
         if not task_type or task_type == "build":
-            build_manager = BuildTaskManager()
-            if days:
-                # 清理指定天数前的任务
-                from datetime import timedelta
-
-                cutoff_time = datetime.now() - timedelta(days=days)
-
-                # 获取所有任务
-                all_tasks = build_manager.list_tasks()
-                tasks_to_remove = [
-                    task["task_id"]
-                    for task in all_tasks
-                    if task.get("created_at")
-                    and datetime.fromisoformat(task["created_at"]) < cutoff_time
-                    and (not status or task.get("status") == status)
-                ]
-
-                # 执行删除
-                for task_id in tasks_to_remove:
-                    build_manager.delete_task(task_id)
-                    removed_count += 1
-            elif status:
-                # 清理指定状态的任务
-                tasks_to_remove = [
-                    task["task_id"] for task in build_manager.list_tasks(status=status)
-                ]
-
-                # 执行删除
-                for task_id in tasks_to_remove:
-                    build_manager.delete_task(task_id)
-                    removed_count += 1
-            elif not days and not status:
-                # 清理全部（只清理非运行中的任务）
-                all_tasks = build_manager.list_tasks()
-                tasks_to_remove = [
-                    task["task_id"]
-                    for task in all_tasks
-                    if task.get("status") not in ["running", "pending"]
-                ]
-
-                # 执行删除
-                for task_id in tasks_to_remove:
-                    build_manager.delete_task(task_id)
-                    removed_count += 1
+            removed_count += retention.purge_build_tasks(
+                before=before, statuses=statuses
+            )
 
         # 清理导出任务
         if not task_type or task_type == "export":
-            export_manager = ExportTaskManager()
-            if days:
-                # 清理指定天数前的任务
-                from datetime import timedelta
-
-                cutoff_time = datetime.now() - timedelta(days=days)
-
-                # 获取所有任务
-                all_tasks = export_manager.list_tasks()
-                tasks_to_remove = [
-                    task["task_id"]
-                    for task in all_tasks
-                    if task.get("created_at")
-                    and datetime.fromisoformat(task["created_at"]) < cutoff_time
-                    and (not status or task.get("status") == status)
-                ]
-
-                # 执行删除
-                for task_id in tasks_to_remove:
-                    export_manager.delete_task(task_id)
-                    removed_count += 1
-            elif status:
-                # 清理指定状态的任务
-                tasks_to_remove = [
-                    task["task_id"] for task in export_manager.list_tasks(status=status)
-                ]
-
-                # 执行删除
-                for task_id in tasks_to_remove:
-                    export_manager.delete_task(task_id)
-                    removed_count += 1
-            elif not days and not status:
-                # 清理全部（只清理非运行中的任务）
-                all_tasks = export_manager.list_tasks()
-                tasks_to_remove = [
-                    task["task_id"]
-                    for task in all_tasks
-                    if task.get("status") not in ["running", "pending"]
-                ]
-
-                # 执行删除
-                for task_id in tasks_to_remove:
-                    export_manager.delete_task(task_id)
-                    removed_count += 1
+            removed_count += retention.purge_export_tasks(
+                before=before, statuses=statuses
+            )
 
         # 记录操作日志
         OperationLogger.log(
@@ -3049,24 +2927,10 @@ async def cleanup_docker_build_dir(
         # 获取所有有效任务的构建上下文路径集合
         valid_build_contexts = set()
         try:
-            build_manager = BuildTaskManager()
-            all_tasks = build_manager.list_tasks()
-            for task in all_tasks:
-                task_id = task.get("task_id")
-                # 获取构建上下文路径（从 image_name 和 task_id 推导）
-                image_name = task.get("image", "")
-                if image_name:
-                    build_context = os.path.join(
-                        BUILD_DIR,
-                        f"{image_name.replace('/', '_')}_{task_id[:8]}",
-                    )
-                    if build_context:
-                        # 转换为绝对路径并规范化
-                        abs_path = os.path.abspath(build_context)
-                        valid_build_contexts.add(abs_path)
-                        # 同时添加相对路径到 BUILD_DIR 的路径，以防匹配问题
-                        if not os.path.isabs(build_context):
-                            valid_build_contexts.add(os.path.abspath(build_context))
+            from backend.retention import RetentionEngine
+
+            # 只查询 task_id 和 image 两列，不加载完整任务
+            valid_build_contexts = RetentionEngine().build_context_paths()
             print(f"🔍 找到 {len(valid_build_contexts)} 个有效任务的构建上下文")
             if len(valid_build_contexts) > 0:
                 print(f"🔍 有效路径示例: {list(valid_build_contexts)[:3]}")
@@ -3420,7 +3284,7 @@ async def create_export_task(
     """创建导出任务"""
     try:
         username = get_current_username(request)
-        if not DOCKER_AVAILABLE:
+        if not is_docker_available(timeout=0):
             raise HTTPException(
                 status_code=503, detail="Docker 服务不可用，无法导出镜像"
             )
@@ -3525,6 +3389,11 @@ async def download_export_task(task_id: str):
 
         file_path = task_manager.get_task_file_path(task_id)
 
+        # 最近下载过的导出文件不会被磁盘配额回收
+        from backend.disk_gc import DiskBudgetGC
+
+        DiskBudgetGC().touch(file_path)
+
         # 确定文件类型
         if file_path.endswith(".gz"):
             content_type = "application/gzip"
@@ -3716,27 +3585,7 @@ async def parse_compose(request: ParseComposeRequest):
 async def list_templates():
     """列出所有可用模板"""
     try:
-        templates = get_all_templates()
-        details = []
-
-        for name, info in templates.items():
-            try:
-                stat = os.stat(info["path"])
-                details.append(
-                    {
-                        "name": name,
-                        "filename": os.path.basename(info["path"]),
-                        "size": stat.st_size,
-                        "updated_at": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                        "type": info["type"],
-                        "project_type": info.get("project_type", "jar"),
-                        "editable": info["type"] == "user",
-                    }
-                )
-            except OSError:
-                continue
-
-        details.sort(key=lambda item: natural_sort_key(item["name"]))
+        details = TemplateIndex().get_details()
         return JSONResponse(details)
     except HTTPException:
         raise
@@ -3751,20 +3600,19 @@ async def get_template_params(
 ):
     """获取模板的参数列表"""
     try:
-        # 获取模板路径
-        template_path = get_template_path(template, project_type)
-        if not template_path or not os.path.exists(template_path):
+        # 获取模板路径与解析结果（模板索引中已缓存）
+        template_index = TemplateIndex()
+        template_path = template_index.resolve_path(template, project_type)
+        parsed = template_index.get_parsed(template_path) if template_path else None
+        if not parsed:
             raise HTTPException(status_code=404, detail="模板不存在")
 
-        # 读取模板内容
-        with open(template_path, "r", encoding="utf-8") as f:
-            content = f.read()
-
         # 解析参数（全局参数）
-        all_params = parse_template_variables(content)
+        all_params = parsed["variables"]
 
         # 解析服务阶段（多阶段构建）
-        services, global_param_names = parse_dockerfile_services(content)
+        services = parsed["services"]
+        global_param_names = parsed["global_param_names"]
 
         # 区分全局参数和服务参数
         global_params = [p for p in all_params if p["name"] in global_param_names]
@@ -3810,12 +3658,10 @@ async def get_template(
                 raise HTTPException(status_code=404, detail="模板不存在")
 
             template_path = templates[name]["path"]
-            if not os.path.exists(template_path):
+            content = TemplateIndex().get_content(template_path)
+            if content is None:
                 raise HTTPException(status_code=404, detail="模板文件不存在")
 
-            with open(template_path, "r", encoding="utf-8") as f:
-                content = f.read()
-
             return JSONResponse(
                 {
                     "name": name,
@@ -3826,27 +3672,7 @@ async def get_template(
             )
         else:
             # 返回模板列表（支持分页和模糊查询）
-            templates = get_all_templates()
-            details = []
-
-            for name, info in templates.items():
-                try:
-                    stat = os.stat(info["path"])
-                    details.append(
-                        {
-                            "name": name,
-                            "filename": os.path.basename(info["path"]),
-                            "size": stat.st_size,
-                            "updated_at": datetime.fromtimestamp(
-                                stat.st_mtime
-                            ).isoformat(),
-                            "type": info["type"],
-                            "project_type": info.get("project_type", "jar"),
-                            "editable": info["type"] == "user",
-                        }
-                    )
-                except OSError:
-                    continue
+            details = TemplateIndex().get_details()
 
             # 如果提供了查询关键词，进行模糊搜索
             if query:
@@ -3917,6 +3743,7 @@ async def create_template(request: TemplateRequest, http_request: Request):
         # 保存模板
         with open(template_path, "w", encoding="utf-8") as f:
             f.write(content)
+        TemplateIndex().invalidate(template_path)
 
         print(f"✅ 模板已保存: {template_path}")
         print(f"📊 文件大小: {os.path.getsize(template_path)} bytes")
@@ -4023,8 +3850,10 @@ async def update_template(request: TemplateRequest, http_request: Request):
                 os.remove(old_path)
         else:
             # 仅更新内容
+            new_path = old_path
             with open(old_path, "w", encoding="utf-8") as f:
                 f.write(content)
+        TemplateIndex().invalidate(old_path, new_path)
 
         # 记录操作日志
         OperationLogger.log(
@@ -4065,6 +3894,7 @@ async def delete_template(request: DeleteTemplateRequest, http_request: Request)
         # 删除文件
         if os.path.exists(template_path):
             os.remove(template_path)
+        TemplateIndex().invalidate(template_path)
 
         # 记录操作日志
         OperationLogger.log(
@@ -4089,8 +3919,11 @@ async def get_docker_info(
     try:
         from backend.docker_info_cache import docker_info_cache
 
-        # 使用缓存获取Docker信息
-        info = docker_info_cache.get_docker_info(force_refresh=force_refresh)
+        # 使用缓存获取Docker信息（可能等待 Docker 初始化或访问 Docker，放到线程池执行）
+        loop = asyncio.get_running_loop()
+        info = await loop.run_in_executor(
+            None, lambda: docker_info_cache.get_docker_info(force_refresh=force_refresh)
+        )
 
         # 添加缓存年龄信息
         cache_age = docker_info_cache.get_cache_age()
@@ -4113,8 +3946,9 @@ async def refresh_docker_info(request: Request):
         username = get_current_username(request)
         from backend.docker_info_cache import docker_info_cache
 
-        # 强制刷新缓存
-        info = docker_info_cache.refresh_cache()
+        # 强制刷新缓存（可能等待 Docker 初始化或访问 Docker，放到线程池执行）
+        loop = asyncio.get_running_loop()
+        info = await loop.run_in_executor(None, docker_info_cache.refresh_cache)
 
         # 记录操作日志
         OperationLogger.log(
@@ -4147,9 +3981,10 @@ async def get_docker_images(
 ):
     """获取 Docker 镜像列表（支持后台分页和过滤）"""
     try:
-        from backend.handlers import docker_builder, DOCKER_AVAILABLE
+        from backend.handlers import get_docker_builder
 
-        if not DOCKER_AVAILABLE or not docker_builder:
+        docker_builder = get_docker_builder(timeout=0)
+        if not docker_builder or not docker_builder.is_available():
             return JSONResponse(
                 {
                     "images": [],
@@ -4280,9 +4115,10 @@ async def delete_docker_image(request: DeleteImageRequest, http_request: Request
     """删除 Docker 镜像"""
     try:
         username = get_current_username(http_request)
-        from backend.handlers import docker_builder, DOCKER_AVAILABLE
+        from backend.handlers import get_docker_builder
 
-        if not DOCKER_AVAILABLE or not docker_builder:
+        docker_builder = get_docker_builder(timeout=0)
+        if not docker_builder or not docker_builder.is_available():
             raise HTTPException(status_code=503, detail="Docker 服务不可用")
 
         if not hasattr(docker_builder, "client") or not docker_builder.client:
@@ -4307,9 +4143,10 @@ async def prune_docker_images(http_request: Request):
     """清理未使用的镜像"""
     try:
         username = get_current_username(http_request)
-        from backend.handlers import docker_builder, DOCKER_AVAILABLE
+        from backend.handlers import get_docker_builder
 
-        if not DOCKER_AVAILABLE or not docker_builder:
+        docker_builder = get_docker_builder(timeout=0)
+        if not docker_builder or not docker_builder.is_available():
             raise HTTPException(status_code=503, detail="Docker 服务不可用")
 
         result = docker_builder.client.images.prune()
@@ -4334,9 +4171,10 @@ async def get_docker_containers(
 ):
     """获取容器列表（支持后台分页和过滤）"""
     try:
-        from backend.handlers import docker_builder, DOCKER_AVAILABLE
+        from backend.handlers import get_docker_builder
 
-        if not DOCKER_AVAILABLE or not docker_builder:
+        docker_builder = get_docker_builder(timeout=0)
+        if not docker_builder or not docker_builder.is_available():
             return JSONResponse(
                 {
                     "containers": [],
@@ -4440,9 +4278,10 @@ async def start_container(container_id: str, http_request: Request):
     """启动容器"""
     try:
         username = get_current_username(http_request)
-        from backend.handlers import docker_builder, DOCKER_AVAILABLE
+        from backend.handlers import get_docker_builder
 
-        if not DOCKER_AVAILABLE or not docker_builder:
+        docker_builder = get_docker_builder(timeout=0)
+        if not docker_builder or not docker_builder.is_available():
             raise HTTPException(status_code=503, detail="Docker 服务不可用")
 
         container = docker_builder.client.containers.get(container_id)
@@ -4462,9 +4301,10 @@ async def stop_container(
     """停止容器，支持强制停止"""
     try:
         username = get_current_username(http_request)
-        from backend.handlers import docker_builder, DOCKER_AVAILABLE
+        from backend.handlers import get_docker_builder
 
-        if not DOCKER_AVAILABLE or not docker_builder:
+        docker_builder = get_docker_builder(timeout=0)
+        if not docker_builder or not docker_builder.is_available():
             raise HTTPException(status_code=503, detail="Docker 服务不可用")
 
         container = docker_builder.client.containers.get(container_id)
@@ -4489,9 +4329,10 @@ async def restart_container(container_id: str, http_request: Request):
     """重启容器"""
     try:
         username = get_current_username(http_request)
-        from backend.handlers import docker_builder, DOCKER_AVAILABLE
+        from backend.handlers import get_docker_builder
 
-        if not DOCKER_AVAILABLE or not docker_builder:
+        docker_builder = get_docker_builder(timeout=0)
+        if not docker_builder or not docker_builder.is_available():
             raise HTTPException(status_code=503, detail="Docker 服务不可用")
 
         container = docker_builder.client.containers.get(container_id)
@@ -4509,9 +4350,10 @@ async def remove_container(container_id: str, http_request: Request):
     """删除容器"""
     try:
         username = get_current_username(http_request)
-        from backend.handlers import docker_builder, DOCKER_AVAILABLE
+        from backend.handlers import get_docker_builder
 
-        if not DOCKER_AVAILABLE or not docker_builder:
+        docker_builder = get_docker_builder(timeout=0)
+        if not docker_builder or not docker_builder.is_available():
             raise HTTPException(status_code=503, detail="Docker 服务不可用")
 
         container = docker_builder.client.containers.get(container_id)
@@ -4529,9 +4371,10 @@ async def prune_containers(http_request: Request):
     """清理已停止的容器"""
     try:
         username = get_current_username(http_request)
-        from backend.handlers import docker_builder, DOCKER_AVAILABLE
+        from backend.handlers import get_docker_builder
 
-        if not DOCKER_AVAILABLE or not docker_builder:
+        docker_builder = get_docker_builder(timeout=0)
+        if not docker_builder or not docker_builder.is_available():
             raise HTTPException(status_code=503, detail="Docker 服务不可用")
 
         result = docker_builder.client.containers.prune()
@@ -4823,35 +4666,54 @@ async def list_pipelines(
         manager = PipelineManager()
         pipelines = manager.list_pipelines(enabled=enabled)
 
-        # 为每个流水线添加当前任务状态和最后一次构建状态
-        build_manager = BuildManager()
+        # 确保 pipelines 是列表
+        if not isinstance(pipelines, list):
+            print(f"⚠️ pipelines 不是列表类型: {type(pipelines)}")
+            pipelines = []
 
-        # 优化：只查询一次所有任务，然后在内存中过滤（避免重复查询数据库）
+        # 最后一次构建、成功/失败次数、排队数由分组 SQL 统计并缓存（任务变化后增量刷新）
+        from backend.pipeline_summary_cache import PipelineSummaryCache
+
+        summary_cache = PipelineSummaryCache()
         try:
-            all_tasks = build_manager.task_manager.list_tasks(
-                task_type="build_from_source"
-            )
+            summaries = summary_cache.get_summaries()
         except Exception as e:
-            print(f"⚠️ 查询任务列表失败: {e}")
+            print(f"⚠️ 查询流水线汇总失败: {e}")
             import traceback
 
             traceback.print_exc()
-            # 如果查询任务失败，使用空列表继续处理
-            all_tasks = []
+            # 如果查询失败，使用空汇总继续处理
+            summaries = {}
 
-        # 确保 pipelines 是列表
-        if not isinstance(pipelines, list):
-            print(f"⚠️ pipelines 不是列表类型: {type(pipelines)}")
-            pipelines = []
+        # 一次查询所有流水线的当前任务（不加载日志）
+        current_tasks = {}
+        current_task_ids = [
+            p.get("current_task_id") for p in pipelines if p.get("current_task_id")
+        ]
+        if current_task_ids:
+            from backend.database import get_db_session
+            from backend.models import Task
 
-        # 按 pipeline_id 分组任务，提高查找效率
-        tasks_by_pipeline = {}
-        for task in all_tasks:
-            task_pipeline_id = task.get("pipeline_id")
-            if task_pipeline_id:
-                if task_pipeline_id not in tasks_by_pipeline:
-                    tasks_by_pipeline[task_pipeline_id] = []
-                tasks_by_pipeline[task_pipeline_id].append(task)
+            db = get_db_session()
+            try:
+                rows = (
+                    db.query(
+                        Task.task_id,
+                        Task.status,
+                        Task.created_at,
+                        Task.image,
+                        Task.tag,
+                        Task.pipeline_id,
+                    )
+                    .filter(Task.task_id.in_(current_task_ids))
+                    .all()
+                )
+                current_tasks = {row.task_id: row for row in rows}
+            except Exception as e:
+                print(f"⚠️ 查询流水线当前任务失败: {e}")
+                current_task_ids = []
+            finally:
+                db.close()
 
         for pipeline in pipelines:
             pipeline_id = pipeline.get("pipeline_id")
@@ -4867,80 +4729,50 @@ async def list_pipelines(
 
             # 获取当前正在运行的任务
             task_id = pipeline.get("current_task_id")
-            if task_id:
-                try:
-                    task = build_manager.task_manager.get_task(task_id)
-                    if task:
-                        pipeline["current_task_status"] = task.get("status")
-                        pipeline["current_task_info"] = {
-                            "task_id": task_id,
-                            "status": task.get("status"),
-                            "created_at": task.get("created_at"),
-                            "image": task.get("image"),
-                            "tag": task.get("tag"),
-                        }
-                    else:
-                        # 任务不存在，清除绑定
+            current_task_pending = False
+            if task_id and task_id in current_task_ids:
+                task = current_tasks.get(task_id)
+                if task:
+                    pipeline["current_task_status"] = task.status
+                    pipeline["current_task_info"] = {
+                        "task_id": task_id,
+                        "status": task.status,
+                        "created_at": (
+                            task.created_at.isoformat() if task.created_at else None
+                        ),
+                        "image": task.image,
+                        "tag": task.tag,
+                    }
+                    current_task_pending = (
+                        task.status == "pending" and task.pipeline_id == pipeline_id
+                    )
+                else:
+                    # 任务不存在，清除绑定
+                    try:
                         manager.unbind_task(pipeline_id)
-                        pipeline["current_task_id"] = None
-                except Exception as e:
-                    # 如果获取任务失败，清除绑定
-                    print(f"⚠️ 获取任务 {task_id} 失败: {e}")
-                    manager.unbind_task(pipeline_id)
+                    except Exception as e:
+                        print(f"⚠️ 解绑流水线 {pipeline_id} 的任务失败: {e}")
                     pipeline["current_task_id"] = None
 
-            # 从分组后的任务中查找该流水线的任务
-            pipeline_tasks = tasks_by_pipeline.get(pipeline_id, [])
-            last_task = None
-            success_count = 0
-            failed_count = 0
-
-            for task in pipeline_tasks:
-                # 统计成功和失败数量
-                task_status = task.get("status")
-                if task_status == "completed":
-                    success_count += 1
-                elif task_status == "failed":
-                    failed_count += 1
-
-                # 查找所有状态的任务，取最新的一个
-                task_created_at = task.get("created_at", "")
-                if not last_task or (
-                    task_created_at
-                    and task_created_at > last_task.get("created_at", "")
-                ):
-                    last_task = task
+            summary = summaries.get(pipeline_id) or summary_cache.empty_summary()
 
             # 添加最后一次构建信息（包含所有状态）
-            if last_task:
-                pipeline["last_build"] = {
-                    "task_id": last_task.get("task_id"),
-                    "status": last_task.get("status"),
-                    "created_at": last_task.get("created_at"),
-                    "completed_at": last_task.get("completed_at"),
-                    "image": last_task.get("image"),
-                    "tag": last_task.get("tag"),
-                    "error": last_task.get("error"),
-                }
+            last_build = summary["last_build"]
+            pipeline["last_build"] = last_build
+            if last_build:
                 # 添加一个便捷的成功状态字段（仅对已完成的任务）
-                pipeline["last_build_success"] = last_task.get("status") == "completed"
+                pipeline["last_build_success"] = last_build["status"] == "completed"
             else:
-                pipeline["last_build"] = None
                 pipeline["last_build_success"] = None
 
             # 添加成功/失败统计
-            pipeline["success_count"] = success_count
-            pipeline["failed_count"] = failed_count
+            pipeline["success_count"] = summary["success_count"]
+            pipeline["failed_count"] = summary["failed_count"]
 
-            # 添加队列信息
-            try:
-                queue_length = manager.get_queue_length(pipeline_id)
-                pipeline["queue_length"] = queue_length
-                pipeline["has_queued_tasks"] = queue_length > 0
-            except Exception as e:
-                print(f"⚠️ 获取流水线 {pipeline_id} 队列长度失败: {e}")
-                pipeline["queue_length"] = 0
-                pipeline["has_queued_tasks"] = False
+            # 添加队列信息（等待中的任务，不含当前绑定的任务）
+            queue_length = summary["pending_count"] - (1 if current_task_pending else 0)
+            pipeline["queue_length"] = max(0, queue_length)
+            pipeline["has_queued_tasks"] = pipeline["queue_length"] > 0
 
         return JSONResponse({"pipelines": pipelines, "total": len(pipelines)})
     except Exception as e:
@@ -5136,6 +4968,28 @@ async def get_pipeline_tasks(
         raise HTTPException(status_code=500, detail=f"获取流水线任务失败: {str(e)}")
 
 
+@router.get("/pipelines/{pipeline_id}/webhook-notifications")
+async def get_pipeline_webhook_notifications(
+    pipeline_id: str,
+    limit: int = Query(50, ge=1, le=500, description="返回数量"),
+):
+    """获取流水线的构建后Webhook通知历史（状态、尝试次数、最后一次响应）"""
+    try:
+        from backend.webhook_dispatcher import PostBuildWebhookDispatcher
+
+        return JSONResponse(
+            {
+                "notifications": PostBuildWebhookDispatcher().history(
+                    pipeline_id, limit=limit
+                )
+            }
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"获取构建后Webhook通知历史失败: {str(e)}"
+        )
+
+
 @router.put("/pipelines/{pipeline_id}")
 async def update_pipeline(
     pipeline_id: str, request: UpdatePipelineRequest, http_request: Request
@@ -5607,508 +5461,92 @@ async def webhook_trigger(webhook_token: str, request: Request):
                 f"🔓 Webhook 未配置签名验证，直接允许通过: pipeline={pipeline.get('name')}"
             )
 
-        # 解析 Webhook 负载（尝试解析 JSON）
-        try:
-            payload = json.loads(body.decode("utf-8"))
-        except:
-            payload = {}
+        # 持久化投递后立即返回 202，由后台工作线程按流水线顺序处理（相同投递ID的重发直接忽略）
+        from backend.webhook_ingest import WebhookIngestQueue, get_delivery_id
 
-        # 提取分支信息（不同平台格式不同）
-        webhook_branch = None
-
-        # 首先尝试从 ref 字段提取分支（最可靠的方式）
-        if "ref" in payload:
-            ref = payload["ref"]
-            print(f"🔍 Webhook ref 字段: {ref}")
-
-            # 处理分支引用：refs/heads/branch_name
-            if ref.startswith("refs/heads/"):
-                webhook_branch = ref.replace("refs/heads/", "")
-                print(f"✅ 从 refs/heads/ 提取分支: {webhook_branch}")
-            # 处理标签引用：refs/tags/tag_name（应该忽略）
-            elif ref.startswith("refs/tags/"):
-                print(f"⚠️ 检测到标签推送 (refs/tags/)，忽略此 webhook 触发")
-                return JSONResponse(
-                    {
-                        "message": "标签推送事件，已忽略触发",
-                        "pipeline": pipeline.get("name"),
-                        "ref": ref,
-                        "ignored": True,
-                    }
-                )
-            # GitLab: ref = main (可能已经是分支名，不包含 refs/ 前缀)
-            elif not ref.startswith("refs/"):
-                webhook_branch = ref
-                print(f"✅ 从 ref 直接提取分支（GitLab格式）: {webhook_branch}")
-
-        # 如果从 ref 字段提取失败，尝试从合并请求/拉取请求中提取目标分支
-        if not webhook_branch:
-            # Gitee/GitHub: 从 pull_request 字段提取目标分支
-            if "pull_request" in payload:
-                pr = payload["pull_request"]
-                # Gitee/GitHub: base.ref 是目标分支
-                if "base" in pr and "ref" in pr["base"]:
-                    webhook_branch = pr["base"]["ref"]
-                    print(f"✅ 从 pull_request.base.ref 提取目标分支: {webhook_branch}")
-            # GitLab: 从 merge_request 字段提取目标分支
-            elif "merge_request" in payload:
-                mr = payload["merge_request"]
-                # GitLab: target_branch 是目标分支
-                if "target_branch" in mr:
-                    webhook_branch = mr["target_branch"]
-                    print(
-                        f"✅ 从 merge_request.target_branch 提取目标分支: {webhook_branch}"
-                    )
-
-        # 记录提取结果
-        if webhook_branch:
-            print(f"📌 成功提取的 webhook_branch: {webhook_branch}")
-        else:
-            print(f"⚠️ 未能从 payload 中提取分支信息")
-            print(f"   可用的 payload 字段: {list(payload.keys())}")
-
-        # 统一分支策略处理（与手动触发保持一致）
-        # 支持新的webhook_branch_strategy字段，同时兼容旧的webhook_branch_filter和webhook_use_push_branch字段
-        webhook_branch_strategy = pipeline.get("webhook_branch_strategy")
-        webhook_allowed_branches = pipeline.get("webhook_allowed_branches", [])
-        webhook_branch_filter = pipeline.get("webhook_branch_filter", False)
-        webhook_use_push_branch = pipeline.get("webhook_use_push_branch", True)
-        configured_branch = pipeline.get("branch")
-
-        # 如果没有新策略字段，根据旧字段推断策略
-        if not webhook_branch_strategy:
-            if webhook_allowed_branches and len(webhook_allowed_branches) > 0:
-                webhook_branch_strategy = "select_branches"
-            elif webhook_branch_filter:
-                webhook_branch_strategy = "filter_match"
-            elif webhook_use_push_branch:
-                webhook_branch_strategy = "use_push"
-            else:
-                webhook_branch_strategy = "use_configured"
-
-        # 调试信息：输出配置值
-        print(f"🔍 Webhook 分支配置:")
-        print(f"   - webhook_branch_strategy: {webhook_branch_strategy}")
-        print(f"   - webhook_allowed_branches: {webhook_allowed_branches}")
-        print(f"   - configured_branch: {configured_branch}")
-        print(f"   - webhook_branch: {webhook_branch}")
-
-        # 根据分支策略确定使用的分支（统一逻辑）
-        # 重要：对于 webhook 触发，如果成功提取了 webhook_branch，应该优先使用它
-        branch = None
-
-        if webhook_branch_strategy == "select_branches":
-            # 选择分支触发策略：只允许匹配的分支触发
-            if webhook_branch:
-                if webhook_branch in webhook_allowed_branches:
-                    branch = webhook_branch
-                    print(f"✅ 分支在允许列表中，使用推送分支: {branch}")
-                else:
-                    print(
-                        f"⚠️ 分支不在允许列表中，忽略触发: webhook_branch={webhook_branch}, allowed={webhook_allowed_branches}"
-                    )
-                    return JSONResponse(
-                        {
-                            "message": f"分支不在允许列表中，已忽略触发（推送分支: {webhook_branch}）",
-                            "pipeline": pipeline.get("name"),
-                            "webhook_branch": webhook_branch,
-                            "allowed_branches": webhook_allowed_branches,
-                            "ignored": True,
-                        }
-                    )
-            else:
-                # Webhook未提供分支信息，使用配置的分支
-                branch = configured_branch
-                print(f"⚠️ Webhook未提供分支信息，使用配置分支: {branch}")
-        elif webhook_branch_strategy == "filter_match":
-            # 只允许匹配分支触发：检查推送分支是否匹配配置分支
-            if webhook_branch:
-                if webhook_branch == configured_branch:
-                    branch = webhook_branch
-                    print(f"✅ 分支匹配，使用推送分支: {branch}")
-                else:
-                    print(
-                        f"⚠️ 分支不匹配，忽略触发: webhook_branch={webhook_branch}, configured={configured_branch}"
-                    )
-                    return JSONResponse(
-                        {
-                            "message": f"分支不匹配，已忽略触发（推送分支: {webhook_branch}, 配置分支: {configured_branch}）",
-                            "pipeline": pipeline.get("name"),
-                            "webhook_branch": webhook_branch,
-                            "configured_branch": configured_branch,
-                            "ignored": True,
-                        }
-                    )
-            else:
-                # Webhook未提供分支信息，使用配置的分支
-                branch = configured_branch
-                print(f"⚠️ Webhook未提供分支信息，使用配置分支: {branch}")
-        elif webhook_branch_strategy == "use_push":
-            # 使用推送分支构建：必须使用webhook推送的分支
-            if webhook_branch:
-                branch = webhook_branch
-                print(f"✅ 使用推送分支构建: {branch}")
-            else:
-                # Webhook未提供分支信息，对于 use_push 策略应该报错而不是回退
-                print(f"❌ use_push 策略要求 webhook 提供分支信息，但提取失败")
-                return JSONResponse(
-                    {
-                        "message": "无法触发构建：use_push 策略要求 webhook 提供分支信息，但未能从 payload 中提取分支",
-                        "pipeline": pipeline.get("name"),
-                        "error": "missing_webhook_branch",
-                        "strategy": "use_push",
-                    },
-                    status_code=400,
-                )
-        else:  # use_configured
-            # 使用配置分支构建：但如果 webhook 成功提取了分支，优先使用 webhook 分支
-            # 这样可以确保从 test 合并到 master 时，使用的是 master 而不是配置的 test
-            if webhook_branch:
-                branch = webhook_branch
-                print(
-                    f"✅ use_configured 策略：检测到 webhook 分支，优先使用推送分支: {branch}"
-                )
-                print(
-                    f"   配置的分支 ({configured_branch}) 将被忽略，因为 webhook 明确推送到了 {webhook_branch}"
-                )
-            else:
-                # Webhook未提供分支信息，使用配置的分支
-                branch = configured_branch
-                print(f"✅ 使用配置分支构建: {branch}")
-
-        # 如果最终没有确定分支，报错
-        if not branch:
-            print(f"❌ 无法触发构建: pipeline={pipeline.get('name')}, 无法确定分支")
-            return JSONResponse(
-                {
-                    "message": "无法触发构建：无法确定分支",
-                    "pipeline": pipeline.get("name"),
-                    "error": "missing_branch",
-                },
-                status_code=400,
+        ingest_queue = WebhookIngestQueue()
+        headers = dict(request.headers)
+        delivery_id = get_delivery_id(headers, body)
+        delivery, duplicate = ingest_queue.enqueue(
+            pipeline["pipeline_id"], delivery_id, headers, body
+        )
+        if duplicate:
+            print(
+                f"🔁 重复的 Webhook 投递，已忽略: pipeline={pipeline.get('name')}, delivery_id={delivery_id}"
             )
-
-        # 根据推送的分支查找对应的标签（分支标签映射应该基于推送的分支，而不是用于构建的分支）
-        branch_tag_mapping = pipeline.get("branch_tag_mapping", {})
-        default_tag = pipeline.get("tag", "latest")  # 默认标签
-
-        # 调试信息：输出最终确定的分支（详细总结）
-        print(f"📊 分支确定总结:")
-        print(f"   - 原始 ref 字段: {payload.get('ref', 'N/A')}")
-        print(f"   - 提取的 webhook_branch: {webhook_branch}")
-        print(f"   - 配置的 configured_branch: {configured_branch}")
-        print(f"   - 分支策略: {webhook_branch_strategy}")
-        print(f"   - 最终使用的 branch: {branch}")
-        if webhook_branch and branch != webhook_branch:
+        else:
             print(
-                f"   ⚠️ 警告：最终使用的分支 ({branch}) 与 webhook 推送的分支 ({webhook_branch}) 不一致！"
+                f"📥 Webhook 投递已接收: pipeline={pipeline.get('name')}, delivery_id={delivery_id}"
             )
-        elif webhook_branch and branch == webhook_branch:
-            print(f"   ✅ 确认：最终使用的分支与 webhook 推送的分支一致")
 
-        # 使用webhook推送的分支来查找标签映射（如果有的话）
-        branch_for_tag_mapping = webhook_branch if webhook_branch else branch
+        return JSONResponse(
+            {
+                "message": (
+                    "重复的投递，已忽略" if duplicate else "Webhook 已接收，等待处理"
+                ),
+                "status": "duplicate" if duplicate else "accepted",
+                "pipeline": pipeline.get("name"),
+                "delivery_id": delivery_id,
+                "delivery_status": delivery.get("status"),
+                "queue_depth": ingest_queue.stats()["depth"],
+            },
+            status_code=202,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
 
-        # 获取标签列表（支持单个标签或多个标签）
-        tags = [default_tag]  # 默认只有一个标签
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Webhook 处理失败: {str(e)}")
 
-        if branch_for_tag_mapping and branch_tag_mapping:
-            mapped_tag_value = None
-            # 优先精确匹配
-            if branch_for_tag_mapping in branch_tag_mapping:
-                mapped_tag_value = branch_tag_mapping[branch_for_tag_mapping]
-            else:
-                # 尝试通配符匹配（如 feature/* -> feature）
-                import fnmatch
 
-                for pattern, mapped_tag in branch_tag_mapping.items():
-                    if fnmatch.fnmatch(branch_for_tag_mapping, pattern):
-                        mapped_tag_value = mapped_tag
-                        break
+@router.get("/webhook/{webhook_token}/deliveries/{delivery_id}")
+async def get_webhook_delivery(webhook_token: str, delivery_id: str):
+    """查询 Webhook 投递的处理状态和结果"""
+    from backend.webhook_ingest import WebhookIngestQueue
 
-            # 处理标签值（支持字符串、数组或逗号分隔的字符串）
-            if mapped_tag_value:
-                if isinstance(mapped_tag_value, list):
-                    # 如果是数组，直接使用
-                    tags = mapped_tag_value
-                elif isinstance(mapped_tag_value, str):
-                    # 如果是字符串，检查是否包含逗号
-                    if "," in mapped_tag_value:
-                        # 逗号分隔的多个标签
-                        tags = [
-                            t.strip() for t in mapped_tag_value.split(",") if t.strip()
-                        ]
-                    else:
-                        # 单个标签
-                        tags = [mapped_tag_value]
+    manager = PipelineManager()
+    pipeline = manager.get_pipeline_by_token(webhook_token)
+    if not pipeline:
+        raise HTTPException(status_code=404, detail="流水线不存在")
 
-        # 为每个标签创建任务
-        from backend.handlers import pipeline_to_task_config
+    delivery = WebhookIngestQueue().get_delivery(pipeline["pipeline_id"], delivery_id)
+    if not delivery:
+        raise HTTPException(status_code=404, detail="投递不存在")
+    return JSONResponse(delivery)
 
-        build_manager = BuildManager()
-        pipeline_id = pipeline["pipeline_id"]
 
-        # 生成第一个标签的任务配置（用于综合检查）
-        # 如果多个标签，使用第一个标签的配置进行检查
-        first_tag = tags[0] if tags else None
-        if first_tag:
-            print(
-                f"🔍 [Webhook触发] 开始综合检查: pipeline={pipeline.get('name')}, branch={branch}, tag={first_tag}"
-            )
-            first_task_config = pipeline_to_task_config(
-                pipeline,
-                trigger_source="webhook",
-                branch=branch,
-                tag=first_tag,
-                webhook_branch=webhook_branch,
-                branch_tag_mapping=branch_tag_mapping,
-            )
-            print(
-                f"🔍 [Webhook触发] 任务配置已生成: pipeline_id={pipeline_id[:8]}..., branch={first_task_config.get('branch')}, tag={first_task_config.get('tag')}"
-            )
+@router.get("/webhook-queue/stats")
+async def get_webhook_queue_stats():
+    """获取 Webhook 接收队列状态（队列深度、排队和处理耗时）"""
+    from backend.webhook_ingest import WebhookIngestQueue
 
-            # 使用综合检查方法统一检查防抖、运行中任务和队列
-            duplicate_result = manager.check_duplicate_task(
-                pipeline_id, first_task_config, debounce_seconds=3
-            )
+    return JSONResponse(WebhookIngestQueue().stats())
 
-            if duplicate_result == "debounced":
-                # 防抖时间内的相同配置，直接屏蔽
-                print(
-                    f"🚫 流水线 {pipeline.get('name')} 触发被屏蔽（3秒内相同信息）: branch={branch}, tag={first_tag}"
-                )
-                return JSONResponse(
-                    {
-                        "message": "触发过于频繁，相同信息的触发已被屏蔽（3秒内）",
-                        "status": "debounced",
-                        "pipeline": pipeline.get("name"),
-                        "branch": branch,
-                        "tag": first_tag,
-                    }
-                )
-            elif duplicate_result == "running_same_config":
-                # 运行中的任务也是相同配置，直接返回排队状态，不创建新任务
-                current_task_id = manager.get_pipeline_running_task(pipeline_id)
-                queue_length = manager.get_queue_length(pipeline_id)
-                print(
-                    f"🚫 流水线 {pipeline.get('name')} 触发被屏蔽（运行中的任务也是相同配置）: branch={branch}, tag={first_tag}, current_task_id={current_task_id[:8] if current_task_id else 'None'}..."
-                )
-                return JSONResponse(
-                    {
-                        "message": "运行中的任务也是相同配置，已忽略重复触发",
-                        "status": "running_same_config",
-                        "pipeline": pipeline.get("name"),
-                        "branch": branch,
-                        "tag": first_tag,
-                        "current_task_id": current_task_id,
-                        "queue_length": queue_length,
-                    }
-                )
-            elif duplicate_result == "queued_same_config":
-                # 队列中已有相同配置的任务，直接返回，不创建新任务
-                queue_length = manager.get_queue_length(pipeline_id)
-                print(
-                    f"🚫 流水线 {pipeline.get('name')} 触发被屏蔽（队列中已有相同配置的任务）: branch={branch}, tag={first_tag}"
-                )
-                return JSONResponse(
-                    {
-                        "message": "队列中已有相同配置的任务，已忽略重复触发",
-                        "status": "queued_same_config",
-                        "pipeline": pipeline.get("name"),
-                        "branch": branch,
-                        "tag": first_tag,
-                        "queue_length": queue_length,
-                    }
-                )
 
-        # 基于分支的任务创建逻辑：相同分支需要排队，不同分支可以并发
-        print(
-            f"🔍 [Webhook触发] 开始基于分支的任务创建: pipeline={pipeline.get('name')}, branch={branch}, tags={tags}"
-        )
-        
-        # 检查是否有相同分支的任务在运行或排队
-        has_same_branch_task = manager.check_same_branch_task_running_or_queued(
-            pipeline_id, branch
-        )
-        
-        queued_task_ids = []
-        started_task_ids = []
-        
-        # 为每个标签创建任务
-        for tag in tags:
-            print(f"🔍 调用 pipeline_to_task_config:")
-            print(f"   - branch 参数: {branch}")
-            print(f"   - webhook_branch 参数: {webhook_branch}")
-            print(f"   - tag 参数: {tag}")
-            task_config = pipeline_to_task_config(
-                pipeline,
-                trigger_source="webhook",
-                branch=branch,
-                tag=tag,
-                webhook_branch=webhook_branch,
-                branch_tag_mapping=branch_tag_mapping,
-            )
-            print(
-                f"🔍 pipeline_to_task_config 返回的 task_config.branch: {task_config.get('branch')}"
-            )
-            
-            # 创建任务（_trigger_task_from_config 会创建 pending 状态的任务）
-            task_id = build_manager._trigger_task_from_config(task_config)
-            
-            # 根据是否有相同分支的任务来决定是否立即启动
-            if has_same_branch_task:
-                # 有相同分支的任务在运行或排队，新任务加入队列（保持 pending 状态）
-                queued_task_ids.append(task_id)
-                print(
-                    f"✅ [任务创建] 已创建排队任务: task_id={task_id[:8]}..., branch={branch}, tag={tag}"
-                )
-            else:
-                # 没有相同分支的任务，立即启动（任务会自动从 pending 转为 running）
-                started_task_ids.append(task_id)
-                print(
-                    f"✅ [任务创建] 已创建并启动任务: task_id={task_id[:8]}..., branch={branch}, tag={tag}"
-                )
-        
-        # 提取 webhook 相关信息
-        webhook_info = {
-            "branch": branch,
-            "tags": tags,  # 添加标签列表信息
-            "event": request.headers.get("x-gitee-event")
-            or request.headers.get("x-gitlab-event")
-            or request.headers.get("x-github-event", "unknown"),
-            "platform": (
-                "gitee"
-                if "x-gitee-event" in request.headers
-                else ("gitlab" if "x-gitlab-event" in request.headers else "github")
-            ),
-        }
+@router.get("/database/stats")
+async def get_database_stats():
+    """获取数据库访问统计（连接池状态、写锁等待、database is locked 重试次数）"""
+    from backend.database import get_db_stats
 
-        # 尝试从 payload 中提取更多信息
-        if payload:
-            if "commits" in payload and payload["commits"]:
-                webhook_info["commit_count"] = len(payload["commits"])
-                webhook_info["last_commit"] = (
-                    payload["commits"][0].get("message", "")[:100]
-                    if payload["commits"]
-                    else ""
-                )
-            if "repository" in payload:
-                webhook_info["repository"] = payload["repository"].get("name", "")
+    return JSONResponse(get_db_stats())
 
-        # 根据任务状态返回不同的响应
-        if queued_task_ids:
-            # 有排队任务
-            task_id = queued_task_ids[0]
-            queue_length = manager.get_queue_length(pipeline_id)
-            
-            # 记录触发并绑定任务（webhook 触发，只绑定第一个任务）
-            manager.record_trigger(
-                pipeline["pipeline_id"],
-                task_id,
-                trigger_source="webhook",
-                trigger_info=webhook_info,
-            )
 
-            # 记录操作日志
-            OperationLogger.log(
-                "webhook",
-                "pipeline_trigger",
-                {
-                    "pipeline_id": pipeline["pipeline_id"],
-                    "pipeline_name": pipeline.get("name"),
-                    "task_id": task_id,
-                    "task_ids": queued_task_ids if len(queued_task_ids) > 1 else None,
-                    "tags": tags,
-                    "branch": branch,
-                    "trigger_source": "webhook",
-                    "webhook_info": webhook_info,
-                },
-            )
-            
-            if len(tags) > 1:
-                print(
-                    f"🔔 Webhook 触发，已创建 {len(queued_task_ids)} 个任务并加入队列: pipeline={pipeline.get('name')}, branch={branch}, tags={tags}"
-                )
-            else:
-                print(
-                    f"🔔 Webhook 触发，已创建任务并加入队列: pipeline={pipeline.get('name')}, branch={branch}, tag={tags[0]}"
-                )
-            
-            return JSONResponse(
-                {
-                    "message": (
-                        f"已创建 {len(queued_task_ids)} 个任务并加入队列（相同分支任务正在执行）"
-                        if len(tags) > 1
-                        else "任务已创建并加入队列（相同分支任务正在执行）"
-                    ),
-                    "status": "queued",
-                    "task_id": task_id,
-                    "task_ids": queued_task_ids if len(queued_task_ids) > 1 else None,
-                    "queue_length": queue_length,
-                    "pipeline": pipeline.get("name"),
-                    "branch": branch,
-                    "tags": tags,
-                }
-            )
-        else:
-            # 所有任务都立即启动
-            task_id = started_task_ids[0] if started_task_ids else None
-            
-            # 记录触发并绑定任务（webhook 触发，只绑定第一个任务）
-            manager.record_trigger(
-                pipeline["pipeline_id"],
-                task_id,
-                trigger_source="webhook",
-                trigger_info=webhook_info,
-            )
+@router.get("/disk-gc/stats")
+async def get_disk_gc_stats():
+    """获取磁盘配额回收统计（回收数量、释放空间、剩余空间）"""
+    from backend.disk_gc import DiskBudgetGC
 
-            # 记录操作日志
-            OperationLogger.log(
-                "webhook",
-                "pipeline_trigger",
-                {
-                    "pipeline_id": pipeline["pipeline_id"],
-                    "pipeline_name": pipeline.get("name"),
-                    "task_id": task_id,
-                    "task_ids": started_task_ids if len(started_task_ids) > 1 else None,
-                    "tags": tags,
-                    "branch": branch,
-                    "trigger_source": "webhook",
-                    "webhook_info": webhook_info,
-                },
-            )
-            
-            if len(tags) > 1:
-                print(
-                    f"🔔 Webhook 触发，已启动 {len(started_task_ids)} 个构建任务: pipeline={pipeline.get('name')}, branch={branch}, tags={tags}"
-                )
-            else:
-                print(
-                    f"🔔 Webhook 触发，已启动构建任务: pipeline={pipeline.get('name')}, branch={branch}, tag={tags[0]}"
-                )
+    return JSONResponse(DiskBudgetGC().stats())
 
-            return JSONResponse(
-                {
-                    "message": (
-                        f"已启动 {len(started_task_ids)} 个构建任务"
-                        if len(tags) > 1
-                        else "构建任务已启动"
-                    ),
-                    "status": "started",
-                    "task_id": task_id,
-                    "task_ids": started_task_ids if len(started_task_ids) > 1 else None,
-                    "tags": tags,
-                    "pipeline": pipeline.get("name"),
-                    "branch": branch,
-                }
-            )
-    except HTTPException:
-        raise
-    except Exception as e:
-        import traceback
 
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Webhook 处理失败: {str(e)}")
+@router.get("/post-build-webhooks/stats")
+async def get_post_build_webhook_stats():
+    """获取构建后Webhook分发统计（发送中、重试、成功、失败数量）"""
+    from backend.webhook_dispatcher import PostBuildWebhookDispatcher
+
+    return JSONResponse(PostBuildWebhookDispatcher().stats())
 
 
 # === 部署配置 Webhook 触发 ===
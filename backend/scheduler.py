@@ -1,13 +1,79 @@
 # backend/scheduler.py
-"""流水线定时调度器"""
+"""
+流水线定时调度器
+到期任务保存在按执行时间排序的最小堆中，调度线程只睡眠到下一个到期任务，
+流水线新增、修改、删除时立即唤醒；主机健康检查等周期任务作为独立的定时条目，在各自的线程中执行
+"""
+import hashlib
+import heapq
+import itertools
 import threading
 import time
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Set
 from croniter import croniter
 from backend.pipeline_manager import PipelineManager
+from backend.pipeline_registry import PipelineRegistry
 from backend.handlers import BuildManager
 
+# 默认错过执行的容忍时间（秒）：延迟不超过该时间的执行视为正常触发
+DEFAULT_MISFIRE_GRACE_SECONDS = 300
+
+# 默认补偿策略：once（错过的执行补触发一次）或 skip（跳过错过的执行）
+DEFAULT_CATCH_UP = "once"
+CATCH_UP_POLICIES = ("once", "skip")
+
+# 默认最大抖动（秒）：相同 cron 表达式的流水线按 ID 分散到该范围内触发
+DEFAULT_MAX_JITTER_SECONDS = 30
+
+# 调度线程单次最长睡眠（秒），防止系统时间调整后长时间不检查
+MAX_SLEEP_SECONDS = 60
+
+JOB_PIPELINE = "pipeline"
+JOB_TIMER = "timer"
+
+
+class _CronJob:
+    """单个流水线的定时任务（预先解析好的 croniter）"""
+    
+    def __init__(self, pipeline_id: str, name: str, cron_expr: str, jitter: int):
+        self.pipeline_id = pipeline_id
+        self.name = name
+        self.cron_expr = cron_expr
+        self.jitter = jitter
+        self.next_run: Optional[datetime] = None
+        self.version = 0
+        self._iter = None
+    
+    def advance(self, after: datetime) -> datetime:
+        """计算 after 之后的下一次执行时间"""
+        if (
+            self._iter is None
+            or self.next_run is None
+            or not self.next_run <= after <= self.next_run + timedelta(hours=1)
+        ):
+            # 首次计算或间隔过久时从 after 重新定位，否则沿用迭代器顺序推进
+            self._iter = croniter(self.cron_expr, after)
+        next_run = self._iter.get_next(datetime)
+        while next_run <= after:
+            next_run = self._iter.get_next(datetime)
+        self.next_run = next_run
+        return next_run
+    
+    def due_at(self) -> float:
+        """堆中的触发时间戳（执行时间加抖动）"""
+        return self.next_run.timestamp() + self.jitter
+
+
+class _Timer:
+    """周期执行的定时条目（在独立线程中执行，上一次未结束时跳过本次）"""
+    
+    def __init__(self, name: str, interval: float, func: Callable[[], None]):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.running = False
+
 
 class PipelineScheduler:
     """流水线定时调度器"""
@@ -17,6 +83,19 @@ class PipelineScheduler:
         self.thread: Optional[threading.Thread] = None
         self.pipeline_manager = PipelineManager()
         self.build_manager = None  # 延迟初始化
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._jobs: Dict[str, _CronJob] = {}
+        # 定时任务版本号（进程内单调递增，流水线删除后重新添加也不会与旧的堆条目相同）
+        self._job_versions = itertools.count(1)
+        self._timers: Dict[str, _Timer] = {}
+        # 有变化、需要重新同步的流水线（None 表示全部）
+        self._changed: Optional[Set[str]] = set()
+        self._jobs_loaded = False
+        self.misfire_grace_seconds = DEFAULT_MISFIRE_GRACE_SECONDS
+        self.catch_up = DEFAULT_CATCH_UP
+        self.max_jitter_seconds = DEFAULT_MAX_JITTER_SECONDS
     
     def start(self):
         """启动调度器"""
@@ -24,7 +103,20 @@ class PipelineScheduler:
             print("⚠️ 调度器已在运行")
             return
         
+        self._load_settings()
+        with self._cond:
+            self._heap = []
+            self._jobs = {}
+            self._changed = None
+        self._jobs_loaded = False
         self.running = True
+        PipelineRegistry().add_listener(self._on_pipelines_changed)
+        
+        # 主机健康检查等周期任务作为独立的定时条目
+        self._add_timer("agent_hosts", 60, self._check_agent_hosts)  # 每60秒检查一次Agent主机
+        self._add_timer("portainer_hosts", 120, self._check_portainer_hosts)  # 每120秒检查一次Portainer主机（使用较长的间隔，避免频繁检测）
+        self._add_timer("docker_info", 1800, self._refresh_docker_info)  # 每30分钟刷新一次Docker信息缓存
+        
         self.thread = threading.Thread(target=self._run, daemon=True)
         self.thread.start()
         print("✅ 流水线调度器已启动")
@@ -34,106 +126,250 @@ class PipelineScheduler:
         if not self.running:
             return
         
-        self.running = False
+        PipelineRegistry().remove_listener(self._on_pipelines_changed)
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
         if self.thread:
             self.thread.join(timeout=5)
         print("✅ 流水线调度器已停止")
     
-    def _run(self):
-        """调度器主循环"""
-        last_agent_check = 0
-        agent_check_interval = 60  # 每60秒检查一次Agent主机
-        last_portainer_check = 0
-        portainer_check_interval = 120  # 每120秒检查一次Portainer主机（使用较长的间隔，避免频繁检测）
-        last_docker_refresh = 0
-        docker_refresh_interval = 1800  # 每30分钟刷新一次Docker信息缓存
+    def _load_settings(self):
+        """读取调度配置（错过执行的容忍时间、补偿策略、抖动）"""
+        try:
+            from backend.config import load_config
+            
+            settings = load_config().get("scheduler", {}) or {}
+        except Exception:
+            settings = {}
         
+        grace = settings.get("misfire_grace_seconds")
+        self.misfire_grace_seconds = max(
+            0, int(DEFAULT_MISFIRE_GRACE_SECONDS if grace is None else grace)
+        )
+        catch_up = settings.get("catch_up") or DEFAULT_CATCH_UP
+        if catch_up not in CATCH_UP_POLICIES:
+            print(f"⚠️ 未知的补偿策略 {catch_up}，使用默认策略 {DEFAULT_CATCH_UP}")
+            catch_up = DEFAULT_CATCH_UP
+        self.catch_up = catch_up
+        jitter = settings.get("max_jitter_seconds")
+        self.max_jitter_seconds = max(
+            0, int(DEFAULT_MAX_JITTER_SECONDS if jitter is None else jitter)
+        )
+    
+    def _jitter_for(self, pipeline_id: str) -> int:
+        """流水线的固定抖动秒数（按 ID 哈希，重启后保持不变）"""
+        if self.max_jitter_seconds <= 0:
+            return 0
+        digest = hashlib.md5(pipeline_id.encode("utf-8")).hexdigest()
+        return int(digest[:8], 16) % (self.max_jitter_seconds + 1)
+    
+    def _on_pipelines_changed(self, pipeline_ids: Optional[Set[str]]):
+        """流水线变更通知（在提交变更的线程中调用）：记录变化并唤醒调度线程"""
+        with self._cond:
+            if pipeline_ids is None or self._changed is None:
+                self._changed = None
+            else:
+                self._changed.update(pipeline_ids)
+            self._cond.notify_all()
+    
+    def _push(self, due: float, kind: str, key: str, version: int = 0):
+        """加入堆（调用方需持有锁）"""
+        heapq.heappush(self._heap, (due, next(self._seq), kind, key, version))
+    
+    def _add_timer(self, name: str, interval: float, func: Callable[[], None]):
+        """注册周期任务（启动后立即执行一次）"""
+        with self._cond:
+            self._timers[name] = _Timer(name, interval, func)
+            self._push(time.time(), JOB_TIMER, name)
+            self._cond.notify_all()
+    
+    def _run(self):
+        """调度器主循环：睡眠到下一个到期条目或被流水线变更唤醒"""
         while self.running:
             try:
-                self._check_pipelines()
-                
-                current_time = time.time()
+                with self._cond:
+                    changed = self._changed
+                    self._changed = set()
+                if changed is None or changed:
+                    self._sync_pipelines(changed)
                 
-                # 定期检查Agent主机离线状态
-                if current_time - last_agent_check >= agent_check_interval:
-                    self._check_agent_hosts()
-                    last_agent_check = current_time
+                with self._cond:
+                    if not self.running:
+                        break
+                    if self._changed is None or self._changed:
+                        continue
+                    now = time.time()
+                    if not self._heap or self._heap[0][0] > now:
+                        timeout = MAX_SLEEP_SECONDS
+                        if self._heap:
+                            timeout = min(timeout, self._heap[0][0] - now)
+                        self._cond.wait(timeout)
+                        continue
+                    _, _, kind, key, version = heapq.heappop(self._heap)
                 
-                # 定期检查Portainer主机状态
-                if current_time - last_portainer_check >= portainer_check_interval:
-                    self._check_portainer_hosts()
-                    last_portainer_check = current_time
-                
-                # 定期刷新Docker信息缓存
-                if current_time - last_docker_refresh >= docker_refresh_interval:
-                    self._refresh_docker_info()
-                    last_docker_refresh = current_time
+                if kind == JOB_TIMER:
+                    self._run_timer(key)
+                else:
+                    self._run_job(key, version)
             except Exception as e:
                 print(f"❌ 调度器执行出错: {e}")
                 import traceback
                 traceback.print_exc()
-            
-            # 每分钟检查一次
-            time.sleep(60)
+                time.sleep(1)
     
-    def _check_pipelines(self):
-        """检查并执行到期的流水线"""
-        now = datetime.now()
+    def _sync_pipelines(self, pipeline_ids: Optional[Set[str]]):
+        """
+        根据流水线配置同步定时任务（cron 表达式只在变化时重新校验和解析）
         
-        # 获取所有启用的流水线
-        pipelines = self.pipeline_manager.list_pipelines(enabled=True)
+        Args:
+            pipeline_ids: 需要同步的流水线ID（None 表示全部）
+        """
+        if pipeline_ids is None:
+            pipelines = {
+                p["pipeline_id"]: p
+                for p in self.pipeline_manager.list_pipelines(enabled=True)
+            }
+            pipeline_ids = set(pipelines) | set(self._jobs)
+        else:
+            pipelines = {}
+            for pipeline_id in pipeline_ids:
+                pipeline = self.pipeline_manager.get_pipeline(pipeline_id)
+                if pipeline and pipeline.get("enabled"):
+                    pipelines[pipeline_id] = pipeline
         
-        for pipeline in pipelines:
-            cron_expr = pipeline.get("cron_expression")
-            if not cron_expr:
-                continue
-            
-            pipeline_id = pipeline.get("pipeline_id")
-            
+        now = datetime.now()
+        # 仅启动后的首次加载沿用数据库中的下次执行时间（错过的执行按补偿策略处理）
+        use_stored = not self._jobs_loaded
+        for pipeline_id in pipeline_ids:
             try:
-                # 验证 cron 表达式
-                if not croniter.is_valid(cron_expr):
-                    print(f"⚠️ 流水线 {pipeline_id} 的 cron 表达式无效: {cron_expr}")
-                    continue
-                
-                # 计算下次执行时间
-                next_run = pipeline.get("next_run_time")
-                
-                if next_run is None:
-                    # 首次运行，计算下次执行时间
-                    cron = croniter(cron_expr, now)
-                    next_run_time = cron.get_next(datetime)
-                    self._update_next_run_time(pipeline_id, next_run_time)
-                    print(f"📅 流水线 {pipeline['name']} 下次执行时间: {next_run_time}")
-                    continue
-                
-                # 解析下次执行时间
-                next_run_dt = datetime.fromisoformat(next_run)
-                
-                # 检查是否到期
-                if now >= next_run_dt:
-                    print(f"🚀 触发定时流水线: {pipeline['name']}")
-                    self._trigger_pipeline(pipeline)
-                    
-                    # 计算新的下次执行时间
-                    cron = croniter(cron_expr, now)
-                    next_run_time = cron.get_next(datetime)
-                    self._update_next_run_time(pipeline_id, next_run_time)
-                    print(f"📅 流水线 {pipeline['name']} 新的下次执行时间: {next_run_time}")
-            
+                self._sync_pipeline(
+                    pipeline_id, pipelines.get(pipeline_id), now, use_stored
+                )
             except Exception as e:
                 print(f"❌ 处理流水线 {pipeline_id} 时出错: {e}")
                 import traceback
                 traceback.print_exc()
+        self._jobs_loaded = True
+    
+    def _sync_pipeline(
+        self,
+        pipeline_id: str,
+        pipeline: Optional[dict],
+        now: datetime,
+        use_stored: bool = False,
+    ):
+        """同步单个流水线的定时任务"""
+        cron_expr = (pipeline or {}).get("cron_expression")
+        job = self._jobs.get(pipeline_id)
+        
+        if not cron_expr:
+            # 流水线被删除、禁用或取消定时
+            if job:
+                with self._cond:
+                    self._jobs.pop(pipeline_id, None)
+            return
+        
+        if job and job.cron_expr == cron_expr:
+            job.name = pipeline.get("name", job.name)
+            return
+        
+        # 验证 cron 表达式
+        if not croniter.is_valid(cron_expr):
+            print(f"⚠️ 流水线 {pipeline_id} 的 cron 表达式无效: {cron_expr}")
+            if job:
+                with self._cond:
+                    self._jobs.pop(pipeline_id, None)
+            return
+        
+        new_job = _CronJob(
+            pipeline_id,
+            pipeline.get("name", "unknown"),
+            cron_expr,
+            self._jitter_for(pipeline_id),
+        )
+        
+        next_run = None
+        stored = pipeline.get("next_run_time")
+        if use_stored and not job and stored:
+            try:
+                next_run = datetime.fromisoformat(stored)
+            except (TypeError, ValueError):
+                next_run = None
+        
+        if next_run is None:
+            next_run = new_job.advance(now)
+            self._update_next_run_time(pipeline_id, next_run)
+            print(f"📅 流水线 {new_job.name} 下次执行时间: {next_run}")
+        else:
+            new_job.next_run = next_run
+        
+        with self._cond:
+            new_job.version = next(self._job_versions)
+            self._jobs[pipeline_id] = new_job
+            self._push(new_job.due_at(), JOB_PIPELINE, pipeline_id, new_job.version)
+    
+    def _run_job(self, pipeline_id: str, version: int):
+        """执行到期的流水线定时任务"""
+        with self._cond:
+            job = self._jobs.get(pipeline_id)
+            if not job or job.version != version:
+                # 过期的堆条目（流水线已修改或删除）
+                return
+        
+        now = datetime.now()
+        scheduled = job.next_run
+        late_seconds = (now - scheduled).total_seconds() - job.jitter
+        
+        pipeline = self.pipeline_manager.get_pipeline(pipeline_id)
+        if not pipeline or not pipeline.get("enabled"):
+            self._on_pipelines_changed({pipeline_id})
+            return
+        
+        if late_seconds <= self.misfire_grace_seconds:
+            print(f"🚀 触发定时流水线: {pipeline['name']}")
+            self._trigger_pipeline(pipeline)
+        elif self.catch_up == "once":
+            print(
+                f"🚀 触发定时流水线: {pipeline['name']}（补偿错过的执行，原定时间 {scheduled}）"
+            )
+            self._trigger_pipeline(pipeline)
+        else:
+            print(f"⏭️ 跳过错过的定时执行: {pipeline['name']}（原定时间 {scheduled}）")
+        
+        # 计算新的下次执行时间（跳过已错过的时间点）
+        next_run_time = job.advance(max(now, scheduled))
+        self._update_next_run_time(pipeline_id, next_run_time)
+        print(f"📅 流水线 {pipeline['name']} 新的下次执行时间: {next_run_time}")
+        
+        with self._cond:
+            if self._jobs.get(pipeline_id) is job and job.version == version:
+                self._push(job.due_at(), JOB_PIPELINE, pipeline_id, version)
+    
+    def _run_timer(self, name: str):
+        """在独立线程中执行周期任务，并安排下一次执行"""
+        with self._cond:
+            timer = self._timers.get(name)
+            if not timer:
+                return
+            self._push(time.time() + timer.interval, JOB_TIMER, name)
+            if timer.running:
+                # 上一次还未结束，跳过本次
+                return
+            timer.running = True
+        
+        def run():
+            try:
+                timer.func()
+            finally:
+                timer.running = False
+        
+        threading.Thread(target=run, daemon=True, name=f"scheduler-{name}").start()
     
     def _update_next_run_time(self, pipeline_id: str, next_run_time: datetime):
         """更新流水线的下次执行时间"""
         try:
-            pipeline = self.pipeline_manager.get_pipeline(pipeline_id)
-            if pipeline:
-                pipeline["next_run_time"] = next_run_time.isoformat()
-                # 直接保存
-                self.pipeline_manager._save_pipelines()
+            self.pipeline_manager.set_next_run_time(pipeline_id, next_run_time)
         except Exception as e:
             print(f"❌ 更新下次执行时间失败: {e}")
     
@@ -199,7 +435,7 @@ class PipelineScheduler:
                     "branch": pipeline.get("branch"),
                 }
             )
-            
+        
         except Exception as e:
             pipeline_name = pipeline.get("name", "unknown")
             print(f"❌ 触发流水线 {pipeline_name} 失败: {e}")
@@ -0,0 +1,85 @@
+# backend/session_changes.py
+"""
+会话变更分发模块
+各内存缓存/索引注册变更处理器：每次刷新时收集本事务中相关的变化，
+事务提交后分发给处理器，回滚或未提交就关闭会话时丢弃
+"""
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# session.info 中记录本事务各处理器收集的变化的键
+_SESSION_INFO_KEY = "session_changes"
+
+
+class _ChangeHandler(NamedTuple):
+    name: str
+    collect: Callable[[Session, Any], None]
+    on_commit: Callable[[Any], None]
+    factory: Callable[[], Any]
+
+
+_handlers: List[_ChangeHandler] = []
+_handlers_lock = threading.Lock()
+
+
+def register_change_handler(
+    name: str,
+    collect: Callable[[Session, Any], None],
+    on_commit: Callable[[Any], None],
+    factory: Callable[[], Any] = set,
+):
+    """
+    注册变更处理器（同名处理器只注册一次）
+
+    Args:
+        name: 处理器名称
+        collect: 每次刷新后调用 collect(session, pending)，将本次刷新的变化记入 pending
+        on_commit: 事务提交后以收集到的变化调用（没有变化时不调用）
+        factory: 创建每个事务的变化容器（默认 set）
+    """
+    with _handlers_lock:
+        if any(h.name == name for h in _handlers):
+            return
+        _handlers.append(_ChangeHandler(name, collect, on_commit, factory))
+
+
+def get_pending(session: Session, name: str) -> Any:
+    """获取会话本事务中处理器的变化容器（不存在时创建）"""
+    pending: Dict[str, Any] = session.info.setdefault(_SESSION_INFO_KEY, {})
+    if name not in pending:
+        handler = next(h for h in _handlers if h.name == name)
+        pending[name] = handler.factory()
+    return pending[name]
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    """记录本次刷新中各处理器关心的变化"""
+    for handler in _handlers:
+        handler.collect(session, get_pending(session, handler.name))
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_changes(session):
+    """事务提交后将变化分发给各处理器"""
+    pending = session.info.pop(_SESSION_INFO_KEY, None)
+    if not pending:
+        return
+    for handler in _handlers:
+        changes = pending.get(handler.name)
+        if not changes:
+            continue
+        try:
+            handler.on_commit(changes)
+        except Exception as e:
+            print(f"⚠️ 分发会话变更失败（{handler.name}）: {e}")
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_changes(session, transaction):
+    """事务结束（回滚或未提交就关闭会话）时丢弃未提交的变化"""
+    if transaction.parent is None:
+        session.info.pop(_SESSION_INFO_KEY, None)
@@ -3,11 +3,13 @@
 SSH 部署执行器
 通过 SSH 连接执行 Docker 部署
 """
-import paramiko
 import logging
-from typing import Dict, Any, Optional
+from typing import TYPE_CHECKING, Dict, Any, Optional
 from io import StringIO
 
+if TYPE_CHECKING:
+    import paramiko
+
 logger = logging.getLogger(__name__)
 
 
@@ -26,7 +28,7 @@ class SSHDeployExecutor:
         password: Optional[str] = None,
         private_key: Optional[str] = None,
         key_password: Optional[str] = None
-    ) -> paramiko.SSHClient:
+    ) -> "paramiko.SSHClient":
         """
         创建 SSH 客户端
         
@@ -41,6 +43,8 @@ class SSHDeployExecutor:
         Returns:
             SSH 客户端
         """
+        import paramiko
+
         ssh_client = paramiko.SSHClient()
         ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
         
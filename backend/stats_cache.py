@@ -8,6 +8,8 @@ from datetime import datetime, timedelta
 from typing import Dict, Optional, Tuple
 from pathlib import Path
 
+from backend import metrics
+
 
 class StatsCacheManager:
     """目录统计缓存管理器"""
@@ -198,7 +200,9 @@ class StatsCacheManager:
 
             # 检查内存缓存：如果缓存有效且不强制刷新，直接返回
             if not force_refresh and self._is_memory_cache_valid():
+                metrics.record_cache("stats_build", hit=True)
                 return self._memory_cache.copy()
+            metrics.record_cache("stats_build", hit=False)
 
             cache = self._load_cache()
             cache_time = None
@@ -322,7 +326,9 @@ class StatsCacheManager:
 
             # 检查内存缓存：如果缓存有效且不强制刷新，直接返回
             if not force_refresh and self._is_memory_cache_valid():
+                metrics.record_cache("stats_export", hit=True)
                 return self._memory_cache.copy()
+            metrics.record_cache("stats_export", hit=False)
 
             cache = self._load_cache()
             cache_time = None
@@ -418,6 +424,27 @@ class StatsCacheManager:
 
             return result
 
+    def get_items(self, stats_type: str = "build") -> Dict[str, Dict]:
+        """
+        获取每个条目的大小和修改时间（先增量刷新统计）
+
+        Args:
+            stats_type: 统计类型，"build"（按构建上下文目录）或 "export"（按文件）
+
+        Returns:
+            {相对路径: {"size": int, "mtime": float}}
+        """
+        if stats_type == "build":
+            self.get_build_dir_stats(force_refresh=True)
+        else:
+            self.get_export_dir_stats(force_refresh=True)
+        with self.lock:
+            items = self._load_cache().get("items", {})
+            return {
+                name: {"size": item.get("size", 0), "mtime": item.get("mtime", 0)}
+                for name, item in items.items()
+            }
+
     def update_cache_async(self, stats_type: str = "build"):
         """
         异步更新缓存（在后台线程中执行，带防抖机制）
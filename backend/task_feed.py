@@ -0,0 +1,323 @@
+# backend/task_feed.py
+"""
+统一任务列表
+构建任务、部署任务（tasks 表）和导出任务（export_tasks 表）按创建时间倒序合并为一个列表：
+先用 UNION ALL 在各表的 (状态/类型, created_at) 索引上各取一页任务ID，合并排序后只保留一页，
+再按ID批量加载这一页任务的摘要字段；翻页使用 (created_at, task_id) 键集游标，
+查询成本只与每页数量有关，与任务总数无关
+"""
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# 任务分类
+TASK_CATEGORIES = ("build", "deploy", "export")
+
+
+def encode_cursor(task: Dict) -> str:
+    """分页游标（上一页最后一个任务的创建时间和ID）"""
+    return f"{task['created_at']}|{task['task_id']}"
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    created_at, _, task_id = cursor.rpartition("|")
+    if not created_at or not task_id:
+        raise ValueError(f"无效的分页游标: {cursor}")
+    return datetime.fromisoformat(created_at), task_id
+
+
+def _categories(category: Optional[str], task_type: Optional[str]) -> List[str]:
+    """
+    需要查询的任务分类
+
+    task_type 兼容旧参数：deploy/export 等同于对应分类，其他值为构建任务的具体类型
+    """
+    categories = [category] if category else list(TASK_CATEGORIES)
+    if task_type in ("deploy", "export"):
+        categories = [c for c in categories if c == task_type]
+    elif task_type:
+        categories = [c for c in categories if c == "build"]
+    return [c for c in categories if c in TASK_CATEGORIES]
+
+
+def _conditions(
+    category: str,
+    status: Optional[str],
+    task_type: Optional[str],
+    start_time: Optional[datetime],
+    end_time: Optional[datetime],
+    cursor: Optional[Tuple[datetime, str]],
+):
+    """某个分类的表和过滤条件"""
+    from sqlalchemy import and_, or_
+    from backend.models import ExportTask, Task
+
+    if category == "export":
+        model = ExportTask
+        conditions = []
+    elif category == "deploy":
+        model = Task
+        conditions = [Task.task_type == "deploy"]
+    else:
+        model = Task
+        if task_type and task_type not in ("deploy", "export"):
+            conditions = [Task.task_type == task_type]
+        else:
+            conditions = [Task.task_type != "deploy"]
+
+    if status:
+        conditions.append(model.status == status)
+    if start_time:
+        conditions.append(model.created_at >= start_time)
+    if end_time:
+        conditions.append(model.created_at < end_time)
+    if cursor:
+        cursor_time, cursor_id = cursor
+        conditions.append(
+            or_(
+                model.created_at < cursor_time,
+                and_(model.created_at == cursor_time, model.task_id < cursor_id),
+            )
+        )
+    return model, conditions
+
+
+def _deploy_summary(task_config) -> Dict:
+    """部署任务的显示名称（应用名）和部署目标"""
+    summary = {}
+    if isinstance(task_config, str):
+        try:
+            task_config = json.loads(task_config)
+        except (json.JSONDecodeError, TypeError):
+            return summary
+    if not isinstance(task_config, dict):
+        return summary
+
+    targets = task_config.get("targets")
+    if targets:
+        summary["task_config"] = {"targets": targets}
+
+    config = task_config.get("config", {})
+    if isinstance(config, str):
+        try:
+            config = json.loads(config)
+        except (json.JSONDecodeError, TypeError):
+            config = {}
+    app = config.get("app", {}) if isinstance(config, dict) else {}
+    if isinstance(app, dict) and app.get("name"):
+        # 使用应用名称作为显示名称
+        summary["image"] = app.get("name")
+    return summary
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _load_summaries(db, page: List[Tuple[str, str]]) -> List[Dict]:
+    """按ID批量加载一页任务的摘要字段（保持 page 的顺序）"""
+    from backend.models import ExportTask, Pipeline, Task
+
+    task_ids = [task_id for task_id, category in page if category != "export"]
+    export_ids = [task_id for task_id, category in page if category == "export"]
+    summaries: Dict[str, Dict] = {}
+
+    if task_ids:
+        rows = db.query(
+            Task.task_id,
+            Task.task_type,
+            Task.image,
+            Task.tag,
+            Task.status,
+            Task.created_at,
+            Task.started_at,
+            Task.completed_at,
+            Task.error,
+            Task.source,
+            Task.pipeline_id,
+            Task.branch,
+            Task.trigger_source,
+            Task.task_config,
+        ).filter(Task.task_id.in_(task_ids))
+        for row in rows:
+            task_config = row.task_config if isinstance(row.task_config, dict) else {}
+            summary = {
+                "task_id": row.task_id,
+                "task_type": row.task_type,
+                "task_category": "deploy" if row.task_type == "deploy" else "build",
+                "image": row.image,
+                "tag": row.tag,
+                "status": row.status,
+                "created_at": _isoformat(row.created_at),
+                "started_at": _isoformat(row.started_at),
+                "completed_at": _isoformat(row.completed_at),
+                "error": row.error,
+                "source": row.source,
+                "pipeline_id": row.pipeline_id,
+                "branch": task_config.get("branch") or row.branch,
+                "trigger_source": row.trigger_source,
+            }
+            if row.task_type == "deploy":
+                summary.update(_deploy_summary(row.task_config))
+            else:
+                summary["selected_services"] = task_config.get("selected_services")
+                summary["push_mode"] = task_config.get("push_mode")
+            summaries[row.task_id] = summary
+
+        # 流水线名称一次查询
+        pipeline_ids = {
+            s["pipeline_id"] for s in summaries.values() if s.get("pipeline_id")
+        }
+        if pipeline_ids:
+            names = dict(
+                db.query(Pipeline.pipeline_id, Pipeline.name).filter(
+                    Pipeline.pipeline_id.in_(pipeline_ids)
+                )
+            )
+            for summary in summaries.values():
+                if summary.get("pipeline_id") in names:
+                    summary["pipeline_name"] = names[summary["pipeline_id"]]
+
+    if export_ids:
+        rows = db.query(
+            ExportTask.task_id,
+            ExportTask.task_type,
+            ExportTask.image,
+            ExportTask.tag,
+            ExportTask.compress,
+            ExportTask.registry,
+            ExportTask.use_local,
+            ExportTask.status,
+            ExportTask.file_size,
+            ExportTask.source,
+            ExportTask.created_at,
+            ExportTask.completed_at,
+            ExportTask.error,
+        ).filter(ExportTask.task_id.in_(export_ids))
+        for row in rows:
+            summaries[row.task_id] = {
+                "task_id": row.task_id,
+                "task_type": row.task_type,
+                "task_category": "export",
+                "image": row.image,
+                "tag": row.tag,
+                "compress": row.compress,
+                "registry": row.registry,
+                "use_local": row.use_local,
+                "status": row.status,
+                "file_size": row.file_size,
+                "source": row.source,
+                "created_at": _isoformat(row.created_at),
+                "completed_at": _isoformat(row.completed_at),
+                "error": row.error,
+            }
+
+    # 两次查询之间被删除的任务直接跳过
+    return [summaries[task_id] for task_id, _ in page if task_id in summaries]
+
+
+def query_task_feed(
+    limit: int = 20,
+    status: Optional[str] = None,
+    category: Optional[str] = None,
+    task_type: Optional[str] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    offset: int = 0,
+) -> Dict:
+    """
+    按创建时间倒序查询任务摘要
+
+    Args:
+        limit: 返回条数
+        status: 过滤任务状态
+        category: 过滤任务分类（build/deploy/export）
+        task_type: 过滤任务类型（兼容旧参数，见 _categories）
+        start_time: 创建时间起点（包含）
+        end_time: 创建时间终点（不包含）
+        cursor: 上一页返回的 next_cursor（键集分页，不需要 offset）
+        offset: 偏移量（没有 cursor 时的页码分页）
+
+    Returns:
+        {"tasks": [...], "next_cursor": str 或 None}
+    """
+    from sqlalchemy import literal, select, union_all
+    from backend.database import get_db_session
+
+    categories = _categories(category, task_type)
+    if not categories:
+        return {"tasks": [], "next_cursor": None}
+    keyset = _decode_cursor(cursor) if cursor else None
+    if keyset:
+        offset = 0
+    # 每个分类最多需要 offset + limit 条，多取一条判断是否还有下一页
+    fetch = offset + limit + 1
+
+    branches = []
+    for name in categories:
+        model, conditions = _conditions(
+            name, status, task_type, start_time, end_time, keyset
+        )
+        branch = (
+            select(
+                model.task_id.label("task_id"),
+                model.created_at.label("created_at"),
+                literal(name).label("category"),
+            )
+            .where(*conditions)
+            .order_by(model.created_at.desc(), model.task_id.desc())
+            .limit(fetch)
+            .subquery()
+        )
+        branches.append(select(branch))
+
+    merged = (union_all(*branches) if len(branches) > 1 else branches[0]).subquery()
+    stmt = (
+        select(merged.c.task_id, merged.c.created_at, merged.c.category)
+        .order_by(merged.c.created_at.desc(), merged.c.task_id.desc())
+        .offset(offset)
+        .limit(limit + 1)
+    )
+
+    db = get_db_session()
+    try:
+        rows = db.execute(stmt).all()
+        page = rows[:limit]
+        tasks = _load_summaries(db, [(row.task_id, row.category) for row in page])
+    finally:
+        db.close()
+
+    next_cursor = None
+    if len(rows) > limit and page[-1].created_at:
+        last = page[-1]
+        next_cursor = encode_cursor(
+            {"created_at": last.created_at.isoformat(), "task_id": last.task_id}
+        )
+    return {"tasks": tasks, "next_cursor": next_cursor}
+
+
+def count_task_feed(
+    status: Optional[str] = None,
+    category: Optional[str] = None,
+    task_type: Optional[str] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+) -> int:
+    """统计任务数量（页码分页显示总数时使用，键集分页不需要）"""
+    from sqlalchemy import func, select
+    from backend.database import get_db_session
+
+    db = get_db_session()
+    try:
+        total = 0
+        for name in _categories(category, task_type):
+            model, conditions = _conditions(
+                name, status, task_type, start_time, end_time, None
+            )
+            total += db.execute(
+                select(func.count()).select_from(model).where(*conditions)
+            ).scalar()
+        return total
+    finally:
+        db.close()
@@ -0,0 +1,291 @@
+# backend/template_index.py
+"""
+模板目录索引
+内存中保存每个模板的路径、项目类型、内容、内容哈希以及解析出的模板参数和服务阶段；
+模板增删改接口写入文件后调用 invalidate()，外部对目录的修改通过目录 mtime 检测，
+只重新扫描发生变化的目录、只重新读取发生变化的文件
+"""
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# 两次检查目录 mtime 的最小间隔（秒），间隔内的读取不访问磁盘
+DIR_CHECK_INTERVAL = 5
+
+TEMPLATE_SUFFIX = ".Dockerfile"
+
+# 未指定项目类型时按此顺序查找模板（与 get_template_path 一致）
+DEFAULT_PROJECT_TYPES = ["jar", "nodejs", "python", "go", "rust", "web"]
+
+
+class _TemplateFile:
+    """单个模板文件（内容与解析结果）"""
+
+    def __init__(self, path: str, stat: os.stat_result, content: str):
+        self.path = path
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+        self.updated_at = datetime.fromtimestamp(stat.st_mtime).isoformat()
+        self.content = content
+        self.content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        self._parsed: Optional[Dict] = None
+
+    def parsed(self) -> Dict:
+        """解析模板参数和服务阶段（首次访问时解析，内容不变则复用）"""
+        if self._parsed is None:
+            from backend.handlers import parse_dockerfile_services
+            from backend.template_parser import parse_template_variables
+
+            services, global_param_names = parse_dockerfile_services(self.content)
+            self._parsed = {
+                "variables": parse_template_variables(self.content),
+                "services": services,
+                "global_param_names": set(global_param_names),
+            }
+        return self._parsed
+
+
+class TemplateIndex:
+    """模板目录索引（内置模板 + 用户自定义模板）"""
+
+    _instance = None
+    _lock = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._lock = threading.RLock()
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        """初始化索引"""
+        # 目录 -> (mtime_ns, [模板文件路径（listdir 顺序）], [子目录（listdir 顺序）])
+        self._dirs: Dict[str, Tuple[int, List[str], List[str]]] = {}
+        self._files: Dict[str, _TemplateFile] = {}
+        self._templates: Optional[Dict[str, Dict]] = None
+        self._details: Optional[List[Dict]] = None
+        self._dirty_paths = set()
+        self._last_check = 0.0
+        self._force_check = True
+
+    def _base_dirs(self) -> List[Tuple[str, str]]:
+        from backend.handlers import BUILTIN_TEMPLATES_DIR, USER_TEMPLATES_DIR
+
+        # 先内置模板，再用户自定义模板（会覆盖同名内置模板）
+        return [(BUILTIN_TEMPLATES_DIR, "builtin"), (USER_TEMPLATES_DIR, "user")]
+
+    def _scan_dir(self, dir_path: str, mtime_ns: int, with_subdirs: bool):
+        """重新扫描目录（调用方需持有锁），未变化的文件沿用已读取的内容"""
+        files = []
+        subdirs = []
+        for f in os.listdir(dir_path):
+            path = os.path.join(dir_path, f)
+            if f.endswith(TEMPLATE_SUFFIX):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                cached = self._files.get(path)
+                if (
+                    cached is None
+                    or path in self._dirty_paths
+                    or cached.mtime_ns != stat.st_mtime_ns
+                    or cached.size != stat.st_size
+                ):
+                    try:
+                        with open(path, "r", encoding="utf-8") as fp:
+                            content = fp.read()
+                    except (OSError, UnicodeDecodeError) as e:
+                        print(f"⚠️ 读取模板失败 {path}: {e}")
+                        continue
+                    self._files[path] = _TemplateFile(path, stat, content)
+                files.append(path)
+            elif with_subdirs and os.path.isdir(path):
+                # 跳过隐藏目录和特殊目录
+                if not (f.startswith(".") or f.startswith("_")):
+                    subdirs.append(path)
+        self._dirs[dir_path] = (mtime_ns, files, subdirs)
+
+    def _refresh(self):
+        """检查目录变化并增量更新（调用方需持有锁）"""
+        now = time.monotonic()
+        if not self._force_check and now - self._last_check < DIR_CHECK_INTERVAL:
+            return
+        self._last_check = now
+        self._force_check = False
+
+        dirty_dirs = {os.path.dirname(p) for p in self._dirty_paths}
+        changed = False
+        seen_dirs = set()
+
+        def check(dir_path: str, with_subdirs: bool):
+            nonlocal changed
+            seen_dirs.add(dir_path)
+            try:
+                mtime_ns = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                if self._dirs.pop(dir_path, None) is not None:
+                    changed = True
+                return
+            state = self._dirs.get(dir_path)
+            if state is None or state[0] != mtime_ns or dir_path in dirty_dirs:
+                self._scan_dir(dir_path, mtime_ns, with_subdirs)
+                changed = True
+            if with_subdirs:
+                for subdir in self._dirs[dir_path][2]:
+                    check(subdir, False)
+
+        for base_dir, _ in self._base_dirs():
+            check(base_dir, True)
+
+        # 清理已删除目录和文件
+        for dir_path in list(self._dirs):
+            if dir_path not in seen_dirs:
+                del self._dirs[dir_path]
+                changed = True
+        live_files = {p for state in self._dirs.values() for p in state[1]}
+        for path in list(self._files):
+            if path not in live_files:
+                del self._files[path]
+
+        self._dirty_paths = set()
+        if changed:
+            self._templates = None
+            self._details = None
+
+    def _build_templates(self) -> Dict[str, Dict]:
+        """按扫描顺序合并模板（调用方需持有锁），与原 get_all_templates 结果一致"""
+        templates = {}
+        for base_dir, template_type in self._base_dirs():
+            state = self._dirs.get(base_dir)
+            if state is None:
+                continue
+
+            # 根目录的模板（向后兼容）：从文件名推断项目类型
+            for path in state[1]:
+                name = os.path.basename(path)[: -len(TEMPLATE_SUFFIX)]
+                templates[name] = {
+                    "name": name,
+                    "path": path,
+                    "type": template_type,
+                    "project_type": "nodejs" if "node" in name.lower() else "jar",
+                }
+
+            # 子目录（项目类型目录）
+            for subdir in state[2]:
+                sub_state = self._dirs.get(subdir)
+                if sub_state is None:
+                    continue
+                project_type = os.path.basename(subdir)
+                for path in sub_state[1]:
+                    name = os.path.basename(path)[: -len(TEMPLATE_SUFFIX)]
+                    templates[name] = {
+                        "name": name,
+                        "path": path,
+                        "type": template_type,
+                        "project_type": project_type,
+                    }
+        return templates
+
+    def _get_templates(self) -> Dict[str, Dict]:
+        """调用方需持有锁"""
+        self._refresh()
+        if self._templates is None:
+            self._templates = self._build_templates()
+        return self._templates
+
+    def get_templates(self) -> Dict[str, Dict]:
+        """获取所有模板 {名称: {name, path, type, project_type}}，用户模板优先"""
+        with self._lock:
+            return {name: dict(info) for name, info in self._get_templates().items()}
+
+    def get_details(self) -> List[Dict]:
+        """获取模板列表详情（按名称自然排序）"""
+        with self._lock:
+            templates = self._get_templates()
+            if self._details is None:
+                from backend.handlers import natural_sort_key
+
+                details = []
+                for name, info in templates.items():
+                    file = self._files.get(info["path"])
+                    if file is None:
+                        continue
+                    details.append(
+                        {
+                            "name": name,
+                            "filename": os.path.basename(info["path"]),
+                            "size": file.size,
+                            "updated_at": file.updated_at,
+                            "type": info["type"],  # 'builtin' 或 'user'
+                            "project_type": info.get("project_type", "jar"),
+                            "editable": info["type"] == "user",  # 只有用户模板可编辑
+                        }
+                    )
+                details.sort(key=lambda item: natural_sort_key(item["name"]))
+                self._details = details
+            return [dict(item) for item in self._details]
+
+    def get_content(self, path: str) -> Optional[str]:
+        """获取模板内容（不在索引中时返回 None）"""
+        with self._lock:
+            self._refresh()
+            file = self._files.get(path)
+            return file.content if file else None
+
+    def get_parsed(self, path: str) -> Optional[Dict]:
+        """
+        获取模板的解析结果
+
+        Returns:
+            {"variables", "services", "global_param_names", "content_hash"}，不在索引中时返回 None
+        """
+        with self._lock:
+            self._refresh()
+            file = self._files.get(path)
+            if file is None:
+                return None
+            parsed = file.parsed()
+            return {
+                "variables": [dict(v) for v in parsed["variables"]],
+                "services": [dict(s) for s in parsed["services"]],
+                "global_param_names": set(parsed["global_param_names"]),
+                "content_hash": file.content_hash,
+            }
+
+    def resolve_path(
+        self, template_name: str, project_type: Optional[str] = None
+    ) -> Optional[str]:
+        """按 get_template_path 的查找顺序在索引中查找模板路径"""
+        from backend.handlers import BUILTIN_TEMPLATES_DIR, USER_TEMPLATES_DIR
+
+        filename = f"{template_name}{TEMPLATE_SUFFIX}"
+        candidates = []
+        for ptype in [project_type] if project_type else DEFAULT_PROJECT_TYPES:
+            candidates.append(os.path.join(USER_TEMPLATES_DIR, ptype, filename))
+            candidates.append(os.path.join(BUILTIN_TEMPLATES_DIR, ptype, filename))
+        # 根目录（向后兼容）
+        candidates.append(os.path.join(USER_TEMPLATES_DIR, filename))
+        candidates.append(os.path.join(BUILTIN_TEMPLATES_DIR, filename))
+
+        with self._lock:
+            self._refresh()
+            for path in candidates:
+                if path in self._files:
+                    return path
+        return None
+
+    def invalidate(self, *paths: str):
+        """
+        模板文件被写入或删除后调用，下次读取时立即检查目录并重新读取这些文件
+
+        Args:
+            paths: 被修改的模板文件路径（为空时只强制检查目录）
+        """
+        with self._lock:
+            self._dirty_paths.update(p for p in paths if p)
+            self._force_check = True
@@ -0,0 +1,182 @@
+# backend/template_renderer.py
+"""
+字符串模板渲染引擎
+Webhook 请求体（{name}）和部署配置（{{ name }}）共用：模板只编译一次为片段列表，
+按模板内容缓存，渲染时单次拼接；支持嵌套键（app.name）和转义（\\{{ name }} 输出原文）；
+上下文中不存在的变量保留原样
+"""
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+# 编译结果缓存数量
+TEMPLATE_CACHE_SIZE = 512
+
+# 变量名：字母/下划线开头，可用 . 分隔嵌套键（数字段表示列表下标）
+_NAME = r"[A-Za-z_][\w]*(?:\.\w+)*"
+
+# 模板语法：(占位符正则, 转义后输出的原文前缀)
+_SYNTAXES = {
+    # {{ name }}（部署配置）
+    "double": re.compile(r"(\\)?\{\{\s*(" + _NAME + r")\s*\}\}"),
+    # {name}（Webhook 请求体）
+    "single": re.compile(r"(\\)?\{(" + _NAME + r")\}"),
+}
+
+# 值转义方式
+_ESCAPERS: Dict[str, Callable[[str], str]] = {
+    # 嵌入 JSON 字符串时转义引号、反斜杠和控制字符
+    "json": lambda value: json.dumps(value, ensure_ascii=False)[1:-1],
+}
+
+_MISSING = object()
+
+
+def _lookup(context: Dict[str, Any], name: str, path: Tuple[str, ...]) -> Any:
+    """查找变量值（优先完整键名，其次按 . 逐级查找）"""
+    if name in context:
+        return context[name]
+    if len(path) == 1:
+        return _MISSING
+    value: Any = context
+    for part in path:
+        if isinstance(value, dict):
+            if part not in value:
+                return _MISSING
+            value = value[part]
+        elif isinstance(value, (list, tuple)) and part.isdigit():
+            index = int(part)
+            if index >= len(value):
+                return _MISSING
+            value = value[index]
+        else:
+            return _MISSING
+    return value
+
+
+class CompiledTemplate:
+    """编译后的模板：文本片段与变量片段交替的列表"""
+
+    __slots__ = ("source", "segments", "variables")
+
+    def __init__(self, source: str, syntax: str):
+        self.source = source
+        # str 为原文片段，(变量名, 路径, 占位符原文) 为变量片段
+        self.segments: List[Union[str, Tuple[str, Tuple[str, ...], str]]] = []
+        self.variables: List[str] = []
+
+        pattern = _SYNTAXES[syntax]
+        pos = 0
+        text: List[str] = []
+        for match in pattern.finditer(source):
+            text.append(source[pos : match.start()])
+            pos = match.end()
+            escaped, name = match.group(1), match.group(2)
+            if escaped:
+                # 转义的占位符输出去掉反斜杠后的原文
+                text.append(match.group(0)[1:])
+                continue
+            if text:
+                self.segments.append("".join(text))
+                text = []
+            self.segments.append((name, tuple(name.split(".")), match.group(0)))
+            if name not in self.variables:
+                self.variables.append(name)
+        text.append(source[pos:])
+        tail = "".join(text)
+        if tail:
+            self.segments.append(tail)
+
+    def render(
+        self,
+        context: Dict[str, Any],
+        none_as: str = "",
+        escape: Optional[Union[str, Callable[[str], str]]] = None,
+    ) -> str:
+        """
+        单次渲染
+
+        Args:
+            context: 变量上下文
+            none_as: 值为 None 时输出的文本
+            escape: 值的转义方式（"json" 或自定义函数），None 表示不转义
+        """
+        escaper = _ESCAPERS[escape] if isinstance(escape, str) else escape
+        parts = []
+        for segment in self.segments:
+            if isinstance(segment, str):
+                parts.append(segment)
+                continue
+            name, path, placeholder = segment
+            value = _lookup(context, name, path)
+            if value is _MISSING:
+                parts.append(placeholder)
+                continue
+            value = none_as if value is None else str(value)
+            parts.append(escaper(value) if escaper else value)
+        return "".join(parts)
+
+
+_cache: "OrderedDict[Tuple[str, str], CompiledTemplate]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def compile_template(template: str, syntax: str = "double") -> CompiledTemplate:
+    """
+    编译模板（按语法和模板内容缓存）
+
+    Args:
+        template: 模板字符串
+        syntax: "double"（{{ name }}）或 "single"（{name}）
+    """
+    if syntax not in _SYNTAXES:
+        raise ValueError(f"不支持的模板语法: {syntax}")
+    key = (syntax, template)
+    with _cache_lock:
+        compiled = _cache.get(key)
+        if compiled is not None:
+            _cache.move_to_end(key)
+            return compiled
+
+    compiled = CompiledTemplate(template, syntax)
+    with _cache_lock:
+        _cache[key] = compiled
+        if len(_cache) > TEMPLATE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return compiled
+
+
+def render(
+    template: str,
+    context: Dict[str, Any],
+    syntax: str = "double",
+    none_as: str = "",
+    escape: Optional[Union[str, Callable[[str], str]]] = None,
+) -> str:
+    """
+    渲染模板字符串
+
+    Args:
+        template: 模板字符串
+        context: 变量上下文
+        syntax: "double"（{{ name }}）或 "single"（{name}）
+        none_as: 值为 None 时输出的文本
+        escape: 值的转义方式（"json" 或自定义函数），None 表示不转义
+
+    Returns:
+        渲染后的字符串
+    """
+    if not isinstance(template, str) or not template:
+        return template
+    # 不含占位符的模板直接返回，不占用缓存
+    if "{" not in template:
+        return template
+    return compile_template(template, syntax).render(context, none_as, escape)
+
+
+def clear_cache():
+    """清空编译缓存"""
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,461 @@
+# backend/webhook_dispatcher.py
+"""
+构建后 Webhook 通知分发
+每条通知先持久化到 webhook_notifications 表，再由独立事件循环线程并发发送：
+所有通知共享一个 httpx.AsyncClient（连接复用），同一主机的并发数受限；
+失败的通知按指数退避重试，服务重启后未完成的通知会重新调度；
+调用方只写入数据库即返回，慢接收方不会阻塞其他通知或流水线队列
+"""
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+# 默认分发策略
+DEFAULT_POST_BUILD_WEBHOOK = {
+    "timeout": 10.0,  # 单次请求超时（秒）
+    "max_attempts": 5,  # 最多尝试次数（含首次）
+    "backoff_base_seconds": 5,  # 第 n 次重试等待 base * 2^(n-1) 秒
+    "backoff_max_seconds": 600,  # 重试等待上限
+    "per_host_limit": 4,  # 同一主机的最大并发请求数
+    "max_connections": 100,  # 连接池最大连接数
+    "history_days": 30,  # 通知记录保留天数
+}
+
+# 已结束的通知状态
+FINISHED_STATUSES = ("succeeded", "failed")
+
+
+def get_dispatch_policy() -> Dict:
+    """读取分发策略（config.yml 中的 post_build_webhook 节，缺省项使用默认值）"""
+    policy = dict(DEFAULT_POST_BUILD_WEBHOOK)
+    try:
+        from backend.config import load_config
+
+        policy.update(load_config().get("post_build_webhook") or {})
+    except Exception as e:
+        print(f"⚠️ 读取构建后Webhook配置失败，使用默认值: {e}")
+    return policy
+
+
+class PostBuildWebhookDispatcher:
+    """构建后 Webhook 通知分发器"""
+
+    _instance = None
+    _lock = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._lock = threading.Lock()
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        """初始化分发器"""
+        self._policy = get_dispatch_policy()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        # 事件循环就绪（_loop 已设置）后置位，每次启动重新创建
+        self._ready = threading.Event()
+        self._client = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        # 已调度（等待发送或正在发送）的通知ID，避免重复调度
+        self._scheduled = set()
+        self._stats = {
+            "dispatched": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retries": 0,
+            "in_flight": 0,
+        }
+
+    # ============ 生命周期 ============
+
+    def start(self):
+        """启动事件循环线程，并恢复未完成的通知（其他线程正在启动时等待其就绪）"""
+        with self._lock:
+            ready = self._ready
+            started = self._thread is not None
+            if not started:
+                self._policy = get_dispatch_policy()
+                self._ready = ready = threading.Event()
+                self._thread = threading.Thread(
+                    target=self._run_loop,
+                    args=(ready,),
+                    daemon=True,
+                    name="post-build-webhook",
+                )
+                self._thread.start()
+        ready.wait(timeout=10)
+        if started:
+            return
+
+        self._prune_history()
+        self._recover()
+        print("✅ 构建后Webhook分发器已启动")
+
+    def _run_loop(self, ready: threading.Event):
+        import httpx
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        policy = self._policy
+        self._client = httpx.AsyncClient(
+            timeout=policy["timeout"],
+            limits=httpx.Limits(
+                max_connections=policy["max_connections"],
+                max_keepalive_connections=max(1, policy["max_connections"] // 4),
+            ),
+        )
+        self._loop = loop
+        ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            loop.run_until_complete(self._client.aclose())
+            loop.close()
+
+    def stop(self):
+        """停止分发（未完成的通知保留在数据库中，下次启动时继续）"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = None
+            self._thread = None
+            self._scheduled = set()
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+        if thread is not None:
+            thread.join(timeout=5)
+        self._host_semaphores = {}
+
+    def _ensure_started(self):
+        """确保事件循环已启动并就绪"""
+        self.start()
+
+    # ============ 分发 ============
+
+    def dispatch(
+        self,
+        pipeline_id: str,
+        task_id: Optional[str],
+        webhooks: List[Dict],
+    ) -> List[int]:
+        """
+        持久化并调度一次构建的所有通知（立即返回，不等待发送）
+
+        Args:
+            pipeline_id: 流水线ID
+            task_id: 任务ID
+            webhooks: [{"index", "url", "method", "headers", "body"}]
+
+        Returns:
+            通知记录ID列表
+        """
+        from backend.database import get_db_session
+        from backend.models import WebhookNotification
+
+        if not webhooks:
+            return []
+        self._ensure_started()
+
+        now = datetime.now()
+        db = get_db_session()
+        try:
+            records = [
+                WebhookNotification(
+                    pipeline_id=pipeline_id,
+                    task_id=task_id,
+                    webhook_index=webhook.get("index", 0),
+                    url=webhook["url"],
+                    method=(webhook.get("method") or "POST").upper(),
+                    headers=webhook.get("headers") or {},
+                    body=webhook.get("body"),
+                    status="pending",
+                    attempts=0,
+                    max_attempts=self._policy["max_attempts"],
+                    next_attempt_at=now,
+                    created_at=now,
+                )
+                for webhook in webhooks
+            ]
+            db.add_all(records)
+            db.commit()
+            record_ids = [record.id for record in records]
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        with self._lock:
+            self._stats["dispatched"] += len(record_ids)
+        for record_id in record_ids:
+            self._schedule(record_id, 0)
+        return record_ids
+
+    def _schedule(self, record_id: int, delay: float):
+        """调度通知在 delay 秒后发送（线程安全）"""
+        with self._lock:
+            loop = self._loop
+            if loop is None:
+                # 事件循环未就绪或已停止，通知保留为 pending，下次启动时由 _recover 恢复
+                print(f"⚠️ Webhook 分发器未运行，通知 {record_id} 将在下次启动时发送")
+                return
+            if record_id in self._scheduled:
+                return
+            self._scheduled.add(record_id)
+
+        def fire():
+            asyncio.ensure_future(self._deliver(record_id))
+
+        loop.call_soon_threadsafe(loop.call_later, max(0.0, delay), fire)
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        """同一主机共享的并发限制（只在事件循环线程中调用）"""
+        host = urlsplit(url).netloc.lower()
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(max(1, int(self._policy["per_host_limit"])))
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    async def _deliver(self, record_id: int):
+        """发送一条通知并记录结果，失败时按退避重新调度"""
+        from backend.webhook_trigger import trigger_webhook
+
+        loop = asyncio.get_running_loop()
+        retry_delay = None
+        try:
+            record = await loop.run_in_executor(None, self._load, record_id)
+            if record is None or record["status"] in FINISHED_STATUSES:
+                return
+
+            with self._lock:
+                self._stats["in_flight"] += 1
+            try:
+                async with self._host_semaphore(record["url"]):
+                    result = await trigger_webhook(
+                        record["url"],
+                        record["method"],
+                        record["headers"],
+                        record["body"],
+                        timeout=self._policy["timeout"],
+                        client=self._client,
+                    )
+            finally:
+                with self._lock:
+                    self._stats["in_flight"] -= 1
+
+            retry_delay = await loop.run_in_executor(
+                None, self._record_result, record_id, result
+            )
+        except Exception as e:
+            # 数据库暂时不可用等异常，稍后重试（尝试次数不变）
+            print(f"⚠️ 构建后Webhook发送异常: id={record_id}, error={e}")
+            retry_delay = self._policy["backoff_base_seconds"]
+        finally:
+            with self._lock:
+                self._scheduled.discard(record_id)
+
+        if retry_delay is not None:
+            self._schedule(record_id, retry_delay)
+
+    def _load(self, record_id: int) -> Optional[Dict]:
+        from backend.database import get_db_session
+        from backend.models import WebhookNotification
+
+        db = get_db_session()
+        try:
+            record = db.get(WebhookNotification, record_id)
+            return self._to_dict(record) if record else None
+        finally:
+            db.close()
+
+    def _backoff(self, attempts: int) -> float:
+        """第 attempts 次失败后的重试等待时间"""
+        base = self._policy["backoff_base_seconds"]
+        return min(self._policy["backoff_max_seconds"], base * (2 ** (attempts - 1)))
+
+    def _record_result(self, record_id: int, result: Dict) -> Optional[float]:
+        """
+        保存发送结果
+
+        Returns:
+            需要重试时返回等待秒数，否则返回 None
+        """
+        from backend.database import get_db_session
+        from backend.models import WebhookNotification
+
+        now = datetime.now()
+        db = get_db_session()
+        try:
+            record = db.get(WebhookNotification, record_id)
+            if record is None:
+                return None
+            record.attempts = (record.attempts or 0) + 1
+            record.last_status_code = result.get("status_code")
+            record.response_text = (result.get("response_text") or "")[:500]
+            retry_delay = None
+            if result.get("success"):
+                record.status = "succeeded"
+                record.last_error = None
+                record.next_attempt_at = None
+                record.finished_at = now
+            elif record.attempts < (record.max_attempts or 1):
+                retry_delay = self._backoff(record.attempts)
+                record.status = "retrying"
+                record.last_error = result.get("error") or (
+                    f"HTTP {result.get('status_code')}"
+                )
+                record.next_attempt_at = now + timedelta(seconds=retry_delay)
+            else:
+                record.status = "failed"
+                record.last_error = result.get("error") or (
+                    f"HTTP {result.get('status_code')}"
+                )
+                record.next_attempt_at = None
+                record.finished_at = now
+            db.commit()
+
+            with self._lock:
+                if record.status == "succeeded":
+                    self._stats["succeeded"] += 1
+                elif record.status == "failed":
+                    self._stats["failed"] += 1
+                else:
+                    self._stats["retries"] += 1
+
+            if record.status == "succeeded":
+                print(
+                    f"✅ 构建后Webhook发送成功: url={record.url}, status_code={record.last_status_code}"
+                )
+            else:
+                print(
+                    f"❌ 构建后Webhook发送失败（第 {record.attempts}/{record.max_attempts} 次）: "
+                    f"url={record.url}, error={record.last_error}"
+                    + (
+                        f"，{retry_delay:.0f}秒后重试"
+                        if retry_delay is not None
+                        else ""
+                    )
+                )
+            return retry_delay
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    # ============ 恢复与清理 ============
+
+    def _recover(self):
+        """重新调度未完成的通知（服务重启后）"""
+        from backend.database import get_db_session
+        from backend.models import WebhookNotification
+
+        db = get_db_session()
+        try:
+            rows = (
+                db.query(WebhookNotification.id, WebhookNotification.next_attempt_at)
+                .filter(WebhookNotification.status.in_(("pending", "retrying")))
+                .all()
+            )
+        finally:
+            db.close()
+
+        now = datetime.now()
+        for record_id, next_attempt_at in rows:
+            delay = (next_attempt_at - now).total_seconds() if next_attempt_at else 0
+            self._schedule(record_id, delay)
+        if rows:
+            print(f"🔄 已恢复 {len(rows)} 条未完成的构建后Webhook通知")
+
+    def _prune_history(self):
+        """清理过期的已结束通知记录"""
+        from backend.database import get_db_session
+        from backend.models import WebhookNotification
+
+        cutoff = datetime.now() - timedelta(days=self._policy["history_days"])
+        db = get_db_session()
+        try:
+            removed = (
+                db.query(WebhookNotification)
+                .filter(
+                    WebhookNotification.status.in_(FINISHED_STATUSES),
+                    WebhookNotification.created_at < cutoff,
+                )
+                .delete(synchronize_session=False)
+            )
+            db.commit()
+            if removed:
+                print(f"🧹 已清理 {removed} 条过期的构建后Webhook通知记录")
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ 清理构建后Webhook通知记录失败: {e}")
+        finally:
+            db.close()
+
+    # ============ 查询 ============
+
+    @staticmethod
+    def _to_dict(record) -> Dict:
+        return {
+            "id": record.id,
+            "pipeline_id": record.pipeline_id,
+            "task_id": record.task_id,
+            "webhook_index": record.webhook_index,
+            "url": record.url,
+            "method": record.method,
+            "headers": record.headers or {},
+            "body": record.body,
+            "status": record.status,
+            "attempts": record.attempts or 0,
+            "max_attempts": record.max_attempts,
+            "next_attempt_at": (
+                record.next_attempt_at.isoformat() if record.next_attempt_at else None
+            ),
+            "last_status_code": record.last_status_code,
+            "last_error": record.last_error,
+            "response_text": record.response_text,
+            "created_at": record.created_at.isoformat() if record.created_at else None,
+            "finished_at": (
+                record.finished_at.isoformat() if record.finished_at else None
+            ),
+        }
+
+    def history(self, pipeline_id: str, limit: int = 50) -> List[Dict]:
+        """流水线的通知历史（按创建时间倒序，不含请求头和请求体）"""
+        from backend.database import get_db_session
+        from backend.models import WebhookNotification
+
+        db = get_db_session()
+        try:
+            records = (
+                db.query(WebhookNotification)
+                .filter(WebhookNotification.pipeline_id == pipeline_id)
+                .order_by(
+                    WebhookNotification.created_at.desc(),
+                    WebhookNotification.id.desc(),
+                )
+                .limit(limit)
+                .all()
+            )
+            result = []
+            for record in records:
+                item = self._to_dict(record)
+                item.pop("headers")
+                item.pop("body")
+                result.append(item)
+            return result
+        finally:
+            db.close()
+
+    def stats(self) -> Dict:
+        """分发统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["scheduled"] = len(self._scheduled)
+            stats["running"] = self._loop is not None
+            return stats
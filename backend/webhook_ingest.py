@@ -0,0 +1,970 @@
+# backend/webhook_ingest.py
+"""
+Webhook 异步接收队列
+接口只负责验证签名并持久化原始投递（按投递ID幂等），立即返回 202；
+后台工作线程按流水线顺序处理投递（同一流水线串行、不同流水线并发），
+服务重启后未处理完的投递会重新入队
+"""
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional, Tuple
+
+from backend.pipeline_manager import PipelineManager
+
+# 默认工作线程数
+DEFAULT_WEBHOOK_WORKERS = 4
+
+# 已处理投递记录的保留天数
+WEBHOOK_DELIVERY_RETENTION_DAYS = 7
+
+# 清理过期投递记录的间隔（秒）
+PRUNE_INTERVAL_SECONDS = 3600
+
+# 延迟统计保留的最近样本数
+LATENCY_SAMPLE_SIZE = 500
+
+# 平台投递ID请求头（按优先级）：只有平台为每次投递生成的ID才用于去重
+DELIVERY_ID_HEADERS = (
+    "x-github-delivery",
+    "x-gitlab-event-uuid",
+    "x-gitee-delivery",
+)
+
+# 不持久化的请求头（签名、令牌等敏感信息）
+SENSITIVE_HEADERS = (
+    "x-hub-signature",
+    "x-hub-signature-256",
+    "x-gitlab-token",
+    "x-gitee-token",
+    "authorization",
+    "cookie",
+)
+
+
+def get_delivery_id(headers: Dict[str, str], body: bytes) -> str:
+    """
+    获取投递ID
+
+    平台重发同一投递时ID不变，按该ID去重；没有平台投递ID的请求（手动调用、通用 Webhook）
+    每次生成新的ID，内容相同的请求也会分别处理
+    """
+    for name in DELIVERY_ID_HEADERS:
+        value = headers.get(name)
+        if value:
+            return value[:128]
+    return f"local:{uuid.uuid4().hex}"
+
+
+def _percentile(samples: List[float], percent: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+    return ordered[index]
+
+
+class WebhookIngestQueue:
+    """Webhook 异步接收队列"""
+
+    _instance = None
+    _lock = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._lock = threading.Lock()
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        """初始化队列"""
+        self._cond = threading.Condition(self._lock)
+        # 每个流水线的待处理投递（记录ID）
+        self._pipeline_queues: Dict[str, Deque[int]] = {}
+        # 有待处理投递且当前没有工作线程在处理的流水线
+        self._ready: Deque[str] = deque()
+        self._active_pipelines = set()
+        self._workers: List[threading.Thread] = []
+        self._prune_thread: Optional[threading.Thread] = None
+        self._prune_stop = threading.Event()
+        self._running = False
+        self._stats = {
+            "received": 0,
+            "duplicates": 0,
+            "completed": 0,
+            "failed": 0,
+        }
+        self._wait_samples: Deque[float] = deque(maxlen=LATENCY_SAMPLE_SIZE)
+        self._process_samples: Deque[float] = deque(maxlen=LATENCY_SAMPLE_SIZE)
+
+    def start(self, workers: Optional[int] = None):
+        """启动工作线程，并恢复未处理完的投递"""
+        if workers is None:
+            try:
+                from backend.config import load_config
+
+                workers = (
+                    load_config().get("webhook", {}).get("workers")
+                    or DEFAULT_WEBHOOK_WORKERS
+                )
+            except Exception:
+                workers = DEFAULT_WEBHOOK_WORKERS
+
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+
+        self._prune_deliveries()
+        self._recover_deliveries()
+
+        for i in range(max(1, int(workers))):
+            thread = threading.Thread(
+                target=self._worker_loop, daemon=True, name=f"webhook-worker-{i}"
+            )
+            thread.start()
+            self._workers.append(thread)
+        self._prune_stop.clear()
+        self._prune_thread = threading.Thread(
+            target=self._prune_loop, daemon=True, name="webhook-delivery-prune"
+        )
+        self._prune_thread.start()
+        print(f"✅ Webhook 接收队列已启动（{len(self._workers)} 个工作线程）")
+
+    def stop(self):
+        """停止工作线程（未处理的投递保留在数据库中，下次启动时继续处理）"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._prune_stop.set()
+        for thread in self._workers:
+            thread.join(timeout=5)
+        self._workers = []
+        if self._prune_thread:
+            self._prune_thread.join(timeout=5)
+            self._prune_thread = None
+
+    def _schedule(self, pipeline_id: str, record_id: int):
+        """将投递加入流水线队列（调用方需持有锁）"""
+        queue = self._pipeline_queues.setdefault(pipeline_id, deque())
+        queue.append(record_id)
+        if pipeline_id not in self._active_pipelines and pipeline_id not in self._ready:
+            self._ready.append(pipeline_id)
+        self._cond.notify()
+
+    def enqueue(
+        self, pipeline_id: str, delivery_id: str, headers: Dict[str, str], body: bytes
+    ) -> Tuple[Dict, bool]:
+        """
+        持久化投递并加入队列
+
+        Args:
+            pipeline_id: 流水线ID
+            delivery_id: 投递ID
+            headers: 请求头
+            body: 原始请求体
+
+        Returns:
+            (投递信息, 是否为重复投递)
+        """
+        from sqlalchemy.exc import IntegrityError
+        from backend.database import get_db_session
+        from backend.models import WebhookDelivery
+
+        safe_headers = {
+            k.lower(): v
+            for k, v in headers.items()
+            if k.lower() not in SENSITIVE_HEADERS
+        }
+
+        db = get_db_session()
+        try:
+            existing = (
+                db.query(WebhookDelivery)
+                .filter(
+                    WebhookDelivery.pipeline_id == pipeline_id,
+                    WebhookDelivery.delivery_id == delivery_id,
+                )
+                .first()
+            )
+            if existing:
+                with self._lock:
+                    self._stats["duplicates"] += 1
+                return self._to_dict(existing), True
+
+            delivery = WebhookDelivery(
+                delivery_id=delivery_id,
+                pipeline_id=pipeline_id,
+                headers=safe_headers,
+                body=body.decode("utf-8", errors="replace"),
+                status="pending",
+                received_at=datetime.now(),
+            )
+            db.add(delivery)
+            try:
+                db.commit()
+            except IntegrityError:
+                # 并发的重复投递
+                db.rollback()
+                existing = (
+                    db.query(WebhookDelivery)
+                    .filter(
+                        WebhookDelivery.pipeline_id == pipeline_id,
+                        WebhookDelivery.delivery_id == delivery_id,
+                    )
+                    .first()
+                )
+                with self._lock:
+                    self._stats["duplicates"] += 1
+                return self._to_dict(existing), True
+
+            result = self._to_dict(delivery)
+        finally:
+            db.close()
+
+        with self._cond:
+            self._stats["received"] += 1
+            # 队列未启动时只持久化，启动时由 _recover_deliveries 统一入队
+            if self._running:
+                self._schedule(pipeline_id, result["id"])
+        return result, False
+
+    def _to_dict(self, delivery) -> Dict:
+        return {
+            "id": delivery.id,
+            "delivery_id": delivery.delivery_id,
+            "pipeline_id": delivery.pipeline_id,
+            "status": delivery.status,
+            "result": delivery.result,
+            "error": delivery.error,
+            "received_at": (
+                delivery.received_at.isoformat() if delivery.received_at else None
+            ),
+            "started_at": (
+                delivery.started_at.isoformat() if delivery.started_at else None
+            ),
+            "finished_at": (
+                delivery.finished_at.isoformat() if delivery.finished_at else None
+            ),
+        }
+
+    def get_delivery(self, pipeline_id: str, delivery_id: str) -> Optional[Dict]:
+        """查询投递处理状态"""
+        from backend.database import get_db_session
+        from backend.models import WebhookDelivery
+
+        db = get_db_session()
+        try:
+            delivery = (
+                db.query(WebhookDelivery)
+                .filter(
+                    WebhookDelivery.pipeline_id == pipeline_id,
+                    WebhookDelivery.delivery_id == delivery_id,
+                )
+                .first()
+            )
+            return self._to_dict(delivery) if delivery else None
+        finally:
+            db.close()
+
+    def _recover_deliveries(self):
+        """恢复服务重启前未处理完的投递（按接收顺序重新入队）"""
+        from backend.database import get_db_session
+        from backend.models import WebhookDelivery
+
+        db = get_db_session()
+        try:
+            deliveries = (
+                db.query(WebhookDelivery.id, WebhookDelivery.pipeline_id)
+                .filter(WebhookDelivery.status.in_(("pending", "processing")))
+                .order_by(WebhookDelivery.received_at.asc(), WebhookDelivery.id.asc())
+                .all()
+            )
+        except Exception as e:
+            print(f"⚠️ 恢复未处理的 Webhook 投递失败: {e}")
+            return
+        finally:
+            db.close()
+
+        if not deliveries:
+            return
+        with self._cond:
+            for record_id, pipeline_id in deliveries:
+                self._schedule(pipeline_id, record_id)
+        print(f"🔄 已恢复 {len(deliveries)} 个未处理的 Webhook 投递")
+
+    def _prune_deliveries(self):
+        """清理过期的已处理投递记录"""
+        from backend.database import get_db_session
+        from backend.models import WebhookDelivery
+
+        cutoff = datetime.now() - timedelta(days=WEBHOOK_DELIVERY_RETENTION_DAYS)
+        db = get_db_session()
+        try:
+            removed = (
+                db.query(WebhookDelivery)
+                .filter(
+                    WebhookDelivery.status.in_(("completed", "failed")),
+                    WebhookDelivery.received_at < cutoff,
+                )
+                .delete(synchronize_session=False)
+            )
+            db.commit()
+            if removed:
+                print(f"🧹 已清理 {removed} 条过期的 Webhook 投递记录")
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ 清理 Webhook 投递记录失败: {e}")
+        finally:
+            db.close()
+
+    def _prune_loop(self):
+        """定期清理过期的投递记录"""
+        while not self._prune_stop.wait(PRUNE_INTERVAL_SECONDS):
+            self._prune_deliveries()
+
+    def _next(self) -> Optional[Tuple[str, int]]:
+        """取出下一个可处理的投递（同一流水线同时只有一个工作线程处理）"""
+        with self._cond:
+            while self._running and not self._ready:
+                self._cond.wait()
+            if not self._running:
+                return None
+            pipeline_id = self._ready.popleft()
+            record_id = self._pipeline_queues[pipeline_id].popleft()
+            self._active_pipelines.add(pipeline_id)
+            return pipeline_id, record_id
+
+    def _done(self, pipeline_id: str):
+        """流水线的当前投递处理完成，继续调度其余投递"""
+        with self._cond:
+            self._active_pipelines.discard(pipeline_id)
+            queue = self._pipeline_queues.get(pipeline_id)
+            if queue:
+                self._ready.append(pipeline_id)
+                self._cond.notify()
+            else:
+                self._pipeline_queues.pop(pipeline_id, None)
+
+    def _worker_loop(self):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            pipeline_id, record_id = item
+            try:
+                self._process(record_id)
+            except Exception as e:
+                print(f"❌ 处理 Webhook 投递异常 (id={record_id}): {e}")
+                import traceback
+
+                traceback.print_exc()
+            finally:
+                self._done(pipeline_id)
+
+    def _process(self, record_id: int):
+        """处理单个投递并记录结果"""
+        from backend.database import get_db_session
+        from backend.models import WebhookDelivery
+
+        db = get_db_session()
+        try:
+            delivery = (
+                db.query(WebhookDelivery)
+                .filter(WebhookDelivery.id == record_id)
+                .first()
+            )
+            if not delivery or delivery.status in ("completed", "failed"):
+                return
+            delivery.status = "processing"
+            delivery.started_at = datetime.now()
+            db.commit()
+
+            pipeline_id = delivery.pipeline_id
+            delivery_id = delivery.delivery_id
+            headers = dict(delivery.headers or {})
+            body = (delivery.body or "").encode("utf-8")
+            wait_seconds = (delivery.started_at - delivery.received_at).total_seconds()
+        finally:
+            db.close()
+
+        start_time = time.time()
+        result = None
+        error = None
+        try:
+            pipeline = PipelineManager().get_pipeline(pipeline_id)
+            if not pipeline:
+                error = "流水线不存在"
+            elif not pipeline.get("enabled", False):
+                result = {
+                    "message": "流水线已禁用，已忽略触发",
+                    "pipeline": pipeline.get("name"),
+                    "ignored": True,
+                }
+            else:
+                result = process_webhook_delivery(pipeline, body, headers)
+                if result.get("error"):
+                    error = result.get("message") or result["error"]
+        except Exception as e:
+            import traceback
+
+            traceback.print_exc()
+            error = f"Webhook 处理失败: {str(e)}"
+        process_seconds = time.time() - start_time
+
+        db = get_db_session()
+        try:
+            delivery = (
+                db.query(WebhookDelivery)
+                .filter(WebhookDelivery.id == record_id)
+                .first()
+            )
+            if delivery:
+                delivery.status = "failed" if error else "completed"
+                delivery.result = result
+                delivery.error = error
+                delivery.finished_at = datetime.now()
+                db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ 保存 Webhook 投递结果失败 (id={record_id}): {e}")
+        finally:
+            db.close()
+
+        with self._lock:
+            self._stats["failed" if error else "completed"] += 1
+            self._wait_samples.append(wait_seconds)
+            self._process_samples.append(process_seconds)
+
+        status_icon = "❌" if error else "✅"
+        print(
+            f"{status_icon} Webhook 投递处理完成: delivery_id={delivery_id}, "
+            f"排队 {wait_seconds:.2f}s, 处理 {process_seconds:.2f}s"
+            + (f", 错误: {error}" if error else "")
+        )
+
+    def stats(self) -> Dict:
+        """队列状态（深度、处理延迟）"""
+        with self._lock:
+            depth = sum(len(q) for q in self._pipeline_queues.values())
+            wait_samples = list(self._wait_samples)
+            process_samples = list(self._process_samples)
+            return {
+                "running": self._running,
+                "workers": len(self._workers),
+                "depth": depth,
+                "processing": len(self._active_pipelines),
+                "pipelines_waiting": len(self._ready),
+                **self._stats,
+                "wait_seconds": {
+                    "avg": (
+                        round(sum(wait_samples) / len(wait_samples), 3)
+                        if wait_samples
+                        else 0.0
+                    ),
+                    "p95": round(_percentile(wait_samples, 95), 3),
+                },
+                "process_seconds": {
+                    "avg": (
+                        round(sum(process_samples) / len(process_samples), 3)
+                        if process_samples
+                        else 0.0
+                    ),
+                    "p95": round(_percentile(process_samples, 95), 3),
+                },
+            }
+
+
+def process_webhook_delivery(
+    pipeline: dict, body: bytes, headers: Dict[str, str]
+) -> Dict:
+    """
+    处理一次 Webhook 投递：解析负载、确定分支和标签、重复检查并创建构建任务
+
+    Args:
+        pipeline: 流水线配置
+        body: 原始请求体
+        headers: 请求头（名称为小写）
+
+    Returns:
+        处理结果（包含 error 字段时表示投递无法触发构建）
+    """
+    from backend.handlers import BuildManager, OperationLogger
+
+    manager = PipelineManager()
+
+    # 解析 Webhook 负载（尝试解析 JSON）
+    try:
+        payload = json.loads(body.decode("utf-8"))
+    except:
+        payload = {}
+
+    # 提取分支信息（不同平台格式不同）
+    webhook_branch = None
+
+    # 首先尝试从 ref 字段提取分支（最可靠的方式）
+    if "ref" in payload:
+        ref = payload["ref"]
+        print(f"🔍 Webhook ref 字段: {ref}")
+
+        # 处理分支引用：refs/heads/branch_name
+        if ref.startswith("refs/heads/"):
+            webhook_branch = ref.replace("refs/heads/", "")
+            print(f"✅ 从 refs/heads/ 提取分支: {webhook_branch}")
+        # 处理标签引用：refs/tags/tag_name（应该忽略）
+        elif ref.startswith("refs/tags/"):
+            print("⚠️ 检测到标签推送 (refs/tags/)，忽略此 webhook 触发")
+            return {
+                "message": "标签推送事件，已忽略触发",
+                "pipeline": pipeline.get("name"),
+                "ref": ref,
+                "ignored": True,
+            }
+        # GitLab: ref = main (可能已经是分支名，不包含 refs/ 前缀)
+        elif not ref.startswith("refs/"):
+            webhook_branch = ref
+            print(f"✅ 从 ref 直接提取分支（GitLab格式）: {webhook_branch}")
+
+    # 如果从 ref 字段提取失败，尝试从合并请求/拉取请求中提取目标分支
+    if not webhook_branch:
+        # Gitee/GitHub: 从 pull_request 字段提取目标分支
+        if "pull_request" in payload:
+            pr = payload["pull_request"]
+            # Gitee/GitHub: base.ref 是目标分支
+            if "base" in pr and "ref" in pr["base"]:
+                webhook_branch = pr["base"]["ref"]
+                print(f"✅ 从 pull_request.base.ref 提取目标分支: {webhook_branch}")
+        # GitLab: 从 merge_request 字段提取目标分支
+        elif "merge_request" in payload:
+            mr = payload["merge_request"]
+            # GitLab: target_branch 是目标分支
+            if "target_branch" in mr:
+                webhook_branch = mr["target_branch"]
+                print(
+                    f"✅ 从 merge_request.target_branch 提取目标分支: {webhook_branch}"
+                )
+
+    # 记录提取结果
+    if webhook_branch:
+        print(f"📌 成功提取的 webhook_branch: {webhook_branch}")
+    else:
+        print("⚠️ 未能从 payload 中提取分支信息")
+        print(f"   可用的 payload 字段: {list(payload.keys())}")
+
+    # 统一分支策略处理（与手动触发保持一致）
+    # 支持新的webhook_branch_strategy字段，同时兼容旧的webhook_branch_filter和webhook_use_push_branch字段
+    webhook_branch_strategy = pipeline.get("webhook_branch_strategy")
+    webhook_allowed_branches = pipeline.get("webhook_allowed_branches", [])
+    webhook_branch_filter = pipeline.get("webhook_branch_filter", False)
+    webhook_use_push_branch = pipeline.get("webhook_use_push_branch", True)
+    configured_branch = pipeline.get("branch")
+
+    # 如果没有新策略字段，根据旧字段推断策略
+    if not webhook_branch_strategy:
+        if webhook_allowed_branches and len(webhook_allowed_branches) > 0:
+            webhook_branch_strategy = "select_branches"
+        elif webhook_branch_filter:
+            webhook_branch_strategy = "filter_match"
+        elif webhook_use_push_branch:
+            webhook_branch_strategy = "use_push"
+        else:
+            webhook_branch_strategy = "use_configured"
+
+    # 调试信息：输出配置值
+    print("🔍 Webhook 分支配置:")
+    print(f"   - webhook_branch_strategy: {webhook_branch_strategy}")
+    print(f"   - webhook_allowed_branches: {webhook_allowed_branches}")
+    print(f"   - configured_branch: {configured_branch}")
+    print(f"   - webhook_branch: {webhook_branch}")
+
+    # 根据分支策略确定使用的分支（统一逻辑）
+    # 重要：对于 webhook 触发，如果成功提取了 webhook_branch，应该优先使用它
+    branch = None
+
+    if webhook_branch_strategy == "select_branches":
+        # 选择分支触发策略：只允许匹配的分支触发
+        if webhook_branch:
+            if webhook_branch in webhook_allowed_branches:
+                branch = webhook_branch
+                print(f"✅ 分支在允许列表中，使用推送分支: {branch}")
+            else:
+                print(
+                    f"⚠️ 分支不在允许列表中，忽略触发: webhook_branch={webhook_branch}, allowed={webhook_allowed_branches}"
+                )
+                return {
+                    "message": f"分支不在允许列表中，已忽略触发（推送分支: {webhook_branch}）",
+                    "pipeline": pipeline.get("name"),
+                    "webhook_branch": webhook_branch,
+                    "allowed_branches": webhook_allowed_branches,
+                    "ignored": True,
+                }
+        else:
+            # Webhook未提供分支信息，使用配置的分支
+            branch = configured_branch
+            print(f"⚠️ Webhook未提供分支信息，使用配置分支: {branch}")
+    elif webhook_branch_strategy == "filter_match":
+        # 只允许匹配分支触发：检查推送分支是否匹配配置分支
+        if webhook_branch:
+            if webhook_branch == configured_branch:
+                branch = webhook_branch
+                print(f"✅ 分支匹配，使用推送分支: {branch}")
+            else:
+                print(
+                    f"⚠️ 分支不匹配，忽略触发: webhook_branch={webhook_branch}, configured={configured_branch}"
+                )
+                return {
+                    "message": f"分支不匹配，已忽略触发（推送分支: {webhook_branch}, 配置分支: {configured_branch}）",
+                    "pipeline": pipeline.get("name"),
+                    "webhook_branch": webhook_branch,
+                    "configured_branch": configured_branch,
+                    "ignored": True,
+                }
+        else:
+            # Webhook未提供分支信息，使用配置的分支
+            branch = configured_branch
+            print(f"⚠️ Webhook未提供分支信息，使用配置分支: {branch}")
+    elif webhook_branch_strategy == "use_push":
+        # 使用推送分支构建：必须使用webhook推送的分支
+        if webhook_branch:
+            branch = webhook_branch
+            print(f"✅ 使用推送分支构建: {branch}")
+        else:
+            # Webhook未提供分支信息，对于 use_push 策略应该报错而不是回退
+            print("❌ use_push 策略要求 webhook 提供分支信息，但提取失败")
+            return {
+                "message": "无法触发构建：use_push 策略要求 webhook 提供分支信息，但未能从 payload 中提取分支",
+                "pipeline": pipeline.get("name"),
+                "error": "missing_webhook_branch",
+                "strategy": "use_push",
+            }
+    else:  # use_configured
+        # 使用配置分支构建：但如果 webhook 成功提取了分支，优先使用 webhook 分支
+        # 这样可以确保从 test 合并到 master 时，使用的是 master 而不是配置的 test
+        if webhook_branch:
+            branch = webhook_branch
+            print(
+                f"✅ use_configured 策略：检测到 webhook 分支，优先使用推送分支: {branch}"
+            )
+            print(
+                f"   配置的分支 ({configured_branch}) 将被忽略，因为 webhook 明确推送到了 {webhook_branch}"
+            )
+        else:
+            # Webhook未提供分支信息，使用配置的分支
+            branch = configured_branch
+            print(f"✅ 使用配置分支构建: {branch}")
+
+    # 如果最终没有确定分支，报错
+    if not branch:
+        print(f"❌ 无法触发构建: pipeline={pipeline.get('name')}, 无法确定分支")
+        return {
+            "message": "无法触发构建：无法确定分支",
+            "pipeline": pipeline.get("name"),
+            "error": "missing_branch",
+        }
+
+    # 根据推送的分支查找对应的标签（分支标签映射应该基于推送的分支，而不是用于构建的分支）
+    branch_tag_mapping = pipeline.get("branch_tag_mapping", {})
+    default_tag = pipeline.get("tag", "latest")  # 默认标签
+
+    # 调试信息：输出最终确定的分支（详细总结）
+    print("📊 分支确定总结:")
+    print(f"   - 原始 ref 字段: {payload.get('ref', 'N/A')}")
+    print(f"   - 提取的 webhook_branch: {webhook_branch}")
+    print(f"   - 配置的 configured_branch: {configured_branch}")
+    print(f"   - 分支策略: {webhook_branch_strategy}")
+    print(f"   - 最终使用的 branch: {branch}")
+    if webhook_branch and branch != webhook_branch:
+        print(
+            f"   ⚠️ 警告：最终使用的分支 ({branch}) 与 webhook 推送的分支 ({webhook_branch}) 不一致！"
+        )
+    elif webhook_branch and branch == webhook_branch:
+        print("   ✅ 确认：最终使用的分支与 webhook 推送的分支一致")
+
+    # 使用webhook推送的分支来查找标签映射（如果有的话）
+    branch_for_tag_mapping = webhook_branch if webhook_branch else branch
+
+    # 获取标签列表（支持单个标签或多个标签）
+    tags = [default_tag]  # 默认只有一个标签
+
+    if branch_for_tag_mapping and branch_tag_mapping:
+        mapped_tag_value = None
+        # 优先精确匹配
+        if branch_for_tag_mapping in branch_tag_mapping:
+            mapped_tag_value = branch_tag_mapping[branch_for_tag_mapping]
+        else:
+            # 尝试通配符匹配（如 feature/* -> feature）
+            import fnmatch
+
+            for pattern, mapped_tag in branch_tag_mapping.items():
+                if fnmatch.fnmatch(branch_for_tag_mapping, pattern):
+                    mapped_tag_value = mapped_tag
+                    break
+
+        # 处理标签值（支持字符串、数组或逗号分隔的字符串）
+        if mapped_tag_value:
+            if isinstance(mapped_tag_value, list):
+                # 如果是数组，直接使用
+                tags = mapped_tag_value
+            elif isinstance(mapped_tag_value, str):
+                # 如果是字符串，检查是否包含逗号
+                if "," in mapped_tag_value:
+                    # 逗号分隔的多个标签
+                    tags = [t.strip() for t in mapped_tag_value.split(",") if t.strip()]
+                else:
+                    # 单个标签
+                    tags = [mapped_tag_value]
+
+    # 为每个标签创建任务
+    from backend.handlers import pipeline_to_task_config
+
+    build_manager = BuildManager()
+    pipeline_id = pipeline["pipeline_id"]
+
+    # 生成第一个标签的任务配置（用于综合检查）
+    # 如果多个标签，使用第一个标签的配置进行检查
+    first_tag = tags[0] if tags else None
+    if first_tag:
+        print(
+            f"🔍 [Webhook触发] 开始综合检查: pipeline={pipeline.get('name')}, branch={branch}, tag={first_tag}"
+        )
+        first_task_config = pipeline_to_task_config(
+            pipeline,
+            trigger_source="webhook",
+            branch=branch,
+            tag=first_tag,
+            webhook_branch=webhook_branch,
+            branch_tag_mapping=branch_tag_mapping,
+        )
+        print(
+            f"🔍 [Webhook触发] 任务配置已生成: pipeline_id={pipeline_id[:8]}..., branch={first_task_config.get('branch')}, tag={first_task_config.get('tag')}"
+        )
+
+        # 使用综合检查方法统一检查防抖、运行中任务和队列
+        duplicate_result = manager.check_duplicate_task(
+            pipeline_id, first_task_config, debounce_seconds=3
+        )
+
+        if duplicate_result == "debounced":
+            # 防抖时间内的相同配置，直接屏蔽
+            print(
+                f"🚫 流水线 {pipeline.get('name')} 触发被屏蔽（3秒内相同信息）: branch={branch}, tag={first_tag}"
+            )
+            return {
+                "message": "触发过于频繁，相同信息的触发已被屏蔽（3秒内）",
+                "status": "debounced",
+                "pipeline": pipeline.get("name"),
+                "branch": branch,
+                "tag": first_tag,
+            }
+        elif duplicate_result == "running_same_config":
+            # 运行中的任务也是相同配置，直接返回排队状态，不创建新任务
+            current_task_id = manager.get_pipeline_running_task(pipeline_id)
+            queue_length = manager.get_queue_length(pipeline_id)
+            print(
+                f"🚫 流水线 {pipeline.get('name')} 触发被屏蔽（运行中的任务也是相同配置）: branch={branch}, tag={first_tag}, current_task_id={current_task_id[:8] if current_task_id else 'None'}..."
+            )
+            return {
+                "message": "运行中的任务也是相同配置，已忽略重复触发",
+                "status": "running_same_config",
+                "pipeline": pipeline.get("name"),
+                "branch": branch,
+                "tag": first_tag,
+                "current_task_id": current_task_id,
+                "queue_length": queue_length,
+            }
+        elif duplicate_result == "queued_same_config":
+            # 队列中已有相同配置的任务，直接返回，不创建新任务
+            queue_length = manager.get_queue_length(pipeline_id)
+            print(
+                f"🚫 流水线 {pipeline.get('name')} 触发被屏蔽（队列中已有相同配置的任务）: branch={branch}, tag={first_tag}"
+            )
+            return {
+                "message": "队列中已有相同配置的任务，已忽略重复触发",
+                "status": "queued_same_config",
+                "pipeline": pipeline.get("name"),
+                "branch": branch,
+                "tag": first_tag,
+                "queue_length": queue_length,
+            }
+
+    # 基于分支的任务创建逻辑：相同分支需要排队，不同分支可以并发
+    print(
+        f"🔍 [Webhook触发] 开始基于分支的任务创建: pipeline={pipeline.get('name')}, branch={branch}, tags={tags}"
+    )
+
+    # 检查是否有相同分支的任务在运行或排队
+    has_same_branch_task = manager.check_same_branch_task_running_or_queued(
+        pipeline_id, branch
+    )
+
+    queued_task_ids = []
+    started_task_ids = []
+
+    # 为每个标签创建任务
+    for tag in tags:
+        print("🔍 调用 pipeline_to_task_config:")
+        print(f"   - branch 参数: {branch}")
+        print(f"   - webhook_branch 参数: {webhook_branch}")
+        print(f"   - tag 参数: {tag}")
+        task_config = pipeline_to_task_config(
+            pipeline,
+            trigger_source="webhook",
+            branch=branch,
+            tag=tag,
+            webhook_branch=webhook_branch,
+            branch_tag_mapping=branch_tag_mapping,
+        )
+        print(
+            f"🔍 pipeline_to_task_config 返回的 task_config.branch: {task_config.get('branch')}"
+        )
+
+        # 创建任务（_trigger_task_from_config 会创建 pending 状态的任务）
+        task_id = build_manager._trigger_task_from_config(task_config)
+
+        # 根据是否有相同分支的任务来决定是否立即启动
+        if has_same_branch_task:
+            # 有相同分支的任务在运行或排队，新任务加入队列（保持 pending 状态）
+            queued_task_ids.append(task_id)
+            print(
+                f"✅ [任务创建] 已创建排队任务: task_id={task_id[:8]}..., branch={branch}, tag={tag}"
+            )
+        else:
+            # 没有相同分支的任务，立即启动（任务会自动从 pending 转为 running）
+            started_task_ids.append(task_id)
+            print(
+                f"✅ [任务创建] 已创建并启动任务: task_id={task_id[:8]}..., branch={branch}, tag={tag}"
+            )
+
+    # 提取 webhook 相关信息
+    webhook_info = {
+        "branch": branch,
+        "tags": tags,  # 添加标签列表信息
+        "event": headers.get("x-gitee-event")
+        or headers.get("x-gitlab-event")
+        or headers.get("x-github-event", "unknown"),
+        "platform": (
+            "gitee"
+            if "x-gitee-event" in headers
+            else ("gitlab" if "x-gitlab-event" in headers else "github")
+        ),
+    }
+
+    # 尝试从 payload 中提取更多信息
+    if payload:
+        if "commits" in payload and payload["commits"]:
+            webhook_info["commit_count"] = len(payload["commits"])
+            webhook_info["last_commit"] = (
+                payload["commits"][0].get("message", "")[:100]
+                if payload["commits"]
+                else ""
+            )
+        if "repository" in payload:
+            webhook_info["repository"] = payload["repository"].get("name", "")
+
+    # 根据任务状态返回不同的响应
+    if queued_task_ids:
+        # 有排队任务
+        task_id = queued_task_ids[0]
+        queue_length = manager.get_queue_length(pipeline_id)
+
+        # 记录触发并绑定任务（webhook 触发，只绑定第一个任务）
+        manager.record_trigger(
+            pipeline["pipeline_id"],
+            task_id,
+            trigger_source="webhook",
+            trigger_info=webhook_info,
+        )
+
+        # 记录操作日志
+        OperationLogger.log(
+            "webhook",
+            "pipeline_trigger",
+            {
+                "pipeline_id": pipeline["pipeline_id"],
+                "pipeline_name": pipeline.get("name"),
+                "task_id": task_id,
+                "task_ids": queued_task_ids if len(queued_task_ids) > 1 else None,
+                "tags": tags,
+                "branch": branch,
+                "trigger_source": "webhook",
+                "webhook_info": webhook_info,
+            },
+        )
+
+        if len(tags) > 1:
+            print(
+                f"🔔 Webhook 触发，已创建 {len(queued_task_ids)} 个任务并加入队列: pipeline={pipeline.get('name')}, branch={branch}, tags={tags}"
+            )
+        else:
+            print(
+                f"🔔 Webhook 触发，已创建任务并加入队列: pipeline={pipeline.get('name')}, branch={branch}, tag={tags[0]}"
+            )
+
+        return {
+            "message": (
+                f"已创建 {len(queued_task_ids)} 个任务并加入队列（相同分支任务正在执行）"
+                if len(tags) > 1
+                else "任务已创建并加入队列（相同分支任务正在执行）"
+            ),
+            "status": "queued",
+            "task_id": task_id,
+            "task_ids": queued_task_ids if len(queued_task_ids) > 1 else None,
+            "queue_length": queue_length,
+            "pipeline": pipeline.get("name"),
+            "branch": branch,
+            "tags": tags,
+        }
+    else:
+        # 所有任务都立即启动
+        task_id = started_task_ids[0] if started_task_ids else None
+
+        # 记录触发并绑定任务（webhook 触发，只绑定第一个任务）
+        manager.record_trigger(
+            pipeline["pipeline_id"],
+            task_id,
+            trigger_source="webhook",
+            trigger_info=webhook_info,
+        )
+
+        # 记录操作日志
+        OperationLogger.log(
+            "webhook",
+            "pipeline_trigger",
+            {
+                "pipeline_id": pipeline["pipeline_id"],
+                "pipeline_name": pipeline.get("name"),
+                "task_id": task_id,
+                "task_ids": started_task_ids if len(started_task_ids) > 1 else None,
+                "tags": tags,
+                "branch": branch,
+                "trigger_source": "webhook",
+                "webhook_info": webhook_info,
+            },
+        )
+
+        if len(tags) > 1:
+            print(
+                f"🔔 Webhook 触发，已启动 {len(started_task_ids)} 个构建任务: pipeline={pipeline.get('name')}, branch={branch}, tags={tags}"
+            )
+        else:
+            print(
+                f"🔔 Webhook 触发，已启动构建任务: pipeline={pipeline.get('name')}, branch={branch}, tag={tags[0]}"
+            )
+
+        return {
+            "message": (
+                f"已启动 {len(started_task_ids)} 个构建任务"
+                if len(tags) > 1
+                else "构建任务已启动"
+            ),
+            "status": "started",
+            "task_id": task_id,
+            "task_ids": started_task_ids if len(started_task_ids) > 1 else None,
+            "tags": tags,
+            "pipeline": pipeline.get("name"),
+            "branch": branch,
+        }
@@ -15,6 +15,7 @@ async def trigger_webhook(
     headers: Optional[Dict[str, str]] = None,
     body: Optional[str] = None,
     timeout: float = 10.0,
+    client: Optional[httpx.AsyncClient] = None,
 ) -> Dict[str, Any]:
     """
     触发 Webhook HTTP 请求
@@ -25,6 +26,7 @@ async def trigger_webhook(
         headers: 请求头（可选）
         body: 请求体（可选）
         timeout: 超时时间（秒）
+        client: 共享的 HTTP 客户端（复用连接，不传时为本次请求创建临时客户端）
 
     Returns:
         包含 success, status_code, response_text 的字典
@@ -35,25 +37,30 @@ async def trigger_webhook(
         if headers:
             request_headers.update(headers)
 
+        if method.upper() not in ("POST", "PUT", "PATCH"):
+            logger.warning(f"不支持的HTTP方法: {method}，使用POST")
+            method = "POST"
+
         # 发送HTTP请求
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            if method.upper() == "POST":
-                response = await client.post(url, headers=request_headers, content=body)
-            elif method.upper() == "PUT":
-                response = await client.put(url, headers=request_headers, content=body)
-            elif method.upper() == "PATCH":
-                response = await client.patch(
-                    url, headers=request_headers, content=body
+        if client is not None:
+            response = await client.request(
+                method.upper(),
+                url,
+                headers=request_headers,
+                content=body,
+                timeout=timeout,
+            )
+        else:
+            async with httpx.AsyncClient(timeout=timeout) as temp_client:
+                response = await temp_client.request(
+                    method.upper(), url, headers=request_headers, content=body
                 )
-            else:
-                logger.warning(f"不支持的HTTP方法: {method}，使用POST")
-                response = await client.post(url, headers=request_headers, content=body)
-
-            return {
-                "success": response.status_code < 400,
-                "status_code": response.status_code,
-                "response_text": response.text[:500],  # 限制响应文本长度
-            }
+
+        return {
+            "success": response.status_code < 400,
+            "status_code": response.status_code,
+            "response_text": response.text[:500],  # 限制响应文本长度
+        }
     except httpx.TimeoutException:
         logger.error(f"Webhook 请求超时: {url}")
         return {
@@ -80,25 +87,49 @@ async def trigger_webhook(
         }
 
 
-def render_template(template: str, context: Dict[str, Any]) -> str:
+def render_template(
+    template: str, context: Dict[str, Any], escape: Optional[str] = None
+) -> str:
     """
     渲染模板字符串（支持变量替换）
 
     Args:
-        template: 模板字符串，支持 {variable} 格式的变量
+        template: 模板字符串，支持 {variable} 格式的变量（可嵌套，如 {app.name}）
         context: 变量上下文
+        escape: 变量值的转义方式（"json" 表示按 JSON 字符串转义），None 表示不转义
 
     Returns:
         渲染后的字符串
     """
     try:
-        result = template
-        for key, value in context.items():
-            placeholder = "{" + key + "}"
-            # 将值转换为字符串
-            str_value = str(value) if value is not None else ""
-            result = result.replace(placeholder, str_value)
-        return result
+        from backend.template_renderer import render
+
+        return render(template, context, syntax="single", escape=escape)
     except Exception as e:
         logger.error(f"模板渲染失败: {e}")
         return template
+
+
+def render_body(
+    template: str, context: Dict[str, Any], headers: Optional[Dict[str, str]] = None
+) -> str:
+    """
+    渲染请求体模板
+
+    Content-Type 为 JSON（默认 application/json）时变量值按 JSON 字符串转义，
+    镜像名、分支名等包含引号或反斜杠时请求体仍是合法 JSON
+
+    Args:
+        template: 请求体模板
+        context: 变量上下文
+        headers: Webhook 配置的请求头（可覆盖 Content-Type）
+
+    Returns:
+        渲染后的请求体
+    """
+    content_type = "application/json"
+    for name, value in (headers or {}).items():
+        if name.lower() == "content-type":
+            content_type = str(value)
+    escape = "json" if "json" in content_type.lower() else None
+    return render_template(template, context, escape=escape)
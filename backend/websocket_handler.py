@@ -10,6 +10,7 @@ from fastapi import WebSocket, WebSocketDisconnect
 from backend.agent_host_manager import AgentHostManager
 from backend.pending_host_manager import pending_host_manager
 from backend.agent_secret_manager import AgentSecretManager
+from backend import metrics
 
 # 存储活跃的连接
 active_connections: Dict[str, WebSocket] = {}
@@ -111,6 +112,9 @@ class ConnectionManager:
             for attempt in range(max_retries):
                 try:
                     await websocket.send_json(message)
+                    metrics.record_websocket_message(
+                        host_id, "out", message.get("type")
+                    )
                     if attempt > 0:
                         logger.info(
                             f"[WebSocket] 消息发送成功（重试 {attempt} 次后）: host_id={host_id}, type={message.get('type')}"
@@ -232,6 +236,7 @@ class ConnectionManager:
         for host_id, websocket in active_connections.items():
             try:
                 await websocket.send_json(message)
+                metrics.record_websocket_message(host_id, "out", message.get("type"))
             except Exception as e:
                 print(f"⚠️ 广播消息失败 ({host_id}): {e}")
                 disconnected.append(host_id)
@@ -515,6 +520,7 @@ async def handle_agent_websocket(
                     continue
 
                 message_type = message.get("type")
+                metrics.record_websocket_message(host_id, "in", message_type)
                 logger.debug(
                     f"[WebSocket] 开始处理消息: {'pending' if is_pending else f'host_id={host_id}'}, type={message_type}"
                 )
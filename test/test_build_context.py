@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+测试构建上下文打包缓存：内容相同的上下文（如重试任务重新克隆到新目录）复用缓存 tar
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import build_context
+
+
+def _write_context(root: str, name: str, files: dict) -> str:
+    """在 root 下创建名为 name 的构建上下文"""
+    context_path = os.path.join(root, name)
+    for rel_path, content in files.items():
+        full_path = os.path.join(context_path, rel_path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "w", encoding="utf-8") as f:
+            f.write(content)
+    return context_path
+
+
+def test_identical_contexts_in_different_dirs_hit_cache():
+    """不同目录下内容相同的上下文，第二次打包命中缓存"""
+    files = {
+        "Dockerfile": "FROM alpine\nCOPY app /app\n",
+        "app/main.py": "print('hello')\n",
+    }
+    with tempfile.TemporaryDirectory() as root:
+        old_cache_dir = build_context.CONTEXT_CACHE_DIR
+        build_context.CONTEXT_CACHE_DIR = os.path.join(root, "context_cache")
+        try:
+            first = build_context.prepare_build_context(
+                _write_context(root, "app_aaaaaaaa", files)
+            )
+            # 重试任务：新目录、重新写入的文件（修改时间不同）
+            second = build_context.prepare_build_context(
+                _write_context(root, "app_bbbbbbbb", files)
+            )
+        finally:
+            build_context.CONTEXT_CACHE_DIR = old_cache_dir
+
+    assert first["cached"] is False
+    assert second["cached"] is True
+    assert second["path"] == first["path"]
+    assert second["file_count"] == first["file_count"] == 2
+
+
+def test_changed_content_misses_cache():
+    """文件内容变化时不复用缓存"""
+    with tempfile.TemporaryDirectory() as root:
+        old_cache_dir = build_context.CONTEXT_CACHE_DIR
+        build_context.CONTEXT_CACHE_DIR = os.path.join(root, "context_cache")
+        try:
+            first = build_context.prepare_build_context(
+                _write_context(root, "a", {"Dockerfile": "FROM alpine\n"})
+            )
+            second = build_context.prepare_build_context(
+                _write_context(root, "b", {"Dockerfile": "FROM busybox\n"})
+            )
+        finally:
+            build_context.CONTEXT_CACHE_DIR = old_cache_dir
+
+    assert second["cached"] is False
+    assert second["path"] != first["path"]
+
+
+if __name__ == "__main__":
+    test_identical_contexts_in_different_dirs_hit_cache()
+    test_changed_content_misses_cache()
+    print("✅ 构建上下文缓存测试通过")
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+测试构建后 Webhook 请求体渲染：JSON 请求体中的变量值按 JSON 字符串转义
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.webhook_trigger import render_body, render_template
+
+BODY_TEMPLATE = '{"image": "{image}", "branch": "{branch}", "tag": "{tag}"}'
+
+
+def test_json_body_escapes_quoted_values():
+    """镜像名、分支名包含引号或反斜杠时仍渲染为合法 JSON"""
+    context = {"image": 'n"g', "branch": "feat\\x", "tag": "v1"}
+    body = render_body(BODY_TEMPLATE, context)
+    assert json.loads(body) == {"image": 'n"g', "branch": "feat\\x", "tag": "v1"}
+
+
+def test_json_escape_option():
+    """render_template 指定 escape="json" 时转义变量值"""
+    body = render_template('{"a":"{image}"}', {"image": 'n"g'}, escape="json")
+    assert json.loads(body) == {"a": 'n"g'}
+
+
+def test_non_json_body_is_not_escaped():
+    """Content-Type 不是 JSON 时保持原样替换"""
+    body = render_body(
+        "image={image}", {"image": 'n"g'}, {"content-type": "text/plain"}
+    )
+    assert body == 'image=n"g'
+
+
+if __name__ == "__main__":
+    test_json_body_escapes_quoted_values()
+    test_json_escape_option()
+    test_non_json_body_is_not_escaped()
+    print("✅ Webhook 请求体渲染测试通过")